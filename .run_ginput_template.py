@@ -4,6 +4,7 @@ import argparse
 from ginput.priors import acos_interface as aci, tccon_priors, map_maker, mlo_smo_prep
 from ginput.mod_maker import mod_maker
 from ginput.download import get_GEOS5
+from ginput.common_utils import bundles
 
 
 def parse_args():
@@ -51,6 +52,13 @@ def parse_args():
     map_parser = subparsers.add_parser('map', help='Generate .map (a priori) files.')
     map_maker.parse_cl_args(map_parser)
 
+    mvm_parser = subparsers.add_parser('mod-vmr-map', help='Generate .map files directly from GEOS data, without '
+                                                           'writing and reading back .mod and .vmr files.')
+    map_maker.parse_mod_vmr_map_args(mvm_parser)
+
+    export_parser = subparsers.add_parser('export-bundle', help='Write the legacy .mod/.vmr/.map files from bundles')
+    bundles.parse_export_args(export_parser)
+
     return vars(parser.parse_args())
 
 
@@ -0,0 +1,579 @@
+"""
+Read and write profile bundles, netCDF4 files that each hold many .mod, .vmr, or .map profiles.
+
+Writing one small text file per site and time, then parsing them all back in, takes most of the time in large
+reprocessing runs. As an alternative, mod_maker, the TCCON priors driver, and map_maker can store their output in
+bundles, one per day holding every site. Each bundle holds one kind of profile ("mod", "vmr" or "map") and has the
+groups:
+
+    * "file": the legacy file name, site abbreviation, date/time, latitude, and longitude of each profile. The
+      date/time, latitude, and longitude are those given in the legacy file name, as the text readers return them.
+    * "constants" and "scalar": values defined once per profile, e.g. the .mod header constants and surface values.
+    * "profile": the profile variables, with dimensions "profiles"-by-"levels" and their units as attributes.
+    * "header": any other text that goes in the legacy file headers, e.g. the .mod version line.
+
+Values are stored at full precision, so :func:`read_bundle` gives slightly different (more precise) values than
+reading the text files. :func:`export_bundle` recreates the legacy text files, formatted exactly as the text writers
+would have written them, for use with GGG.
+"""
+
+from argparse import ArgumentParser
+import datetime as dt
+import netCDF4 as ncdf
+import numpy as np
+import os
+
+from . import mod_utils, ioutils, readers, writers
+from .ggg_logging import logger
+from .. import __version__
+
+bundle_kinds = ('mod', 'vmr', 'map')
+_record_groups = ('constants', 'scalar', 'profile', 'header')
+_time_units = 'seconds since 1970-01-01 00:00:00'
+
+
+def bundle_file_name(product, date, kind):
+    """
+    Construct the standard name for a bundle file.
+
+    :param product: the GEOS product the profiles were made from, e.g. "fpit".
+    :type product: str
+
+    :param date: the day that the bundle holds profiles for.
+    :type date: datetime-like
+
+    :param kind: which kind of profiles the bundle holds, one of "mod", "vmr", or "map".
+    :type kind: str
+
+    :return: the file name (without a directory)
+    :rtype: str
+    """
+    if kind not in bundle_kinds:
+        raise ValueError('kind must be one of: {}'.format(', '.join(bundle_kinds)))
+    return '{}_{}.{}.nc'.format(product.upper(), date.strftime('%Y%m%d'), kind)
+
+
+def write_bundle(bundle_file, kind, records, units=None, product='fpit', replace=False):
+    """
+    Write profiles to a bundle file.
+
+    :param bundle_file: the path to the bundle file to write.
+    :type bundle_file: str
+
+    :param kind: which kind of profiles these are, one of "mod", "vmr", or "map".
+    :type kind: str
+
+    :param records: the profiles to write. Each must be a dictionary with the group "file" and any of "constants",
+     "scalar", "profile", and "header". "file" must contain the keys "name", "site", "datetime", "lat", and "lon". The
+     other groups map variable names to values: floats for "constants" and "scalar", 1D arrays for "profile", and
+     strings for "header". All profiles must have the same variables, in the same order, and the same number of
+     levels.
+    :type records: list(dict)
+
+    :param units: the units of the profile variables, if known.
+    :type units: dict or None
+
+    :param product: the GEOS product the profiles were made from. Used to organize the legacy files into
+     subdirectories when exporting.
+    :type product: str
+
+    :param replace: if ``False`` and ``bundle_file`` already exists, the profiles in it are kept, except for those with
+     the same file name as one of the new profiles. If ``True``, the existing bundle is overwritten.
+    :type replace: bool
+
+    :return: none, writes the bundle file.
+    """
+    if kind not in bundle_kinds:
+        raise ValueError('kind must be one of: {}'.format(', '.join(bundle_kinds)))
+
+    records = list(records)
+    units = dict() if units is None else dict(units)
+    if not replace and os.path.exists(bundle_file):
+        existing_info = read_bundle_info(bundle_file)
+        if existing_info['kind'] != kind:
+            raise ValueError('{} holds {} profiles, cannot add {} profiles to it'.format(
+                bundle_file, existing_info['kind'], kind
+            ))
+        new_names = {rec['file']['name'] for rec in records}
+        records = [rec for rec in read_bundle(bundle_file) if rec['file']['name'] not in new_names] + records
+        existing_info['units'].update(units)
+        units = existing_info['units']
+
+    if len(records) == 0:
+        raise ValueError('No profiles given to write to {}'.format(bundle_file))
+    records.sort(key=lambda rec: (rec['file']['datetime'], rec['file']['name']))
+
+    first_record = records[0]
+    group_keys = {group: list(first_record.get(group, dict()).keys()) for group in _record_groups}
+    nlev = np.size(first_record['profile'][group_keys['profile'][0]]) if group_keys['profile'] else 0
+    for rec in records:
+        for group, keys in group_keys.items():
+            if list(rec.get(group, dict()).keys()) != keys:
+                raise ValueError('Profile {} does not have the same {} variables as profile {}. All profiles in a '
+                                 'bundle must have the same variables.'.format(rec['file']['name'], group,
+                                                                               first_record['file']['name']))
+        for varname, vardat in rec.get('profile', dict()).items():
+            if np.shape(vardat) != (nlev,):
+                raise ValueError('Profile variable {} in {} does not have the same number of levels ({}) as the other '
+                                 'profiles'.format(varname, rec['file']['name'], nlev))
+
+    # Write to a temporary file first so that a failed write cannot leave a partial bundle in place of a complete one
+    tmp_file = bundle_file + '.tmp'
+    try:
+        with ncdf.Dataset(tmp_file, 'w') as wobj:
+            wobj.createDimension('profiles', len(records))
+            wobj.createDimension('levels', nlev)
+
+            file_grp = wobj.createGroup('file')
+            for key in ('name', 'site'):
+                var = file_grp.createVariable(key, str, ('profiles',))
+                var[:] = np.array([rec['file'][key] for rec in records], dtype=object)
+            var = file_grp.createVariable('datetime', 'f8', ('profiles',))
+            var.units = _time_units
+            var[:] = ncdf.date2num([rec['file']['datetime'] for rec in records], _time_units)
+            for key in ('lat', 'lon'):
+                var = file_grp.createVariable(key, 'f8', ('profiles',))
+                var[:] = np.array([rec['file'][key] for rec in records], dtype=float)
+
+            for group in _record_groups:
+                grp = wobj.createGroup(group)
+                for key in group_keys[group]:
+                    if group == 'profile':
+                        var = grp.createVariable(key, 'f8', ('profiles', 'levels'), zlib=True)
+                        var[:] = np.stack([np.ma.filled(rec[group][key], np.nan) for rec in records])
+                        if key in units:
+                            var.units = units[key]
+                    elif group == 'header':
+                        var = grp.createVariable(key, str, ('profiles',))
+                        var[:] = np.array([rec[group][key] for rec in records], dtype=object)
+                    else:
+                        var = grp.createVariable(key, 'f8', ('profiles',))
+                        var[:] = np.array([rec[group][key] for rec in records], dtype=float)
+
+            wobj.bundle_kind = kind
+            wobj.product = product
+            wobj.source = 'ginput version {}'.format(__version__)
+            ioutils.add_creation_info(wobj, creation_note='ginput bundles.write_bundle', creation_att_name='history')
+
+        os.replace(tmp_file, bundle_file)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+
+def read_bundle_info(bundle_file):
+    """
+    Read the kind of profiles in a bundle, the GEOS product they were made from, and the profile variable units.
+
+    :param bundle_file: the path to the bundle file.
+    :type bundle_file: str
+
+    :return: a dictionary with the keys "kind", "product", and "units".
+    :rtype: dict
+    """
+    with ncdf.Dataset(bundle_file) as ds:
+        units = {k: v.units for k, v in ds['profile'].variables.items() if 'units' in v.ncattrs()}
+        return {'kind': ds.bundle_kind, 'product': ds.product, 'units': units}
+
+
+def read_bundle(bundle_file, stacked=False):
+    """
+    Read the profiles in a bundle file.
+
+    :param bundle_file: the path to the bundle file.
+    :type bundle_file: str
+
+    :param stacked: if ``False``, each profile is returned as its own dictionary. If ``True``, all the profiles are
+     returned in a single dictionary, with the same layout as :func:`ginput.priors.tccon_priors.stack_mod_data`.
+    :type stacked: bool
+
+    :return: for each profile, a dictionary with the groups "file", "constants", "scalar", "profile", and "header". For
+     .mod bundles, this is the same form as :func:`~ginput.common_utils.readers.read_mod_file` returns, so the profiles
+     can be passed directly to the TCCON priors code. If ``stacked`` is ``True``, a single dictionary where the
+     "profile" variables are nlev-by-nprof arrays and the other variables nprof-element vectors.
+    :rtype: list(dict) or dict
+    """
+    data = dict()
+    with ncdf.Dataset(bundle_file) as ds:
+        ds.set_auto_mask(False)
+        for group in ('file',) + _record_groups:
+            data[group] = {k: v[:] for k, v in ds[group].variables.items()}
+        file_dates = ncdf.num2date(data['file']['datetime'], ds['file']['datetime'].units,
+                                   only_use_cftime_datetimes=False, only_use_python_datetimes=True)
+        data['file']['datetime'] = np.array(file_dates)
+
+    if stacked:
+        data['profile'] = {k: v.T for k, v in data['profile'].items()}
+        return data
+
+    records = []
+    for iprof in range(data['file']['name'].size):
+        rec = dict()
+        for group, group_data in data.items():
+            if group == 'profile':
+                rec[group] = {k: v[iprof] for k, v in group_data.items()}
+            else:
+                rec[group] = {k: v[iprof].item() if isinstance(v[iprof], np.generic) else v[iprof]
+                              for k, v in group_data.items()}
+        records.append(rec)
+    return records
+
+
+def find_daily_bundles(bundle_dir, kind, date_range, product='fpit', skip_missing=False):
+    """
+    Find the daily bundles in a directory that cover a range of dates.
+
+    :param bundle_dir: the directory containing the bundles, named as :func:`bundle_file_name` names them.
+    :type bundle_dir: str
+
+    :param kind: which kind of bundle to find, one of "mod", "vmr", or "map".
+    :type kind: str
+
+    :param date_range: the first (inclusive) and last (exclusive) date/time to find bundles for.
+    :type date_range: list(datetime-like)
+
+    :param product: the GEOS product the profiles were made from.
+    :type product: str
+
+    :param skip_missing: set to ``True`` to skip days that do not have a bundle, rather than raising an error.
+    :type skip_missing: bool
+
+    :return: the path to each day's bundle, keyed by date, in date order.
+    :rtype: dict
+    :raises IOError: if any of the bundles are missing and ``skip_missing`` is ``False``.
+    """
+    bundle_files = dict()
+    missing_files = []
+    day = date_range[0].date()
+    while dt.datetime.combine(day, dt.time()) < date_range[1]:
+        bundle_file = os.path.join(bundle_dir, bundle_file_name(product, day, kind))
+        if os.path.isfile(bundle_file):
+            bundle_files[day] = bundle_file
+        elif not skip_missing:
+            missing_files.append(bundle_file)
+        day += dt.timedelta(days=1)
+
+    if len(missing_files) > 0:
+        raise IOError('Could not find the following {} bundles:\n  * {}'.format(kind, '\n  * '.join(missing_files)))
+    return bundle_files
+
+
+def select_records(records, date_range=None, sites=None):
+    """
+    Select the profiles in a date range and at certain sites.
+
+    :param records: the profiles, as returned by :func:`read_bundle`.
+    :type records: list(dict)
+
+    :param date_range: the first (inclusive) and last (exclusive) date/time of the profiles to keep. If ``None``, all
+     dates are kept.
+    :type date_range: list(datetime-like)
+
+    :param sites: the abbreviation, latitude, and longitude of each site to keep the profiles for. A profile is kept if
+     it has the site's abbreviation and, unless the site's latitude and longitude are ``None``, lies within 0.5 degrees
+     of them (as the legacy file names usually round the coordinates to whole degrees). If ``None``, all sites are
+     kept.
+    :type sites: list(tuple)
+
+    :return: the selected profiles, in their original order.
+    :rtype: list(dict)
+    """
+    def at_site(file_vars, site):
+        abbrev, lat, lon = site
+        if file_vars['site'] != abbrev:
+            return False
+        elif lat is None:
+            return True
+        dlon = (file_vars['lon'] - lon + 180) % 360 - 180
+        return abs(file_vars['lat'] - lat) <= 0.5 and abs(dlon) <= 0.5
+
+    selected = []
+    for rec in records:
+        file_vars = rec['file']
+        if date_range is not None and not date_range[0] <= file_vars['datetime'] < date_range[1]:
+            continue
+        if sites is not None and not any(at_site(file_vars, s) for s in sites):
+            continue
+        selected.append(rec)
+    return selected
+
+
+def mod_record_from_file(mod_file, site_abbrev='xx'):
+    """
+    Read a GEOS-style .mod file into a profile dictionary that can be written to a bundle.
+
+    :param mod_file: the path to the .mod file.
+    :type mod_file: str
+
+    :param site_abbrev: the site abbreviation to record for this profile.
+    :type site_abbrev: str
+
+    :return: the profile dictionary and the units of the profile variables.
+    :rtype: dict, dict
+    """
+    modstruct = readers.read_mod_file(mod_file, as_struct=True)
+    if len(modstruct.header_lines) != 7:
+        raise ValueError('{} is not a GEOS-style .mod file, only those can be bundled'.format(mod_file))
+    version = modstruct.header_lines[4]
+    units = {n: u for n, u in zip(modstruct.profile_names, modstruct.profile_units)}
+
+    moddat = modstruct.to_dict()
+    record = make_record(os.path.basename(mod_file), site_abbrev, moddat['file'], constants=moddat['constants'],
+                          scalar=moddat['scalar'], profile=moddat['profile'], header={'version': version})
+    return record, units
+
+
+def vmr_record_from_file(vmr_file, site_abbrev='xx'):
+    """
+    Read a .vmr file written by ginput into a profile dictionary that can be written to a bundle.
+
+    :param vmr_file: the path to the .vmr file.
+    :type vmr_file: str
+
+    :param site_abbrev: the site abbreviation to record for this profile.
+    :type site_abbrev: str
+
+    :return: the profile dictionary and the units of the profile variables (always empty, .vmr files do not record
+     units).
+    :rtype: dict, dict
+    """
+    vmrdat = readers.read_vmr_file(vmr_file, lowercase_names=False)
+    # The extra header lines have to be kept exactly as written, so get them from the file rather than the parsed values
+    nheader = mod_utils.get_num_header_lines(vmr_file)
+    with open(vmr_file, 'r') as robj:
+        header_lines = [robj.readline() for _ in range(nheader)]
+    standard_keys = ('GINPUT_VERSION', 'ZTROP_VMR', 'DATE_VMR', 'LAT_VMR')
+    extra_lines = [line[1:].rstrip('\n') for line in header_lines[1:-1] if line.split(':')[0].strip() not in standard_keys]
+
+    file_vars = dict(vmrdat['file'])
+    file_vars['lat'] = vmrdat['scalar']['LAT_VMR']
+    profile = vmrdat['profile']
+    gas_names = [k for k in profile if k != 'Altitude']
+    record = make_record(os.path.basename(vmr_file), site_abbrev, file_vars,
+                          scalar={'ZTROP_VMR': vmrdat['scalar']['ZTROP_VMR']}, profile=profile,
+                          header={'gas_name_order': ' '.join(gas_names), 'extra_header': '\n'.join(extra_lines)})
+    return record, dict()
+
+
+def map_record_from_file(map_file):
+    """
+    Read a text .map file into a profile dictionary that can be written to a bundle.
+
+    :param map_file: the path to the .map file.
+    :type map_file: str
+
+    :return: the profile dictionary and the units of the profile variables.
+    :rtype: dict, dict
+    """
+    if not map_file.endswith('.map'):
+        raise ValueError('Only text .map files can be bundled')
+
+    mapdat = readers.read_map_file(map_file)
+    nheader = mod_utils.get_num_header_lines(map_file)
+    with open(map_file, 'r') as robj:
+        header_lines = [robj.readline().rstrip('\n') for _ in range(nheader)]
+    wet_or_dry = 'wet' if writers.wmf_message[0] in header_lines else 'dry'
+
+    base_name = os.path.basename(map_file)
+    file_vars = {'datetime': mod_utils.find_datetime_substring(base_name, out_type=dt.datetime),
+                 'lat': mod_utils.find_lat_substring(base_name, to_float=True),
+                 'lon': mod_utils.find_lon_substring(base_name, to_float=True)}
+    record = map_record(base_name, base_name.split('_')[0], file_vars, mapdat['profile'],
+                        mapdat['constants']['Latitude'], wet_or_dry)
+    return record, dict(writers._map_text_units)
+
+
+def map_record(map_name, site_abbrev, file_vars, mapdat, obs_lat, wet_or_dry):
+    """
+    Create a profile dictionary for a .map profile that can be written to a bundle.
+
+    :param map_name: the name of the legacy .map file for this profile.
+    :type map_name: str
+
+    :param site_abbrev: the site abbreviation for this profile.
+    :type site_abbrev: str
+
+    :param file_vars: a dictionary with the date/time, latitude, and longitude given in the file name.
+    :type file_vars: dict
+
+    :param mapdat: the .map profile variables, with the names used in the text .map files.
+    :type mapdat: dict
+
+    :param obs_lat: the latitude of the profile.
+    :type obs_lat: float
+
+    :param wet_or_dry: whether the gas concentrations are "wet" or "dry" mole fractions.
+    :type wet_or_dry: str
+
+    :return: the profile dictionary
+    :rtype: dict
+    """
+    profile = {k: mapdat[k] for k in writers._map_var_order}
+    return make_record(map_name, site_abbrev, file_vars, scalar={'obs_lat': obs_lat}, profile=profile,
+                       header={'wet_or_dry': wet_or_dry})
+
+
+def make_record(name, site_abbrev, file_vars, constants=None, scalar=None, profile=None, header=None):
+    """
+    Create a profile dictionary that can be written to a bundle.
+
+    :param name: the name of the legacy file for this profile.
+    :type name: str
+
+    :param site_abbrev: the site abbreviation for this profile.
+    :type site_abbrev: str
+
+    :param file_vars: a dictionary with the date/time ("datetime"), latitude ("lat"), and longitude ("lon") given in
+     the legacy file name.
+    :type file_vars: dict
+
+    :param constants: the values for the "constants" group.
+    :type constants: dict or None
+
+    :param scalar: the values for the "scalar" group.
+    :type scalar: dict or None
+
+    :param profile: the profile variables.
+    :type profile: dict or None
+
+    :param header: the strings for the "header" group.
+    :type header: dict or None
+
+    :return: the profile dictionary
+    :rtype: dict
+    """
+    file_vars = {'name': name, 'site': site_abbrev, 'datetime': file_vars['datetime'], 'lat': file_vars['lat'],
+                 'lon': file_vars['lon']}
+    return {'file': file_vars,
+            'constants': dict() if constants is None else constants,
+            'scalar': dict() if scalar is None else scalar,
+            'profile': dict() if profile is None else profile,
+            'header': dict() if header is None else header}
+
+
+def bundle_text_files(bundle_file, kind, files, site_abbrev='xx', product='fpit', replace=False):
+    """
+    Store existing legacy text files in a bundle.
+
+    :param bundle_file: the path to the bundle file to write.
+    :type bundle_file: str
+
+    :param kind: which kind of files these are, one of "mod", "vmr", or "map".
+    :type kind: str
+
+    :param files: the paths to the text files to store.
+    :type files: list(str)
+
+    :param site_abbrev: the site abbreviation to record for the .mod and .vmr files. The site for .map files is taken
+     from their file names.
+    :type site_abbrev: str
+
+    :param product: the GEOS product the files were made from.
+    :type product: str
+
+    :param replace: see :func:`write_bundle`.
+    :type replace: bool
+
+    :return: none, writes the bundle file.
+    """
+    records = []
+    units = dict()
+    for fname in files:
+        if kind == 'mod':
+            rec, rec_units = mod_record_from_file(fname, site_abbrev=site_abbrev)
+        elif kind == 'vmr':
+            rec, rec_units = vmr_record_from_file(fname, site_abbrev=site_abbrev)
+        elif kind == 'map':
+            rec, rec_units = map_record_from_file(fname)
+        else:
+            raise ValueError('kind must be one of: {}'.format(', '.join(bundle_kinds)))
+        records.append(rec)
+        units.update(rec_units)
+
+    write_bundle(bundle_file, kind, records, units=units, product=product, replace=replace)
+
+
+def export_bundle(bundle_file, save_dir, flat_outdir=True, map_fmt='txt', no_cfunits=False):
+    """
+    Write the legacy files for every profile in a bundle.
+
+    :param bundle_file: the path to the bundle file.
+    :type bundle_file: str
+
+    :param save_dir: the directory to write the legacy files to.
+    :type save_dir: str
+
+    :param flat_outdir: if ``True``, the files are written directly to ``save_dir``. If ``False``, they are organized
+     into the standard <product>/<site>/vertical, vmrs-vertical, or maps-vertical subdirectories.
+    :type flat_outdir: bool
+
+    :param map_fmt: which format to write .map files in, "txt" for the text format or "nc" for netCDF files. Not used
+     for .mod or .vmr bundles.
+    :type map_fmt: str
+
+    :param no_cfunits: see :func:`~ginput.common_utils.writers.write_map_file`.
+    :type no_cfunits: bool
+
+    :return: the paths to the files written.
+    :rtype: list(str)
+    """
+    info = read_bundle_info(bundle_file)
+    kind = info['kind']
+    product = info['product']
+    out_files = []
+    for rec in read_bundle(bundle_file):
+        site_abbrev = rec['file']['site']
+        if flat_outdir:
+            out_dir = save_dir
+        elif kind == 'mod':
+            out_dir = mod_utils.mod_output_subdir(save_dir, site_abbrev, product=product)
+        elif kind == 'vmr':
+            out_dir = mod_utils.vmr_output_subdir(save_dir, site_abbrev, product=product)
+        else:
+            out_dir = os.path.join(save_dir, product, site_abbrev, 'maps-vertical')
+        os.makedirs(out_dir, exist_ok=True)
+        out_file = os.path.join(out_dir, rec['file']['name'])
+
+        if kind == 'mod':
+            writers.write_mod_file(out_file, rec['header']['version'], constants=rec['constants'],
+                                   scalar=rec['scalar'], profile=rec['profile'])
+        elif kind == 'vmr':
+            profile_gases = dict(rec['profile'])
+            profile_alt = profile_gases.pop('Altitude')
+            extra_header = rec['header']['extra_header']
+            writers.write_vmr_file(out_file, tropopause_alt=rec['scalar']['ZTROP_VMR'],
+                                   profile_date=rec['file']['datetime'], profile_lat=rec['file']['lat'],
+                                   profile_alt=profile_alt, profile_gases=profile_gases,
+                                   gas_name_order=rec['header']['gas_name_order'].split(),
+                                   extra_header_info=extra_header.split('\n') if extra_header else None)
+        else:
+            if map_fmt == 'nc':
+                out_file += '.nc'
+            writers.write_map_file(out_file, rec['profile'], rec['scalar']['obs_lat'], fmt=map_fmt,
+                                   wet_or_dry=rec['header']['wet_or_dry'], obs_date=rec['file']['datetime'],
+                                   obs_site=site_abbrev, file_lat=rec['file']['lat'], file_lon=rec['file']['lon'],
+                                   no_cfunits=no_cfunits)
+        out_files.append(out_file)
+
+    logger.info('Wrote {} {} files from {}'.format(len(out_files), kind, bundle_file))
+    return out_files
+
+
+def export_cl_driver(bundle_files, save_dir, flat_outdir=False, map_fmt='txt', req_cfunits=False):
+    for bundle_file in bundle_files:
+        export_bundle(bundle_file, save_dir, flat_outdir=flat_outdir, map_fmt=map_fmt, no_cfunits=not req_cfunits)
+
+
+def parse_export_args(p: ArgumentParser):
+    p.description = 'Write the legacy .mod, .vmr, or .map files from profile bundles'
+    p.add_argument('bundle_files', nargs='+', help='The bundle files to write the legacy files from.')
+    p.add_argument('-s', '--save-dir', required=True, help='Directory to write the legacy files to.')
+    p.add_argument('-f', '--flat-outdir', action='store_true',
+                   help='Write the files directly to the save directory, rather than organizing by '
+                        'product/site/vertical, vmrs-vertical, or maps-vertical.')
+    p.add_argument('--map-fmt', choices=('txt', 'nc'), default='txt',
+                   help='Format to write .map files from map bundles in, "txt" for the legacy text format or "nc" '
+                        'for netCDF. Default is "%(default)s".')
+    p.add_argument('-c', '--req-cfunits', action='store_true',
+                   help='Require that CFUnits be successfully imported when writing netCDF .map files.')
+    p.set_defaults(driver_fxn=export_cl_driver)
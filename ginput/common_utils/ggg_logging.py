@@ -1,5 +1,6 @@
 from __future__ import print_function, division
 
+from contextlib import contextmanager
 import logging
 
 
@@ -30,6 +31,25 @@ logger.addHandler(_log_handler)
 logger.setLevel('DEBUG')
 
 
+@contextmanager
+def redirect_log_stream(stream):
+    """
+    Temporarily send the package logger's console output to another stream.
+
+    The console handler keeps the stream it was created with, so :func:`contextlib.redirect_stderr` alone does not
+    capture log messages. Log files are not affected.
+
+    :param stream: the file-like object to write log messages to.
+
+    :return: context manager
+    """
+    old_stream = _log_handler.setStream(stream)
+    try:
+        yield stream
+    finally:
+        _log_handler.setStream(old_stream)
+
+
 def _log_to_file(filename=''):
     fh = logging.FileHandler(filename=filename, mode='w')
     fh.setFormatter(_formatter)
@@ -5,9 +5,13 @@ import datetime as dt
 from hashlib import sha1
 import netCDF4 as ncdf
 import numpy as np
+import os
 from subprocess import CalledProcessError
+import time
 
 from . import mod_utils
+from .ggg_logging import logger
+from .. import __version__
 
 
 def make_ncdim_helper(nc_handle, dim_name, dim_var, **attrs):
@@ -232,3 +236,178 @@ def add_dependent_file_hash(nc_handle, hash_att_name, dependent_file):
     """
     hash_hex = make_dependent_file_hash(dependent_file)
     nc_handle.setncattr(hash_att_name, hash_hex)
+
+
+# The code that builds the equivalent latitude tables: the calculation itself is in mod_utils, and mod_maker reads the
+# GEOS files and sets up the calculation. mod_maker imports this module, so it is found by path rather than imported.
+_eqlat_table_code_files = (os.path.abspath(mod_utils.__file__),
+                           os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'mod_maker',
+                                        'mod_maker.py'))
+
+
+class EqLatTableCache(object):
+    """
+    A persistent on-disk cache of the equivalent latitude interpolation tables computed from GEOS files.
+
+    Computing the equivalent latitude interpolator for one GEOS file takes several minutes, and the same GEOS files
+    are often needed again by later runs (reprocessing, making .mod files for different sites, or satellite granules that
+    share GEOS times). This cache stores the tables behind each :class:`~ginput.common_utils.mod_utils.EqLatInterpolator`
+    in a small netCDF file. Entries are keyed by the SHA1 hash of the GEOS file's contents, the SHA1 hashes of
+    :mod:`mod_utils` (where the equivalent latitude calculation is defined) and :mod:`~ginput.mod_maker.mod_maker`
+    (which builds the tables from the GEOS files), and the ginput version. Any change to the GEOS file or the code
+    therefore results in a cache miss rather than stale tables.
+
+    Reading an entry refreshes its modification time, so that eviction by ``max_entries`` removes the least recently
+    used entries first.
+
+    :param cache_dir: the directory to store the cached tables in. Will be created if it does not exist.
+    :type cache_dir: str
+
+    :param max_entries: the maximum number of tables to keep in the cache. When more than this are present after
+     adding a new one, the least recently used are deleted. ``None`` means no limit.
+    :type max_entries: int or None
+
+    :param max_age_days: tables not used in this many days are deleted when a new one is added. ``None`` means no
+     limit.
+    :type max_age_days: float or None
+    """
+    file_prefix = 'eqlat_table_'
+    file_suffix = '.nc'
+
+    def __init__(self, cache_dir, max_entries=None, max_age_days=None):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self._code_hash = ':'.join(make_dependent_file_hash(f) for f in _eqlat_table_code_files)
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def cache_key(self, geos_file):
+        """
+        Compute the cache key for a GEOS file.
+
+        :param geos_file: path to the GEOS file
+        :type geos_file: str
+
+        :return: the key, as a hexadecimal SHA1 hash
+        :rtype: str
+        """
+        key = '{}:{}:{}'.format(make_dependent_file_hash(geos_file), self._code_hash, __version__)
+        return sha1(key.encode('utf8')).hexdigest()
+
+    def cache_file(self, geos_file=None, key=None):
+        """
+        Get the path of the cache file for a GEOS file or key. One of ``geos_file`` or ``key`` must be given.
+
+        :param geos_file: path to the GEOS file
+        :type geos_file: str
+
+        :param key: the cache key, as returned by :meth:`cache_key`
+        :type key: str
+
+        :return: the path to the cache file. It may or may not exist.
+        :rtype: str
+        """
+        if key is None:
+            key = self.cache_key(geos_file)
+        return os.path.join(self.cache_dir, '{}{}{}'.format(self.file_prefix, key, self.file_suffix))
+
+    def load(self, geos_file, key=None):
+        """
+        Load the equivalent latitude interpolator for a GEOS file from the cache.
+
+        :param geos_file: path to the GEOS file
+        :type geos_file: str
+
+        :param key: the cache key for ``geos_file``, if already computed.
+        :type key: str
+
+        :return: the interpolator, or ``None`` if this GEOS file is not in the cache or its entry could not be read.
+        :rtype: :class:`~ginput.common_utils.mod_utils.EqLatInterpolator` or None
+        """
+        cache_file = self.cache_file(geos_file, key=key)
+        if not os.path.exists(cache_file):
+            return None
+
+        try:
+            with ncdf.Dataset(cache_file, 'r') as nch:
+                interpolator = mod_utils.EqLatInterpolator(pv_grid=nch.variables['pv'][:].filled(np.nan),
+                                                           theta_grid=nch.variables['theta'][:].filled(np.nan),
+                                                           interp_el=nch.variables['eqlat'][:].filled(np.nan))
+        except (OSError, KeyError, ValueError) as err:
+            logger.warning('Could not read cached equivalent latitude table {} ({}), will recompute it'
+                           .format(cache_file, err))
+            return None
+
+        try:
+            # Mark this entry as recently used so that it is not the first one evicted
+            os.utime(cache_file)
+        except OSError:
+            pass
+        logger.debug('Loaded equivalent latitude table for {} from {}'.format(geos_file, cache_file))
+        return interpolator
+
+    def save(self, geos_file, interpolator, key=None):
+        """
+        Save the equivalent latitude interpolator for a GEOS file to the cache, then evict old entries.
+
+        The file is written under a temporary name and moved into place, so concurrent runs sharing a cache will never
+        see a partially written entry.
+
+        :param geos_file: path to the GEOS file
+        :type geos_file: str
+
+        :param interpolator: the interpolator computed from ``geos_file``
+        :type interpolator: :class:`~ginput.common_utils.mod_utils.EqLatInterpolator`
+
+        :param key: the cache key for ``geos_file``, if already computed.
+        :type key: str
+
+        :return: None
+        """
+        cache_file = self.cache_file(geos_file, key=key)
+        tmp_file = '{}.{}.tmp'.format(cache_file, os.getpid())
+        with ncdf.Dataset(tmp_file, 'w') as nch:
+            make_ncdim_helper(nch, 'pv', interpolator.pv_grid, units='PVU')
+            make_ncdim_helper(nch, 'theta', interpolator.theta_grid, units='K')
+            var = nch.createVariable('eqlat', interpolator.interp_EL.dtype, dimensions=('theta', 'pv'), zlib=True)
+            var[:] = interpolator.interp_EL
+            var.units = 'degrees_north'
+            nch.geos_file = os.path.basename(geos_file)
+            nch.mod_utils_sha1 = self._code_hash
+            nch.ginput_version = __version__
+            add_creation_info(nch, creation_note='ioutils.EqLatTableCache')
+        os.replace(tmp_file, cache_file)
+        self.evict()
+
+    def evict(self):
+        """
+        Delete cache entries that are older than ``max_age_days`` or in excess of ``max_entries``.
+
+        :return: None
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.startswith(self.file_prefix) and name.endswith(self.file_suffix):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    entries.append((os.path.getmtime(path), path))
+                except OSError:
+                    # another process may have evicted this entry already
+                    continue
+
+        # newest first
+        entries.sort(reverse=True)
+        to_remove = []
+        if self.max_age_days is not None:
+            oldest_allowed = time.time() - self.max_age_days * 86400
+            to_remove.extend(path for mtime, path in entries if mtime < oldest_allowed)
+        if self.max_entries is not None:
+            to_remove.extend(path for _, path in entries[self.max_entries:])
+
+        for path in set(to_remove):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            else:
+                logger.debug('Evicted {} from the equivalent latitude cache'.format(path))
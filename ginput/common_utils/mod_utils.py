@@ -22,7 +22,7 @@ import pandas as pd
 import re
 
 from numpy.core._multiarray_umath import arctan, tan, sin, cos
-from scipy.interpolate import interp1d, interp2d
+from scipy.interpolate import interp1d, RegularGridInterpolator
 import subprocess
 import sys
 from warnings import warn
@@ -656,21 +656,27 @@ def calculate_potential_temperature(pres, temp):
     return temp * (1000/pres) ** 0.286
 
 
-def convert_geos_eta_coord(delp):
+def convert_geos_eta_coord(delp, axis=None):
     """
     Calculate the pressure grid for a GEOS native file.
 
     :param pres: DELP (pressure thickness) array in Pa. May be any number of
      dimensions, as long as exactly one has a length of 72.
+    :param axis: optional, the index of the vertical dimension of ``delp``. If
+     not given, it is the dimension with a length of 72. Give this if other
+     dimensions might also have 72 elements.
     :return: the pressure level midpoints, in hPa. Note the unit change, this
      is because the GEOS DELP variable is usually in Pa, but hPa is the standard
      unit for pressure levels in the Np files.
     """
     dp_shape = np.array(delp.shape)
-    try:
-        i_ax = np.flatnonzero(dp_shape == 72).item()
-    except ValueError:
-        raise ValueError('delp is either missing its 72 level dimension or has multiple dimensions with length 72')
+    if axis is not None:
+        i_ax = axis
+    else:
+        try:
+            i_ax = np.flatnonzero(dp_shape == 72).item()
+        except ValueError:
+            raise ValueError('delp is either missing its 72 level dimension or has multiple dimensions with length 72')
 
     # From pg. 7 of the GEOS FP document (https://gmao.gsfc.nasa.gov/GMAO_products/documents/GEOS_5_FP_File_Specification_ON4v1_2.pdf)
     # the top pressure is always 0.01 hPa. Since the columns are space-to-surface, we add the cumulative sum to get the
@@ -751,6 +757,179 @@ def calculate_area(lat, lon, lat_res=None, lon_res=None, muted=False):
     return area
 
 
+class EqLatInterpolator(object):
+    """
+    Interpolate equivalent latitude to arbitrary potential vorticity and potential temperature values.
+
+    Instances of this class are returned by :func:`calculate_eq_lat` and replace the :class:`scipy.interpolate.interp2d`
+    objects previously used. Unlike ``interp2d``, calling an instance evaluates equivalent latitude elementwise, so
+    whole profiles, batches of soundings, or full 3D/4D model grids can be passed in one call::
+
+        el = interpolator(epv, theta)
+
+    where ``el`` will have the broadcast shape of ``epv`` and ``theta``. The interpolation is bilinear on the
+    (theta, PV) grid. Values outside the grid are clamped to its edges, which reproduces the nearest-neighbor
+    extrapolation ``interp2d`` did by default. Where either input is NaN, the output is NaN.
+
+    :param pv_grid: the vector of potential vorticity values (in PVU) defining the second dimension of ``interp_el``.
+     Must be strictly increasing.
+    :type pv_grid: array-like
+
+    :param theta_grid: the vector of potential temperature values (in K) defining the first dimension of
+     ``interp_el``. Must be strictly increasing.
+    :type theta_grid: array-like
+
+    :param interp_el: the array of equivalent latitudes (in degrees) on the theta-by-PV grid.
+    :type interp_el: array-like
+    """
+    def __init__(self, pv_grid, theta_grid, interp_el):
+        """
+        See class help.
+        """
+        self.pv_grid = np.asarray(pv_grid, dtype=float)
+        self.theta_grid = np.asarray(theta_grid, dtype=float)
+        self.interp_EL = np.asarray(interp_el, dtype=float)
+        if self.interp_EL.shape != (self.theta_grid.size, self.pv_grid.size):
+            raise ValueError('interp_el must have shape (ntheta, npv) = ({}, {})'.format(self.theta_grid.size,
+                                                                                        self.pv_grid.size))
+        self._interpolator = RegularGridInterpolator((self.theta_grid, self.pv_grid), self.interp_EL,
+                                                     method='linear', bounds_error=False, fill_value=None)
+
+    def __call__(self, pv, theta):
+        """
+        Compute equivalent latitude.
+
+        :param pv: potential vorticity in PVU (1e-6 K . m2 / kg / s).
+        :type pv: array-like
+
+        :param theta: potential temperature in K. Must be broadcastable against ``pv``.
+        :type theta: array-like
+
+        :return: equivalent latitude in degrees, with the broadcast shape of ``pv`` and ``theta``.
+        :rtype: :class:`numpy.ndarray`
+        """
+        pv, theta = np.broadcast_arrays(np.ma.filled(pv, np.nan).astype(float),
+                                        np.ma.filled(theta, np.nan).astype(float))
+        pv = np.clip(pv, self.pv_grid[0], self.pv_grid[-1])
+        theta = np.clip(theta, self.theta_grid[0], self.theta_grid[-1])
+        not_nan = ~(np.isnan(pv) | np.isnan(theta))
+
+        el = np.full(pv.shape, np.nan)
+        el[not_nan] = self._interpolator(np.column_stack([theta[not_nan], pv[not_nan]]))
+        return el
+
+
+def _interp_columns(x, xp, fp):
+    """
+    Linearly interpolate every column of an array to a common set of coordinates.
+
+    This gives the same result as ``out[:, i, j] = np.interp(x, xp[:, i, j], fp[:, i, j])`` for every column, but
+    interpolates all the columns whose ``xp`` values are non-decreasing at once. Any other columns (including ones with
+    NaNs in ``xp``) fall back on :func:`numpy.interp`, since what it returns for non-monotonic coordinates depends on
+    its search algorithm.
+
+    :param x: the coordinates to interpolate to, must be increasing.
+    :type x: :class:`numpy.ndarray`
+
+    :param xp: the coordinates of the input columns, with the interpolation dimension first.
+    :type xp: :class:`numpy.ndarray`
+
+    :param fp: the values of the input columns, same shape as ``xp``.
+    :type fp: :class:`numpy.ndarray`
+
+    :return: the interpolated values, with shape ``(x.size,) + xp.shape[1:]``.
+    :rtype: :class:`numpy.ndarray`
+    """
+    nlev = xp.shape[0]
+    out_shape = (np.size(x),) + xp.shape[1:]
+    xp = xp.reshape(nlev, -1)
+    fp = fp.reshape(nlev, -1)
+    out = np.zeros([np.size(x), xp.shape[1]])
+
+    monotonic = np.all(np.diff(xp, axis=0) >= 0, axis=0)
+    for icol in np.flatnonzero(~monotonic):
+        out[:, icol] = np.interp(x, xp[:, icol], fp[:, icol])
+
+    # Selecting columns doesn't necessarily give C-ordered arrays, which the flat indices used below assume
+    xp = np.ascontiguousarray(xp[:, monotonic])
+    fp = np.ascontiguousarray(fp[:, monotonic])
+    cols = np.arange(xp.shape[1])
+
+    # For each x, we need the number of levels in each column with xp <= x. A level counts for every x from its
+    # insertion point on, so mark the insertion points then accumulate along x.
+    level_counts = np.zeros([np.size(x) + 1, xp.shape[1]], dtype=np.int16)
+    for ilev in range(nlev):
+        level_counts[np.searchsorted(x, xp[ilev], side='left'), cols] += 1
+    level_counts = np.cumsum(level_counts[:-1], axis=0, dtype=np.int16)
+
+    # Same slope calculation as np.interp. Repeated xp values give non-finite slopes, but those are never used since
+    # the interval selected for each x always has xp[j] <= x < xp[j+1].
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slopes = np.diff(fp, axis=0) / np.diff(xp, axis=0)
+
+    mono_out = np.zeros([np.size(x), xp.shape[1]])
+    for i, x_val in enumerate(x):
+        # Index of the last level <= x_val; like np.interp, use the end values outside the range of xp
+        j = level_counts[i].astype(int) - 1
+        flat_inds = np.clip(j, 0, nlev - 2) * xp.shape[1] + cols
+        x0 = xp.take(flat_inds)
+        f0 = fp.take(flat_inds)
+        val = slopes.take(flat_inds) * (x_val - x0) + f0
+        val = np.where(x0 == x_val, f0, val)
+        val = np.where(j < 0, fp[0], val)
+        mono_out[i] = np.where(j >= nlev - 1, fp[-1], val)
+
+    out[:, monotonic] = mono_out
+    return out.reshape(out_shape)
+
+
+def _area_above_thresholds(values, area, thresholds):
+    """
+    Compute the total area of the grid cells with values greater than or equal to each of a set of thresholds.
+
+    This is equivalent to ``[np.sum(area[values >= t]) for t in thresholds]``, but bins the cells by how many
+    thresholds they are at or above and takes a cumulative sum of the binned areas, rather than build a mask of the
+    whole grid for each threshold.
+
+    :param values: the values on the grid. NaNs are not counted toward any threshold.
+    :type values: :class:`numpy.ndarray`
+
+    :param area: the area of each grid cell, same shape as ``values``.
+    :type area: :class:`numpy.ndarray`
+
+    :param thresholds: the thresholds to compute the area at or above, must be sorted in increasing order.
+    :type thresholds: :class:`numpy.ndarray`
+
+    :return: the area for each threshold
+    :rtype: :class:`numpy.ndarray`
+    """
+    values = np.ravel(values)
+    area = np.ravel(area)
+    not_nan = ~np.isnan(values)
+
+    # A cell at or above n thresholds contributes to the area of the first n thresholds, so the area for threshold
+    # i is the sum of the areas binned at i+1 or greater.
+    n_thresh_below = np.searchsorted(thresholds, values[not_nan], side='right')
+    binned_area = np.bincount(n_thresh_below, weights=area[not_nan], minlength=np.size(thresholds) + 1)
+    return np.cumsum(binned_area[::-1])[::-1][1:]
+
+
+def _eqlat_from_area(area_total):
+    """
+    Convert the area poleward of a PV contour (in steradians) to equivalent latitude in degrees.
+    """
+    x = 1 - area_total/(2*np.pi)
+
+    # With Python 3.10 and those dependencies, I started getting cases where x was *just* outside the -1 to 1 allowed domain,
+    # which led to NaNs in the EqL and so bad things downstream. Since values were only slightly outside the domain, it's fine
+    # to clip them, but if they go too far outside the expected values, then we may have a bigger problem.
+    far_outside = (x < -1.01) | (x > 1.01)
+    if np.any(far_outside):
+        warn(f'Total area divided by 2*pi (x={x[far_outside]}) is far outside the domain of arcsin in EqL calculation. Clipping to -1 to 1.')
+
+    return np.arcsin(np.clip(x, -1, 1))*90.0*2/np.pi
+
+
 def calculate_eq_lat_on_grid(EPV, PT, area):
     """
     Calculate equivalent latitude on a 4D grid.
@@ -771,16 +950,7 @@ def calculate_eq_lat_on_grid(EPV, PT, area):
 
     for itime in range(PT.shape[0]):
         interpolator = calculate_eq_lat(EPV[itime], PT[itime], area)
-        # This is probably going to be horrifically slow - but interp2d sometimes gives weird results when called with
-        # vectors, so unfortunately we have to call this one element at a time
-        pbar = ProgressBar(PT[itime].size, prefix='Calculating eq. lat for time {}/{}:'.format(itime, PT.shape[0]),
-                           style='counter')
-        for i in range(PT[itime].size):
-            pbar.print_bar(i)
-            ilev, ilat, ilon = np.unravel_index(i, PT[itime].shape)
-            this_pt = PT[itime, ilev, ilat, ilon]
-            this_epv = EPV[itime, ilev, ilat, ilon]
-            EL[itime, ilev, ilat, ilon] = interpolator(this_epv, this_pt)[0]
+        EL[itime] = interpolator(EPV[itime], PT[itime])
 
     return EL
 
@@ -798,15 +968,9 @@ def calculate_eq_lat(EPV, PT, area):
     :param area: the 2D grid of surface area (in steradians) that corresponds to the 2D slices of the 4D grid.
     :type area: :class:`numpy.ndarray`
 
-    :return: a 2D interpolator for equivalent latitude, requires potential vorticity and potential temperature as inputs
-    :rtype: :class:`scipy.interpolate.interp2d`
-
-    Note: when querying the interpolator for equivalent latitude, it is often best to call it with scalar values, even
-    though that is slower than calling it with the full vector of PV and PT that you wish to get EL for. The problem is
-    that scipy 2D interpolators, when given vectors as input, return a grid. This would be fine, except that the values
-    corresponding to the vector of PV and PT are not always along the diagonal and so cannot be extracted with
-    :func:`numpy.diag`. (I suspect what is happening is that the interpolator sorts the input values when constructing
-    the grid, but I have not tested this. -JLL)
+    :return: a 2D interpolator for equivalent latitude, requires potential vorticity and potential temperature as inputs.
+     It evaluates elementwise, so arrays of PV and PT of any (matching) shape may be passed to it at once.
+    :rtype: :class:`EqLatInterpolator`
     """
     nlev, nlat, nlon = PT.shape
     # Get rid of fill values, this fills the bottom of profiles with the first valid value
@@ -827,11 +991,8 @@ def calculate_eq_lat(EPV, PT, area):
                                  (500.0, 750.0, 20.0), (750.0, 1000.0, 30.0), (1000.0, round_to_zero(np.nanmax(PT)), 100.0))
     new_nlev = np.size(theta_grid)
 
-    # Get PV on the fixed PT levels ~ 2 seconds per date
-    new_EPV = np.zeros([new_nlev, nlat, nlon])
-    for i in range(nlat):
-        for j in range(nlon):
-            new_EPV[:, i, j] = np.interp(theta_grid, PT[:, i, j], EPV[:, i, j])
+    # Get PV on the fixed PT levels
+    new_EPV = _interp_columns(theta_grid, PT, EPV)
 
     # Compute equivalent latitudes
     EL = np.zeros([new_nlev, 100])
@@ -842,24 +1003,7 @@ def calculate_eq_lat(EPV, PT, area):
 
         # define 100 PV values between the min and max PV
         EPV_thresh[k] = np.linspace(minPV,maxPV,100)
-
-        for l,thresh in enumerate(EPV_thresh[k]):
-            area_total = np.sum(area[new_EPV[k]>=thresh])
-            x = 1-area_total/(2*np.pi)
-
-            # With Python 3.10 and those dependencies, I started getting cases where x was *just* outside the -1 to 1 allowed domain,
-            # which led to NaNs in the EqL and so bad things downstream. Since values were only slightly outside the domain, it's fine
-            # to clip them, but if they go too far outside the expected values, then we may have a bigger problem.
-            if x < -1.01 or x > 1.01:
-                warn(f'Total area divided by 2*pi (x={x}) is far outside the domain of arcsin in EqL calculation. Clipping to -1 to 1.')
-                
-            if x < -1:
-                x = -1
-            elif x > 1:
-                x = 1
-
-            
-            EL[k,l] = np.arcsin(x)*90.0*2/np.pi
+        EL[k] = _eqlat_from_area(_area_above_thresholds(new_EPV[k], area, EPV_thresh[k]))
 
     # Define a fixed potential vorticity grid, with increasing spacing away from 0
     # The last term should ensure that 0 is in the grid
@@ -873,15 +1017,26 @@ def calculate_eq_lat(EPV, PT, area):
     for k in range(new_nlev):
         interp_EL[k] = np.interp(pv_grid,EPV_thresh[k],EL[k])
 
-    return interp2d(pv_grid, theta_grid, interp_EL)
+    return EqLatInterpolator(pv_grid, theta_grid, interp_EL)
 
 
 def get_eqlat_profile(interpolator, epv, theta):
-    el = np.full_like(epv, np.nan)
-    for i, (pv, pt) in enumerate(zip(epv, theta)):
-        el[i] = interpolator(pv, pt)
+    """
+    Compute an equivalent latitude profile.
+
+    :param interpolator: the equivalent latitude interpolator returned by :func:`calculate_eq_lat`.
+    :type interpolator: :class:`EqLatInterpolator`
+
+    :param epv: the potential vorticity profile, in PVU.
+    :type epv: array-like
 
-    return el
+    :param theta: the potential temperature profile, in K.
+    :type theta: array-like
+
+    :return: the equivalent latitude profile, same shape as ``epv``.
+    :rtype: :class:`numpy.ndarray`
+    """
+    return interpolator(epv, theta)
 
 
 def calculate_eq_lat_field(EPV, PT, area):
@@ -929,11 +1084,8 @@ def calculate_eq_lat_field(EPV, PT, area):
     #theta_array = np.geomspace(round_to_zero(np.nanmin(PT)),round_to_zero(np.nanmax(PT)),130)
     new_nlev = np.size(theta_array)
 
-    # Get PV on the fixed PT levels ~ 2 seconds per date
-    new_EPV = np.zeros([new_nlev, nlat, nlon])
-    for i in range(nlat):
-        for j in range(nlon):
-            new_EPV[:, i, j] = np.interp(theta_array, PT[:, i, j], EPV[:, i, j])
+    # Get PV on the fixed PT levels
+    new_EPV = _interp_columns(theta_array, PT, EPV)
 
     # Compute equivalent latitudes
     EL = np.zeros([new_nlev, 100])
@@ -945,21 +1097,7 @@ def calculate_eq_lat_field(EPV, PT, area):
         # define 100 PV values between the min and max PV
         #EPV_thresh[k] = np.unique(np.concatenate([-1.0*np.geomspace(1,np.abs(minPV),50),[0],np.geomspace(1,maxPV,50)]))
         EPV_thresh[k] = np.linspace(minPV,maxPV,100)
-
-        for l,thresh in enumerate(EPV_thresh[k]):
-            area_total = np.sum(area[new_EPV[k]>=thresh])
-            x = 1-area_total/(2*np.pi)
-
-            # see comment in calculate_eq_lat
-            if x < -1.01 or x > 1.01:
-                warn(f'Total area divided by 2*pi (x={x}) is far outside the domain of arcsin in EqL calculation. Clipping to -1 to 1.')
-                
-            if x < -1:
-                x = -1
-            elif x > 1:
-                x = 1
-                      
-            EL[k,l] = np.arcsin(x)*90.0*2/np.pi
+        EL[k] = _eqlat_from_area(_area_above_thresholds(new_EPV[k], area, EPV_thresh[k]))
 
     # pv_array has much less elements than in calculate_eq_lat in order to be used with griddata
     pv_array = np.unique(np.concatenate([
@@ -1871,6 +2009,113 @@ def frac_years_to_reldelta(frac_year, allow_nans=True):
     return rdels
 
 
+def _shift_months(dates, months):
+    """
+    Shift an array of dates by whole months the way a :class:`relativedelta` does.
+
+    As with :class:`relativedelta`, the day of month is clipped to the length of the new month (e.g. 31 Mar minus one
+    month is 28 or 29 Feb) and the time of day is kept.
+
+    :param dates: the dates to shift.
+    :type dates: :class:`numpy.ndarray` with a datetime64 type
+
+    :param months: the number of months to shift by, may be negative. Must be broadcastable against ``dates``.
+    :type months: int or :class:`numpy.ndarray`
+
+    :return: the shifted dates, with the same datetime64 type as ``dates``.
+    :rtype: :class:`numpy.ndarray`
+    """
+    month_start = dates.astype('datetime64[M]')
+    time_in_month = dates - month_start.astype(dates.dtype)
+    day_in_month = time_in_month.astype('timedelta64[D]')
+    time_of_day = time_in_month - day_in_month
+
+    new_month_start = month_start + np.asarray(months).astype('timedelta64[M]')
+    new_month_len = (new_month_start + 1).astype('datetime64[D]') - new_month_start.astype('datetime64[D]')
+    day_in_month = np.minimum(day_in_month, new_month_len - 1)
+    return (new_month_start.astype('datetime64[D]') + day_in_month).astype(dates.dtype) + time_of_day
+
+
+def _days_to_timedelta64(days):
+    """
+    Convert non-negative fractional days to microsecond timedelta64 values, rounding exactly as :class:`datetime.timedelta`
+
+    :param days: the number of days, must be >= 0.
+    :type days: :class:`numpy.ndarray`
+
+    :rtype: :class:`numpy.ndarray`
+    """
+    # timedelta converts the whole days exactly, then the fractional days to microseconds in floating point, rounding
+    # what is left over to the nearest microsecond with ties going to the even total.
+    frac_days, whole_days = np.modf(days)
+    leftover_us, whole_us = np.modf(frac_days * 86400e6)
+    total_us = whole_days.astype(np.int64) * 86400000000 + whole_us.astype(np.int64)
+    round_us = np.round(leftover_us).astype(np.int64)
+    ties = np.abs(leftover_us) == 0.5
+    round_us[ties] = (total_us[ties] % 2 == 1).astype(np.int64)
+    return (total_us + round_us).astype('timedelta64[us]')
+
+
+def subtract_frac_years(dates, frac_years):
+    """
+    Subtract fractional years from dates, the same as subtracting the output of :func:`frac_years_to_reldelta`.
+
+    The whole years are subtracted as calendar years and the fractional part as a fixed number of days (assuming 365.25
+    days per year). Unlike :func:`frac_years_to_reldelta`, this does not create a :class:`relativedelta` for every
+    value, so is much faster for large arrays.
+
+    :param dates: the date or dates to subtract from. Must be broadcastable against ``frac_years``.
+    :type dates: datetime-like or array-like of datetimes
+
+    :param frac_years: the fractional years to subtract. NaNs give NaT.
+    :type frac_years: float or array-like
+
+    :return: the dates, as a datetime64 array with microsecond precision.
+    :rtype: :class:`numpy.ndarray`
+    """
+    date_shape = np.shape(dates)
+    dates = pd.DatetimeIndex(np.atleast_1d(dates).ravel()).values.astype('datetime64[us]').reshape(date_shape)
+    frac_years = np.asarray(frac_years, dtype=float)
+    dates, frac_years = np.broadcast_arrays(dates, frac_years)
+
+    nans = np.isnan(frac_years)
+    whole_years = np.where(nans, 0, np.floor(frac_years)).astype(int)
+    frac_days = np.where(nans, 0, np.mod(frac_years, 1) * days_per_year)
+
+    new_dates = _shift_months(dates, -12 * whole_years) - _days_to_timedelta64(frac_days)
+    new_dates[nans] = np.datetime64('NaT')
+    return new_dates
+
+
+def subtract_reldelta(dates, delta):
+    """
+    Subtract a :class:`relativedelta` or timedelta from an array of dates.
+
+    :param dates: the dates to subtract from.
+    :type dates: :class:`numpy.ndarray` with a datetime64 type
+
+    :param delta: the time to subtract. If a :class:`relativedelta` with any absolute values (e.g. ``day=1``) is given,
+     it will be subtracted from each date in turn; otherwise this is vectorized.
+    :type delta: :class:`relativedelta`, :class:`datetime.timedelta`, or :class:`pandas.Timedelta`
+
+    :return: the new dates, with the same type as ``dates``.
+    :rtype: :class:`numpy.ndarray`
+    """
+    if not isinstance(delta, relativedelta):
+        return (dates - np.timedelta64(pd.Timedelta(delta).to_pytimedelta(), 'us')).astype(dates.dtype)
+
+    absolute_attrs = ('year', 'month', 'day', 'weekday', 'hour', 'minute', 'second', 'microsecond')
+    if any(getattr(delta, attr) is not None for attr in absolute_attrs):
+        return np.array([pd.Timestamp(d) - delta if not np.isnat(d) else d for d in dates.flat],
+                        dtype=dates.dtype).reshape(dates.shape)
+
+    # Like relativedelta, move by whole months first, then by the fixed time.
+    fixed_delta = dt.timedelta(days=delta.days, hours=delta.hours, minutes=delta.minutes, seconds=delta.seconds,
+                               microseconds=delta.microseconds)
+    new_dates = _shift_months(dates, -(12 * delta.years + delta.months)) - np.timedelta64(fixed_delta, 'us')
+    return new_dates.astype(dates.dtype)
+
+
 def timedelta_to_frac_year(timedelta):
     """
     Convert a concrete timedelta to fractional years
@@ -2,6 +2,7 @@ import datetime as dt
 import os
 import re
 from collections import OrderedDict
+from io import StringIO
 
 import netCDF4 as ncdf
 import numpy as np
@@ -86,67 +87,170 @@ def read_out_file(out_file, as_dataframes=False, replace_fills=False):
         return df
 
 
-def read_mod_file(mod_file, as_dataframes=False):
+_mod_constant_names = ('earth_radius', 'ecc2', 'obs_lat', 'surface_gravity', 'profile_base_geometric_alt',
+                       'base_pressure', 'tropopause_pressure')
+
+
+class ModFileData(object):
     """
-    Read a TCCON .mod file.
+    Lightweight container for the contents of one .mod file.
+
+    The profile variables are stored as the columns of a single nlev-by-nvar array, rather than as separate arrays in a
+    dictionary. Individual profile variables can be retrieved by indexing this object with their name, e.g.
+    ``moddat['Temperature']``, which returns a view into that array.
+
+    :ivar filename: the path to the .mod file
+    :ivar header_lines: the header lines of the file, without trailing newlines
+    :ivar datetime: the date and time given in the file name
+    :ivar lat: the latitude given in the file name
+    :ivar lon: the longitude given in the file name
+    :ivar constants: the constants from the second line of the header
+    :ivar scalar: the variables that are defined once per profile, e.g. surface pressure and tropopause
+    :ivar profile_names: the names of the profile variables, in order of the columns in ``profile_data``
+    :ivar profile_units: the units of the profile variables, in the same order
+    :ivar profile_data: the nlev-by-nvar array of profile variables
+    """
+    __slots__ = ('filename', 'header_lines', 'datetime', 'lat', 'lon', 'constants', 'scalar', 'profile_names',
+                 'profile_units', 'profile_data')
+
+    def __init__(self, filename, header_lines, datetime, lat, lon, constants, scalar, profile_names, profile_units,
+                 profile_data):
+        self.filename = filename
+        self.header_lines = header_lines
+        self.datetime = datetime
+        self.lat = lat
+        self.lon = lon
+        self.constants = constants
+        self.scalar = scalar
+        self.profile_names = profile_names
+        self.profile_units = profile_units
+        self.profile_data = profile_data
+
+    def __getitem__(self, item):
+        return self.profile_data[:, self.profile_names.index(item)]
+
+    def __contains__(self, item):
+        return item in self.profile_names
+
+    @property
+    def nlev(self):
+        return self.profile_data.shape[0]
+
+    def to_dict(self, as_dataframes=False):
+        """
+        Convert this data to the nested dictionary returned by :func:`read_mod_file`.
+
+        :param as_dataframes: if ``True``, the groups will be data frames rather than dictionaries.
+        :type as_dataframes: bool
+
+        :return: the dictionary with keys 'file', 'constants', 'scalar' and 'profile'.
+        :rtype: dict
+        """
+        file_vars = {'datetime': self.datetime, 'lon': self.lon, 'lat': self.lat}
+        if as_dataframes:
+            return {'file': pd.DataFrame(file_vars, index=[0]),
+                    'constants': pd.DataFrame({k: [v] for k, v in self.constants.items()}),
+                    'scalar': pd.DataFrame({k: [v] for k, v in self.scalar.items()}),
+                    'profile': pd.DataFrame(self.profile_data, columns=self.profile_names)}
+        else:
+            return {'file': file_vars,
+                    'constants': self.constants.copy(),
+                    'scalar': self.scalar.copy(),
+                    'profile': {k: self.profile_data[:, i].copy() for i, k in enumerate(self.profile_names)}}
 
-    :param mod_file: the path to the mod file.
-    :type mod_file: str
 
-    :param as_dataframes: if ``True``, then the collection of variables will be kept as dataframes. If ``False``
-     (default), they are converted to dictionaries of floats or numpy arrays.
-    :type as_dataframes: bool
+def _parse_mod_number(value):
+    # Same type inference as pandas would do on a single value: integers stay integers
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
 
-    :return: a dictionary with keys 'file' (values derived from file name), 'constants' (constant values stored in the
-     .mod file header), 'scalar' (values like surface height and tropopause pressure that are only defined once per
-     profile) and 'profile' (profile variables) containing the respective variables. These values will be dictionaries
-     or data frames, depending on ``as_dataframes``.
-    :rtype: dict
+
+def _parse_mod_profile(mod_file, lines, names):
     """
-    n_header_lines = mod_utils.get_num_header_lines(mod_file)
-    # Read the constants from the second line of the file. There's no header for these, we just have to rely on the
-    # same constants being in the same position.
-    constant_vars = pd.read_csv(mod_file, sep='\s+', header=None, nrows=1, skiprows=1,
-                                names=('earth_radius', 'ecc2', 'obs_lat', 'surface_gravity',
-                                       'profile_base_geometric_alt', 'base_pressure', 'tropopause_pressure'))
-    # Read the scalar variables (e.g. surface pressure, SZA, tropopause) first. We just have to assume their headers are
-    # on line 3 and values on line 4 of the file, the first number in the first line gives us the line the profile
-    # variables start on.
-    scalar_vars = pd.read_csv(mod_file, sep='\s+', header=2, nrows=1)
-
-    # Now read the profile vars.
-    profile_vars = pd.read_csv(mod_file, sep='\s+', header=n_header_lines-1)
+    Convert the profile lines of a .mod file into an nlev-by-nvar array.
+    """
+    values = ' '.join(lines).split()
+    try:
+        return np.array(values, dtype=float).reshape(-1, len(names))
+    except ValueError:
+        # Could not convert to a regular float array, for example because some values are masked ("--") or a line is
+        # missing values. Let pandas handle these cases, with masked values read as NaNs.
+        df = pd.read_csv(StringIO('\n'.join(lines)), sep='\s+', header=None, names=names, na_values=['--'])
+        if len(df) != len(lines):
+            raise ModelError('Could not parse the profile in {}'.format(mod_file))
+        return df.values
+
+
+def _read_mod_file_struct(mod_file):
+    with open(mod_file, 'r') as robj:
+        lines = robj.read().splitlines()
+
+    # The first line gives the number of header lines; the last header line has the profile variable names and the
+    # one before it their units. The constants are on the second line. There's no header for these, we just have to
+    # rely on the same constants being in the same position. The scalar variables' names are on the third line and
+    # their values on the fourth.
+    header_info = lines[0].split(',') if ',' in lines[0] else lines[0].split()
+    n_header_lines = int(header_info[0])
+    constants = {k: _parse_mod_number(v) for k, v in zip(_mod_constant_names, lines[1].split())}
+    scalar = {k: _parse_mod_number(v) for k, v in zip(lines[2].split(), lines[3].split())}
+    profile_units = lines[n_header_lines-2].split()
+    profile_names = lines[n_header_lines-1].split()
+    profile_lines = [l for l in lines[n_header_lines:] if l.strip()]
+    profile_data = _parse_mod_profile(mod_file, profile_lines, profile_names)
 
     # Also get the information that's only in the file name (namely date and longitude, we'll also read the latitude
     # because it's there).
-    file_vars = dict()
     base_name = os.path.basename(mod_file)
-    file_vars['datetime'] = mod_utils.find_datetime_substring(base_name, out_type=dt.datetime)
-    file_vars['lon'] = mod_utils.find_lon_substring(base_name, to_float=True)
-    file_vars['lat'] = mod_utils.find_lat_substring(base_name, to_float=True)
+    file_datetime = mod_utils.find_datetime_substring(base_name, out_type=dt.datetime)
+    file_lon = mod_utils.find_lon_substring(base_name, to_float=True)
+    file_lat = mod_utils.find_lat_substring(base_name, to_float=True)
 
     # Check that the header latitude and the file name latitude don't differ by more than 0.5 degree. Even if rounded
     # to an integer for the file name, the difference should not exceed 0.5 degree.
     lat_diff_threshold = 0.5
-    if np.abs(file_vars['lat'] - constant_vars['obs_lat'].item()) > lat_diff_threshold:
+    if np.abs(file_lat - constants['obs_lat']) > lat_diff_threshold:
         raise ModelError('The latitude in the file name and .mod file header differ by more than {lim} deg ({name} vs. '
                          '{head}). This indicates a possibly malformed .mod file.'
-                         .format(lim=lat_diff_threshold, name=file_vars['lat'], head=constant_vars['obs_lat'].item())
+                         .format(lim=lat_diff_threshold, name=file_lat, head=constants['obs_lat'])
                          )
 
-    out_dict = dict()
-    if as_dataframes:
-        out_dict['file'] = pd.DataFrame(file_vars, index=[0])
-        out_dict['constants'] = constant_vars
-        out_dict['scalar'] = scalar_vars
-        out_dict['profile'] = profile_vars
-    else:
-        out_dict['file'] = file_vars
-        out_dict['constants'] = {k: v.item() for k, v in constant_vars.items()}
-        out_dict['scalar'] = {k: v.item() for k, v in scalar_vars.items()}
-        out_dict['profile'] = {k: v.values for k, v in profile_vars.items()}
+    return ModFileData(filename=mod_file, header_lines=lines[:n_header_lines], datetime=file_datetime, lat=file_lat,
+                       lon=file_lon, constants=constants, scalar=scalar, profile_names=profile_names,
+                       profile_units=profile_units, profile_data=profile_data)
 
-    return out_dict
+
+def read_mod_file(mod_file, as_dataframes=False, as_struct=False):
+    """
+    Read a TCCON .mod file.
+
+    The file is read once and parsed directly, since the .mod files are small enough that the overhead of a more
+    general table reader would dominate when reading many of them.
+
+    :param mod_file: the path to the mod file.
+    :type mod_file: str
+
+    :param as_dataframes: if ``True``, then the collection of variables will be kept as dataframes. If ``False``
+     (default), they are converted to dictionaries of floats or numpy arrays.
+    :type as_dataframes: bool
+
+    :param as_struct: if ``True``, return a :class:`ModFileData` instance instead of a dictionary. ``as_dataframes`` is
+     ignored in that case.
+    :type as_struct: bool
+
+    :return: a dictionary with keys 'file' (values derived from file name), 'constants' (constant values stored in the
+     .mod file header), 'scalar' (values like surface height and tropopause pressure that are only defined once per
+     profile) and 'profile' (profile variables) containing the respective variables. These values will be dictionaries
+     or data frames, depending on ``as_dataframes``. Profile variables are always floating point; masked values
+     (written as "--") are NaNs.
+    :rtype: dict or :class:`ModFileData`
+    """
+    moddat = _read_mod_file_struct(mod_file)
+    if as_struct:
+        return moddat
+    else:
+        return moddat.to_dict(as_dataframes=as_dataframes)
 
 
 def read_mod_file_units(mod_file):
@@ -249,10 +353,14 @@ def _read_map_txt_file(map_file, as_dataframes=False, skip_header=False):
 
             for i in range(n_skip+1, n_header_lines-1):
                 line = mapf.readline()
-                # Lines have the form Name (units): value - ignore anything in parentheses
-                name, value = line.split(':')
+                # Lines have the form Name (units): value - ignore anything in parentheses. Skip lines that are not
+                # constants, such as the note about wet mole fractions.
+                name, _, value = line.partition(':')
                 name = re.sub(r'\(.+\)', '', name).strip()
-                constants[name] = float(value)
+                try:
+                    constants[name] = float(value)
+                except ValueError:
+                    continue
 
     df = pd.read_csv(map_file, header=n_header_lines-2, skiprows=[n_header_lines-1], na_values='NAN')
     # Sometimes extra space gets kept in the headers - remove that
@@ -3,14 +3,16 @@ import netCDF4 as ncdf
 import numpy as np
 import os
 import pandas as pd
+import re
 from warnings import warn
 
 # Have trouble with CFUnits when calling from a Jupyter notebook. This allows the module to at least be imported if that
-# happens - the problem seems to be an issue interacting with the C library.
+# happens - the problem seems to be an issue interacting with the C library. An OSError means the UDUNITS-2 C library
+# itself could not be found.
 try:
     from cfunits import Units
-except (AssertionError, AttributeError):
-    warn('Could not import cfunits due to an assertion or attribute error. Will not be able to enforce CF units conventions.')
+except (AssertionError, AttributeError, OSError):
+    warn('Could not import cfunits due to an assertion, attribute, or OS error. Will not be able to enforce CF units conventions.')
     cfunits_imported = False
 else:
     cfunits_imported = True
@@ -54,6 +56,29 @@ _map_var_formats = {'Height': _float_fmt, 'Temp': _float_fmt, 'Pressure': _exp_f
                     'h2o': _exp_fmt, 'hdo': _exp_fmt, 'co2': _float_fmt, 'n2o': _float_fmt, 'co': _exp_fmt,
                     'ch4': '{:7.1f}', 'hf': _float_fmt, 'o2': '{:7.4f}', 'gravity': '{:6.3f}'}
 
+# Layout of the GEOS-style .mod files written by mod_maker: the header constants, the surface variables (with the
+# names they have in the .mod file header), and the format, scaling, name and units of each profile variable.
+mod_constant_names = ('earth_radius', 'ecc2', 'obs_lat', 'surface_gravity', 'profile_base_geometric_alt',
+                      'base_pressure', 'tropopause_pressure')
+mod_constants_fmt = '{:8.3f} {:11.4e} {:7.3f} {:5.3f} {:8.3f} {:8.3f} {:8.3f}\n'
+mod_surf_var_order = ('PS', 'T2M', 'H', 'MMW', 'H2O_DMF', 'RH', 'SLP', 'TROPPB', 'TROPPV', 'TROPPT', 'TROPT', 'SZA')
+mod_surf_names = ('Pressure', 'Temperature', 'Height', 'MMW', 'H2O', 'RH', 'SLP', 'TROPPB', 'TROPPV', 'TROPPT', 'TROPT',
+                  'SZA')
+mod_surf_header = 'Pressure  Temperature     Height     MMW        H2O      RH         SLP        TROPPB        TROPPV      TROPPT       TROPT       SZA\n'
+mod_surf_fmt = '{:9.3e}    {:7.3f}    {:7.3f}    {:7.4f}    {:9.3e}{:>6.1f}    {:9.3e}    {:9.3e}    {:9.3e}    {:9.3e}    {:7.3f}    {:7.3f}\n'
+
+mod_var_fmt_info = {'lev':     {'total_width': 13, 'format': '9.3e',  'scale': 1,   'name': 'Pressure', 'units': 'mbar'},
+                    'T':       {'total_width': 13, 'format': '11.3f',  'scale': 1,   'name': 'Temperature', 'units': 'Kelvin'},
+                    'H':       {'total_width': 9,  'format': '7.3f',  'scale': 1,   'name': 'Height', 'units': 'km'},
+                    'mmw':     {'total_width': 12, 'format': '7.4f',  'scale': 1,   'name': 'MMW', 'units': 'g/mole'},
+                    'H2O_DMF': {'total_width': 12, 'format': '10.3e', 'scale': 1,   'name': 'H2O', 'units': 'DMF'},
+                    'RH':      {'total_width': 8,  'format': '>6.1f', 'scale': 100, 'name': 'RH', 'units': '%'},
+                    'EPV':     {'total_width': 15, 'format': '10.3e', 'scale': 1,   'name': 'EPV', 'units': 'K.m+2/kg/s'},
+                    'PT':      {'total_width': 11, 'format': '8.3f',  'scale': 1,   'name': 'PT', 'units': 'Kelvin'},
+                    'EL':      {'total_width': 11, 'format': '7.3f',  'scale': 1,   'name': 'EqL', 'units': 'degrees'},
+                    'O3':      {'total_width': 11, 'format': '9.3e',  'scale': 1,   'name': 'O3', 'units': 'kg/kg'},
+                    'CO':      {'total_width': 11, 'format': '9.3e',  'scale': 1, 'name': 'CO', 'units': 'mol/mol'}}
+
 wmf_message = ['NOTE: The gas concentrations (including H2O) are WET MOLE FRACTIONS. If you require dry mole fractions,',
                'you must calculate [H2O]_dry = (1/[H2O]_wet - 1)^-1 and then [gas]_dry = [gas]_wet * (1 + [H2O]_dry).']
 
@@ -123,7 +148,8 @@ def write_map_from_vmr_mod(vmr_file, mod_file, map_output_dir, fmt='txt', wet_or
     if vmr_latstr != mod_latstr:
         raise RuntimeError('The .vmr and .mod files have different latitudes in their filenames!')
 
-    mapdat, obs_lat = _merge_and_convert_mod_vmr(vmr_file, mod_file, wet_or_dry=wet_or_dry)
+    moddat = readers.read_mod_file(mod_file)
+    mapdat, obs_lat = _merge_and_convert_mod_vmr(vmr_file, moddat, wet_or_dry=wet_or_dry)
     map_name = '{site}_{lat}_{lon}_{date}Z.map'.format(site=site_abbrev, lat=vmr_latstr, lon=vmr_lonstr,
                                                        date=vmr_date.strftime('%Y%m%d%H'))
     map_name = os.path.join(map_output_dir, map_name)
@@ -131,16 +157,44 @@ def write_map_from_vmr_mod(vmr_file, mod_file, map_output_dir, fmt='txt', wet_or
     if fmt == 'txt':
         _write_text_map_file(mapdat=mapdat, obs_lat=obs_lat, map_file=map_name, wet_or_dry=wet_or_dry)
     elif fmt == 'nc':
-        moddat = readers.read_mod_file(mod_file)
         _write_ncdf_map_file(mapdat=mapdat, obs_lat=obs_lat, obs_date=moddat['file']['datetime'], obs_site=site_abbrev,
                              file_lat=moddat['file']['lat'], file_lon=moddat['file']['lon'],
                              map_file=map_name+'.nc', wet_or_dry=wet_or_dry, no_cfunits=no_cfunits)
 
 
+def write_map_file(map_file, mapdat, obs_lat, fmt='txt', wet_or_dry='wet', obs_date=None, obs_site='xx',
+                   file_lat=None, file_lon=None, no_cfunits=False):
+    """
+    Write a .map file from already merged .mod and .vmr data
+
+    :param map_file: the path to write the .map file to, including the extension.
+    :param mapdat: the .map variables, with the keys used in the text .map files (e.g. "Height", "Temp", "co2").
+    :param obs_lat: the latitude of the profile.
+    :param fmt: what format to write the .map file in, either "txt" for the original text files or "nc" for the new
+     netCDF files.
+    :param wet_or_dry: whether ``mapdat`` contains wet or dry mole fractions.
+    :param obs_date: the date/time of the profile. Only used for netCDF files.
+    :param obs_site: the site abbreviation. Only used for netCDF files.
+    :param file_lat: the latitude in the .mod file name. Only used for netCDF files.
+    :param file_lon: the longitude in the .mod file name. Only used for netCDF files.
+    :param no_cfunits: if True, then will not format unit strings if CFUnits failed to import. Has no effect if CFUnits
+     did import successfully.
+    :return: none, writes the .map or .map.nc file.
+    """
+    if fmt == 'txt':
+        _write_text_map_file(mapdat=mapdat, obs_lat=obs_lat, map_file=map_file, wet_or_dry=wet_or_dry)
+    elif fmt == 'nc':
+        _write_ncdf_map_file(mapdat=mapdat, obs_lat=obs_lat, obs_date=obs_date, obs_site=obs_site, file_lat=file_lat,
+                             file_lon=file_lon, map_file=map_file, wet_or_dry=wet_or_dry, no_cfunits=no_cfunits)
+    else:
+        raise ValueError('fmt must be "txt" or "nc"')
+
+
 def _merge_and_convert_mod_vmr(vmr_file, mod_file, vmr_vars=('h2o', 'hdo', 'co2', 'n2o', 'co', 'ch4', 'hf', 'o2'),
                                mod_vars=('Height', 'Temperature', 'Pressure', 'Density', 'gravity'), wet_or_dry='wet'):
-    vmrdat = readers.read_vmr_file(vmr_file)
-    moddat = readers.read_mod_file(mod_file)
+    # Either file may instead be the data already read in, in the form returned by the readers
+    vmrdat = readers.read_vmr_file(vmr_file) if isinstance(vmr_file, str) else vmr_file
+    moddat = readers.read_mod_file(mod_file) if isinstance(mod_file, str) else mod_file
     mapdat = dict()
 
     # put the .mod variables (always on the GEOS native grid) on the same grid as the .vmr file (whatever that is).
@@ -209,17 +263,38 @@ def _write_text_map_file(mapdat, obs_lat, map_file, wet_or_dry):
     # Now prepend the number of header rows and data columns
     header.insert(0, '{} {}'.format(len(header)+1, len(_map_var_order)))
 
-    # Begin writing
-    with open(map_file, 'w') as wobj:
-        for line in header:
-            wobj.write(line + '\n')
-        for i in range(mapdat['Height'].size):
-            line = ','.join(fmt.format(value) for value, fmt in iter_values_formats(i))
-            wobj.write(line + '\n')
+    # Begin writing. Write to a temporary file first so that a .map file is never left half written if this is
+    # interrupted (e.g. one worker of a parallel run failing).
+    tmp_file = '{}.{}.tmp'.format(map_file, os.getpid())
+    try:
+        with open(tmp_file, 'w') as wobj:
+            for line in header:
+                wobj.write(line + '\n')
+            for i in range(mapdat['Height'].size):
+                line = ','.join(fmt.format(value) for value, fmt in iter_values_formats(i))
+                wobj.write(line + '\n')
+        os.replace(tmp_file, map_file)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
 
 
 def _write_ncdf_map_file(mapdat, obs_lat, obs_date, file_lat, file_lon, obs_site, map_file, wet_or_dry,
                          no_cfunits=False):
+    # As with the text files, write to a temporary file and move it into place once complete
+    tmp_file = '{}.{}.tmp'.format(map_file, os.getpid())
+    try:
+        _write_ncdf_map_contents(mapdat=mapdat, obs_lat=obs_lat, obs_date=obs_date, file_lat=file_lat,
+                                 file_lon=file_lon, obs_site=obs_site, map_file=tmp_file, wet_or_dry=wet_or_dry,
+                                 no_cfunits=no_cfunits)
+        os.replace(tmp_file, map_file)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+
+def _write_ncdf_map_contents(mapdat, obs_lat, obs_date, file_lat, file_lon, obs_site, map_file, wet_or_dry,
+                             no_cfunits=False):
     with ncdf.Dataset(map_file, 'w') as wobj:
         alt_human_units = _map_canonical_units['Height']
         alt_units = _cfunits(alt_human_units, no_cfunits=no_cfunits)
@@ -274,6 +349,90 @@ def _write_ncdf_map_file(mapdat, obs_lat, obs_date, file_lat, file_lon, obs_site
         wobj.constant_mass_h2o_units = _cfunits('kg/mol', no_cfunits=no_cfunits)
 
 
+def build_mod_fmt_strings(var_order):
+    # Units and names just need to have the right total width and be centered
+    header_fmt = ''
+    data_fmt = ''
+    var_names = dict()
+    var_units = dict()
+
+    spaces = '    '
+
+    for v in var_order:
+        var_info = mod_var_fmt_info[v]
+
+        this_fmt = var_info['format']
+        # Assuming the format is something like "9.3e" or "7.3f" the total width of the format is the number before
+        # the decimal. Get that and subtract from total width to figure out how many spaces to add to the end of the
+        # column.
+        fmt_width = int(re.search(r'\d+(?=\.)', this_fmt).group())
+        if fmt_width > var_info['total_width']:
+            raise NotImplementedError('The format width is greater than the total column width.')
+
+        full_fmt = '{{{}:{}}}'.format(v, this_fmt) + spaces
+        data_fmt += full_fmt
+
+        header_fmt += '{{{}:^{}}}'.format(v, fmt_width) + spaces
+        var_names[v] = var_info['name']
+        var_units[v] = var_info['units']
+
+    header_names = header_fmt.format(**var_names) + '\n'
+    header_units = header_fmt.format(**var_units) + '\n'
+    var_name_mapping = {v: k for k, v in var_names.items()}
+    data_fmt += '\n'
+    return header_names, header_units, var_name_mapping, data_fmt
+
+
+def write_mod_file(mod_file, version, constants, scalar, profile):
+    """
+    Write a GEOS-style .mod file from already computed values
+
+    This writes the same layout as :func:`ginput.mod_maker.mod_maker.write_mod`, but does not do any of the physical
+    checks or derived quantity calculations; the values must be exactly as they are to be written. It is used to write
+    .mod files from the values stored in a profile bundle (see :mod:`~ginput.common_utils.bundles`).
+
+    :param mod_file: the path to write the .mod file to
+    :type mod_file: str
+
+    :param version: the version line to write in the header
+    :type version: str
+
+    :param constants: the header constants, with the keys given in ``mod_constant_names``.
+    :type constants: dict
+
+    :param scalar: the surface values, with the keys given in ``mod_surf_names``.
+    :type scalar: dict
+
+    :param profile: the profile variables, with the keys being the names used in the .mod file (e.g. "Pressure",
+     "Temperature"). They are written in the order they are iterated over. Values must already be scaled as they are
+     to be written (e.g. RH in percent).
+    :type profile: dict(array)
+
+    :return: none, writes the .mod file
+    """
+    name_mapping = {info['name']: key for key, info in mod_var_fmt_info.items()}
+    try:
+        var_order = [name_mapping[name] for name in profile]
+    except KeyError as err:
+        raise ValueError('Unknown .mod profile variable: {}'.format(err.args[0]))
+    header_names, header_units, _, fmt = build_mod_fmt_strings(var_order)
+
+    mod_content = ['7  {}\n'.format(len(var_order)),
+                   mod_constants_fmt.format(*[constants[k] for k in mod_constant_names]),
+                   mod_surf_header,
+                   mod_surf_fmt.format(*[scalar[k] for k in mod_surf_names]),
+                   version + '\n',
+                   header_units,
+                   header_names]
+
+    columns = [profile[mod_var_fmt_info[key]['name']] for key in var_order]
+    for row in zip(*columns):
+        mod_content.append(fmt.format(**dict(zip(var_order, row))))
+
+    with open(mod_file, 'w') as wobj:
+        wobj.writelines(mod_content)
+
+
 def write_vmr_file(vmr_file, tropopause_alt, profile_date, profile_lat, profile_alt, profile_gases, gas_name_order=None,
                    extra_header_info=None):
     """
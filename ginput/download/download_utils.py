@@ -1,6 +1,15 @@
 from __future__ import print_function, division
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import datetime as dt
+import email.utils
+import os
+import requests
 import sys
+import threading
+import time
+
+from ..common_utils import ioutils
+from ..common_utils.ggg_logging import logger
 
 
 _date_range_cl_help = 'The range of dates to get, in YYYYMMDD-YYYYMMDD format. The second date may be omitted, in ' \
@@ -44,3 +53,243 @@ def parse_date_range(date_range_str, allow_hours_minutes=True):
         end_date = start_date + dt.timedelta(days=1)
 
     return start_date, end_date
+
+
+class DownloadError(Exception):
+    """
+    Error raised when a file could not be downloaded or failed verification.
+    """
+    pass
+
+
+# Client errors that may succeed if tried again (request timeout and too many requests); any other 4xx will not.
+_retryable_client_errors = (408, 429)
+
+
+def _remote_size_from_headers(headers, offset=0):
+    # For a ranged (206) response, the full size is the last part of the Content-Range header
+    # ("bytes 100-199/200"); otherwise it is the offset plus the length of this response.
+    content_range = headers.get('Content-Range')
+    if content_range is not None and '/' in content_range:
+        total = content_range.rsplit('/', 1)[1]
+        if total != '*':
+            return int(total)
+    content_length = headers.get('Content-Length')
+    if content_length is None:
+        return None
+    return offset + int(content_length)
+
+
+def _remote_mtime_from_headers(headers):
+    last_mod = headers.get('Last-Modified')
+    if last_mod is None:
+        return None
+    try:
+        return email.utils.parsedate_to_datetime(last_mod).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def _set_mtime_from_headers(filename, headers):
+    # Mimic wget -N by giving the file the modification time the server reports, so that timestamps are meaningful
+    # when deciding whether to redownload.
+    mtime = _remote_mtime_from_headers(headers)
+    if mtime is not None:
+        os.utime(filename, (mtime, mtime))
+
+
+def download_file(url, dest, session=None, expected_sha1=None, retries=4, backoff=2.0, timeout=60,
+                  block_size=1024**2, overwrite=False):
+    """
+    Download a single file over HTTP(S), resuming partial transfers and retrying on failure.
+
+    The file is downloaded to ``dest + ".part"`` and only renamed to ``dest`` once complete and verified, so a partial
+    file never appears under the final name. If a ``.part`` file already exists (e.g. from an interrupted run), the
+    transfer is resumed from where it left off with an HTTP range request; if the server does not support ranges, the
+    download restarts from the beginning. The ``.part`` file is given the modification time the server reports and
+    that time is sent as the ``If-Range`` condition, so if the remote file has changed since the ``.part`` file was
+    started, the server sends the whole new file rather than new bytes to append to old ones. Completed files are
+    checked against the size reported by the server and, if ``expected_sha1`` is given, against that checksum.
+
+    Client errors (HTTP 4xx) other than 408 and 429 are not retried, since trying again will not change the result.
+
+    Like ``wget -N``, if ``dest`` already exists and matches the size and modification time the server reports, the
+    download is skipped.
+
+    :param url: the URL to download.
+    :type url: str
+
+    :param dest: the path to save the file as.
+    :type dest: str
+
+    :param session: optional, the :class:`requests.Session` to use. Credentials in ``~/.netrc`` are used automatically.
+     If not given, a new session is created.
+    :type session: :class:`requests.Session`
+
+    :param expected_sha1: optional, the hexadecimal SHA1 hash that the downloaded file must have.
+    :type expected_sha1: str
+
+    :param retries: how many times to retry a failed transfer before giving up.
+    :type retries: int
+
+    :param backoff: the wait before the first retry, in seconds. Doubles for each subsequent retry.
+    :type backoff: float
+
+    :param timeout: the timeout in seconds for connecting to and reading from the server.
+    :type timeout: float
+
+    :param block_size: how many bytes to read from the server at a time.
+    :type block_size: int
+
+    :param overwrite: set to ``True`` to redownload ``dest`` even if it appears to be up to date.
+    :type overwrite: bool
+
+    :return: ``True`` if the file was downloaded, ``False`` if it was already up to date.
+    :rtype: bool
+
+    :raises DownloadError: if the file could not be downloaded after ``retries`` attempts, or the downloaded file does
+     not pass verification.
+    """
+    if session is None:
+        session = requests.Session()
+    part_file = dest + '.part'
+
+    if os.path.exists(dest) and not overwrite:
+        try:
+            head = session.head(url, timeout=timeout, allow_redirects=True)
+            head.raise_for_status()
+        except requests.RequestException as err:
+            logger.debug('Could not check whether {} is up to date ({}), redownloading'.format(dest, err))
+        else:
+            remote_size = _remote_size_from_headers(head.headers)
+            remote_mtime = _remote_mtime_from_headers(head.headers)
+            same_size = remote_size is None or remote_size == os.path.getsize(dest)
+            same_time = remote_mtime is None or remote_mtime == int(os.path.getmtime(dest))
+            if same_size and same_time:
+                logger.debug('{} is up to date, not downloading'.format(dest))
+                return False
+
+    last_error = None
+    for attempt in range(retries + 1):
+        if attempt > 0:
+            wait = backoff * 2 ** (attempt - 1)
+            logger.info('Retrying {} in {:.0f} s (attempt {} of {})'.format(url, wait, attempt, retries))
+            time.sleep(wait)
+
+        offset = os.path.getsize(part_file) if os.path.exists(part_file) else 0
+        if offset > 0:
+            # Only resume if the remote file has not changed since the partial file was started
+            headers = {'Range': 'bytes={}-'.format(offset),
+                       'If-Range': email.utils.formatdate(os.path.getmtime(part_file), usegmt=True)}
+        else:
+            headers = dict()
+        try:
+            with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                if response.status_code == 416:
+                    # Requested range not satisfiable - the partial file is probably already complete (or bigger
+                    # than the remote file), so check it below rather than downloading anything.
+                    remote_size = _remote_size_from_headers(response.headers)
+                    mode = None
+                else:
+                    response.raise_for_status()
+                    if offset > 0 and response.status_code != 206:
+                        logger.debug('Server did not resume {} (no range support or the file changed), restarting '
+                                     'download'.format(url))
+                        offset = 0
+                    remote_size = _remote_size_from_headers(response.headers, offset=offset)
+                    mode = 'ab' if offset > 0 else 'wb'
+
+                if mode is not None:
+                    try:
+                        with open(part_file, mode) as fobj:
+                            for block in response.iter_content(chunk_size=block_size):
+                                fobj.write(block)
+                    finally:
+                        # Mark which version of the remote file this is part of for the If-Range check when resuming.
+                        # If the server does not report one, the time just written will not match, so a later attempt
+                        # restarts rather than resuming.
+                        _set_mtime_from_headers(part_file, response.headers)
+                resp_headers = response.headers
+        except requests.HTTPError as err:
+            last_error = err
+            logger.warning('Error downloading {}: {}'.format(url, err))
+            status = err.response.status_code if err.response is not None else None
+            if status is not None and 400 <= status < 500 and status not in _retryable_client_errors:
+                break
+            continue
+        except (requests.RequestException, OSError) as err:
+            last_error = err
+            logger.warning('Error downloading {}: {}'.format(url, err))
+            continue
+
+        local_size = os.path.getsize(part_file) if os.path.exists(part_file) else 0
+        if remote_size is not None and local_size != remote_size:
+            last_error = DownloadError('{} is {} bytes, expected {}'.format(part_file, local_size, remote_size))
+            logger.warning(str(last_error))
+            if local_size > remote_size:
+                # Can't resume from a file that is too big, so start over
+                os.remove(part_file)
+            continue
+
+        if expected_sha1 is not None:
+            file_sha1 = ioutils.make_dependent_file_hash(part_file)
+            if file_sha1 != expected_sha1:
+                # A corrupt file can't be fixed by resuming, so start over
+                os.remove(part_file)
+                last_error = DownloadError('SHA1 of {} ({}) does not match expected ({})'
+                                           .format(url, file_sha1, expected_sha1))
+                logger.warning(str(last_error))
+                continue
+
+        os.replace(part_file, dest)
+        _set_mtime_from_headers(dest, resp_headers)
+        return True
+
+    raise DownloadError('Failed to download {} after {} attempts: {}'.format(url, attempt + 1, last_error))
+
+
+def download_files(url_dest_pairs, nthreads=4, checksums=None, **kwargs):
+    """
+    Download several files concurrently with :func:`download_file`.
+
+    :param url_dest_pairs: a sequence of (url, destination path) tuples.
+    :type url_dest_pairs: list(tuple(str, str))
+
+    :param nthreads: the maximum number of files to download at once.
+    :type nthreads: int
+
+    :param checksums: optional, a dictionary mapping URLs to the SHA1 hashes the files they point to must have. URLs
+     not in the dictionary are only verified by size.
+    :type checksums: dict
+
+    :param kwargs: additional keyword arguments for :func:`download_file`.
+
+    :return: a dictionary mapping the URL of each file that could not be downloaded (or could not be moved into place
+     once downloaded) to the error raised.
+    :rtype: dict
+    """
+    checksums = dict() if checksums is None else checksums
+    # Sessions are not guaranteed to be thread safe, so give each thread its own, which it will reuse for all of its
+    # downloads to keep connections alive.
+    thread_data = threading.local()
+
+    def get_one(url, dest):
+        if not hasattr(thread_data, 'session'):
+            thread_data.session = requests.Session()
+        return download_file(url, dest, session=thread_data.session, expected_sha1=checksums.get(url), **kwargs)
+
+    failures = dict()
+    with ThreadPoolExecutor(max_workers=max(nthreads, 1)) as executor:
+        futures = {executor.submit(get_one, url, dest): url for url, dest in url_dest_pairs}
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                downloaded = future.result()
+            except (DownloadError, OSError) as err:
+                logger.error('Failed to download {}: {}'.format(url, err) if isinstance(err, OSError) else str(err))
+                failures[url] = err
+            else:
+                if downloaded:
+                    logger.info('Downloaded {}'.format(url))
+
+    return failures
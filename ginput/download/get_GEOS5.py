@@ -27,6 +27,7 @@ _std_out_paths = {'surf': 'Nx', 'p': 'Np', 'eta': 'Nv'}
 _level_types = tuple(_std_out_paths.keys())
 _default_level_type = 'p'
 _default_grid_type = 'L'
+_default_nthreads = 4
 
 
 def execute(cmd, cwd=os.getcwd()):
@@ -203,6 +204,10 @@ def _add_common_args(parser):
                              'file type.')
     parser.add_argument('-g','--gridtypes',default="L",choices=["L","C"],
                         help='used to specify the grid type when downloading GEOS-IT files, L for lat-lon and C for cubed-sphere')
+    parser.add_argument('--nthreads', type=int, default=_default_nthreads,
+                        help='How many files to download at once. Default is %(default)d.')
+    parser.add_argument('--use-wget', action='store_true',
+                        help='Download the files serially with wget instead of the built in downloader.')
 
 
 def parse_args(parser=None):
@@ -268,7 +273,7 @@ def check_types_levels(filetypes, levels):
 
 
 def runlog_driver(runlog, path='', mode='FP', filetypes=_default_file_type, levels=_default_level_type,
-                  first_date=None, last_date=None):
+                  first_date=None, last_date=None, nthreads=_default_nthreads, use_wget=False, **kwargs):
     try:
         # I've had bad luck trying to slice index a DatetimeIndex with timestamps, so convert first and last dates to
         # strings before slicing the runlog
@@ -287,11 +292,12 @@ def runlog_driver(runlog, path='', mode='FP', filetypes=_default_file_type, leve
     geos_date_ranges = mod_utils.get_runlog_geos_date_ranges(rldf)
 
     for drange in geos_date_ranges:
-        driver(drange, mode=mode, path=path, filetypes=filetypes, levels=levels)
+        driver(drange, mode=mode, path=path, filetypes=filetypes, levels=levels, nthreads=nthreads, use_wget=use_wget)
 
 
 def driver(date_range, mode='FP', path='.', filetypes=_default_file_type, levels=_default_level_type,
-           gridtypes=_default_grid_type,log_file=sys.stdout, verbosity=0, list_only=False, **kwargs):
+           gridtypes=_default_grid_type,log_file=sys.stdout, verbosity=0, list_only=False, nthreads=_default_nthreads,
+           use_wget=False, **kwargs):
     """
     Run get_GEOS5 as if called from the command line.
 
@@ -323,9 +329,18 @@ def driver(date_range, mode='FP', path='.', filetypes=_default_file_type, levels
 
     :param gridtypes: the type of grid when using GEOS-IT files "L" for lat-lon and "C" for cubed-sphere
 
+    :param nthreads: how many files to download at once. Each file is downloaded to a temporary ".part" file, which is
+     resumed if interrupted and only renamed once complete, so partial files never appear in the output directories.
+    :type nthreads: int
+
+    :param use_wget: set to ``True`` to download the files serially with wget instead. In that case, ``log_file`` and
+     ``verbosity`` control the wget output.
+    :type use_wget: bool
+
     :param kwargs: unused, swallows extra keyword arguments.
 
     :return: none, downloads GEOS files to ``path``.
+    :raises download_utils.DownloadError: if any files could not be downloaded.
     """
     filetypes, levels = check_types_levels(filetypes, levels)
     gridtypes = (gridtypes,)
@@ -343,10 +358,21 @@ def driver(date_range, mode='FP', path='.', filetypes=_default_file_type, levels
             logger.info('Creating {}'.format(outpath))
             os.makedirs(outpath)
 
-        _func_dict[mode](start, end, filetype=ftype, levels=ltype, gridtype=gtype, outpath=os.path.join(outpath, 'getGEOS.dat'))
-        if not list_only:
+        list_file = os.path.join(outpath, 'getGEOS.dat')
+        _func_dict[mode](start, end, filetype=ftype, levels=ltype, gridtype=gtype, outpath=list_file)
+        if list_only:
+            continue
+        elif use_wget:
             for line in execute(wget_cmd.split(), cwd=outpath):
                 print(line, end="", file=log_file)
+        else:
+            with open(list_file) as f:
+                urls = [line.strip() for line in f if line.strip()]
+            url_dest_pairs = [(url, os.path.join(outpath, os.path.basename(url))) for url in urls]
+            failures = dlutils.download_files(url_dest_pairs, nthreads=nthreads)
+            if failures:
+                raise dlutils.DownloadError('{} of {} files could not be downloaded to {}: {}'
+                                            .format(len(failures), len(urls), outpath, ', '.join(sorted(failures))))
 
 
 ########
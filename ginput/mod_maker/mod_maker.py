@@ -86,11 +86,17 @@ The slant .mod files are only generated when the SZA is above 90 degrees.
 There is dictionary of sites with their respective lat/lon in tccon_sites.py, so this works for all TCCON sites, lat/lon values were taken from the wiki page of each site.
 """
 import argparse
+from collections import OrderedDict
+from contextlib import redirect_stdout, redirect_stderr
 import glob
+import io
+from itertools import groupby, repeat
+from multiprocessing import Pool
 import os, sys
 import numpy.ma as ma
 import pandas as pd
-from scipy.interpolate import interp1d, interp2d
+from scipy import ndimage
+from scipy.interpolate import interp1d
 import netCDF4 # netcdf I/O
 import re # used to parse strings
 import time
@@ -100,10 +106,12 @@ from pydap.cas.urs import setup_session # used to connect to the merra opendap s
 import xarray
 import warnings
 
-from ..common_utils import mod_utils, run_utils
+from ..common_utils import mod_utils, ioutils, run_utils, bundles
+from ..common_utils.writers import mod_var_fmt_info, build_mod_fmt_strings, mod_constant_names, mod_constants_fmt, \
+    mod_surf_var_order, mod_surf_names, mod_surf_header, mod_surf_fmt
 from ..common_utils.mod_utils import gravity, check_site_lat_lon_alt
 from ..common_utils.mod_constants import ratio_molec_mass as rmm, p_ussa, t_ussa, z_ussa, mass_dry_air
-from ..common_utils.ggg_logging import logger
+from ..common_utils.ggg_logging import logger, redirect_log_stream
 from .slantify import * # code to make slant paths
 from .tccon_sites import site_dict, tccon_site_info, tccon_site_info_for_date
 
@@ -117,6 +125,7 @@ _new_fixedp_modes = ('fpit', 'fp')
 _new_native_modes = ('fpit-eta', 'fp-eta')
 _new_modmaker_modes = _new_fixedp_modes + _new_native_modes
 _default_mode = 'fpit-eta'
+_mod_bundle_units = {info['name']: info['units'] for info in mod_var_fmt_info.values()}
 
 
 def shell_error(msg, ecode=1):
@@ -164,58 +173,13 @@ def svp_wv_over_ice(temp):
 
     return svp
 
-mod_var_fmt_info = {'lev':     {'total_width': 13, 'format': '9.3e',  'scale': 1,   'name': 'Pressure', 'units': 'mbar'},
-                    'T':       {'total_width': 13, 'format': '11.3f',  'scale': 1,   'name': 'Temperature', 'units': 'Kelvin'},
-                    'H':       {'total_width': 9,  'format': '7.3f',  'scale': 1,   'name': 'Height', 'units': 'km'},
-                    'mmw':     {'total_width': 12, 'format': '7.4f',  'scale': 1,   'name': 'MMW', 'units': 'g/mole'},
-                    'H2O_DMF': {'total_width': 12, 'format': '10.3e', 'scale': 1,   'name': 'H2O', 'units': 'DMF'},
-                    'RH':      {'total_width': 8,  'format': '>6.1f', 'scale': 100, 'name': 'RH', 'units': '%'},
-                    'EPV':     {'total_width': 15, 'format': '10.3e', 'scale': 1,   'name': 'EPV', 'units': 'K.m+2/kg/s'},
-                    'PT':      {'total_width': 11, 'format': '8.3f',  'scale': 1,   'name': 'PT', 'units': 'Kelvin'},
-                    'EL':      {'total_width': 11, 'format': '7.3f',  'scale': 1,   'name': 'EqL', 'units': 'degrees'},
-                    'O3':      {'total_width': 11, 'format': '9.3e',  'scale': 1,   'name': 'O3', 'units': 'kg/kg'},
-                    'CO':      {'total_width': 11, 'format': '9.3e',  'scale': 1, 'name': 'CO', 'units': 'mol/mol'}}
-
-
-def build_mod_fmt_strings(var_order):
-    # Units and names just need to have the right total width and be centered
-    header_fmt = ''
-    data_fmt = ''
-    var_names = dict()
-    var_units = dict()
-
-    spaces = '    '
-
-    for v in var_order:
-        var_info = mod_var_fmt_info[v]
-
-        this_fmt = var_info['format']
-        # Assuming the format is something like "9.3e" or "7.3f" the total width of the format is the number before
-        # the decimal. Get that and subtract from total width to figure out how many spaces to add to the end of the
-        # column.
-        fmt_width = int(re.search(r'\d+(?=\.)', this_fmt).group())
-        if fmt_width > var_info['total_width']:
-            raise NotImplementedError('The format width is greater than the total column width.')
-
-        full_fmt = '{{{}:{}}}'.format(v, this_fmt) + spaces
-        data_fmt += full_fmt
-
-        header_fmt += '{{{}:^{}}}'.format(v, fmt_width) + spaces
-        var_names[v] = var_info['name']
-        var_units[v] = var_info['units']
-
-    header_names = header_fmt.format(**var_names) + '\n'
-    header_units = header_fmt.format(**var_units) + '\n'
-    var_name_mapping = {v: k for k, v in var_names.items()}
-    data_fmt += '\n'
-    return header_names, header_units, var_name_mapping, data_fmt
-
 
 def write_mod(mod_path, version, site_lat, data=0, surf_data=0, func=None, muted=False, slant=False, chem_vars=False):
     """
     Creates a GGG-format .mod file
     INPUTS:
-        mod_path: full path to write the .mod file
+        mod_path: full path to write the .mod file. If None, no file is written and only the output dictionary is
+                  computed (e.g. to store the profile in a bundle instead)
         version: the mod_maker version
         site_lat: site latitude (-90 to 90)
         data: dictionary of the inputs
@@ -233,8 +197,6 @@ def write_mod(mod_path, version, site_lat, data=0, surf_data=0, func=None, muted
     # b/c we use different variables under those cases
     # TODO: these should be defined in a constants file and just referenced here, at least the ones that are truly
     #  constant
-    mod_constant_names = ('earth_radius', 'ecc2', 'obs_lat', 'surface_gravity', 'profile_base_geometric_alt',
-                          'base_pressure', 'tropopause_pressure')
     mod_constants = [6378.137, 6.000E-05, site_lat, 9.81, data['H'][0], 1013.25]
     if type(surf_data)==int: # ncep mode
         # NCEP and GEOS provide different tropopause variables that need to be added
@@ -315,7 +277,6 @@ def write_mod(mod_path, version, site_lat, data=0, surf_data=0, func=None, muted
         print('Warning: output dictionary for NCEP mode not implemented, will just be empty')
 
     else: # merra/geos mode
-        surf_var_order = ['PS', 'T2M', 'H', 'MMW', 'H2O_DMF', 'RH', 'SLP', 'TROPPB', 'TROPPV', 'TROPPT', 'TROPT', 'SZA']
         prof_var_order = ['lev', 'T', 'H', 'mmw', 'H2O_DMF', 'RH', 'EPV', 'PT', 'O3']
         computed_keys = ['mmw', 'PT', 'EL']
         if func is not None:
@@ -326,8 +287,6 @@ def write_mod(mod_path, version, site_lat, data=0, surf_data=0, func=None, muted
 
         mod_constants.append(surf_data['TROPPB'])
         # The head of the .mod file
-        constants_fmt = '{:8.3f} {:11.4e} {:7.3f} {:5.3f} {:8.3f} {:8.3f} {:8.3f}\n'
-        surface_fmt = '{:9.3e}    {:7.3f}    {:7.3f}    {:7.4f}    {:9.3e}{:>6.1f}    {:9.3e}    {:9.3e}    {:9.3e}    {:9.3e}    {:7.3f}    {:7.3f}\n'
         header_names, header_units, final_data_keys, fmt = build_mod_fmt_strings(prof_var_order)
 
         mod_content = []
@@ -335,10 +294,10 @@ def write_mod(mod_path, version, site_lat, data=0, surf_data=0, func=None, muted
         # number of header rows, number of data columns
         mod_content.append('7  {}\n'.format(len(prof_var_order)))
         # constants
-        mod_content.append(constants_fmt.format(*mod_constants))
+        mod_content.append(mod_constants_fmt.format(*mod_constants))
         # surface variables
-        mod_content.append('Pressure  Temperature     Height     MMW        H2O      RH         SLP        TROPPB        TROPPV      TROPPT       TROPT       SZA\n')
-        mod_content.append(surface_fmt.format(*[surf_data[key] for key in surf_var_order]))
+        mod_content.append(mod_surf_header)
+        mod_content.append(mod_surf_fmt.format(*[surf_data[key] for key in mod_surf_var_order]))
         # version info
         mod_content.append(version+'\n')
         # profile data headers
@@ -347,75 +306,113 @@ def write_mod(mod_path, version, site_lat, data=0, surf_data=0, func=None, muted
 
         # not sure if merra needs all the filters/corrections used for ncep data?
 
-        # Export the Pressure, Temp and SHum
-        prototype_array = np.full((len(data['H2O_DMF'],)), np.nan, dtype=float)
-
-        output_dict = dict()
-        for key in final_data_keys.keys():
-            output_dict[key] = prototype_array.copy()
-
-        for k, elem in enumerate(data['H2O_DMF']):
-            # will use to output the final data to the .mod file and the returned dict
-            line_dict = dict()
-
-            #############################################
-            # Check for and fix non-physical quantities #
-            #############################################
+        # Export the Pressure, Temp and SHum. The whole profile is computed at once. Masked array operations have a
+        # lot of overhead for arrays this small, so the calculations are done on the plain data while tracking which
+        # values would be masked separately. Masked levels are written as "--" and are NaNs in the output dictionary.
+        nlev = len(data['H2O_DMF'])
 
-            svp = svp_wv_over_ice(data['T'][k])
-            h2o_wmf = compute_h2o_wmf(data['H2O_DMF'][k]) # wet mole fraction of h2o
-
-            if 300 <= data['lev'][k] <= 1000:
-                # Replace H2O mole fractions that are too small
-                if data['RH'][k] < 30./data['lev'][k]:
-                    if not muted:
-                        print('Replacing too small H2O at {:.2f} hPa; H2O_WMF={:.3e}; {:.3e}; RH={:.3f}'.format(data['lev'][k],h2o_wmf,svp/data['T'][k],data['RH'][k],1.0))
-                    data['RH'][k] = 30./data['lev'][k]
-                    h2o_wmf = svp*data['RH'][k]/data['lev'][k]
-                    data['H2O_DMF'][k] = h2o_wmf/(1-h2o_wmf)
-                    if not muted:
-                        print('svp,h2o_wmf,h2o_dmf',svp,h2o_wmf,data['H2O_DMF'][k],data['RH'][k])
+        if func is not None:
+            # compute equivalent latitude for the whole column at once; 1e6 converts EPV to PVU (1e-6 K . m2 / kg / s).
+            # Neither EPV nor T are altered by the H2O fixes below, so this matches computing it level-by-level.
+            el_profile = func(data['EPV']*1e6, data['T']*(1000.0/data['lev'])**0.286)
+
+        lev, lev_mask = ma.getdata(data['lev']), ma.getmaskarray(data['lev'])
+        temp, temp_mask = ma.getdata(data['T']), ma.getmaskarray(data['T'])
+        rh, rh_mask = ma.getdata(data['RH']).copy(), ma.getmaskarray(data['RH']).copy()
+        h2o_dmf, h2o_dmf_mask = ma.getdata(data['H2O_DMF']).copy(), ma.getmaskarray(data['H2O_DMF']).copy()
+
+        #############################################
+        # Check for and fix non-physical quantities #
+        #############################################
+
+        with np.errstate(all='ignore'):
+            # Masked levels may have fill values that give warnings here; they are not used.
+            svp = svp_wv_over_ice(temp)
+            h2o_wmf = compute_h2o_wmf(h2o_dmf)  # wet mole fraction of h2o
+            h2o_wmf_mask = h2o_dmf_mask.copy()
+            orig_h2o_wmf, orig_h2o_wmf_mask, orig_rh = h2o_wmf.copy(), h2o_wmf_mask.copy(), rh.copy()
+            svp_over_t = svp / temp
+
+            # Replace H2O mole fractions that are too small
+            too_small = (300 <= lev) & (lev <= 1000) & (rh < 30./lev) & ~lev_mask & ~rh_mask
+            rh[too_small] = 30./lev[too_small]
+            rh_mask[too_small] = False
+            h2o_wmf[too_small] = svp[too_small]*rh[too_small]/lev[too_small]
+            h2o_wmf_mask[too_small] = temp_mask[too_small]
+            h2o_dmf[too_small] = h2o_wmf[too_small]/(1-h2o_wmf[too_small])
+            h2o_dmf_mask[too_small] = h2o_wmf_mask[too_small]
 
             # Replace H2O mole fractions that are too large (super-saturated)  GCT 2015-08-05
-            if data['RH'][k] > 1.0:
-                if not muted:
-                    print('Replacing too large H2O at {:.2f} hPa; H2O_WMF={:.3e}; {:.3e}; RH={:.3f}'.format(data['lev'][k],h2o_wmf,svp/data['T'][k],data['RH'][k],1.0))
-                data['RH'][k] = 1.0
-                h2o_wmf = svp*data['RH'][k]/data['lev'][k]
-                data['H2O_DMF'][k] = h2o_wmf/(1-h2o_wmf)
-
-            for key in prof_var_order:
-                if key not in computed_keys:
-                    line_dict[key] = data[key][k]
+            too_large = (rh > 1.0) & ~rh_mask
+            rh[too_large] = 1.0
+            h2o_wmf[too_large] = svp[too_large]*rh[too_large]/lev[too_large]
+            h2o_wmf_mask[too_large] = temp_mask[too_large] | lev_mask[too_large]
+            h2o_dmf[too_large] = h2o_wmf[too_large]/(1-h2o_wmf[too_large])
+            h2o_dmf_mask[too_large] = h2o_wmf_mask[too_large]
 
-            #################################
-            # Calculated derived quantities #
-            #################################
-
-            line_dict['mmw'] = compute_mmw(h2o_wmf)
+            mmw = compute_mmw(h2o_wmf)
             # compute potential temperature
-            line_dict['PT'] = data['T'][k]*(1000.0/data['lev'][k])**0.286
-            if func is None:
-                line_dict['EL'] = None
-            else:
-                # compute equivalent latitude; 1e6 converts EPV to PVU (1e-6 K . m2 / kg / s)
-                line_dict['EL'] = func(line_dict['EPV']*1e6, line_dict['PT'])[0]
-
-            for key in line_dict.keys():
-                scale = mod_var_fmt_info[key]['scale']
-                line_dict[key] *= scale
+            pt = temp*(1000.0/lev)**0.286
 
-            mod_content += [fmt.format(**line_dict)]
-            for outkey, linekey in final_data_keys.items():
-                output_dict[outkey][k] = line_dict[linekey]
+        fixed = too_small | too_large
+        if not muted:
+            def _value(values, mask, k):
+                return ma.masked if mask[k] else values[k]
+
+            for k in np.flatnonzero(fixed):
+                msg = 'too small' if too_small[k] else 'too large'
+                print('Replacing {} H2O at {:.2f} hPa; H2O_WMF={:.3e}; {:.3e}; RH={:.3f}'.format(
+                    msg, _value(lev, lev_mask, k), _value(orig_h2o_wmf, orig_h2o_wmf_mask, k),
+                    _value(svp_over_t, temp_mask, k), orig_rh[k]
+                ))
+                if too_small[k]:
+                    print('svp,h2o_wmf,h2o_dmf', _value(svp, temp_mask, k), _value(h2o_wmf, h2o_wmf_mask, k),
+                          _value(h2o_dmf, h2o_dmf_mask, k), rh[k])
+
+        # The fixes are made in the input dictionary too, since the caller may use these profiles after this
+        data['RH'][fixed] = rh[fixed]
+        data['H2O_DMF'][fixed] = ma.masked_array(h2o_dmf[fixed], mask=h2o_dmf_mask[fixed])
+
+        #################################
+        # Calculated derived quantities #
+        #################################
+
+        columns = {key: (ma.getdata(data[key]), ma.getmaskarray(data[key])) for key in prof_var_order
+                   if key not in computed_keys}
+        columns['RH'] = (rh, rh_mask)
+        columns['H2O_DMF'] = (h2o_dmf, h2o_dmf_mask)
+        columns['mmw'] = (mmw, h2o_wmf_mask)
+        columns['PT'] = (pt, temp_mask | lev_mask)
+        if func is not None:
+            columns['EL'] = (ma.getdata(el_profile), ma.getmaskarray(el_profile))
+
+        output_dict = {outkey: np.full(nlev, np.nan) for outkey in final_data_keys}
+        row_values = []
+        for key in prof_var_order:
+            values, mask = columns[key]
+            values = values[:nlev] * mod_var_fmt_info[key]['scale']
+            mask = mask[:nlev]
+            for outkey in final_data_keys:
+                if final_data_keys[outkey] == key:
+                    output_dict[outkey][~mask] = values[~mask]
+            values = values.tolist()
+            # Masked values are passed as the masked constant so that they are written as "--", as formatting them
+            # level-by-level did.
+            for k in np.flatnonzero(mask):
+                values[k] = ma.masked
+            row_values.append(values)
+
+        if mod_path is not None:
+            mod_content.extend(fmt.format_map(dict(zip(prof_var_order, row))) for row in zip(*row_values))
 
     output_dict['constants'] = {k: v for k, v in zip(mod_constant_names, mod_constants)}
 
-    with open(mod_path,'w') as outfile:
-        outfile.writelines(mod_content)
+    if mod_path is not None:
+        with open(mod_path,'w') as outfile:
+            outfile.writelines(mod_content)
 
-    if not muted:
-        print(mod_path)
+        if not muted:
+            print(mod_path)
 
     return output_dict
 
@@ -981,7 +978,7 @@ def equivalent_latitude_functions(ncdf_path,mode,start=None,end=None,muted=False
         for k in range(new_nlev):
             interp_EL[k] = np.interp(fixed_PV,EPV_thresh[k],EL[k])
 
-        func_dict[date[t]] = interp2d(fixed_PV,fixed_PT,interp_EL)
+        func_dict[date[t]] = mod_utils.EqLatInterpolator(fixed_PV,fixed_PT,interp_EL)
 
         end = time.time()
         nmin.append(int(end-start)/60.0)
@@ -1038,6 +1035,26 @@ def _add_common_args(parser):
     parser.add_argument('-f', '--flat-outdir', action='store_true',
                         help='Write the .mod files directly to the specified output directory, rather than organizing '
                              'by product/site/vertical or slant.')
+    parser.add_argument('--bundle', action='store_const', const='bundle', default='text', dest='mod_format',
+                        help='Write one netCDF bundle per day holding every site\'s profiles, rather than individual '
+                             '.mod files. The bundles are saved in the product directory, and the "export-bundle" '
+                             'subcommand can write the .mod files from them. Only supported by the new mod_maker code '
+                             'and not compatible with --slant.')
+    _add_eqlat_cache_args(parser)
+
+
+def _add_eqlat_cache_args(parser):
+    parser.add_argument('--eqlat-cache-dir', default=None,
+                        help='Directory in which to cache the equivalent latitude tables computed from each GEOS file, '
+                             'so that later runs using the same GEOS files can load them rather than recomputing them. '
+                             'Tables are matched to GEOS files by their contents and invalidated by code changes. If '
+                             'not given, no cache is used.')
+    parser.add_argument('--eqlat-cache-max-entries', type=int, default=None,
+                        help='Maximum number of tables to keep in the equivalent latitude cache; the least recently '
+                             'used are removed first. Default is no limit.')
+    parser.add_argument('--eqlat-cache-max-age', type=float, default=None,
+                        help='Remove tables from the equivalent latitude cache that have not been used in this many '
+                             'days. Default is no limit.')
 
 
 def parse_args(parser=None):
@@ -1066,6 +1083,10 @@ def parse_args(parser=None):
     parser.add_argument('--site', dest='site_abbrv', choices=valid_site_ids, help='Two-letter site abbreviation. '
                                                                                   'Providing this will produce .mod '
                                                                                   'files only for that site.')
+    parser.add_argument('-n', '--nprocs', default=0, type=int,
+                        help='Number of processors to use in parallelization. Each process makes the .mod files for '
+                             'one GEOS time at a time. Default is 0, i.e. run in serial. Only used with the new '
+                             'mod_maker modes ({}).'.format(', '.join(_new_modmaker_modes)))
     _add_common_args(parser)
 
     if am_i_main:
@@ -1149,13 +1170,14 @@ def GEOS_files(GEOS_path, start_date, end_date, chm=False):
     return select_files,select_dates
 
 
-def equivalent_latitude_functions_geos(GEOS_path, start_date=None, end_date=None, muted=False, **kwargs):
+def equivalent_latitude_functions_geos(GEOS_path, start_date=None, end_date=None, muted=False, eqlat_cache=None, **kwargs):
     """
     Inputs:
         - GEOS_path: full path to the folder containing GEOS5-fpit files, an 'Np' folder with 3-hourly files is expected under that path
         - start_date: datetime object
         - end_date: datetime object (exclusive)
         - muted: if True there will be no print statements
+        - eqlat_cache: optional ioutils.EqLatTableCache to load previously computed functions from and save new ones to
     Outputs:
         - func_dict: list of functions, at each dataset time, to get equivalent latitude for a given PV and PT
 
@@ -1171,10 +1193,11 @@ def equivalent_latitude_functions_geos(GEOS_path, start_date=None, end_date=None
     if not muted:
         print('\nGenerating equivalent latitude functions for {} times'.format(len(select_dates)))
 
-    return equivalent_latitude_functions_from_geos_files(select_files, select_dates, muted=muted)
+    return equivalent_latitude_functions_from_geos_files(select_files, select_dates, muted=muted, eqlat_cache=eqlat_cache)
 
 
-def equivalent_latitude_functions_native_geos(GEOS_path, start_date=None, end_date=None, muted=False, **kwargs):
+def equivalent_latitude_functions_native_geos(GEOS_path, start_date=None, end_date=None, muted=False, eqlat_cache=None,
+                                              **kwargs):
     """
     Generate equivalent latitude interpolators from native (72 eta level) GEOS files.
 
@@ -1191,6 +1214,9 @@ def equivalent_latitude_functions_native_geos(GEOS_path, start_date=None, end_da
     :param muted: set to ``True`` to disable logging to the console.
     :type muted: bool
 
+    :param eqlat_cache: optional cache to load previously computed interpolators from and save new ones to.
+    :type eqlat_cache: :class:`~ginput.common_utils.ioutils.EqLatTableCache` or None
+
     :param kwargs: unused, swallows extra keyword arguments.
 
     :return: dictionary of equivalent latitude intepolators, the keys will be the datetime of the interpolators
@@ -1202,10 +1228,11 @@ def equivalent_latitude_functions_native_geos(GEOS_path, start_date=None, end_da
     if not muted:
         print('\nGenerating equivalent latitude functions for {} native GEOS files'.format(len(select_dates)))
 
-    return equivalent_latitude_functions_from_native_geos_files(select_files, select_dates, muted=muted)
+    return equivalent_latitude_functions_from_native_geos_files(select_files, select_dates, muted=muted,
+                                                                eqlat_cache=eqlat_cache)
 
 
-def equivalent_latitude_functions_from_geos_files(geos_np_files, geos_dates, muted=False):
+def equivalent_latitude_functions_from_geos_files(geos_np_files, geos_dates, muted=False, eqlat_cache=None):
     # Use any file for stuff that is the same in all files
     with netCDF4.Dataset(geos_np_files[0], 'r') as dataset:
         lat = dataset['lat'][:]
@@ -1241,11 +1268,19 @@ def equivalent_latitude_functions_from_geos_files(geos_np_files, geos_dates, mut
                                                                                                       ntim - date_ID)))
             sys.stdout.flush()
 
+        if eqlat_cache is not None:
+            cache_key = eqlat_cache.cache_key(geos_np_files[date_ID])
+            func_dict[date] = eqlat_cache.load(geos_np_files[date_ID], key=cache_key)
+            if func_dict[date] is not None:
+                continue
+
         with netCDF4.Dataset(geos_np_files[date_ID]) as dataset:
             PT = (dataset['T'][0] * coeff_mat).data  # Compute potential temperature
             EPV = (dataset['EPV'][0].data) * 1e6  # Potential vorticity in PVU = 1e-6 K . m2 / kg / s
 
         func_dict[date] = mod_utils.calculate_eq_lat(EPV, PT, area)
+        if eqlat_cache is not None:
+            eqlat_cache.save(geos_np_files[date_ID], func_dict[date], key=cache_key)
 
         end = time.time()
         nmin.append(int(end - start) / 60.0)
@@ -1260,7 +1295,7 @@ def equivalent_latitude_functions_from_geos_files(geos_np_files, geos_dates, mut
     return func_dict
 
 
-def equivalent_latitude_functions_from_native_geos_files(geos_nv_files, geos_dates, muted=False):
+def equivalent_latitude_functions_from_native_geos_files(geos_nv_files, geos_dates, muted=False, eqlat_cache=None):
     """
     Generate equivalent latitude interpolators from native GEOS FP(-IT) files
 
@@ -1274,6 +1309,9 @@ def equivalent_latitude_functions_from_native_geos_files(geos_nv_files, geos_dat
     :param muted: set to ``True`` to disable some logging to console.
     :type muted: bool
 
+    :param eqlat_cache: optional cache to load previously computed interpolators from and save new ones to.
+    :type eqlat_cache: :class:`~ginput.common_utils.ioutils.EqLatTableCache` or None
+
     :return: a dictionary of equivalent latitude interpolators. THe keys will be the dates of the GEOS files, there will
      be one interpolator per GEOS file.
     :rtype: dict
@@ -1281,6 +1319,12 @@ def equivalent_latitude_functions_from_native_geos_files(geos_nv_files, geos_dat
     func_dict = dict()
     start = time.time()
     for idx, (geos_file, date) in enumerate(zip(geos_nv_files, geos_dates)):
+        if eqlat_cache is not None:
+            cache_key = eqlat_cache.cache_key(geos_file)
+            func_dict[date] = eqlat_cache.load(geos_file, key=cache_key)
+            if func_dict[date] is not None:
+                continue
+
         with netCDF4.Dataset(geos_file, 'r') as dataset:
             logger.info('Calculating equivalent latitudes for {}/{} GEOS files'.format(idx+1, len(geos_nv_files)))
             lat = dataset['lat'][:]
@@ -1298,6 +1342,8 @@ def equivalent_latitude_functions_from_native_geos_files(geos_nv_files, geos_dat
         # The native 72-level geos files are ordered space-to-surface. The equivalent latitude calculation *may* be okay
         # with that, but I felt it was safer to just go ahead and flip them.
         func_dict[date] = mod_utils.calculate_eq_lat(np.flip(EPV, axis=0), np.flip(PT, axis=0), area)
+        if eqlat_cache is not None:
+            eqlat_cache.save(geos_file, func_dict[date], key=cache_key)
     print("It took {:.1f} minutes to generate equivalent latitude functions for {} GEOS files".format((time.time()-start)/60.0,len(geos_nv_files)))
 
     return func_dict
@@ -1343,61 +1389,229 @@ def add_equivalent_latitude_to_native_geos_file(geos_nv_file, muted=False):
         dataset['eqlat'][0] = np.flip(eqlat, axis=0)
             
 
-def lat_lon_interp(data_old,lat_old,lon_old,lat_new,lon_new,IDs_list):
+def lat_lon_interp_weights(lat_old, lon_old, lat_new, lon_new, IDs_list):
+    """
+    Compute the corner indices and weights to bilinearly interpolate a lat/lon grid to a set of points.
+
+    Points outside the grid cell given for them are clamped to the edges of that cell, the same nearest neighbor
+    extrapolation :class:`scipy.interpolate.interp2d` did when it was used here. Unlike ``interp2d``, cells that cross
+    the date line (where the second longitude index wraps around to 0) are interpolated across it rather than across
+    the whole globe.
+
+    :param lat_old: the latitude vector of the grid, within [-90, 90] degrees.
+    :type lat_old: :class:`numpy.ndarray`
+
+    :param lon_old: the longitude vector of the grid, within [-180, 180) degrees.
+    :type lon_old: :class:`numpy.ndarray`
+
+    :param lat_new: the latitudes of the points to interpolate to.
+    :type lat_new: array-like
+
+    :param lon_new: the longitudes of the points to interpolate to, within [-180, 180).
+    :type lon_new: array-like
+
+    :param IDs_list: the grid cell indices for each point, as returned by :func:`querry_indices`.
+    :type IDs_list: list(list(int))
+
+    :return: the latitude and longitude indices of the four corners of the grid cell around each point (as
+     npoints-by-4 arrays, ordered lower left, lower right, upper left, upper right), and the fractional distance of each
+     point across its cell in latitude and longitude (as npoints-long vectors). These can be given to
+     :func:`lat_lon_interp` as ``interp_weights``.
+    :rtype: tuple(:class:`numpy.ndarray`)
     """
-    Use RectSphereBivariateSpline to interpolate in a latitude-longitude grid (rectangle over of sphere)
+    lat_old = np.ma.getdata(lat_old)
+    lon_old = np.ma.getdata(lon_old)
+    lat_new = np.ma.getdata(lat_new).astype(float).reshape(-1)
+    lon_new = np.ma.getdata(lon_new).astype(float).reshape(-1)
+    lat1, lat2, lon1, lon2 = np.array(IDs_list, dtype=int).reshape(-1, 4).T
 
-    https://docs.scipy.org/doc/scipy/reference/generated/scipy.interpolate.RectSphereBivariateSpline.html
+    def wrap_lon(dlon):
+        return (dlon + 180.0) % 360.0 - 180.0
 
-    lat_old: array of latitude within [-90,90] degrees
-    lon_old: array of longitudes within [-180,+180[ degrees (+180 excluded)
+    lat_frac = np.clip((lat_new - lat_old[lat1]) / (lat_old[lat2] - lat_old[lat1]), 0.0, 1.0)
+    lon_frac = np.clip(wrap_lon(lon_new - lon_old[lon1]) / wrap_lon(lon_old[lon2] - lon_old[lon1]), 0.0, 1.0)
 
-    lat_new: array of latitudest o interpolate to [-90,90]
-    lon_new: array of longitudes to interpolate to [-180,180[
+    lat_inds = np.stack([lat1, lat1, lat2, lat2], axis=1)
+    lon_inds = np.stack([lon1, lon2, lon1, lon2], axis=1)
+    return lat_inds, lon_inds, lat_frac, lon_frac
+
+
+def lat_lon_interp(data_old,lat_old,lon_old,lat_new,lon_new,IDs_list,interp_weights=None):
     """
+    Bilinearly interpolate data on a latitude-longitude grid to a set of points.
+
+    Each point is interpolated from the four corners of its grid cell. If any of those corners are NaN or masked, the
+    result for that point is NaN.
+
+    :param data_old: the data to interpolate. The last two dimensions must be latitude and longitude; any leading
+     dimensions (e.g. levels) are interpolated all at once.
+    :type data_old: :class:`numpy.ndarray`
+
+    :param lat_old: the latitude vector of the grid, within [-90, 90] degrees.
+    :type lat_old: :class:`numpy.ndarray`
 
-    # make copies of input arrays to not modify them in place
-    data_old = data_old.copy()
-    lat_old = lat_old.copy()
-    lon_old = lon_old.copy()
-    lat_new = lat_new.copy()
-    lon_new = lon_new.copy()
+    :param lon_old: the longitude vector of the grid, within [-180, 180) degrees.
+    :type lon_old: :class:`numpy.ndarray`
 
-    """	
-    # Using interpolation in rectangles on a sphere
-    lat_old = deg2rad(lat_old+90)[1:-1]
-    lon_old = deg2rad(lon_old)
+    :param lat_new: the latitudes of the points to interpolate to.
+    :type lat_new: array-like
 
-    data_old = data_old[1:-1,:]
+    :param lon_new: the longitudes of the points to interpolate to, within [-180, 180).
+    :type lon_new: array-like
 
-    func = RectSphereBivariateSpline(lat_old,lon_old,data_old)
+    :param IDs_list: the grid cell indices for each point, as returned by :func:`querry_indices`.
+    :type IDs_list: list(list(int))
 
-    for i,elem in enumerate(lon_new):
-        if elem<0:
-            lon_new[i] = elem + 360
+    :param interp_weights: the output of :func:`lat_lon_interp_weights` for these points. If not given, it is computed
+     from the other inputs. Pass it in when interpolating multiple variables to the same points.
+    :type interp_weights: tuple(:class:`numpy.ndarray`)
 
-    data_new = func.ev(deg2rad(lat_new+90),deg2rad(lon_new))
+    :return: the interpolated data, with the latitude and longitude dimensions replaced by a points dimension.
+    :rtype: :class:`numpy.ndarray`
     """
+    if interp_weights is None:
+        interp_weights = lat_lon_interp_weights(lat_old, lon_old, lat_new, lon_new, IDs_list)
+    lat_inds, lon_inds, lat_frac, lon_frac = interp_weights
 
-    data_new = []
-    count = 0
-    for IDs in IDs_list:
-        lat1,lat2,lon1,lon2 = IDs
+    data_old = np.ma.filled(np.ma.asarray(data_old, dtype=float), np.nan)
+    corners = data_old[..., lat_inds, lon_inds]
 
-        lat = np.array([lat_old[lat1],lat_old[lat2]])
-        lon = np.array([lon_old[lon1],lon_old[lon2]])
+    # Interpolate as a + (b - a)*f rather than as a weighted sum of the corners so that constant fields (e.g. pressure
+    # on fixed levels) come out exactly. Any NaN corner still makes the result NaN, even if its weight is 0.
+    lower = corners[..., 0] + (corners[..., 1] - corners[..., 0]) * lon_frac
+    upper = corners[..., 2] + (corners[..., 3] - corners[..., 2]) * lon_frac
+    return lower + (upper - lower) * lat_frac
 
-        data = np.array([[data_old[lat1,lon1],data_old[lat1,lon2]],[data_old[lat2,lon1],data_old[lat2,lon2]]])
 
-        data = ma.masked_where(np.isnan(data),data)
+class GeosSubsetReader(object):
+    """
+    Read only the parts of GEOS variables needed to interpolate them to a set of points.
+
+    Interpolating to a point only uses the four grid points around it (see :func:`querry_indices`), so reading the
+    full global field of each variable is mostly wasted I/O. This finds the grid points needed by all the points, groups
+    them into connected lat/lon boxes, and reads only those hyperslabs from the GEOS file. The data are returned as
+    compact arrays whose last two dimensions are the latitudes and longitudes in :attr:`lat_ids` and :attr:`lon_ids`
+    rather than the full grid; grid points inside those that are not in any box are NaNs. Use :meth:`remap_weights` to
+    make interpolation weights from :func:`lat_lon_interp_weights` (computed on the full grid) index these arrays.
+
+    :param IDs_list: the grid cell indices for each point, as returned by :func:`querry_indices`.
+    :type IDs_list: list(list(int))
+
+    :param nlat: the number of latitudes in the full GEOS grid.
+    :type nlat: int
+
+    :param nlon: the number of longitudes in the full GEOS grid.
+    :type nlon: int
+    """
+    def __init__(self, IDs_list, nlat, nlon):
+        ids = np.array(IDs_list, dtype=int).reshape(-1, 4)
+        # querry_indices may return -1 for a cell crossing the edge of the grid, so wrap the same way numpy indexing
+        # would.
+        lat1, lat2, lon1, lon2 = (ids % [nlat, nlat, nlon, nlon]).T
+        needed = np.zeros((nlat, nlon), dtype=bool)
+        for lat_ids, lon_ids in ((lat1, lon1), (lat1, lon2), (lat2, lon1), (lat2, lon2)):
+            needed[lat_ids, lon_ids] = True
+
+        # Each connected group of needed grid points becomes one box to read. Points on either side of the date line
+        # end up in separate boxes, which is what we want since they cannot be read as one hyperslab.
+        labels, _ = ndimage.label(needed, structure=np.ones((3, 3)))
+        self.boxes = ndimage.find_objects(labels)
+
+        in_box = np.zeros_like(needed)
+        for box in self.boxes:
+            in_box[box] = True
+        self.lat_ids = np.flatnonzero(in_box.any(axis=1))
+        self.lon_ids = np.flatnonzero(in_box.any(axis=0))
+
+        # Lookup tables from full grid to compact indices. Every index inside a box is in lat_ids/lon_ids, so each box
+        # maps to a contiguous block of the compact arrays.
+        self._lat_pos = np.full(nlat, -1, dtype=int)
+        self._lat_pos[self.lat_ids] = np.arange(self.lat_ids.size)
+        self._lon_pos = np.full(nlon, -1, dtype=int)
+        self._lon_pos[self.lon_ids] = np.arange(self.lon_ids.size)
+
+    def _compact_slice(self, box_slice, pos):
+        start = pos[box_slice.start]
+        return slice(start, start + box_slice.stop - box_slice.start)
+
+    def read(self, variable):
+        """
+        Read the first time of a GEOS variable for the needed boxes.
+
+        :param variable: the netCDF variable to read, must have dimensions (time, [lev,] lat, lon).
+        :type variable: :class:`netCDF4.Variable`
+
+        :return: the compact array, with masked values replaced by NaNs.
+        :rtype: :class:`numpy.ndarray`
+        """
+        out = np.full(variable.shape[1:-2] + (self.lat_ids.size, self.lon_ids.size), np.nan)
+        for lat_slice, lon_slice in self.boxes:
+            block = variable[0, ..., lat_slice, lon_slice]
+            out[..., self._compact_slice(lat_slice, self._lat_pos), self._compact_slice(lon_slice, self._lon_pos)] = \
+                np.ma.filled(np.ma.asarray(block, dtype=float), np.nan)
+        return out
+
+    def remap_weights(self, interp_weights):
+        """
+        Convert interpolation weights for the full grid to weights for the compact arrays returned by :meth:`read`.
+
+        :param interp_weights: the output of :func:`lat_lon_interp_weights` for points covered by this reader.
+        :type interp_weights: tuple(:class:`numpy.ndarray`)
+
+        :return: the same weights, with the latitude and longitude indices replaced by indices into the compact arrays.
+        :rtype: tuple(:class:`numpy.ndarray`)
+        """
+        lat_inds, lon_inds, lat_frac, lon_frac = interp_weights
+        lat_inds = self._lat_pos[lat_inds % self._lat_pos.size]
+        lon_inds = self._lon_pos[lon_inds % self._lon_pos.size]
+        if np.any(lat_inds < 0) or np.any(lon_inds < 0):
+            raise ValueError('Some interpolation weights refer to grid points not read by this GeosSubsetReader')
+        return lat_inds, lon_inds, lat_frac, lon_frac
+
+
+def _read_geos_profile_vars(geos_file, varlist, subset):
+    """
+    Read the 3D GEOS variables needed for .mod files around a set of points, including the pressure levels as "lev".
+
+    :param geos_file: the GEOS profile (Np or Nv) file to read.
+    :type geos_file: str
+
+    :param varlist: the variables to read. "lev" is always the pressure, even for native files.
+    :type varlist: list(str)
 
-        func = interp2d(lon,lat,data)
+    :param subset: the reader defining which parts of the GEOS grid to read.
+    :type subset: :class:`GeosSubsetReader`
 
-        data_new.append(func(lon_new[count],lat_new[count]))
+    :return: dictionary of compact arrays, with native files flipped to be surface-to-space.
+    :rtype: dict
+    """
+    data = dict()
+    with netCDF4.Dataset(geos_file, 'r') as dataset:
+        file_is_native = mod_utils.is_geos_on_native_grid(geos_file)
+        for var in varlist:
+            if var == 'lev':
+                # 'lev' needs handle specially because we want it to always be pressure, but in the native files
+                # it is eta.
+                continue
 
-        count+=1
+            # Only the first time is read, which since there's only one time per file just cuts the data from 4D to 3D
+            data[var] = subset.read(dataset[var])
+            if file_is_native and 'lev' in dataset[var].dimensions:
+                # The native 72 eta level files are organized space-to-surface vertically; the 42 fixed pressure
+                # level files are surface-to-space. We want the latter so we need to flip the vertical dimension
+                # if it is a native file. The vertical dimension, if present, is first.
+                data[var] = np.flipud(data[var])
+
+        if file_is_native:
+            pres_levels = mod_utils.convert_geos_eta_coord(subset.read(dataset['DELP']), axis=0)
+            pres_levels = np.flipud(pres_levels)
+        else:
+            pres_levels = dataset['lev'][:]
+            pres_levels = np.broadcast_to(pres_levels.reshape(-1, 1, 1), data[varlist[0]].shape)
+        data['lev'] = pres_levels
+
+    return data
 
-    return data_new
 
 def show_interp(data,x,y,interp_data,ilev,pres):
 
@@ -1430,15 +1644,24 @@ def load_chem_variables(geos_file, geos_vars, target_site_dicts, pres_levels=Non
         lat = dataset['lat'][:]
         lon = dataset['lon'][:]
 
+        for site, subdict in target_site_dicts.items():
+            slat = subdict['lat']
+            slon = subdict['lon_180']
+            target_site_dicts[site]['IDs'] = querry_indices([lat, lon], site_lat=slat, site_lon_180=slon,
+                                                            box_lat_half_width=box_lat_half_width,
+                                                            box_lon_half_width=box_lon_half_width)
+
+        # Only read the parts of the chemistry fields around the sites
+        subset = GeosSubsetReader([subdict['IDs'] for subdict in target_site_dicts.values()], lat.size, lon.size)
         geos_data = dict()
         for var in geos_vars:
-            geos_data[var] = dataset[var][0]
-            if geos_data[var].shape[0] == 72:
+            geos_data[var] = subset.read(dataset[var])
+            if 'lev' in dataset[var].dimensions:
                 # The vertical dimension should be first if present. Flip native variables
                 # to be surface-to-space.
                 geos_data[var] = np.flipud(geos_data[var])
 
-        geos_pres = mod_utils.convert_geos_eta_coord(dataset['DELP'][0].filled(np.nan))
+        geos_pres = mod_utils.convert_geos_eta_coord(subset.read(dataset['DELP']), axis=0)
         geos_data['pres'] = np.flipud(geos_pres)
 
     # Handle the lat/lon interpolation
@@ -1446,14 +1669,7 @@ def load_chem_variables(geos_file, geos_vars, target_site_dicts, pres_levels=Non
     nsites = len(target_site_dicts)
     site_data = {v: np.full([nlevels, nsites], np.nan) for v in geos_vars}
 
-    for site, subdict in target_site_dicts.items():
-        slat = subdict['lat']
-        slon = subdict['lon_180']
-        target_site_dicts[site]['IDs'] = querry_indices([lat, lon], site_lat=slat, site_lon_180=slon,
-                                                        box_lat_half_width=box_lat_half_width,
-                                                        box_lon_half_width=box_lon_half_width)
-
-    interp_geos_data = interp_geos_data_to_sites(geos_data, lat, lon, target_site_dicts, muted=muted)
+    interp_geos_data = interp_geos_data_to_sites(geos_data, lat, lon, target_site_dicts, muted=muted, subset=subset)
 
     # Interpolate to the standard pressure levels. Do this in log-log space since pressure and concentration typically
     # vary exponentially with altitude. If no pressure levels given, then assume we are working with the native files
@@ -1477,7 +1693,7 @@ def load_chem_variables(geos_file, geos_vars, target_site_dicts, pres_levels=Non
     return site_data
 
 
-def interp_geos_data_to_sites(DATA, lat, lon, site_dict, varlist=None, muted=False):
+def interp_geos_data_to_sites(DATA, lat, lon, site_dict, varlist=None, muted=False, subset=None):
     """
     Interpolate GEOS data to the lat/lon of the sites where .mod files are needed.
 
@@ -1500,6 +1716,10 @@ def interp_geos_data_to_sites(DATA, lat, lon, site_dict, varlist=None, muted=Fal
     :param muted: set to ``True`` to silence progress messages
     :type muted: bool
 
+    :param subset: the reader used to read ``DATA``, if the arrays are the compact arrays returned by
+     :meth:`GeosSubsetReader.read` rather than global fields.
+    :type subset: :class:`GeosSubsetReader`
+
     :return: a dictionary of GEOS variables as masked arrays, interpolated to the site lat/lons. The arrays will be
      nlevels-by-nsites.
     :rtype: dict
@@ -1510,32 +1730,27 @@ def interp_geos_data_to_sites(DATA, lat, lon, site_dict, varlist=None, muted=Fal
     ids_list = [site_dict[site]['IDs'] for site in site_dict]
     new_lats = np.array([site_dict[site]['lat'] for site in site_dict])
     new_lons = np.array([site_dict[site]['lon_180'] for site in site_dict])
-
-    nsite = len(site_dict)
-    default_geos_var = list(DATA.keys())[0]
-    nlev = DATA[default_geos_var].shape[0]
+    interp_weights = lat_lon_interp_weights(lat, lon, new_lats, new_lons, ids_list)
+    if subset is not None:
+        interp_weights = subset.remap_weights(interp_weights)
 
     if not muted:
         print('\t-Interpolate to (lat,lon) of sites ...')
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore")
-        interp_data = dict()
-        for var in varlist:
-            if not muted:
-                sys.stdout.write('\r\t\tNow doing : {:<10s}'.format(var))
-                sys.stdout.flush()
+    interp_data = dict()
+    for var in varlist:
+        if not muted:
+            sys.stdout.write('\r\t\tNow doing : {:<10s}'.format(var))
+            sys.stdout.flush()
 
-            if DATA[var].ndim == 2:
-                interp_data[var] = lat_lon_interp(DATA[var], lat, lon, new_lats, new_lons, ids_list)
-            else:
-                interp_data[var] = np.zeros([nlev, nsite])
-                for ilev, level_data in enumerate(DATA[var]):
-                    interp_data[var][ilev] = lat_lon_interp(level_data, lat, lon, new_lats, new_lons, ids_list)
+        interp_data[var] = lat_lon_interp(DATA[var], lat, lon, new_lats, new_lons, ids_list,
+                                          interp_weights=interp_weights)
+        if DATA[var].ndim == 2:
+            # Surface variables are kept as one-element arrays for each site
+            interp_data[var] = interp_data[var][:, np.newaxis]
 
     # setup masks
     for var in varlist:
-        for i in range(nsite):
-            interp_data[var] = ma.masked_where(np.isnan(interp_data[var]), interp_data[var])
+        interp_data[var] = ma.masked_where(np.isnan(interp_data[var]), interp_data[var])
 
     return interp_data
 
@@ -1665,9 +1880,42 @@ def extrapolate_to_surface(var_to_interp, INTERP_DATA, SLANT_DATA=None):
                     elem[var][:np.where(level_pres==first_p)[0][0]] = elem[var][np.where(level_pres==first_p)][0]
 
 
+def _custom_locations_dict(site_abbrv, lat, lon, alt):
+    """
+    Build a dictionary of custom locations in the same format as the TCCON site dictionary.
+
+    Several custom locations may share an abbreviation (e.g. different observation coordinates for one site in a
+    runlog), so if an abbreviation is repeated, the location's index is appended to make its key unique. Each location's
+    "abbrv" entry keeps the original abbreviation, which is what the .mod file subdirectories are named with.
+
+    :param site_abbrv: site abbreviation(s)
+    :type site_abbrv: str or list(str)
+
+    :param lat: latitude(s) in [-90,90] range
+    :type lat: float or list(float)
+
+    :param lon: longitude(s) in [0,360] or [-180,180] range
+    :type lon: float or list(float)
+
+    :param alt: altitude(s) in meters
+    :type alt: float or list(float)
+
+    :return: the dictionary of locations, keyed by unique site IDs
+    :rtype: :class:`collections.OrderedDict`
+    """
+    site_abbrv, lat, lon, alt = check_site_lat_lon_alt(site_abbrv, lat=lat, lon=lon, alt=alt)
+    locations = OrderedDict()
+    for i, (this_abbrv, this_lat, this_lon, this_alt) in enumerate(zip(site_abbrv, lat, lon, alt)):
+        key = this_abbrv if site_abbrv.count(this_abbrv) == 1 else '{}_{}'.format(this_abbrv, i)
+        locations[key] = {'name': 'custom site', 'loc': 'custom loc', 'abbrv': this_abbrv,
+                          'lat': this_lat, 'lon': this_lon, 'alt': this_alt}
+    return locations
+
+
 def mod_maker_new(start_date=None, end_date=None, func_dict=None, GEOS_path=None, chem_path=None, locations=site_dict,
                   slant=False, muted=False, lat=None, lon=None, alt=None, site_abbrv=None, save_path=None, product='fpit',
-                  keep_latlon_prec=False, save_in_utc=True, native_files=False, chem_variables=tuple(), flat_outdir=False, **kwargs):
+                  keep_latlon_prec=False, save_in_utc=True, native_files=False, chem_variables=tuple(), flat_outdir=False,
+                  nprocs=0, eqlat_cache=None, mod_format='text', **kwargs):
     """
     This code only works with GEOS-5 FP-IT data.
     It generates MOD files for all sites between start_date and end_date on GEOS-5 times (every 3 hours)
@@ -1675,28 +1923,44 @@ def mod_maker_new(start_date=None, end_date=None, func_dict=None, GEOS_path=None
     Inputs:
         - start_date: datetime object for first date, YYYYMMDD_HH, _HH is optional and defaults to _00
         - end_date:  datetime object for last date, YYYYMMDD_HH, _HH is optional and defaults to _00
-        - func_dict: output of equivalent_latitude_functions
+        - func_dict: output of equivalent_latitude_functions. If None, the functions are computed from the GEOS files.
         - GEOS_path: full path to the directory containing all the GEOS5-FP-IT files, the directory must contain a 'Np' folder with profile data, and a 'Nx' folder with surface data
         - locations: dictionary of sites, defaults to the one in tccon_sites.py
         - slant: if True both slant and vertical .mod files will be generated
         - muted: if True there will be no print statements except for warnings and errors
-        - (optional) lat: latitude in [-90,90] range
-        - (optional) lon: longitude in [0,360] range
-        - (optional) alt: altitude (meters)
-        - (optional) site_abbrv: two letter site abbreviation
+        - (optional) lat: latitude in [-90,90] range, or a sequence of latitudes
+        - (optional) lon: longitude in [0,360] range, or a sequence of longitudes
+        - (optional) alt: altitude (meters), or a sequence of altitudes
+        - (optional) site_abbrv: two letter site abbreviation, or a sequence of abbreviations
+        - (optional) nprocs: number of processes to use to make the .mod files for different GEOS times in parallel.
+          0 (the default) runs in serial.
+        - (optional) eqlat_cache: ioutils.EqLatTableCache to use if computing the equivalent latitude functions here
+        - (optional) mod_format: 'text' (the default) to write the usual .mod files, or 'bundle' to write one bundle per
+          day holding every site's profiles instead (see common_utils.bundles). Bundles are saved directly in the
+          product directory. None writes nothing, only the returned dictionary is computed.
     Outputs:
-        - .mod files at every GEOS5 time within the given date range
+        - .mod files (or daily bundles) at every GEOS5 time within the given date range
+        - a dictionary of the .mod file data, keyed by date then site. Each site has the write_mod output for the
+          'vertical' and 'slant' profiles, and the vertical profile as a 'record' in the same form as
+          common_utils.readers.read_mod_file returns (with the extra keys of a bundle profile)
 
-    If any of alt/lat/lon is given, the other two must be given too as well as site_abbrv
+    If any of alt/lat/lon is given, the other two must be given too as well as site_abbrv. Sequences of lat/lon/alt
+    will all be made in one pass, so each GEOS file is only read once. If site_abbrv is a single abbreviation, it is used
+    for all of them. If lat/lon/alt are not given, site_abbrv may also be a sequence of TCCON site abbreviations.
 
     When giving dates with _HHMM, dates must correspond exactly to GEOS5 times, so 3 hourly UTC times starting at HHMM=0000
+
+    When running in parallel, if func_dict is None, each process computes the equivalent latitude function for the GEOS
+    times it is working on. Each GEOS time's log output is printed as one block once it finishes, in time order.
     """
     
-    if lat is not None: # a custom location was given
+    if lat is not None: # custom location(s) were given
         site_abbrv = 'xx' if site_abbrv is None else site_abbrv
-        locations = {site_abbrv:{'name':'custom site','loc':'custom loc','lat':lat,'lon':lon,'alt':alt}}
-    elif site_abbrv and site_abbrv != 'all': # if not custom location is given, but a site abbreviation is given, just do that one site
-        locations = {site_abbrv:locations[site_abbrv]}
+        locations = _custom_locations_dict(site_abbrv, lat, lon, alt)
+    elif site_abbrv and site_abbrv != 'all': # if not custom location is given, but site abbreviation(s) are given, just do those sites
+        site_abbrv = [site_abbrv] if isinstance(site_abbrv, str) else site_abbrv
+        if 'all' not in site_abbrv:
+            locations = {abbrv:locations[abbrv] for abbrv in site_abbrv}
 
     if chem_path is None:
         # Assume that the chemistry files are in the same folder as the met files
@@ -1718,7 +1982,7 @@ def mod_maker_new(start_date=None, end_date=None, func_dict=None, GEOS_path=None
     else:
         mod_path = os.path.join(save_path,product)
     
-    if not os.path.exists(mod_path):
+    if mod_format is not None and not os.path.exists(mod_path):
         if not muted:
             print('Creating',mod_path)
         os.makedirs(mod_path)
@@ -1726,6 +1990,10 @@ def mod_maker_new(start_date=None, end_date=None, func_dict=None, GEOS_path=None
     do_load_chem = len(chem_variables) > 0
     if slant and do_load_chem:
         raise NotImplementedError('Slant path chemistry variables have not yet been implemented')
+    if mod_format not in ('text', 'bundle', None):
+        raise ValueError('mod_format must be "text", "bundle", or None')
+    elif slant and mod_format != 'text':
+        raise NotImplementedError('Slant .mod files can only be written as text files')
 
     varlist = ['T','QV','RH','H','EPV','O3','PHIS', 'lev']
     surf_varlist = ['T2M','QV2M','PS','SLP','TROPPB','TROPPV','TROPPT','TROPT']
@@ -1740,49 +2008,38 @@ def mod_maker_new(start_date=None, end_date=None, func_dict=None, GEOS_path=None
             raise RuntimeError('Dates for the chemistry files do not match the dates for the met file. Something '
                                'went wrong when looking for these files.')
 
+    if nprocs > 0:
+        timestep_kws = dict(GEOS_path=GEOS_path, chem_path=chem_path, locations=locations, slant=slant, muted=muted,
+                            save_path=save_path, product=product, keep_latlon_prec=keep_latlon_prec,
+                            save_in_utc=save_in_utc, native_files=native_files, chem_variables=chem_variables,
+                            flat_outdir=flat_outdir, eqlat_cache=eqlat_cache, mod_format=mod_format)
+        return _mod_maker_new_parallel(select_dates, func_dict, nprocs, timestep_kws)
+
+    if func_dict is None:
+        eqlat_fxn = equivalent_latitude_functions_native_geos if native_files else equivalent_latitude_functions_geos
+        func_dict = eqlat_fxn(GEOS_path=GEOS_path, start_date=start_date, end_date=end_date, muted=muted,
+                              eqlat_cache=eqlat_cache)
+
     nsite = len(locations)
 
     start = time.time()
     mod_dicts = dict()
+    bundle_records = dict()
 
     for date_ID, UTC_date in enumerate(select_dates):
         site_dict = tccon_site_info_for_date(UTC_date, site_dict_in=locations)
         mod_dicts[UTC_date] = dict()
         start_it = time.time()
 
-        DATA = {}
         if not muted:
             print('\nNOW DOING date {:4d} / {} :'.format(date_ID+1,len(select_dates)),UTC_date.strftime("%Y-%m-%d %H:%M"),' UTC')
-            print('\t-Read global data ...')
+            print('\t-Read data around sites ...')
 
         file_is_native = mod_utils.is_geos_on_native_grid(select_files[date_ID])
         if file_is_native != native_files:
             raise RuntimeError('Loaded a native level GEOS file but expected a fixed pressure file, or vice versa')
 
         with netCDF4.Dataset(select_files[date_ID],'r') as dataset:
-            for var in varlist:
-                if var == 'lev':
-                    # 'lev' needs handle specially because we want it to always be pressure, but in the native files
-                    # it is eta.
-                    continue
-
-                # Taking dataset[var][0] is equivalent to dataset[var][0,:,:,:], which since there's only one time per
-                # file just cuts the data from 4D to 3D
-                DATA[var] = dataset[var][0]
-                if file_is_native and DATA[var].shape[0] == 72:
-                    # The native 72 eta level files are organized space-to-surface vertically; the 42 fixed pressure
-                    # level files are surface-to-space. We want the latter so we need to flip the vertical dimension
-                    # if it is a native file. The vertical dimension, if present, should be first and have 72 levels.
-                    DATA[var] = np.flipud(DATA[var])
-
-            if file_is_native:
-                pres_levels = mod_utils.convert_geos_eta_coord(dataset['DELP'][0])
-                pres_levels = np.flipud(pres_levels)
-            else:
-                pres_levels = dataset['lev'][:]
-                pres_levels = np.broadcast_to(pres_levels.reshape(-1, 1, 1), DATA[varlist[0]].shape)
-            DATA['lev'] = pres_levels
-
             lat = dataset['lat'][:]
             lon = dataset['lon'][:]
             nlev = dataset.dimensions['lev'].size
@@ -1803,10 +2060,15 @@ def mod_maker_new(start_date=None, end_date=None, func_dict=None, GEOS_path=None
             else:
                 site_dict[site]['IDs'] = querry_indices([lat,lon],site_dict[site]['lat'],site_dict[site]['lon_180'],box_lat_half_width,box_lon_half_width)
 
+        # Only the grid points around the sites are needed, so only read those parts of the GEOS fields. (The full
+        # fields needed for the equivalent latitude are read separately when making func_dict.)
+        site_subset = GeosSubsetReader([site_dict[site]['IDs'] for site in site_dict], lat.size, lon.size)
+        DATA = _read_geos_profile_vars(select_files[date_ID], varlist, site_subset)
+
         SURF_DATA = {}
         with netCDF4.Dataset(select_surf_files[date_ID],'r') as dataset:
             for var in surf_varlist:
-                SURF_DATA[var] = dataset[var][0]
+                SURF_DATA[var] = site_subset.read(dataset[var])
 
         if not muted:
             print('\t-Interpolate to (lat,lon) of sites ...')
@@ -1815,10 +2077,10 @@ def mod_maker_new(start_date=None, end_date=None, func_dict=None, GEOS_path=None
         # on fixed pressure levels, and need to interpolate anyway. If using a fixed pressure level file, we've
         # broadcast the pressure levels to be the same size as the rest of the 3D variables.
         INTERP_DATA = interp_geos_data_to_sites(DATA, lat=lat, lon=lon, site_dict=site_dict, varlist=varlist,
-                                                muted=muted)
+                                                muted=muted, subset=site_subset)
 
         INTERP_SURF_DATA = interp_geos_data_to_sites(SURF_DATA, lat=lat, lon=lon, site_dict=site_dict,
-                                                     varlist=surf_varlist, muted=muted)
+                                                     varlist=surf_varlist, muted=muted, subset=site_subset)
 
         ##############################################################################
         # Handle some variable conversions/custom calculations for the met variables #
@@ -1893,47 +2155,45 @@ def mod_maker_new(start_date=None, end_date=None, func_dict=None, GEOS_path=None
             if not muted:
                 print('\r\t\t{:<40s}'.format('DONE'))
 
-            # Set two lists with all the latitudes and longitudes of all sites at all slant levels
-            slant_lat = []
-            slant_lon = []
-            slat_slon = []
+            # Index the unique (lat,lon) of the slant points of all sites with the sun above the horizon, and record for
+            # each of those sites which point each of its levels is (-1 for masked levels)
+            slant_point_index = {}
+            slant_point_ids = {}
             for site in site_dict:
                 if site_dict[site]['slant_coords']['sza']<90: # only make profiles where sun is above the horizon
                     slat = site_dict[site]['slant_coords']['lat']
                     slon = site_dict[site]['slant_coords']['lon']
-                    slant_lat.extend(slat)
-                    slant_lon.extend(slon)
-                    for i in range(len(slat)):
-                        if slat[i] is ma.masked:
-                            continue
-                        if (slat[i],slon[i]) not in slat_slon:
-                            slat_slon.append((slat[i],slon[i]))
+                    ids = np.full(len(slat),-1)
+                    for i in np.flatnonzero(~ma.getmaskarray(slat)):
+                        ids[i] = slant_point_index.setdefault((slat[i],slon[i]),len(slant_point_index))
+                    slant_point_ids[site] = ids
+            slat_slon = list(slant_point_index)
 
             IDs_list = np.array([querry_indices([lat,lon],slat,slon,box_lat_half_width,box_lon_half_width) for slat,slon in slat_slon])
 
             slant_lat = np.array([slat for slat,slon in slat_slon])
             slant_lon = np.array([slon for slat,slon in slat_slon])
 
+            # The slant paths can leave the boxes read around the sites, so read the grid points around the slant
+            # points as well
+            if not muted:
+                print('\t-Read data along slant paths ...')
+            slant_subset = GeosSubsetReader(IDs_list, lat.size, lon.size)
+            SLANT_GEOS_DATA = _read_geos_profile_vars(select_files[date_ID], varlist, slant_subset)
+
             # Interpolate to each slant level (lat,lon)
             # This will give a vertical profile at every (lat,lon) of all the slant levels
             if not muted:
                 print('\t-Interpolate to each slant level (lat,lon) ...')
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore")
-                NEW_INTERP_DATA = {}
-                for var in varlist:
-                    if not muted:
-                        sys.stdout.write('\r\t\tNow doing : {:<10s}'.format(var))
-                        sys.stdout.flush()
-                    if DATA[var].ndim==2:
-                        NEW_INTERP_DATA[var] = lat_lon_interp(DATA[var],lat,lon,slant_lat,slant_lon,IDs_list)
-                        continue
-
-                    NEW_INTERP_DATA[var] = np.zeros([nlev,len(IDs_list)])
-                    for ilev,level_data in enumerate(DATA[var]):
-                        NEW_INTERP_DATA[var][ilev] = lat_lon_interp(level_data,lat,lon,slant_lat,slant_lon,IDs_list)
+            slant_weights = slant_subset.remap_weights(lat_lon_interp_weights(lat,lon,slant_lat,slant_lon,IDs_list))
+            NEW_INTERP_DATA = {}
+            for var in varlist:
                 if not muted:
-                    print('\r\t\t{:<40s}'.format('DONE'))
+                    sys.stdout.write('\r\t\tNow doing : {:<10s}'.format(var))
+                    sys.stdout.flush()
+                NEW_INTERP_DATA[var] = lat_lon_interp(SLANT_GEOS_DATA[var],lat,lon,slant_lat,slant_lon,IDs_list,interp_weights=slant_weights)
+            if not muted:
+                print('\r\t\t{:<40s}'.format('DONE'))
             # setup masks
             for var in set(varlist)-set(['PHIS']):
                 NEW_INTERP_DATA[var] = ma.masked_where(np.isnan(NEW_INTERP_DATA[var]),NEW_INTERP_DATA[var])
@@ -1942,23 +2202,16 @@ def mod_maker_new(start_date=None, end_date=None, func_dict=None, GEOS_path=None
             if not muted:
                 print('\t-Get data along slant paths ...')
             SLANT_DATA = {}
-            for site in site_dict: # for each site
-                if site_dict[site]['slant_coords']['sza']<90:
-                    SLANT_DATA[site] = site_dict[site]['slant_coords']
-                    SLANT_DATA[site]['H'] = SLANT_DATA[site]['alt']
-                    SLANT_DATA[site]['lev'] = INTERP_DATA[site]['prof']['lev']
-                    for var in set(varlist)-set(['H','PHIS']): # for each variable
-                        SLANT_DATA[site][var] = np.array([])
-                        for i in range(len(SLANT_DATA[site]['H'])): # for each slant point
-                            slat,slon = SLANT_DATA[site]['lat'][i] , SLANT_DATA[site]['lon'][i]
-                            try:
-                                ID = slat_slon.index((slat,slon))
-                            except ValueError:
-                                SLANT_DATA[site][var] = np.append(SLANT_DATA[site][var],np.nan)
-                            else:
-                                SLANT_DATA[site][var] = np.append(SLANT_DATA[site][var],NEW_INTERP_DATA[var][i,ID])
-
-                        SLANT_DATA[site][var] = ma.masked_where(np.isnan(SLANT_DATA[site][var]),SLANT_DATA[site][var])
+            for site, ids in slant_point_ids.items(): # for each site with the sun above the horizon
+                SLANT_DATA[site] = site_dict[site]['slant_coords']
+                SLANT_DATA[site]['H'] = SLANT_DATA[site]['alt']
+                SLANT_DATA[site]['lev'] = INTERP_DATA[site]['prof']['lev']
+                levels = np.flatnonzero(ids>=0)
+                for var in set(varlist)-set(['H','PHIS']): # for each variable
+                    # gather all the slant points of this site at once; masked levels and missing values become NaNs
+                    SLANT_DATA[site][var] = np.full(ids.size,np.nan)
+                    SLANT_DATA[site][var][levels] = ma.filled(NEW_INTERP_DATA[var][levels,ids[levels]],np.nan)
+                    SLANT_DATA[site][var] = ma.masked_where(np.isnan(SLANT_DATA[site][var]),SLANT_DATA[site][var])
         # end of 'if slant'
 
         if not muted:
@@ -2002,16 +2255,18 @@ def mod_maker_new(start_date=None, end_date=None, func_dict=None, GEOS_path=None
             utc_offset = timedelta(hours=site_dict[site]['lon_180']/15.0) if not save_in_utc else timedelta(hours=0)
             local_date = UTC_date + utc_offset
 
-            vertical_mod_path = mod_path if flat_outdir else os.path.join(mod_path,site,'vertical')
-            if not os.path.exists(vertical_mod_path):
-                os.makedirs(vertical_mod_path)
+            # custom locations may have had their key made unique, the output directory should still use the abbreviation
+            site_dir = site_dict[site].get('abbrv', site)
+            vertical_mod_path = mod_path if flat_outdir else os.path.join(mod_path,site_dir,'vertical')
+            if mod_format == 'text':
+                # exist_ok is needed as other processes may create the same directories when running in parallel
+                os.makedirs(vertical_mod_path, exist_ok=True)
 
             if slant:
                 # We already check at the beginning of this function that flat_outdir = False if slant = True
                 # so we don't need to handle the flat_outdir = True case here.
-                slant_mod_path =  os.path.join(mod_path,site,'slant')
-                if not os.path.exists(slant_mod_path):
-                    os.makedirs(slant_mod_path)
+                slant_mod_path =  os.path.join(mod_path,site_dir,'slant')
+                os.makedirs(slant_mod_path, exist_ok=True)
 
             # directions for .mod file name
             if site_lat >= 0:
@@ -2028,11 +2283,15 @@ def mod_maker_new(start_date=None, end_date=None, func_dict=None, GEOS_path=None
             if not muted:
                 print('\t\t\t{:<20s} : {}'.format(site_dict[site]['name'], mod_name))
 
-            # write vertical mod file
-            mod_file_path = os.path.join(vertical_mod_path,mod_name)
+            # write vertical mod file, or just compute its contents if it is going in a bundle
+            mod_file_path = os.path.join(vertical_mod_path,mod_name) if mod_format == 'text' else None
             vertical_mod_dict = write_mod(mod_file_path,version,site_lat,data=INTERP_DATA[site]['prof']
                                           ,surf_data=INTERP_DATA[site]['surf'],func=func_dict[UTC_date],
                                           muted=muted,slant=slant,chem_vars=do_load_chem)
+            vertical_record = _mod_bundle_record(mod_name, site_dir, version, vertical_mod_dict,
+                                                 INTERP_DATA[site]['surf'])
+            if mod_format == 'bundle':
+                bundle_records.setdefault(UTC_date.date(), []).append(vertical_record)
 
             if slant:
                 # write slant mod_file
@@ -2046,14 +2305,126 @@ def mod_maker_new(start_date=None, end_date=None, func_dict=None, GEOS_path=None
 
             mod_dicts[UTC_date][site]['vertical'] = vertical_mod_dict
             mod_dicts[UTC_date][site]['slant'] = slant_mod_dict
+            mod_dicts[UTC_date][site]['record'] = vertical_record
         if not muted:
             print('\ndate {:4d} / {} DONE in {:.0f} seconds'.format(date_ID+1,len(select_dates),time.time()-start_it))
+
+    for bundle_date, records in bundle_records.items():
+        bundle_file = os.path.join(mod_path, bundles.bundle_file_name(product, bundle_date, 'mod'))
+        bundles.write_bundle(bundle_file, 'mod', records, units=_mod_bundle_units, product=product)
+        if not muted:
+            print('Wrote {} profiles to {}'.format(len(records), bundle_file))
+
     if not muted:
         print('It took {:.1f} minutes to generate .mod files for {} dates'.format((time.time()-start)/60.0,len(select_dates)))
 
     return mod_dicts
 
 
+def _mod_maker_new_parallel(select_dates, func_dict, nprocs, timestep_kws):
+    """
+    Run :func:`mod_maker_new` for each GEOS time in a separate process.
+
+    When writing bundles, each day's GEOS times are done together in one process instead, so that only one process
+    writes each day's bundle.
+
+    :param select_dates: the GEOS times to make .mod files for.
+    :type select_dates: list(datetime)
+
+    :param func_dict: the equivalent latitude functions for each time, or ``None`` to have each process compute its own.
+    :type func_dict: dict or None
+
+    :param nprocs: number of processes to use.
+    :type nprocs: int
+
+    :param timestep_kws: the other keywords to pass through to :func:`mod_maker_new`.
+    :type timestep_kws: dict
+
+    :return: the dictionary of .mod file data, keyed by date then site.
+    :rtype: dict
+    """
+    muted = timestep_kws['muted']
+    if not muted:
+        print('\nGenerating .mod files for {} dates with {} processes'.format(len(select_dates), nprocs))
+
+    if timestep_kws['mod_format'] == 'bundle':
+        date_groups = [list(dates) for _, dates in groupby(select_dates, key=lambda d: d.date())]
+    else:
+        date_groups = [[date] for date in select_dates]
+
+    start = time.time()
+    mod_dicts = dict()
+    group_funcs = [None if func_dict is None else {date: func_dict[date] for date in dates} for dates in date_groups]
+    with Pool(processes=nprocs) as pool:
+        # imap returns results in order, so the output dictionary and the log are the same regardless of which
+        # process finishes first.
+        results = pool.imap(_mod_maker_new_timestep, zip(date_groups, group_funcs, repeat(timestep_kws)))
+        for group_ID, (timestep_dicts, timestep_log, timestep_err) in enumerate(results):
+            mod_dicts.update(timestep_dicts)
+            # Warnings and log messages are always shown, as they are when running serially
+            sys.stderr.write(timestep_err)
+            if not muted:
+                sys.stdout.write(timestep_log)
+                print('\ndate {:4d} / {} collected'.format(group_ID+1, len(date_groups)))
+
+    if not muted:
+        print('It took {:.1f} minutes to generate .mod files for {} dates'.format((time.time()-start)/60.0,len(select_dates)))
+
+    return mod_dicts
+
+
+def _mod_maker_new_timestep(args):
+    """
+    Worker for :func:`_mod_maker_new_parallel` that makes the .mod files for one or more consecutive GEOS times.
+
+    :param args: the GEOS times, equivalent latitude function dictionary, and keywords for :func:`mod_maker_new`.
+    :type args: tuple
+
+    :return: the dictionary of .mod file data for these times, everything it printed, and everything it wrote to
+     stderr (including log messages).
+    :rtype: dict, str, str
+    """
+    utc_dates, func_dict, timestep_kws = args
+    log = io.StringIO()
+    err = io.StringIO()
+    with redirect_stdout(log), redirect_stderr(err), redirect_log_stream(err):
+        # The end date is exclusive, so this only selects the GEOS files from the first to the last of utc_dates
+        timestep_dicts = mod_maker_new(start_date=utc_dates[0], end_date=utc_dates[-1] + timedelta(seconds=1),
+                                       func_dict=func_dict, nprocs=0, **timestep_kws)
+    return timestep_dicts, log.getvalue(), err.getvalue()
+
+
+def _mod_bundle_record(mod_name, site_abbrev, version, mod_dict, surf_data):
+    """
+    Make the bundle profile dictionary for one .mod file.
+
+    :param mod_name: the name the .mod file would have.
+    :type mod_name: str
+
+    :param site_abbrev: the site abbreviation.
+    :type site_abbrev: str
+
+    :param version: the version line for the .mod file header.
+    :type version: str
+
+    :param mod_dict: the dictionary returned by :func:`write_mod` for this profile.
+    :type mod_dict: dict
+
+    :param surf_data: the surface data given to :func:`write_mod` for this profile.
+    :type surf_data: dict
+
+    :return: the profile dictionary
+    :rtype: dict
+    """
+    file_vars = {'datetime': mod_utils.find_datetime_substring(mod_name, out_type=datetime),
+                 'lat': mod_utils.find_lat_substring(mod_name, to_float=True),
+                 'lon': mod_utils.find_lon_substring(mod_name, to_float=True)}
+    scalar = {name: surf_data[key] for name, key in zip(mod_surf_names, mod_surf_var_order)}
+    profile = {k: v for k, v in mod_dict.items() if k != 'constants'}
+    return bundles.make_record(mod_name, site_abbrev, file_vars, constants=mod_dict['constants'], scalar=scalar,
+                               profile=profile, header={'version': version})
+
+
 def mod_maker(site_abbrv=None,start_date=None,end_date=None,mode=None,locations=site_dict,HH=12,MM=0,time_step=24,muted=False,lat=None,lon=None,alt=None,save_path=None,ncdf_path=None,keep_latlon_prec=False,**kwargs):
     """
     Inputs:
@@ -2281,7 +2652,9 @@ def runlog_driver(runlog, site_abbrv=None, first_date='2000-01-01', **kwargs):
 
 
 def driver(date_range, met_path, chem_path=None, save_path=None, keep_latlon_prec=False, save_in_utc=True, muted=False,
-           slant=False, alt=None, lon=None, lat=None, site_abbrv=None, mode=_default_mode, include_chm=True, flat_outdir=False, **kwargs):
+           slant=False, alt=None, lon=None, lat=None, site_abbrv=None, mode=_default_mode, include_chm=True, flat_outdir=False,
+           eqlat_cache_dir=None, eqlat_cache_max_entries=None, eqlat_cache_max_age=None, nprocs=0, mod_format='text',
+           **kwargs):
     """
     Function that when called executes the full mod maker process as if called from the command line
 
@@ -2370,17 +2743,42 @@ def driver(date_range, met_path, chem_path=None, save_path=None, keep_latlon_pre
      subdirectories by product, site, and vertical/slant.
     :type flat_outdir: bool
 
+    :param eqlat_cache_dir: directory to cache equivalent latitude tables in, so that they are only computed once for
+     each GEOS file. If ``None``, no cache is used. Only used by the new mod_maker code.
+    :type eqlat_cache_dir: str or None
+
+    :param eqlat_cache_max_entries: maximum number of tables to keep in the cache, see
+     :class:`~ginput.common_utils.ioutils.EqLatTableCache`.
+    :type eqlat_cache_max_entries: int or None
+
+    :param eqlat_cache_max_age: remove tables not used in this many days from the cache, see
+     :class:`~ginput.common_utils.ioutils.EqLatTableCache`.
+    :type eqlat_cache_max_age: float or None
+
+    :param nprocs: number of processes to use to make .mod files for different GEOS times in parallel, each of which
+     also computes the equivalent latitude functions for its times. 0 runs in serial. Only used by the new mod_maker
+     code.
+    :type nprocs: int
+
+    :param mod_format: "text" to write the usual .mod files or "bundle" to write one netCDF bundle per day holding all
+     the sites' profiles instead (see :mod:`~ginput.common_utils.bundles`). ``None`` writes nothing and only returns the
+     profiles. Bundles and ``None`` are only supported by the new mod_maker code.
+    :type mod_format: str or None
+
     :param kwargs: unused, swallows extra keyword arguments
 
-    :return: nothing, writes .mod files to the output directory.
+    :return: for the new mod_maker code, the dictionary of .mod data returned by :func:`mod_maker_new`; nothing for
+     the old code. Writes .mod files to the output directory.
     """
     start_date, end_date = date_range
     site_abbrv, lat, lon, alt = check_site_lat_lon_alt(site_abbrv, lat=lat, lon=lon, alt=alt)
 
-    # The modmaker functions are not set up to allow multiple custom lat/lon/alts to be passed, so if there are multiple
-    # lat/lon/alts to be made, then we have to iterate over them. In the case of the new mod maker, we want to only
-    # generate the eq. lat. interpolation functions once, because those take a long time.
+    # The old modmaker function is not set up to allow multiple custom lat/lon/alts to be passed, so if there are
+    # multiple lat/lon/alts to be made, then we have to iterate over them. The new mod maker takes all of them at once,
+    # so that the eq. lat. interpolation functions are generated once and each GEOS file is only read once.
     if mode in _old_modmaker_modes:
+        if mod_format != 'text':
+            raise NotImplementedError('Only text .mod files can be written by the old mod_maker code')
         for this_abbrv, this_lat, this_lon, this_alt in zip(site_abbrv, lat, lon, alt):
             mod_maker(site_abbrv=this_abbrv, start_date=start_date, end_date=end_date, locations=site_dict,
                       HH=12, MM=0, time_step=24, muted=muted, lat=this_lat, lon=this_lon, alt=this_alt,
@@ -2397,13 +2795,29 @@ def driver(date_range, met_path, chem_path=None, save_path=None, keep_latlon_pre
 
         chem_vars = ('CO',) if include_chm else tuple()
         product = mode.replace('-eta', '')
-        func_dict = eqlat_fxn(GEOS_path=met_path, start_date=start_date, end_date=end_date, muted=muted)
-
-        for this_abbrv, this_lat, this_lon, this_alt in zip(site_abbrv, lat, lon, alt):
-            mod_maker_new(start_date=start_date, end_date=end_date, func_dict=func_dict, GEOS_path=met_path,
-                          chem_path=chem_path, chem_variables=chem_vars, slant=slant, locations=site_dict, muted=muted,
-                          lat=this_lat, lon=this_lon, alt=this_alt, site_abbrv=this_abbrv, save_path=save_path, product=product,
-                          keep_latlon_prec=keep_latlon_prec, save_in_utc=save_in_utc, native_files=native_files, flat_outdir=flat_outdir)
+        if eqlat_cache_dir is None:
+            eqlat_cache = None
+        else:
+            eqlat_cache = ioutils.EqLatTableCache(eqlat_cache_dir, max_entries=eqlat_cache_max_entries,
+                                                  max_age_days=eqlat_cache_max_age)
+        if nprocs > 0:
+            # Let each process compute the equivalent latitude functions for the times it is working on
+            func_dict = None
+        else:
+            func_dict = eqlat_fxn(GEOS_path=met_path, start_date=start_date, end_date=end_date, muted=muted,
+                                  eqlat_cache=eqlat_cache)
+
+        if lat[0] is None:
+            # check_site_lat_lon_alt ensures that either all or none of the lat/lon/alts are given, so we can just
+            # check the first one to know if we're making standard TCCON sites or custom locations.
+            lat, lon, alt = None, None, None
+
+        return mod_maker_new(start_date=start_date, end_date=end_date, func_dict=func_dict, GEOS_path=met_path,
+                             chem_path=chem_path, chem_variables=chem_vars, slant=slant, locations=site_dict,
+                             muted=muted, lat=lat, lon=lon, alt=alt, site_abbrv=site_abbrv, save_path=save_path,
+                             product=product, keep_latlon_prec=keep_latlon_prec, save_in_utc=save_in_utc,
+                             native_files=native_files, flat_outdir=flat_outdir, nprocs=nprocs,
+                             eqlat_cache=eqlat_cache, mod_format=mod_format)
     else:
         raise ValueError('mode "{}" is not one of the allowed values: {}'.format(
             mode, ', '.join(_old_modmaker_modes + _new_modmaker_modes)
@@ -6,6 +6,7 @@ The function "slantify" is the main function in this code, it converts a vertica
 Running this python code will run a test case (see the bottom of the code)
 
 """
+from functools import lru_cache
 import numpy as np
 from numpy import cos,sin,tan,arctan,arccos,arcsin,arctan2,deg2rad,rad2deg
 from datetime import datetime, timedelta
@@ -55,12 +56,10 @@ def sun_earth_distance(date):
         - Sun-Earth distance (meters)
     """
 
-    planets = load('de421.bsp')
+    planets, ts = _load_ephemeris()
 
     earth,sun = planets['earth'],planets['sun']
 
-    ts = load.timescale()
-
     t = ts.utc(date.replace(tzinfo=utc))
 
     astrometric = earth.at(t).observe(sun)
@@ -68,6 +67,13 @@ def sun_earth_distance(date):
 
     return distance.m
 
+@lru_cache(maxsize=None)
+def _load_ephemeris():
+    """
+    Load the planetary ephemeris and timescale once, rather than re-reading them for every call to sun_earth_distance
+    """
+    return load('de421.bsp'), load.timescale()
+
 def r_geoid(lat,lon,re,rp):
     """
     Radius of geoid at lat,lon (meters)
@@ -82,7 +88,11 @@ def r_geoid(lat,lon,re,rp):
         - Radius of geoid at lat,lon (meters)
     """
 
-    return np.sqrt( (cos(lat)**2*re**4+sin(lat)**2*rp**4) / ((cos(lat)*re)**2+(sin(lat)*rp)**2) )
+    # convert the 4th powers to floats up front, an integer radius would otherwise make an object array for array inputs
+    re4 = float(re**4)
+    rp4 = float(rp**4)
+
+    return np.sqrt( (cos(lat)**2*re4+sin(lat)**2*rp4) / ((cos(lat)*re)**2+(sin(lat)*rp)**2) )
 
 def rv(lat,re,n):
     """
@@ -111,6 +121,8 @@ def geoid_position(lat,lon,re,n):
 
     Outputs:
         - Cartesian position vector from geoid center to surface at lat,lon
+
+    lat and lon may be arrays, in which case the x,y,z components are along the first axis of the output
     """
 
     return rv(lat,re,n)*np.array([cos(lat)*cos(lon),cos(lat)*sin(lon),sin(lat)*n**2])
@@ -124,6 +136,8 @@ def vertical_unit_vector(lat,lon):
         - lon : longitude (radians)
     Outputs:
         - Unit vector along the vertical at lat,lon
+
+    lat and lon may be arrays, in which case the x,y,z components are along the first axis of the output
     """
 
     return np.array([cos(lat)*cos(lon),cos(lat)*sin(lon),sin(lat)])
@@ -131,7 +145,7 @@ def vertical_unit_vector(lat,lon):
 def lat_lon_alt_at_position(position,re,rp,n):
     """
     Inputs:
-        - position : cartesian position vector
+        - position : cartesian position vector, or an array of them with the x,y,z components along the first axis
         - re : equatorial radius of Earth (meters)
         - rp : polar radius of Earth (meters)
         - n : oblateness of Earth (meters)
@@ -139,6 +153,8 @@ def lat_lon_alt_at_position(position,re,rp,n):
         - lat : geodetic latitude at position (degrees)
         - lon : longitude at position (degrees)
         - alt : vertical distance from geoid surface at position lat/lon (meters)
+
+    If an array of positions is given, lat, lon and alt are arrays with the shape of the remaining axes
     """
 
     x,y,z = position
@@ -153,16 +169,28 @@ def lat_lon_alt_at_position(position,re,rp,n):
 
     alt = distance_between(position,Pg) # vertical distance from geoid surface (meters)
 
-    if np.linalg.norm(position)<rg:
-        alt = -alt
+    # indexing with () turns the result back into a scalar for a single position
+    alt = np.where(np.linalg.norm(position,axis=0)<rg,-alt,alt)[()]
 
     return rad2deg(lat),rad2deg(lon),alt
 
+def positions_along_ray(origin,direction,distances):
+    """
+    Inputs:
+        - origin : cartesian position vector of the start of the ray
+        - direction : cartesian vector along the ray
+        - distances : array of distances along the ray, in units of direction
+    Outputs:
+        - positions : cartesian position vectors of the points along the ray, x,y,z components along the first axis
+    """
+
+    return np.asarray(origin)[:,np.newaxis] + np.outer(direction,distances)
+
 def distance_between(position1,position2):
     """
     Inputs:
-        - position1 : 3d position vector
-        - position2 : 3d position vector
+        - position1 : 3d position vector (or array of them with x,y,z along the first axis)
+        - position2 : 3d position vector (or array of them with x,y,z along the first axis)
     Outputs:
         - d : distance between the two positions
     """
@@ -273,24 +301,23 @@ def slantify(date,lat,lon,alt,vertical_distances,pres=0,temp=0,plots=False):
     tp_lat,tp_lon,tp_alt = lat_lon_alt_at_position(P_tp,re,rp,n) # degrees, degrees, meters
 
     fixed_slant_distances = np.arange(0,5000001,1000) # fixed 1 km slant spacing up to 5000 km
-    fixed_slant_positions = [Po+elem*vsp for elem in fixed_slant_distances]
-    fixed_slant_coords = [lat_lon_alt_at_position(position,re,rp,n) for position in fixed_slant_positions]
+    fixed_slant_positions = positions_along_ray(Po,vsp,fixed_slant_distances)
 
-    P_slant = np.array([elem[2] for elem in fixed_slant_coords]) # vertical distance from geoid surface for each fixed slant point
+    P_slant = lat_lon_alt_at_position(fixed_slant_positions,re,rp,n)[2] # vertical distance from geoid surface for each fixed slant point
     P_vertical = vertical_distances
 
     slant_distances = np.interp(P_vertical,P_slant,fixed_slant_distances) # slant distances along sun ray corresponding to the vertical distances
-    slant_positions = [Po+elem*vsp for elem in slant_distances] # position vectors corresponding to the slant distances along the sun ray
-    slant_coords = [lat_lon_alt_at_position(position,re,rp,n) for position in slant_positions]
+    slant_positions = positions_along_ray(Po,vsp,slant_distances) # position vectors corresponding to the slant distances along the sun ray
+    slant_lat,slant_lon,slant_alt = lat_lon_alt_at_position(slant_positions,re,rp,n)
 
     data = {}
     data['site_lat'] = rad2deg(lat)										# degrees
     data['site_lon'] = rad2deg(lon)										# degrees
     data['vertical'] = vertical_distances/1000.0 						# km
     data['slant'] = slant_distances/1000.0								# km
-    data['lat'] = np.array([elem[0] for elem in slant_coords])			# degrees
-    data['lon'] = np.array([elem[1] for elem in slant_coords])			# degrees
-    data['alt'] = np.array([elem[2]/1000.0 for elem in slant_coords])	# km
+    data['lat'] = slant_lat												# degrees
+    data['lon'] = slant_lon												# degrees
+    data['alt'] = slant_alt/1000.0										# km
     data['sza'] = rad2deg(corrected_sza)								# degrees
     data['azim'] = rad2deg(azim)										# degrees
 
@@ -379,10 +406,9 @@ def show_distances(re,rp,n,Pg,Po,P_tp,t_tp,tp_alt,v,vsp,h,title=''):
     t = t = np.arange(-10000000,10000001,1000) # slant distances
     h = h # vertical distance
 
-    fixed_slant_positions = [Po+elem*vsp for elem in t]
-    fixed_slant_coords = [lat_lon_alt_at_position(position,re,rp,n) for position in fixed_slant_positions]
+    fixed_slant_positions = positions_along_ray(Po,vsp,t)
 
-    Pt = np.array([elem[2] for elem in fixed_slant_coords]) # vertical distance from geoid surface for each slant point
+    Pt = lat_lon_alt_at_position(fixed_slant_positions,re,rp,n)[2] # vertical distance from geoid surface for each slant point
     Ph = h
 
     IDs = np.where(Pt<(np.max(Ph)+2000))
@@ -404,10 +430,9 @@ def show_distances(re,rp,n,Pg,Po,P_tp,t_tp,tp_alt,v,vsp,h,title=''):
     plot([(t,Pt,'Along sun ray','blue'),(h,Ph,'Along vertical','green'),([t_tp],[tp_alt],'Tangent point','red')],xlab='Distance (km)',ylab='Vertical distance from geoid surface (km)',title=title)
 
     t_interp = np.interp(Ph,Pt[t>=0],t[t>=0])
-    slant_positions = [Po+elem*vsp for elem in 1000.0*t_interp]
-    slant_coords = [lat_lon_alt_at_position(position,re,rp,n) for position in slant_positions]
+    slant_positions = positions_along_ray(Po,vsp,1000.0*t_interp)
 
-    Pt_interp = np.array([elem[2] for elem in slant_coords]) / 1000.0 # vertical distance from geoid surface for each slant point
+    Pt_interp = lat_lon_alt_at_position(slant_positions,re,rp,n)[2] / 1000.0 # vertical distance from geoid surface for each slant point
 
     plot([(t_interp,Pt_interp,'Along sun ray','blue'),(h,Ph,'Along vertical','green')],xlab='Distance (km)',ylab='Vertical distance from geoid surface (km)',title=title)
 
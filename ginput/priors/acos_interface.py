@@ -12,21 +12,21 @@ from __future__ import print_function, division
 
 import argparse
 from contextlib import contextmanager
+import copy
 import datetime as dt
 from dateutil.relativedelta import relativedelta
-from functools import lru_cache
 import h5py
-from itertools import repeat, product
+from itertools import repeat
 import logging
 from multiprocessing import Pool
 import numpy as np
-from pathlib import Path
-import pickle
 import os
-import sys
+import shutil
+import tempfile
 import traceback
+import xarray as xr
 
-from ..common_utils import mod_utils, mod_constants
+from ..common_utils import mod_utils, mod_constants, ioutils
 from ..common_utils.sat_utils import time_weight, datetime2datenum
 from ..common_utils.ggg_logging import logger, setup_logger
 from ..mod_maker import mod_maker
@@ -43,6 +43,9 @@ _fill_val = -999999
 # This will be used as a fill value for strings. It must be bytes b/c HDF5s do not accept fixed length unicode strings
 # so we use fixed length ASCII strings.
 _string_fill = b'N/A'
+# In parallel mode, the soundings are split into about this many contiguous chunks per process. More than one chunk
+# per process keeps the load balanced if some chunks are slower than others.
+_chunks_per_proc = 4
 
 
 class ErrorHandler(object):
@@ -131,7 +134,8 @@ _def_errh = ErrorHandler(suppress_error=False)
 
 def acos_interface_main(instrument, met_resampled_file, geos_files, output_file, mlo_co2_file=None, smo_co2_file=None,
                         use_trop_eqlat=False, cache_strat_lut=False, truncate_mlo_smo_by=0, nprocs=0, interp_pickle_dir='.',
-                        error_handler=_def_errh):
+                        eqlat_cache_dir=None, eqlat_cache_max_entries=None, eqlat_cache_max_age=None,
+                        chunk_size=None, strat_cache_dir=None, error_handler=_def_errh):
     """
     The primary interface to create CO2 priors for the ACOS algorithm
 
@@ -165,6 +169,40 @@ def acos_interface_main(instrument, met_resampled_file, geos_files, output_file,
      is in Aug 2021, the MLO/SMO data will only be used up to June 2021 - but they *must* include data up to that
      month, or an error is raised.
 
+    :param nprocs: optional, the number of processes to use to compute the equivalent latitudes and priors. 0 (default)
+     runs in serial mode.
+    :type nprocs: int
+
+    :param interp_pickle_dir: optional, the directory to write the temporary files holding the equivalent latitude
+     tables, met data, and stratospheric LUTs that the worker processes memory map when running in parallel. These
+     files are removed when done.
+    :type interp_pickle_dir: str
+
+    :param eqlat_cache_dir: optional, a directory to cache the equivalent latitude tables computed from the
+     ``geos_files`` in, so that other granules using the same GEOS files can load them rather than recomputing them.
+     If ``None`` (default), no cache is used.
+    :type eqlat_cache_dir: str or None
+
+    :param eqlat_cache_max_entries: optional, the maximum number of tables to keep in the equivalent latitude cache.
+     See :class:`~ginput.common_utils.ioutils.EqLatTableCache`.
+    :type eqlat_cache_max_entries: int or None
+
+    :param eqlat_cache_max_age: optional, remove tables not used in this many days from the equivalent latitude cache.
+     See :class:`~ginput.common_utils.ioutils.EqLatTableCache`.
+    :type eqlat_cache_max_age: float or None
+
+    :param chunk_size: optional, if given, process the granule this many frames (sounding groups, or exposures for
+     GOSAT) at a time. Each chunk is read, has its equivalent latitudes and priors computed, and is written to the
+     output file before the next is read, so memory use depends on the chunk size rather than the size of the granule.
+     Must be positive. If ``None`` (default), the whole granule is read and processed at once.
+    :type chunk_size: int or None
+
+    :param strat_cache_dir: optional, a directory in which to cache the stratospheric LUTs for each gas, keyed by the
+     MLO/SMO files, the truncation date, and the code version. Granules that share those can then load the LUTs rather
+     than recalculating them, even when ``truncate_mlo_smo_by`` is set. Safe to share between concurrent jobs. If
+     ``None`` (default), no cache is used.
+    :type strat_cache_dir: str or None
+
     :return: None, writes results to the HDF5 ``output_file``.
     """
 
@@ -185,19 +223,24 @@ def acos_interface_main(instrument, met_resampled_file, geos_files, output_file,
         raise IOError('Given path for mlo_co2_file ({}) does not exist'.format(mlo_co2_file))
     if smo_co2_file is not None and not os.path.exists(smo_co2_file):
         raise IOError('Given path for smo_co2_file ({}) does not exist'.format(smo_co2_file))
+    if chunk_size is not None and chunk_size <= 0:
+        raise ValueError('chunk_size must be a positive integer or None, got {}'.format(chunk_size))
 
     if instrument == 'oco':
-        met_data, prior_flags = read_oco_resampled_met(met_resampled_file, error_handler=error_handler)
+        read_met = read_oco_resampled_met
+        met_vars = _oco_met_vars
         gases = ('co2',)
         prior_group = 'priors'
         record_group = 'mlo_smo_record'
     elif instrument == 'gosat':
-        met_data, prior_flags = read_gosat_resampled_met(met_resampled_file, error_handler=error_handler)
+        read_met = read_gosat_resampled_met
+        met_vars = _gosat_met_vars
         gases = ('co2',)
         prior_group = 'priors'
         record_group = 'mlo_smo_record'
     elif instrument == 'geocarb':
-        met_data, prior_flags = read_geocarb_resampled_met(met_resampled_file, error_handler=error_handler)
+        read_met = read_geocarb_resampled_met
+        met_vars = _geocarb_met_vars
         gases = ('co', 'ch4', 'co2')
         prior_group = '{}_priors'
         record_group = 'mlo_smo_{}_record'
@@ -206,22 +249,13 @@ def acos_interface_main(instrument, met_resampled_file, geos_files, output_file,
     else:
         raise ValueError('instrument must be "oco", "gosat", or "geocarb"')
 
-    # Reshape the met data from (soundings, footprints, levels) to (profiles, level)
-    orig_shape = met_data['pv'].shape
-    flags_orig_shape = prior_flags.shape
-
-    nlevels = orig_shape[-1]
-    pv_array = met_data['pv'].reshape(-1, nlevels)
-    theta_array = met_data['theta'].reshape(-1, nlevels)
-
-    datenum_array = met_data['datenums'].reshape(-1)
-    qflag_array = met_data['quality_flags'].reshape(-1)
-
-    prior_flags = prior_flags.reshape(-1)
-
     # Before we spent a lot of time calculating the equivalent latitude, let's determine
     # the truncation date
-    max_date = np.max(met_data['dates'])
+    if chunk_size is None:
+        met_data, prior_flags = read_met(met_resampled_file, error_handler=error_handler)
+        max_date = np.max(met_data['dates'])
+    else:
+        max_date = _read_max_met_date(met_resampled_file, met_vars, chunk_size, error_handler=error_handler)
     # Also fix the end date of the MLO/SMO record relative to the data date, rather than
     # the execution date. Requested by SDOS on 14 Oct 2021.
     record_end_date = mod_utils.start_of_month(max_date) + relativedelta(years=2, months=1)
@@ -240,103 +274,209 @@ def acos_interface_main(instrument, met_resampled_file, geos_files, output_file,
         truncate_mlo_smo_date = None
         
 
+    if eqlat_cache_dir is None:
+        eqlat_cache = None
+    else:
+        eqlat_cache = ioutils.EqLatTableCache(eqlat_cache_dir, max_entries=eqlat_cache_max_entries,
+                                              max_age_days=eqlat_cache_max_age)
+
+    # Start the worker processes and create the directory for the arrays they share only once, so that they are reused
+    # for the equivalent latitudes, every gas, and every chunk
+    with _worker_pool(nprocs, interp_pickle_dir) as workers:
+        eqlat_kws = dict(geos_files=geos_files, nprocs=nprocs, eqlat_pickle_dir=interp_pickle_dir,
+                         eqlat_cache=eqlat_cache, workers=workers, error_handler=error_handler)
+        if chunk_size is None:
+            _add_sounding_eqlats(met_data, prior_flags, **eqlat_kws)
+
+        # Create the priors
+        if cache_strat_lut:
+            # If we're not truncating the MLO/SMO data, we can rely on the internal code
+            # to determine if we need to regenerate the LUT. If we are truncating the
+            # data, then we should force it to regenerate (even though the internal logic
+            # should handle that).
+            regen_lut = None if truncate_mlo_smo_by is None else True
+            save_lut = True
+        else:
+            regen_lut = True
+            save_lut = False
+
+        init_prior_h5(output_file, geos_files, met_resampled_file)
+
+        gas_records = dict()
+        for gas in gases:
+            gas_mlo_file = fmt_gas_file(mlo_co2_file, gas)
+            gas_smo_file = fmt_gas_file(smo_co2_file, gas)
+
+            record_kws = dict(mlo_file=gas_mlo_file, 
+                              smo_file=gas_smo_file, 
+                              recalculate_strat_lut=regen_lut, 
+                              save_strat=save_lut, 
+                              truncate_date=truncate_mlo_smo_date,
+                              last_date=record_end_date,
+                              strat_cache_dir=strat_cache_dir)
+            if gas == 'co':
+                record_kws = dict()
+            record_class = tccon_priors.gas_records[gas]
+            gas_records[gas] = record_class(**record_kws)
+
+        prior_kws = dict(instrument=instrument, nprocs=nprocs, use_trop_eqlat=use_trop_eqlat,
+                         interp_pickle_dir=interp_pickle_dir, workers=workers, error_handler=error_handler)
+        if chunk_size is None:
+            for gas in gases:
+                profiles, units = _make_gas_priors(gas, gas_records[gas], met_data, prior_flags, **prior_kws)
+                # Write the priors to the file requested.
+                write_prior_h5(output_file, profiles, units, prior_group=prior_group.format(gas))
+        else:
+            # Compute the equivalent latitude interpolators once, rather than for every chunk
+            eqlat_kws['eqlat_fxns'] = _geos_eqlat_functions(geos_files, eqlat_cache=eqlat_cache)
+            n_frames = _count_met_frames(met_resampled_file, met_vars)
+            for start in range(0, n_frames, chunk_size):
+                frames = slice(start, min(start + chunk_size, n_frames))
+                logger.info('Processing frames {} to {} of {}'.format(frames.start + 1, frames.stop, n_frames))
+                met_data, prior_flags = read_met(met_resampled_file, error_handler=error_handler, frames=frames)
+                _add_sounding_eqlats(met_data, prior_flags, **eqlat_kws)
+                for gas in gases:
+                    profiles, units = _make_gas_priors(gas, gas_records[gas], met_data, prior_flags, squeeze_axis=1,
+                                                       **prior_kws)
+                    write_prior_h5(output_file, profiles, units, prior_group=prior_group.format(gas), frames=frames,
+                                   n_frames=n_frames)
+                # The workers and the shared eq. lat. tables and strat LUTs carry over to the next chunk, but its met
+                # arrays do not, so remove this chunk's now
+                if workers is not None:
+                    workers.release_met()
+
+    for gas in gases:
+        if gas != 'co':
+            insitu_record_to_h5_group(output_file, gas_records[gas].conc_seasonal, gas, record_group=record_group.format(gas))
+
+
+def _add_sounding_eqlats(met_data, prior_flags, **eqlat_kws):
+    """
+    Compute the equivalent latitude profiles for the soundings in ``met_data`` and add them as its "el" variable.
+
+    :param met_data: the dictionary of met data read from the resampler .h5 file. Modified in place.
+    :type met_data: dict
+
+    :param prior_flags: the array of prior flags for the soundings in ``met_data``. Modified in place.
+    :type prior_flags: :class:`numpy.ndarray`
+
+    :param eqlat_kws: additional keywords for :func:`compute_sounding_equivalent_latitudes`.
+
+    :return: none
+    """
+    # Reshape the met data from (soundings, footprints, levels) to (profiles, level)
+    orig_shape = met_data['pv'].shape
+    nlevels = orig_shape[-1]
+    pv_array = met_data['pv'].reshape(-1, nlevels)
+    theta_array = met_data['theta'].reshape(-1, nlevels)
+
+    datenum_array = met_data['datenums'].reshape(-1)
+    qflag_array = met_data['quality_flags'].reshape(-1)
+
+    flat_prior_flags = prior_flags.reshape(-1)
+
     eqlat_array = compute_sounding_equivalent_latitudes(sounding_pv=pv_array, sounding_theta=theta_array,
                                                         sounding_datenums=datenum_array, sounding_qflags=qflag_array,
-                                                        geos_files=geos_files, nprocs=nprocs, prior_flags=prior_flags,
-                                                        eqlat_pickle_dir=interp_pickle_dir,
-                                                        error_handler=error_handler)
+                                                        prior_flags=flat_prior_flags, **eqlat_kws)
 
     met_data['el'] = eqlat_array.reshape(orig_shape)
-    prior_flags = prior_flags.reshape(flags_orig_shape)
-
-    # Create the priors
-    if cache_strat_lut:
-        # If we're not truncating the MLO/SMO data, we can rely on the internal code
-        # to determine if we need to regenerate the LUT. If we are truncating the
-        # data, then we should force it to regenerate (even though the internal logic
-        # should handle that).
-        regen_lut = None if truncate_mlo_smo_by is None else True
-        save_lut = True
-    else:
-        regen_lut = True
-        save_lut = False
+    # The reshape may have made a copy (e.g. for GOSAT), so copy the flags set during the calculation back
+    prior_flags[...] = flat_prior_flags.reshape(prior_flags.shape)
 
-    unit_scales = {'ppm': 1e-6, 'ppb': 1e-9}
 
-    init_prior_h5(output_file, geos_files, met_resampled_file)
+def _make_gas_priors(gas, gas_record, met_data, prior_flags, instrument, nprocs=0, use_trop_eqlat=False,
+                     interp_pickle_dir='.', squeeze_axis=None, workers=None, error_handler=_def_errh):
+    """
+    Compute the priors for one gas and prepare them to write to the output file.
 
-    for gas in gases:
-        gas_field = '{}_prior'.format(gas)
-        gas_mlo_file = fmt_gas_file(mlo_co2_file, gas)
-        gas_smo_file = fmt_gas_file(smo_co2_file, gas)
-
-        record_kws = dict(mlo_file=gas_mlo_file, 
-                          smo_file=gas_smo_file, 
-                          recalculate_strat_lut=regen_lut, 
-                          save_strat=save_lut, 
-                          truncate_date=truncate_mlo_smo_date,
-                          last_date=record_end_date)
-        if gas == 'co':
-            record_kws = dict()
-        record_class = tccon_priors.gas_records[gas]
-        gas_record = record_class(**record_kws)
-        gas_prior_flags = prior_flags.copy()
-
-        # The keys here define the variable names that will be used in the HDF file. The values define the corresponding
-        # keys in the output dictionaries from tccon_priors.generate_single_tccon_prior.
-        var_mapping = {gas_field: gas_record.gas_name, 'gas_record_latency': 'mean_latency', 'equivalent_latitude': 'EqL',
-                       'gas_record_date': 'gas_date', 'atmospheric_stratum': 'atm_stratum', 'age_of_air': 'strat_age_of_air',
-                       'altitude': 'Height', 'pressure': 'Pressure'}
-        # This dictionary defines extra type information to create the output arrays. _make_output_profiles_dict uses it.
-        # The keys should match those in var_mapping; any key from var_mapping that isn't in this one gets the default
-        # output array (with shape orig_shape and fill value np.nan). Each value in this dict must be a two-element tuple;
-        # the first is the desired shape, the second the fill value (which also sets the type). Any values of -1 in the
-        # shape get replaced with the corresponding value from orig_shape.
-        var_type_info = {'gas_record_date': (orig_shape, None)}
-
-        if nprocs == 0:
-            profiles, units = _prior_serial(orig_shape=orig_shape, var_mapping=var_mapping, var_type_info=var_type_info,
-                                            met_data=met_data, gas_record=gas_record, prior_flags=gas_prior_flags,
-                                            use_trop_eqlat=use_trop_eqlat, error_handler=error_handler)
-        else:
-            profiles, units = _prior_parallel(orig_shape=orig_shape, var_mapping=var_mapping, var_type_info=var_type_info,
-                                              met_data=met_data, gas_record=gas_record, prior_flags=gas_prior_flags, nprocs=nprocs,
-                                              use_trop_eqlat=use_trop_eqlat, error_handler=error_handler)
-
-        # Add latitude, longitude, and flags to the priors file
-        profiles['sounding_longitude'] = met_data['longitude']
-        units['sounding_longitude'] = 'degrees_east'
-        profiles['sounding_latitude'] = met_data['latitude']
-        units['sounding_latitude'] = 'degrees_north'
-        profiles['prior_failure_flags'] = gas_prior_flags
-        units['prior_failure_flags'] = error_handler.get_error_descriptions()
-
-        # Convert the from ppm/ppb to dry mole fraction
+    :param gas: the gas name, e.g. "co2".
+    :type gas: str
+
+    :param gas_record: the MLO/SMO record class instance for this gas.
+    :type gas_record: :class:`~ginput.priors.tccon_priors.MloSmoTraceGasRecord`
+
+    :param met_data: the dictionary of met data read from the resampler .h5 file with equivalent latitude added as the
+     "el" variable.
+    :type met_data: dict
+
+    :param prior_flags: the array of prior flags for the soundings in ``met_data``. Not modified; the flags for this
+     gas are returned as the "prior_failure_flags" variable.
+    :type prior_flags: :class:`numpy.ndarray`
+
+    :param instrument: which instrument the priors are for ("oco", "gosat", or "geocarb").
+    :type instrument: str
+
+    :param squeeze_axis: for GOSAT, which axis of the output arrays to squeeze. ``None`` squeezes all singleton axes.
+    :type squeeze_axis: int or None
+
+    :param workers: the worker processes to use when ``nprocs`` > 0, see :func:`_worker_pool`. If ``None``, they are
+     started just for this gas.
+    :type workers: :class:`_SharedWorkers` or None
+
+    See :func:`acos_interface_main` for the other inputs.
+
+    :return: profiles and units dictionaries, ready to pass to :func:`write_prior_h5`.
+    :rtype: dict, dict
+    """
+    orig_shape = met_data['pv'].shape
+    gas_field = '{}_prior'.format(gas)
+    unit_scales = {'ppm': 1e-6, 'ppb': 1e-9}
+    gas_prior_flags = prior_flags.copy()
+
+    # The keys here define the variable names that will be used in the HDF file. The values define the corresponding
+    # keys in the output dictionaries from tccon_priors.generate_single_tccon_prior.
+    var_mapping = {gas_field: gas_record.gas_name, 'gas_record_latency': 'mean_latency', 'equivalent_latitude': 'EqL',
+                   'gas_record_date': 'gas_date', 'atmospheric_stratum': 'atm_stratum', 'age_of_air': 'strat_age_of_air',
+                   'altitude': 'Height', 'pressure': 'Pressure'}
+    # This dictionary defines extra type information to create the output arrays. _make_output_profiles_dict uses it.
+    # The keys should match those in var_mapping; any key from var_mapping that isn't in this one gets the default
+    # output array (with shape orig_shape and fill value np.nan). Each value in this dict must be a two-element tuple;
+    # the first is the desired shape, the second the fill value (which also sets the type). Any values of -1 in the
+    # shape get replaced with the corresponding value from orig_shape.
+    var_type_info = {'gas_record_date': (orig_shape, None)}
+
+    if nprocs == 0:
+        profiles, units = _prior_serial(orig_shape=orig_shape, var_mapping=var_mapping, var_type_info=var_type_info,
+                                        met_data=met_data, gas_record=gas_record, prior_flags=gas_prior_flags,
+                                        use_trop_eqlat=use_trop_eqlat, error_handler=error_handler)
+    else:
+        profiles, units = _prior_parallel(orig_shape=orig_shape, var_mapping=var_mapping, var_type_info=var_type_info,
+                                          met_data=met_data, gas_record=gas_record, prior_flags=gas_prior_flags, nprocs=nprocs,
+                                          use_trop_eqlat=use_trop_eqlat, error_handler=error_handler,
+                                          share_dir=interp_pickle_dir, workers=workers)
+
+    # Add latitude, longitude, and flags to the priors file
+    profiles['sounding_longitude'] = met_data['longitude']
+    units['sounding_longitude'] = 'degrees_east'
+    profiles['sounding_latitude'] = met_data['latitude']
+    units['sounding_latitude'] = 'degrees_north'
+    profiles['prior_failure_flags'] = gas_prior_flags
+    units['prior_failure_flags'] = error_handler.get_error_descriptions()
+
+    # Convert the from ppm/ppb to dry mole fraction. If no prior in this set of soundings succeeded, then the units
+    # were never set, but all the values are fills anyway.
+    if units[gas_field] in unit_scales:
         profiles[gas_field] *= unit_scales[units[gas_field]]
-        units[gas_field] = 'dmf'
-
-        # Also need to convert the entry dates into decimal years to write to HDF
-        gas_date_dec_years = [mod_utils.date_to_decimal_year(d) for d in profiles['gas_record_date'].flat]
-        profiles['gas_record_date'] = np.array(gas_date_dec_years).reshape(profiles['gas_record_date'].shape)
-        units['gas_record_date'] = 'Date as decimal year (decimal part = 0-based day-of-year / {})'.format(mod_constants.days_per_year)
-
-        # And convert the stratum to a short integer and update the unit to be more descriptive
-        profiles['atmospheric_stratum'] = profiles['atmospheric_stratum'].astype(np.uint8)
-        units['atmospheric_stratum'] = 'flag (1 = troposphere, 2 = middleworld, 3 = overworld)'
-
-        # If running for GOSAT, we have an extra dimension between the exposure and level which is just 1 long and was only
-        # a placeholder to provide compatibility with the loops over sounding group/sounding for OCO. Remove those singleton
-        # dimensions to keep the GOSAT files clean
-        if instrument == 'gosat':
-            for key, value in profiles.items():
-                profiles[key] = value.squeeze()
-                logger.debug('GOSAT array "{}" squeezed from {} to {}'.format(key, value.shape, profiles[key].shape))
-
-        # Write the priors to the file requested.
-        write_prior_h5(output_file, profiles, units, prior_group=prior_group.format(gas))
-        if gas != 'co':
-            insitu_record_to_h5_group(output_file, gas_record.conc_seasonal, gas, record_group=record_group.format(gas))
-        
+    units[gas_field] = 'dmf'
+
+    # Also need to convert the entry dates into decimal years to write to HDF
+    gas_date_dec_years = [mod_utils.date_to_decimal_year(d) for d in profiles['gas_record_date'].flat]
+    profiles['gas_record_date'] = np.array(gas_date_dec_years).reshape(profiles['gas_record_date'].shape)
+    units['gas_record_date'] = 'Date as decimal year (decimal part = 0-based day-of-year / {})'.format(mod_constants.days_per_year)
+
+    # And convert the stratum to a short integer and update the unit to be more descriptive
+    profiles['atmospheric_stratum'] = profiles['atmospheric_stratum'].astype(np.uint8)
+    units['atmospheric_stratum'] = 'flag (1 = troposphere, 2 = middleworld, 3 = overworld)'
+
+    # If running for GOSAT, we have an extra dimension between the exposure and level which is just 1 long and was only
+    # a placeholder to provide compatibility with the loops over sounding group/sounding for OCO. Remove those singleton
+    # dimensions to keep the GOSAT files clean
+    if instrument == 'gosat':
+        for key, value in profiles.items():
+            profiles[key] = value.squeeze(axis=squeeze_axis)
+            logger.debug('GOSAT array "{}" squeezed from {} to {}'.format(key, value.shape, profiles[key].shape))
+
+    return profiles, units
 
 
 def _prior_helper(i_sounding, i_foot, qflag, mod_data, gas_record, var_mapping, var_type_info, use_trop_eqlat=False,
@@ -513,7 +653,7 @@ def _prior_serial(orig_shape, var_mapping, var_type_info, met_data, gas_record,
 
 
 def _prior_parallel(orig_shape, var_mapping, var_type_info, met_data, gas_record, nprocs, prior_flags=None,
-                    use_trop_eqlat=False, error_handler=_def_errh):
+                    use_trop_eqlat=False, error_handler=_def_errh, share_dir='.', workers=None):
     """
     Generate the priors, running in parallel mode.
 
@@ -526,42 +666,103 @@ def _prior_parallel(orig_shape, var_mapping, var_type_info, met_data, gas_record
     :param nprocs: the number of processors to use to run the code.
     :type nprocs: int
 
+    :param share_dir: the directory to write the temporary files that the worker processes memory map.
+    :type share_dir: str
+
+    :param workers: the worker processes to use, see :func:`_worker_pool`. If ``None``, ``nprocs`` processes and a
+     temporary directory in ``share_dir`` are created just for this call.
+    :type workers: :class:`_SharedWorkers` or None
+
     :return: profiles and units dictionaries; profiles contains the actual data, units strings describing the units of
      each array.
     :rtype: dict, dict
     """
+    if workers is None:
+        with _worker_pool(nprocs, share_dir) as workers:
+            return _prior_parallel(orig_shape, var_mapping, var_type_info, met_data, gas_record, nprocs,
+                                   prior_flags=prior_flags, use_trop_eqlat=use_trop_eqlat, error_handler=error_handler,
+                                   workers=workers)
+
     logger.info('Running {} prior calculation in parallel with {} processes'.format(gas_record.gas_name.upper(), nprocs))
 
-    # Need to prepare iterators of the sounding and footprint indices, as well as the individual met dictionaries
-    # and observation dates. We only want to pass the individual dictionary and date to each worker, not the whole
-    # met data, because that would probably be slow due to overhead. (Not tested however.)
-    sounding_inds, footprint_inds = [x for x in zip(*product(range(orig_shape[0]), range(orig_shape[1])))]
-    mod_dicts = map(_construct_mod_dict, repeat(met_data), sounding_inds, footprint_inds)
-    qflags = [met_data['quality_flags'][isound, ifoot] for isound, ifoot in zip(sounding_inds, footprint_inds)]
-
-    with Pool(processes=nprocs) as pool:
-        result = pool.starmap(_prior_helper, zip(sounding_inds, footprint_inds, qflags, mod_dicts,
-                                                 repeat(gas_record), repeat(var_mapping), repeat(var_type_info),
-                                                 repeat(use_trop_eqlat), repeat(prior_flags), repeat(error_handler)))
-
-    # At this point, result will be a list of tuples of pairs of dicts, the first dict the profiles dict, the second
-    # the units dict or None if the prior calculation did not run. We need to combine the profiles into one array per
-    # variable and get one valid units dict
+    # Rather than building a .mod dictionary for each sounding and sending it to the workers, the numeric met arrays,
+    # flags, and strat LUT are written to .npy files that each worker memory maps. The met arrays are only written once
+    # for all the gases and the LUT once per run. Each task is then a contiguous chunk of sounding groups, and only the
+    # chunk bounds (plus the non-numeric arrays for that chunk) are sent.
+    sounding_ranges = _chunk_bounds(orig_shape[0], workers.nprocs)
+    met_files = workers.share_met(met_data)
+    met_objects = [{k: v[s0:s1] for k, v in met_data.items() if k not in met_files} for s0, s1 in sounding_ranges]
+    shared_record = workers.share_gas_record(gas_record)
+    flags_file = workers.share_array(prior_flags, 'prior_flags')
+    try:
+        result = workers.pool.starmap(_prior_chunk_helper, zip(sounding_ranges, repeat(met_files), met_objects,
+                                                               repeat(flags_file), repeat(shared_record),
+                                                               repeat(var_mapping), repeat(var_type_info),
+                                                               repeat(use_trop_eqlat), repeat(error_handler)))
+    finally:
+        os.remove(flags_file)
+
+    # At this point, result will be a list (one per chunk) of lists of tuples of pairs of dicts, the first dict the
+    # profiles dict, the second the units dict or None if the prior calculation did not run. We need to combine the
+    # profiles into one array per variable and get one valid units dict
     profiles, units = _make_output_profiles_dict(orig_shape, var_mapping, var_type_info)
     units_set = False
-    for (these_profs, these_units, retflag), i_sounding, i_foot in zip(result, sounding_inds, footprint_inds):
-        prior_flags[i_sounding, i_foot] = retflag
-        if not units_set and these_units is not None:
-            units = these_units
-            units_set = True
-        for h5var, h5array in profiles.items():
-            h5array[i_sounding, i_foot, :] = these_profs[h5var]
+    for (s0, s1), chunk_result in zip(sounding_ranges, result):
+        for (these_profs, these_units, retflag), (i_sounding, i_foot) in zip(chunk_result, np.ndindex(s1 - s0, orig_shape[1])):
+            i_sounding += s0
+            prior_flags[i_sounding, i_foot] = retflag
+            if not units_set and these_units is not None:
+                units = these_units
+                units_set = True
+            for h5var, h5array in profiles.items():
+                h5array[i_sounding, i_foot, :] = these_profs[h5var]
 
     return profiles, units
 
 
+def _prior_chunk_helper(sounding_range, met_files, met_objects, flags_file, gas_record, var_mapping, var_type_info,
+                        use_trop_eqlat=False, error_handler=_def_errh):
+    """
+    Generate the priors for a contiguous chunk of sounding groups in a worker process
+
+    :param sounding_range: the first and one past the last sounding group index in this chunk.
+    :type sounding_range: tuple(int, int)
+
+    :param met_files: a dictionary mapping met variable names to the .npy files holding the full arrays.
+    :type met_files: dict
+
+    :param met_objects: the met variables that could not be memory mapped, already subset to this chunk.
+    :type met_objects: dict
+
+    :param flags_file: the .npy file holding the prior flags for all soundings.
+    :type flags_file: str
+
+    :param gas_record: the MLO/SMO record, as returned by :func:`_share_gas_record`.
+
+    See :func:`_prior_helper` for the other inputs.
+
+    :return: the results from :func:`_prior_helper` for each sounding in the chunk, in (sounding, footprint) order.
+    :rtype: list
+    """
+    s0, s1 = sounding_range
+    chunk_met = {k: _attach_shared_array(f)[s0:s1] for k, f in met_files.items()}
+    chunk_met.update(met_objects)
+    prior_flags = _attach_shared_array(flags_file)
+    gas_record = _attach_gas_record(gas_record)
+
+    result = []
+    for i_sounding, i_foot in np.ndindex(s1 - s0, prior_flags.shape[1]):
+        mod_data = _construct_mod_dict(chunk_met, i_sounding, i_foot)
+        qflag = chunk_met['quality_flags'][i_sounding, i_foot]
+        result.append(_prior_helper(i_sounding + s0, i_foot, qflag, mod_data, gas_record, var_mapping, var_type_info,
+                                    use_trop_eqlat=use_trop_eqlat, prior_flags=prior_flags,
+                                    error_handler=error_handler))
+    return result
+
+
 def compute_sounding_equivalent_latitudes(sounding_pv, sounding_theta, sounding_datenums, sounding_qflags, geos_files,
-                                          nprocs=0, prior_flags=None, eqlat_pickle_dir='.', error_handler=_def_errh):
+                                          nprocs=0, prior_flags=None, eqlat_pickle_dir='.', eqlat_cache=None,
+                                          eqlat_fxns=None, workers=None, error_handler=_def_errh):
     """
     Compute equivalent latitudes for a collection of OCO soundings
 
@@ -590,6 +791,19 @@ def compute_sounding_equivalent_latitudes(sounding_pv, sounding_theta, sounding_
      generate.
     :type prior_flags: :class:`numpy.ndarray`
 
+    :param eqlat_cache: optional cache to load the equivalent latitude interpolators for ``geos_files`` from, if they
+     were computed previously, and to save newly computed ones to.
+    :type eqlat_cache: :class:`~ginput.common_utils.ioutils.EqLatTableCache` or None
+
+    :param eqlat_fxns: optional, the GEOS date numbers and equivalent latitude interpolators for ``geos_files``, as
+     returned by :func:`_geos_eqlat_functions`. Pass these to avoid recomputing the interpolators when calling this
+     repeatedly for the same GEOS files. If ``None``, they are computed from ``geos_files``.
+    :type eqlat_fxns: tuple or None
+
+    :param workers: the worker processes to use when ``nprocs`` > 0, see :func:`_worker_pool`. If ``None``, they are
+     started just for this call.
+    :type workers: :class:`_SharedWorkers` or None
+
     :param error_handler: an ErrorHandler instance that determines how errors during the eq. lat. computation are caught
      and handled.
     :type error_handler: :class:`ErrorHandler`
@@ -597,6 +811,37 @@ def compute_sounding_equivalent_latitudes(sounding_pv, sounding_theta, sounding_
     :return: an array of equivalent latitudes with dimensions (profiles, levels)
     :rtype: :class:`numpy.ndarray`
     """
+    if eqlat_fxns is None:
+        eqlat_fxns = _geos_eqlat_functions(geos_files, eqlat_cache=eqlat_cache)
+    geos_datenums, eqlat_fxns = eqlat_fxns
+
+    # This part is going to be slow. We need to use the interpolators to get equivalent latitude profiles for each
+    # sounding for the two times on either side of the sounding time, then do a further linear interpolation to
+    # the actual sounding time.
+
+    if nprocs == 0:
+        return _eqlat_serial(sounding_pv, sounding_theta, sounding_datenums, sounding_qflags, geos_datenums, eqlat_fxns,
+                             prior_flags=prior_flags, error_handler=error_handler)
+    else:
+        return _eqlat_parallel(sounding_pv, sounding_theta, sounding_datenums, sounding_qflags, geos_datenums, eqlat_fxns, 
+                               prior_flags=prior_flags, error_handler=error_handler, nprocs=nprocs, eqlat_pickle_dir=eqlat_pickle_dir,
+                               workers=workers)
+
+
+def _geos_eqlat_functions(geos_files, eqlat_cache=None):
+    """
+    Create the equivalent latitude interpolators for a set of GEOS files
+
+    :param geos_files: a list of the GEOS 3D met files that bracket the times of all the soundings.
+    :type geos_files: list(str)
+
+    :param eqlat_cache: optional cache to load the interpolators from or save them to.
+    :type eqlat_cache: :class:`~ginput.common_utils.ioutils.EqLatTableCache` or None
+
+    :return: the date numbers of the GEOS files (see :func:`datetime2datenum`) and the list of interpolators, in the
+     same order as ``geos_files``.
+    :rtype: :class:`numpy.ndarray`, list(:class:`~ginput.common_utils.mod_utils.EqLatInterpolator`)
+    """
     # Create interpolators for each of the GEOS FP files provided. The resulting dictionary will have the files'
     # datetimes as keys
     geos_utc_times = [mod_utils.datetime_from_geos_filename(f) for f in geos_files]
@@ -604,25 +849,17 @@ def compute_sounding_equivalent_latitudes(sounding_pv, sounding_theta, sounding_
 
     on_native_grid = [mod_utils.is_geos_on_native_grid(f) for f in geos_files]
     if all(on_native_grid):
-        eqlat_fxns = mod_maker.equivalent_latitude_functions_from_native_geos_files(geos_files, geos_utc_times)
+        eqlat_fxns = mod_maker.equivalent_latitude_functions_from_native_geos_files(geos_files, geos_utc_times,
+                                                                                    eqlat_cache=eqlat_cache)
     elif not any(on_native_grid):
-        eqlat_fxns = mod_maker.equivalent_latitude_functions_from_geos_files(geos_files, geos_utc_times)
+        eqlat_fxns = mod_maker.equivalent_latitude_functions_from_geos_files(geos_files, geos_utc_times,
+                                                                             eqlat_cache=eqlat_cache)
     else:
         raise RuntimeError('Received a mixture of GEOS files on native 72 level grid and non-native grid. This '
                            'is not supported.')
     # it will be easier to work with this as a list of the interpolators in the right order.
     eqlat_fxns = [eqlat_fxns[k] for k in geos_utc_times]
-
-    # This part is going to be slow. We need to use the interpolators to get equivalent latitude profiles for each
-    # sounding for the two times on either side of the sounding time, then do a further linear interpolation to
-    # the actual sounding time.
-
-    if nprocs == 0:
-        return _eqlat_serial(sounding_pv, sounding_theta, sounding_datenums, sounding_qflags, geos_datenums, eqlat_fxns,
-                             prior_flags=prior_flags, error_handler=error_handler)
-    else:
-        return _eqlat_parallel(sounding_pv, sounding_theta, sounding_datenums, sounding_qflags, geos_datenums, eqlat_fxns, 
-                               prior_flags=prior_flags, error_handler=error_handler, nprocs=nprocs, eqlat_pickle_dir=eqlat_pickle_dir)
+    return geos_datenums, eqlat_fxns
 
 
 def _eqlat_helper(idx, pv_vec, theta_vec, datenum, quality_flag, eqlat_fxns, geos_datenums, prior_flags=None,
@@ -648,7 +885,7 @@ def _eqlat_helper(idx, pv_vec, theta_vec, datenum, quality_flag, eqlat_fxns, geo
 
     :param eqlat_fxns: the collection of equivalent latitude interpolators, must be in the same order as
      ``geos_datenums``.
-    :type eqlat_fxns: list(:class:`scipy.interpolate.interpolate.interp2d`)
+    :type eqlat_fxns: list(:class:`~ginput.common_utils.mod_utils.EqLatInterpolator`)
 
     :param geos_datenums: the date numbers (see ``datenum``) for the GEOS FP files that bracket this sounding. Should
      be >= 2 and must be ordered the same as ``eqlat_fxns``, so that ``eqlat_fxns[0]`` the the equivalent latitude
@@ -667,18 +904,6 @@ def _eqlat_helper(idx, pv_vec, theta_vec, datenum, quality_flag, eqlat_fxns, geo
     elif prior_flags is not None and prior_flags[idx] != 0:
         logger.info('Sounding {}: prior flag != 0. Skipping eq. lat. calculation.'.format(idx))
         return default_return, prior_flags[idx]
-    
-    # Because of a limit on the size of objects that can be sent between threads in Python 3.6,
-    # we need a workaround for big interpolators. If we got strings/paths, then we had to write
-    # those interpolators to files and pass the paths to those files instead. This block can
-    # be removed when we no longer need to support Python 3.6.
-    eqlat_fxns_in = eqlat_fxns
-    eqlat_fxns = []
-    for fxn in eqlat_fxns_in:
-        if isinstance(fxn, (str, Path)):
-            eqlat_fxns.append(_eqlat_pickle_load_cached(fxn))
-        else:
-            eqlat_fxns.append(fxn)
 
     logger.debug('Calculating eq. lat. {}'.format(idx))
     try:
@@ -756,7 +981,7 @@ def _eqlat_serial(sounding_pv, sounding_theta, sounding_datenums, sounding_qflag
     :type geos_datenums: 1D :class:`numpy.ndarray` or equivalent.
 
     :param eqlat_fxns: a list of equivalent latitude interpolators for the date/times specified by ``geos_datenums``.
-    :type eqlat_fxns: list(:class:`scipy.interpolate.interpolate.interp2d`)
+    :type eqlat_fxns: list(:class:`~ginput.common_utils.mod_utils.EqLatInterpolator`)
 
     :return: an array of equivalent latitudes for the soundings (dimensions soundings-by-levels).
     :rtype: :class:`numpy.ndarray`
@@ -776,137 +1001,417 @@ def _eqlat_serial(sounding_pv, sounding_theta, sounding_datenums, sounding_qflag
 
 
 def _eqlat_parallel(sounding_pv, sounding_theta, sounding_datenums, sounding_qflags, geos_datenums, eqlat_fxns, nprocs,
-                    prior_flags=None, error_handler=_def_errh, eqlat_pickle_dir='.'):
+                    prior_flags=None, error_handler=_def_errh, eqlat_pickle_dir='.', workers=None):
     """
     Calculate equivalent latitude running in parallel mode.
 
     :param nprocs: the number of processors to use.
     :type nprocs: int
 
+    :param eqlat_pickle_dir: the directory to write the temporary files that the worker processes memory map.
+    :type eqlat_pickle_dir: str
+
+    :param workers: the worker processes to use, see :func:`_worker_pool`. If ``None``, ``nprocs`` processes and a
+     temporary directory in ``eqlat_pickle_dir`` are created just for this call.
+    :type workers: :class:`_SharedWorkers` or None
+
     See :func:`_eqlat_serial` for the other parameters and return type.
     """
-    logger.info('Running eq. lat. calculation in parallel with {} processes'.format(nprocs))
-    with Pool(processes=nprocs) as pool, _eqlat_pickle_manager(eqlat_fxns, eqlat_pickle_dir) as eqlat_pickles:
-        result = pool.starmap(_eqlat_helper, zip(range(sounding_pv.shape[0]), sounding_pv, sounding_theta,
-                                                 sounding_datenums, sounding_qflags,
-                                                 repeat(eqlat_pickles), repeat(geos_datenums), repeat(prior_flags),
-                                                 repeat(error_handler)))
+    if workers is None:
+        with _worker_pool(nprocs, eqlat_pickle_dir) as workers:
+            return _eqlat_parallel(sounding_pv, sounding_theta, sounding_datenums, sounding_qflags, geos_datenums,
+                                   eqlat_fxns, nprocs, prior_flags=prior_flags, error_handler=error_handler,
+                                   workers=workers)
 
-    eqlats, flags = zip(*result)
-    sounding_eqlat = np.array(eqlats)
+    logger.info('Running eq. lat. calculation in parallel with {} processes'.format(workers.nprocs))
+    sounding_eqlat = np.full_like(sounding_pv, np.nan)
+    sounding_ranges = _chunk_bounds(sounding_pv.shape[0], workers.nprocs)
+
+    # The interpolator tables (once per run) and sounding arrays are written for the workers to memory map, so each
+    # task only needs to receive the bounds of its chunk of soundings.
+    table_files = workers.share_eqlat_tables(eqlat_fxns)
+    sounding_files = {'pv': workers.share_array(sounding_pv, 'pv'),
+                      'theta': workers.share_array(sounding_theta, 'theta'),
+                      'datenums': workers.share_array(sounding_datenums, 'datenums'),
+                      'qflags': workers.share_array(sounding_qflags, 'qflags')}
+    if prior_flags is not None:
+        sounding_files['prior_flags'] = workers.share_array(prior_flags, 'prior_flags')
+    try:
+        result = workers.pool.starmap(_eqlat_chunk_helper, zip(sounding_ranges, repeat(sounding_files),
+                                                               repeat(table_files), repeat(geos_datenums),
+                                                               repeat(error_handler)))
+    finally:
+        for npy_file in sounding_files.values():
+            os.remove(npy_file)
+
+    for (i0, i1), (eqlats, flags) in zip(sounding_ranges, result):
+        sounding_eqlat[i0:i1] = eqlats
+        # Copy the flag values from each parallel call into the array
+        if prior_flags is not None:
+            prior_flags[i0:i1] = flags
     _eqlat_clip(sounding_eqlat)
-    # Copy the flag values from each parallel call into the array
-    for i, flag in enumerate(flags):
-        prior_flags[i] = flag
     return sounding_eqlat
 
 
+def _eqlat_chunk_helper(sounding_range, sounding_files, table_files, geos_datenums, error_handler=_def_errh):
+    """
+    Calculate equivalent latitude for a contiguous chunk of soundings in a worker process
+
+    :param sounding_range: the first and one past the last sounding index in this chunk.
+    :type sounding_range: tuple(int, int)
+
+    :param sounding_files: a dictionary with the .npy files for the "pv", "theta", "datenums", "qflags" and (optionally)
+     "prior_flags" arrays of all the soundings.
+    :type sounding_files: dict
+
+    :param table_files: for each equivalent latitude interpolator, the .npy files with its PV grid, theta grid, and
+     equivalent latitude table.
+    :type table_files: list(tuple(str))
+
+    See :func:`_eqlat_helper` for the other inputs.
+
+    :return: the equivalent latitude profiles and prior flags for the soundings in the chunk.
+    :rtype: :class:`numpy.ndarray`, :class:`numpy.ndarray` or None
+    """
+    i0, i1 = sounding_range
+    arrays = {k: _attach_shared_array(f) for k, f in sounding_files.items()}
+    prior_flags = arrays.get('prior_flags', None)
+    eqlat_fxns = [mod_utils.EqLatInterpolator(*[_attach_shared_array(f) for f in files]) for files in table_files]
+
+    eqlats = np.full((i1 - i0, arrays['pv'].shape[1]), np.nan)
+    for idx in range(i0, i1):
+        eqlats[idx - i0], _ = _eqlat_helper(idx, arrays['pv'][idx], arrays['theta'][idx], arrays['datenums'][idx],
+                                            arrays['qflags'][idx], eqlat_fxns, geos_datenums, prior_flags=prior_flags,
+                                            error_handler=error_handler)
+    flags = None if prior_flags is None else np.array(prior_flags[i0:i1])
+    return eqlats, flags
+
+
+def _chunk_bounds(n, nprocs):
+    """
+    Split ``n`` soundings into contiguous chunks for parallel processing
+
+    :param n: the number of soundings.
+    :type n: int
+
+    :param nprocs: the number of processes that will work on the chunks.
+    :type nprocs: int
+
+    :return: the first and one past the last index of each chunk.
+    :rtype: list(tuple(int, int))
+    """
+    if n == 0:
+        return []
+    nchunks = min(n, nprocs * _chunks_per_proc)
+    return [(c[0], c[-1] + 1) for c in np.array_split(np.arange(n), nchunks)]
+
+
 @contextmanager
-def _eqlat_pickle_manager(eqlat_fxns, pickle_dir='.'):
-    if sys.version_info.major <= 3 and sys.version_info.minor >= 10:
-        logger.info("Running under Python 3.10 or greater, assuming support for large inter-thread objects. Not writing pickle files for eqlat interpolators.")
-        yield eqlat_fxns
-        return 
-    
-    logger.info("Running under Python 3.9 or less, not assuming there is support for large inter-thread objects. Writing pickle files for eqlat interpolators.")
-    mypid = os.getpid()
-    eqlat_pickle_files = []
-    
-    for i, fxn in enumerate(eqlat_fxns):
-        pickle_file = os.path.join(pickle_dir, f'ginput_eqlat_interpolator_pickle.{mypid}-{i}.pkl')
-        if os.path.exists(pickle_file):
-            raise IOError(f'Cannot create eqlat interpolator pickle file {pickle_file}, file already exists')
-        eqlat_pickle_files.append(pickle_file)
-        with open(pickle_file, 'wb') as f:
-            pickle.dump(fxn, f)
-    file_basenames = ', '.join(os.path.basename(fname) for fname in eqlat_pickle_files)
-    logger.info(f'Created {len(eqlat_pickle_files)} pickle files in {os.path.abspath(pickle_dir)}: {file_basenames}')
-    
+def _worker_pool(nprocs, share_dir='.'):
+    """
+    Start the worker processes for the parallel calculations, or give ``None`` if ``nprocs`` is 0.
+
+    :param nprocs: the number of processes to start.
+    :type nprocs: int
+
+    :param share_dir: the directory to create the temporary directory of shared arrays in, see
+     :func:`_shared_array_dir`.
+    :type share_dir: str
+
+    :return: context manager giving a :class:`_SharedWorkers` instance or ``None``. The processes are stopped and the
+     shared arrays removed on exit.
+    """
+    if nprocs == 0:
+        yield None
+        return
+
+    with _shared_array_dir(share_dir) as tmp_dir, Pool(processes=nprocs) as pool:
+        yield _SharedWorkers(pool, nprocs, tmp_dir)
+
+
+class _SharedWorkers(object):
+    """
+    A pool of worker processes and the arrays shared with them through .npy files in one directory
+
+    Keeping these for a whole granule, rather than creating them for each calculation, means the processes are started
+    once and that the equivalent latitude tables and the stratospheric LUTs are written once. The met arrays are
+    written once per set of soundings, for all the gases. Create instances with :func:`_worker_pool`.
+
+    :param pool: the worker processes.
+    :type pool: :class:`multiprocessing.pool.Pool`
+
+    :param nprocs: the number of processes in ``pool``.
+    :type nprocs: int
+
+    :param share_dir: the directory to write the shared arrays to.
+    :type share_dir: str
+    """
+    def __init__(self, pool, nprocs, share_dir):
+        self.pool = pool
+        self.nprocs = nprocs
+        self.share_dir = share_dir
+        self._n_files = 0
+        self._eqlat_tables = None
+        self._gas_records = dict()
+        self._met = None
+
+    def share_array(self, array, name):
+        """
+        Write an array to a new .npy file in the shared directory, see :func:`_share_array`.
+
+        :param array: the array to share.
+        :type array: :class:`numpy.ndarray`
+
+        :param name: the start of the file name. A number is added so that each call writes a new file.
+        :type name: str
+
+        :return: the path to the .npy file
+        :rtype: str
+        """
+        self._n_files += 1
+        return _share_array(array, self.share_dir, '{}_{}'.format(name, self._n_files))
+
+    def share_eqlat_tables(self, eqlat_fxns):
+        """
+        Write the tables of a list of equivalent latitude interpolators, unless they were already written.
+
+        :param eqlat_fxns: the equivalent latitude interpolators.
+        :type eqlat_fxns: list(:class:`~ginput.common_utils.mod_utils.EqLatInterpolator`)
+
+        :return: for each interpolator, the .npy files with its PV grid, theta grid, and equivalent latitude table.
+        :rtype: list(tuple(str))
+        """
+        # Keep a reference to the interpolators, so that another list cannot be mistaken for them
+        if self._eqlat_tables is None or self._eqlat_tables[0] is not eqlat_fxns:
+            table_files = [tuple(self.share_array(arr, '{}_{}'.format(name, i))
+                                 for name, arr in [('pv_grid', fxn.pv_grid), ('theta_grid', fxn.theta_grid),
+                                                   ('interp_el', fxn.interp_EL)])
+                           for i, fxn in enumerate(eqlat_fxns)]
+            self._eqlat_tables = (eqlat_fxns, table_files)
+        return self._eqlat_tables[1]
+
+    def share_gas_record(self, gas_record):
+        """
+        Prepare a gas record to send to the workers with :func:`_share_gas_record`, unless it was already.
+        """
+        key = id(gas_record)
+        if key not in self._gas_records:
+            share_dir = tempfile.mkdtemp(prefix='gas_record_', dir=self.share_dir)
+            self._gas_records[key] = (gas_record, _share_gas_record(gas_record, share_dir))
+        return self._gas_records[key][1]
+
+    def share_met(self, met_data):
+        """
+        Write the numeric met arrays to .npy files, reusing the files already written for the same met data.
+
+        Writing the met data for a new set of soundings removes the files for the previous set.
+
+        :param met_data: the dictionary of met data read from the resampler .h5 file.
+        :type met_data: dict
+
+        :return: a dictionary mapping met variable names to the .npy files holding them.
+        :rtype: dict
+        """
+        if self._met is not None and self._met[0] is not met_data:
+            self.release_met()
+        if self._met is None:
+            self._met = (met_data, dict())
+
+        met_files = self._met[1]
+        for k, v in met_data.items():
+            if k not in met_files and _is_shareable(v):
+                met_files[k] = self.share_array(v, 'met_' + k)
+        return dict(met_files)
+
+    def release_met(self):
+        """
+        Remove the files written by :meth:`share_met`, e.g. once a chunk of soundings is done.
+        """
+        if self._met is not None:
+            for npy_file in self._met[1].values():
+                os.remove(npy_file)
+        self._met = None
+
+
+@contextmanager
+def _shared_array_dir(share_dir='.'):
+    """
+    Create a temporary directory in ``share_dir`` to hold the .npy files shared with worker processes.
+
+    The directory and its contents are removed on exit.
+    """
+    tmp_dir = tempfile.mkdtemp(prefix='ginput_shared_', dir=share_dir)
+    logger.debug('Writing arrays for worker processes to {}'.format(tmp_dir))
     try:
-        yield eqlat_pickle_files
+        yield tmp_dir
     finally:
-        for pickle_file in eqlat_pickle_files:
-            if os.path.exists(pickle_file):
-                os.remove(pickle_file)
-                logger.debug(f'Removed eqlat interpolator pickle file {os.path.abspath(pickle_file)}')
-        logger.info(f'Removed {len(eqlat_pickle_files)} temporary pickle files')
-
-
-@lru_cache(maxsize=4)
-def _eqlat_pickle_load_cached(pickle_file):
-    # It's important to have this as a cached function rather than loading the pickle directly in _eqlat_helper.
-    # If we do that, then it needs to load the pickles for each sounding it operates on, which is slow.
-    # At least in my testing, using this cache function means that the first sounding in a given thread will
-    # load the pickle, but then it is cached, so all the remaining soundings can access it directly from memory.
-    logger.debug(f'Loading eqlat interpolator from file {pickle_file}')
-    with open(pickle_file, 'rb') as f:
-        return pickle.load(f)
-
-
-def read_oco_resampled_met(met_file, error_handler=_def_errh):
-    met_group = 'Meteorology'
-    sounding_group = 'SoundingGeometry'
-    var_dict = {'pv': [met_group, 'epv_profile_met'],
-                'temperature': [met_group, 'temperature_profile_met'],
-                'pressure': [met_group, 'vector_pressure_levels_met'],
-                'date_strings': [sounding_group, 'sounding_time_string'],
-                'altitude': [met_group, 'height_profile_met'],
-                'latitude': [sounding_group, 'sounding_latitude'],
-                'longitude': [sounding_group, 'sounding_longitude'],
-                'trop_pressure': [met_group, 'blended_tropopause_pressure_met'],
-                'trop_temperature': [met_group, 'tropopause_temperature_met'],
-                'surf_gph': [met_group, 'gph_met'],
-                'quality_flags': [sounding_group, 'sounding_qual_flag']
-                }
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        logger.debug('Removed {}'.format(tmp_dir))
+
+
+def _is_shareable(array):
+    return isinstance(array, np.ndarray) and array.dtype.kind in 'biuf'
+
+
+def _share_array(array, share_dir, name):
+    """
+    Write an array to a .npy file that worker processes can memory map with :func:`_attach_shared_array`
+
+    :param array: the array to share. Must have a numeric type.
+    :type array: :class:`numpy.ndarray`
+
+    :param share_dir: the directory to write the file in, usually from :func:`_shared_array_dir`.
+    :type share_dir: str
 
-    return read_resampled_met(met_file, var_dict, error_handler=error_handler)
-
-
-def read_gosat_resampled_met(met_file, error_handler=_def_errh):
-    met_group = 'Meteorology'
-    sounding_group = 'SoundingGeometry'
-    sounding_header = 'SoundingHeader'
-    var_dict = {'pv': [met_group, 'epv_profile_met'],
-                'temperature': [met_group, 'temperature_profile_met'],
-                'pressure': [met_group, 'vector_pressure_levels_met'],
-                'date_strings': [sounding_header, 'sounding_time_string'],
-                'altitude': [met_group, 'height_profile_met'],
-                'latitude': [sounding_group, 'sounding_latitude'],
-                'longitude': [sounding_group, 'sounding_longitude'],
-                'trop_pressure': [met_group, 'blended_tropopause_pressure_met'],
-                'trop_temperature': [met_group, 'tropopause_temperature_met'],
-                'surf_gph': [met_group, 'gph_met'],
-                'quality_flags': [sounding_header, 'sounding_qual_flag']
+    :param name: the name to give the file, without extension.
+    :type name: str
+
+    :return: the path to the .npy file
+    :rtype: str
+    """
+    npy_file = os.path.join(share_dir, '{}.npy'.format(name))
+    np.save(npy_file, np.ascontiguousarray(array))
+    return npy_file
+
+
+def _attach_shared_array(npy_file):
+    # Mapped copy-on-write: all processes read the same pages of the file, while anything a worker writes (e.g. flags
+    # set by the error handler) stays private to that worker just as it would with a pickled copy.
+    return np.load(npy_file, mmap_mode='c')
+
+
+class _SharedDataArray(object):
+    """
+    Stand-in for an :class:`xarray.DataArray` whose values are shared with worker processes through a .npy file
+
+    :param darray: the data array to share.
+    :type darray: :class:`xarray.DataArray`
+
+    :param share_dir: the directory to write the values to.
+    :type share_dir: str
+
+    :param name: the name to give the .npy file, without extension.
+    :type name: str
+    """
+    def __init__(self, darray, share_dir, name):
+        self.npy_file = _share_array(darray.values, share_dir, name)
+        self.dims = darray.dims
+        self.coords = {k: (v.dims, v.values) for k, v in darray.coords.items()}
+        self.attrs = dict(darray.attrs)
+        self.name = darray.name
+
+    def attach(self):
+        """
+        Recreate the data array, with its values memory mapped from the .npy file
+        """
+        return xr.DataArray(_attach_shared_array(self.npy_file), coords=self.coords, dims=self.dims,
+                            attrs=self.attrs, name=self.name)
+
+
+def _share_gas_record(gas_record, share_dir):
+    """
+    Make a copy of a gas record to send to worker processes with its stratospheric LUT written to ``share_dir``
+
+    :param gas_record: the MLO/SMO record class instance.
+    :type gas_record: :class:`~ginput.priors.tccon_priors.TraceGasRecord`
+
+    :param share_dir: the directory to write the LUT arrays to.
+    :type share_dir: str
+
+    :return: a shallow copy of ``gas_record`` with its LUT replaced by :class:`_SharedDataArray` instances. Use
+     :func:`_attach_gas_record` in the workers to restore it.
+    """
+    conc_strat = getattr(gas_record, 'conc_strat', None)
+    if not isinstance(conc_strat, dict):
+        return gas_record
+
+    shared_record = copy.copy(gas_record)
+    shared_record.conc_strat = {region: _SharedDataArray(darray, share_dir, 'strat_lut_{}'.format(region))
+                                for region, darray in conc_strat.items()}
+    return shared_record
+
+
+def _attach_gas_record(gas_record):
+    """
+    Restore the stratospheric LUT of a gas record prepared by :func:`_share_gas_record`. Modifies ``gas_record``.
+    """
+    conc_strat = getattr(gas_record, 'conc_strat', None)
+    if isinstance(conc_strat, dict):
+        gas_record.conc_strat = {region: darray.attach() if isinstance(darray, _SharedDataArray) else darray
+                                 for region, darray in conc_strat.items()}
+    return gas_record
+
+
+_met_group = 'Meteorology'
+_sounding_group = 'SoundingGeometry'
+_sounding_header = 'SoundingHeader'
+
+_oco_met_vars = {'pv': [_met_group, 'epv_profile_met'],
+                 'temperature': [_met_group, 'temperature_profile_met'],
+                 'pressure': [_met_group, 'vector_pressure_levels_met'],
+                 'date_strings': [_sounding_group, 'sounding_time_string'],
+                 'altitude': [_met_group, 'height_profile_met'],
+                 'latitude': [_sounding_group, 'sounding_latitude'],
+                 'longitude': [_sounding_group, 'sounding_longitude'],
+                 'trop_pressure': [_met_group, 'blended_tropopause_pressure_met'],
+                 'trop_temperature': [_met_group, 'tropopause_temperature_met'],
+                 'surf_gph': [_met_group, 'gph_met'],
+                 'quality_flags': [_sounding_group, 'sounding_qual_flag']
                 }
 
+
+def read_oco_resampled_met(met_file, error_handler=_def_errh, frames=None):
+    var_dict = _oco_met_vars
+
+    return read_resampled_met(met_file, var_dict, error_handler=error_handler, frames=frames)
+
+
+_gosat_met_vars = {'pv': [_met_group, 'epv_profile_met'],
+                   'temperature': [_met_group, 'temperature_profile_met'],
+                   'pressure': [_met_group, 'vector_pressure_levels_met'],
+                   'date_strings': [_sounding_header, 'sounding_time_string'],
+                   'altitude': [_met_group, 'height_profile_met'],
+                   'latitude': [_sounding_group, 'sounding_latitude'],
+                   'longitude': [_sounding_group, 'sounding_longitude'],
+                   'trop_pressure': [_met_group, 'blended_tropopause_pressure_met'],
+                   'trop_temperature': [_met_group, 'tropopause_temperature_met'],
+                   'surf_gph': [_met_group, 'gph_met'],
+                   'quality_flags': [_sounding_header, 'sounding_qual_flag']
+                  }
+
+
+def read_gosat_resampled_met(met_file, error_handler=_def_errh, frames=None):
+    var_dict = _gosat_met_vars
+
     # To be compatible with the OCO code, the arrays need to have at most 3 dimensions: sounding group, footprint,
     # level. GOSAT arrays have exposure, band, polarization, and level. To ensure compatibility, make them have
     # [exposure, 1, level] or [exposure, 1] if they should be 2D.
-    data, flags = read_resampled_met(met_file, var_dict, error_handler=error_handler)
+    data, flags = read_resampled_met(met_file, var_dict, error_handler=error_handler, frames=frames)
     for name, arr in data.items():
         data[name] = _gosat_normalize_shape(arr, name)
     flags = _gosat_normalize_shape(flags, 'prior_flags')
     return data, flags
 
 
-def read_geocarb_resampled_met(met_file, error_handler=_def_errh):
-    met_group = 'Meteorology'
-    sounding_group = 'SoundingGeometry'
-    var_dict = {'pv': [met_group, 'epv_profile_met'],
-                'temperature': [met_group, 'temperature_profile_met'],
-                'pressure': [met_group, 'vector_pressure_levels_met'],
-                'date_strings': [sounding_group, 'sounding_time_string'],
-                'altitude': [met_group, 'height_profile_met'],
-                'latitude': [sounding_group, 'sounding_latitude'],
-                'longitude': [sounding_group, 'sounding_longitude'],
-                'trop_pressure': [met_group, 'blended_tropopause_pressure_met'],
-                'trop_temperature': [met_group, 'tropopause_temperature_met'],
-                'surf_gph': [met_group, 'gph_met'],
-                'co': [met_group, 'co_profile_met'],
-                'quality_flags': [sounding_group, 'sounding_qual_flag']
-                }
+_geocarb_met_vars = {'pv': [_met_group, 'epv_profile_met'],
+                     'temperature': [_met_group, 'temperature_profile_met'],
+                     'pressure': [_met_group, 'vector_pressure_levels_met'],
+                     'date_strings': [_sounding_group, 'sounding_time_string'],
+                     'altitude': [_met_group, 'height_profile_met'],
+                     'latitude': [_sounding_group, 'sounding_latitude'],
+                     'longitude': [_sounding_group, 'sounding_longitude'],
+                     'trop_pressure': [_met_group, 'blended_tropopause_pressure_met'],
+                     'trop_temperature': [_met_group, 'tropopause_temperature_met'],
+                     'surf_gph': [_met_group, 'gph_met'],
+                     'co': [_met_group, 'co_profile_met'],
+                     'quality_flags': [_sounding_group, 'sounding_qual_flag']
+                    }
+
 
-    return read_resampled_met(met_file, var_dict, error_handler=error_handler)
+def read_geocarb_resampled_met(met_file, error_handler=_def_errh, frames=None):
+    var_dict = _geocarb_met_vars
+
+    return read_resampled_met(met_file, var_dict, error_handler=error_handler, frames=frames)
 
 
 def _gosat_normalize_shape(arr, name):
@@ -949,7 +1454,7 @@ def _gosat_normalize_shape(arr, name):
         raise NotImplementedError('Do not know how to handle a {}D GOSAT array'.format(arr.ndim))
 
 
-def read_resampled_met(met_file, var_dict, error_handler=_def_errh):
+def read_resampled_met(met_file, var_dict, error_handler=_def_errh, frames=None):
     """
     Read the required data from the HDF5 file containing the resampled met data.
 
@@ -961,6 +1466,10 @@ def read_resampled_met(met_file, var_dict, error_handler=_def_errh):
      and the second the dataset name within that group to read.
     :type var_dict: dict
 
+    :param frames: optional, a slice along the first (frame or exposure) dimension of the datasets to read. Only that
+     part of each dataset is read from disk. If not given, the whole datasets are read.
+    :type frames: slice or None
+
     :return: a dictionary with variables both read directly from the met file and derived from those values. Keys are:
 
         * "pv" - potential vorticity in PVU
@@ -980,11 +1489,14 @@ def read_resampled_met(met_file, var_dict, error_handler=_def_errh):
 
     :rtype: dict
     """
+    if frames is None:
+        frames = slice(None)
+
     data_dict = dict()
     with h5py.File(met_file, 'r') as h5obj:
         for out_var, (group_name, var_name) in var_dict.items():
-            logger.debug('Reading {}/{}'.format(group_name, var_name))
-            tmp_data = h5obj[group_name][var_name][:]
+            logger.debug('Reading {}/{}[{}]'.format(group_name, var_name, frames))
+            tmp_data = h5obj[group_name][var_name][frames]
             if np.issubdtype(tmp_data.dtype, np.floating):
                 tmp_data[tmp_data < _fill_val_threshold] = np.nan
             data_dict[out_var] = tmp_data
@@ -1012,6 +1524,58 @@ def read_resampled_met(met_file, var_dict, error_handler=_def_errh):
     return data_dict, flags
 
 
+def _count_met_frames(met_file, var_dict):
+    """
+    Get the length of the first (frame or exposure) dimension of the resampled met file
+
+    :param met_file: the path to the met file
+    :type met_file: str
+
+    :param var_dict: the dictionary mapping output variables to datasets, as given to :func:`read_resampled_met`.
+    :type var_dict: dict
+
+    :return: the number of frames
+    :rtype: int
+    """
+    group_name, var_name = var_dict['quality_flags']
+    with h5py.File(met_file, 'r') as h5obj:
+        return h5obj[group_name][var_name].shape[0]
+
+
+def _read_max_met_date(met_file, var_dict, chunk_size, error_handler=_def_errh):
+    """
+    Find the latest sounding time in the resampled met file, reading only the date strings one chunk at a time
+
+    :param met_file: the path to the met file
+    :type met_file: str
+
+    :param var_dict: the dictionary mapping output variables to datasets, as given to :func:`read_resampled_met`.
+    :type var_dict: dict
+
+    :param chunk_size: how many frames to read at once.
+    :type chunk_size: int
+
+    :param error_handler: an ErrorHandler instance that determines how errors converting the date strings are handled.
+
+    :return: the latest sounding time
+    :rtype: :class:`datetime.datetime`
+    """
+    group_name, var_name = var_dict['date_strings']
+    max_date = None
+    with h5py.File(met_file, 'r') as h5obj:
+        dset = h5obj[group_name][var_name]
+        for start in range(0, dset.shape[0], chunk_size):
+            date_strings = dset[start:start+chunk_size]
+            flags = np.zeros(date_strings.shape, dtype=np.int16)
+            dates = _convert_acos_time_strings(date_strings, format='datetime', flag_array=flags,
+                                               error_handler=error_handler)
+            chunk_max = np.max(dates)
+            if max_date is None or chunk_max > max_date:
+                max_date = chunk_max
+
+    return max_date
+
+
 def init_prior_h5(output_file, geos_files, resampler_file):
     """
     Initialize the output .h5 file. If it already exists, it will be overwritten.
@@ -1036,7 +1600,7 @@ def init_prior_h5(output_file, geos_files, resampler_file):
         h5obj.attrs['interface_version'] = __acos_int_version__
 
 
-def write_prior_h5(output_file, profile_variables, units, prior_group='priors'):
+def write_prior_h5(output_file, profile_variables, units, prior_group='priors', frames=None, n_frames=None):
     """
     Write the priors to an HDF5 file.
 
@@ -1050,11 +1614,26 @@ def write_prior_h5(output_file, profile_variables, units, prior_group='priors'):
     :param units: a dictionary defining the units each variable is in. Must have the same keys as ``profile_variables``.
     :type units: dict(str)
 
+    :param frames: optional, a slice along the first dimension of the output datasets that ``profile_variables``
+     should be written to. If given, the group and datasets are created the first time this is called for a file
+     (with ``n_frames`` along the first dimension and chunked by the length of ``frames``) and subsequent calls fill
+     in other parts of them. If not given, ``profile_variables`` are written as complete new datasets.
+    :type frames: slice or None
+
+    :param n_frames: the total length of the first dimension of the output datasets. Required if ``frames`` is given.
+    :type n_frames: int or None
+
     :return: none, writes to file on disk.
     """
+    if frames is not None and n_frames is None:
+        raise TypeError('n_frames is required if frames is given')
 
     with h5py.File(output_file, 'a') as h5obj:
-        h5grp = h5obj.create_group(prior_group)
+        if frames is None or prior_group not in h5obj:
+            h5grp = h5obj.create_group(prior_group)
+        else:
+            h5grp = h5obj[prior_group]
+
         for var_name, var_data in profile_variables.items():
             # Replace NaNs with numeric fill values
             if np.issubdtype(var_data.dtype, np.number):
@@ -1069,8 +1648,23 @@ def write_prior_h5(output_file, profile_variables, units, prior_group='priors'):
 
             # Write the data
             var_unit = units[var_name]
-            dset = h5grp.create_dataset(var_name, data=filled_data, fillvalue=this_fill_val)
-            dset.attrs['units'] = var_unit
+            if frames is None:
+                dset = h5grp.create_dataset(var_name, data=filled_data, fillvalue=this_fill_val)
+                dset.attrs['units'] = var_unit
+                continue
+
+            if var_name not in h5grp:
+                chunk_len = min(len(range(*frames.indices(n_frames))), n_frames)
+                dset = h5grp.create_dataset(var_name, shape=(n_frames,) + filled_data.shape[1:],
+                                            dtype=filled_data.dtype, chunks=(chunk_len,) + filled_data.shape[1:],
+                                            compression='gzip', fillvalue=this_fill_val)
+                dset.attrs['units'] = var_unit
+            else:
+                dset = h5grp[var_name]
+                # The units may not be known if every sounding in an earlier chunk failed
+                if len(var_unit) > 0 and len(dset.attrs['units']) == 0:
+                    dset.attrs['units'] = var_unit
+            dset[frames] = filled_data
 
 
 def insitu_record_to_h5_group(output_file, df, gas, record_group='mlo_smo_record'):
@@ -1190,11 +1784,6 @@ def _make_el_profile(pv, theta, interpolator):
     """
     Create an equivalent latitude profile from profiles of PV, theta, and one of the eq. lat. intepolators
 
-    This function will create each level of the eq. lat. profile separately. This is safer than calling the interpolator
-    with the PV and theta vectors because the latter returns a 2D array of eq. lat., and occasionally the profile is
-    not the diagonal of that array. Since I have not figured out under what conditions that happens, I find this
-    approach of calculating each level in a loop, safer.
-
     :param pv: the profile of potential vorticity in PVU (1e-6 K * m2 * kg^-1 * s^-1).
     :type pv: 1D :class:`numpy.ndarray`
 
@@ -1203,15 +1792,12 @@ def _make_el_profile(pv, theta, interpolator):
 
     :param interpolator: one of the interpolators returned by :func:`mod_utils.equivalent_latitude_functions_from_geos_files`
      that interpolates equivalent latitude to given PV and theta.
-    :type interpolator: :class:`scipy.interpolate.interp2d`
+    :type interpolator: :class:`~ginput.common_utils.mod_utils.EqLatInterpolator`
 
     :return: the equivalent latitude profile
     :rtype: 1D :class:`numpy.ndarray`
     """
-    el = np.full_like(pv, np.nan)
-    for i in range(el.size):
-        el[i] = interpolator(pv[i], theta[i])
-    return el
+    return interpolator(pv, theta)
 
 
 def _construct_mod_dict(acos_data_dict, i_sounding, i_foot):
@@ -1333,11 +1919,22 @@ def parse_args(parser=None, instrument=None):
                              'not use the standard logger will also not be silenced.')
     parser.add_argument('-n', '--nprocs', default=0, type=int, help='Number of processors to use in parallelization')
     parser.add_argument('--interp-pickle-dir', default='.',
-                        help='Directory in which to write temporary files containing pickles of the EqL interpolators if needed. '
-                             'These files will only be written if running on Python 3.9 or less, and will be cleaned up automatically. '
-                             'Default is "%(default)s"')
+                        help='Directory in which to write the temporary files with the EqL tables, met data, and strat '
+                             'LUTs that the worker processes share when --nprocs > 0. These files are cleaned up '
+                             'automatically. Default is "%(default)s"')
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help='Process the resampled met file this many frames (sounding groups, or exposures for '
+                             'GOSAT) at a time, writing each chunk to the output file before reading the next. This '
+                             'limits memory use for large granules. Must be positive. By default, the whole file is '
+                             'processed at once.')
+    parser.add_argument('--strat-lut-cache-dir', dest='strat_cache_dir', default=None,
+                        help='Directory to cache the stratospheric LUTs in. LUTs computed from the same MLO/SMO files, '
+                             'truncation date, and code version are loaded from here rather than recalculated, which '
+                             'avoids recomputing them for every granule when truncating the MLO/SMO data. Can be '
+                             'shared between concurrent jobs.')
     parser.add_argument('--raise-errors', action='store_true', help='Raise errors normally rather than suppressing and '
                                                                     'logging them.')
+    mod_maker._add_eqlat_cache_args(parser)
 
     parser.epilog = 'A note on error handling: by default, most errors will be caught and, rather than halt the ' \
                     'execution of this program, will result in a non-zero flag value being stored. A short version ' \
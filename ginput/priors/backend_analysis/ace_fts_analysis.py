@@ -643,16 +643,7 @@ def add_clams_age_to_file(ace_nc_file, save_nc_file=None):
         ace_doy = np.array([mod_utils.day_of_year(d) + 1 for d in ace_dates])
         ace_theta = read_ace_theta(nch, None)
 
-    ace_ages = np.full_like(ace_theta, np.nan)
-    pbar = mod_utils.ProgressBar(ace_theta.shape[0], prefix='Calculating ages for profile', style='counter')
-    for iprof in range(ace_theta.shape[0]):
-        pbar.print_bar(iprof)
-        prof_theta = ace_theta[iprof]
-        prof_lat = np.full_like(prof_theta, ace_lat[iprof])
-        prof_doy = ace_doy[iprof]
-        ace_ages[iprof, :] = tccon_priors.get_clams_age(prof_theta, prof_lat, prof_doy)
-
-    pbar.finish()
+    ace_ages = tccon_priors.get_clams_age(ace_theta, ace_lat[:, np.newaxis], ace_doy[:, np.newaxis])
 
     if save_nc_file is None:
         logger.info('Added CLaMS age to input file: {}'.format(ace_nc_file))
@@ -755,10 +746,7 @@ def _calc_el_age_for_ace(ace_dates, ace_lon, ace_lat, ace_theta, geos_dates, geo
             gdate = geos_dates[i]
             geos_data['PT'] = mod_utils.calculate_potential_temperature(geos_pres[i], geos_data['T'])
             # Calculate the equivalent latitude profiles.
-            eqlat = np.full_like(geos_data['T'], np.nan)
-            for j in range(ace_lon.size):
-                eqlat[j, :] = mod_utils.get_eqlat_profile(eqlat_interpolators[gdate], geos_data['EPV'][j, :], geos_data['PT'][j, :])
-            geos_data['EL'] = eqlat
+            geos_data['EL'] = mod_utils.get_eqlat_profile(eqlat_interpolators[gdate], geos_data['EPV'], geos_data['PT'])
 
         # Put the profiles onto the ACE times and levels #
         geos_data_at_ace_times = _interp_geos_vars_to_ace_times(ace_dates, geos_dates, geos_data_on_std_times)
@@ -789,17 +777,13 @@ def _calc_el_age_for_ace(ace_dates, ace_lon, ace_lat, ace_theta, geos_dates, geo
             geos_data_on_ace_levels[varname] = ace_profiles
 
         # Use the equivalent latitude and potential temperature profiles to look up CLAMS ages #
-        ace_age = np.full_like(ace_theta, np.nan)
-        for i in range(ace_lon.size):
-            if use_geos_theta_for_age:
-                theta_prof = geos_data_on_ace_levels['PT'][i, :]
-            else:
-                theta_prof = ace_theta[i, :]
-
-            eqlat_prof = geos_data_on_ace_levels['EL'][i, :]
-            ace_doy = mod_utils.clams_day_of_year(ace_dates[i])
+        if use_geos_theta_for_age:
+            theta_profs = geos_data_on_ace_levels['PT']
+        else:
+            theta_profs = ace_theta
 
-            ace_age[i, :] = tccon_priors.get_clams_age(theta_prof, eqlat_prof, ace_doy)
+        ace_doy = np.array([mod_utils.clams_day_of_year(d) for d in ace_dates])
+        ace_age = tccon_priors.get_clams_age(theta_profs, geos_data_on_ace_levels['EL'], ace_doy[:, np.newaxis])
 
         geos_data_on_ace_levels['age'] = ace_age
         return geos_data_on_ace_levels
@@ -846,12 +830,8 @@ def _bin_ace_to_geos_times(ace_dates):
 
 def _interp_geos_vars_to_ace_lat_lon(geos_file_path, geos_vars, ace_lon, ace_lat):
     def interp_prof_helper(data, glat, glon, alat, alon, interp_inds):
-        profs_out = np.full([alat.size, data.shape[0]], np.nan)
-        for i, data_layer in enumerate(data):
-            # Reshape to nprofs-by-nlevels to be consistent with ACE
-            profs_out[:, i] = mm.lat_lon_interp(data_layer, glat, glon, alat, alon, interp_inds)
-
-        return profs_out
+        # Transpose to nprofs-by-nlevels to be consistent with ACE
+        return mm.lat_lon_interp(data, glat, glon, alat, alon, interp_inds).T
 
     geos_data = dict()
     geos_interp_inds = []
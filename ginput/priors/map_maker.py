@@ -1,9 +1,14 @@
 from argparse import ArgumentParser
+import datetime as dt
+import json
+from multiprocessing import Pool
 import os
 import pandas as pd
 
-from ..common_utils import mod_utils, writers
-from ..mod_maker import tccon_sites
+from ..common_utils import mod_utils, writers, bundles
+from ..common_utils.ggg_logging import logger
+from ..mod_maker import mod_maker, tccon_sites
+from . import tccon_priors
 
 
 def _find_files_in_dirs(mod_dir, vmr_dir, date_range, site_lat, site_lon, product='fpit', keep_latlon_prec=False,
@@ -108,14 +113,25 @@ def _lookup_site_lat_lon(site_abbrev, date_range):
 
 def cl_driver(date_range, root_dir=None, mod_dir=None, save_dir=None, vmr_dir=None, map_fmt='nc', dry=False,
               product='fpit', site_lat=None, site_lon=None, site_abbrev='xx', keep_latlon_prec=False,
-              skip_missing=False, req_cfunits=False):
+              skip_missing=False, req_cfunits=False, nprocs=0, from_bundles=False):
 
     site_abbrev, site_lat, site_lon, _ = mod_utils.check_site_lat_lon_alt(abbrev=site_abbrev, lat=site_lat,
                                                                           lon=site_lon,
                                                                           alt=None if site_lat is None else 0.0)
 
+    if from_bundles:
+        _cl_bundle_driver(date_range, root_dir=root_dir, mod_dir=mod_dir, vmr_dir=vmr_dir, save_dir=save_dir,
+                          sites=list(zip(site_abbrev, site_lat, site_lon)), product=product, map_fmt=map_fmt,
+                          dry=dry, skip_missing=skip_missing, req_cfunits=req_cfunits)
+        return
+    elif map_fmt == 'bundle':
+        raise ValueError('.map bundles can only be written when reading .mod and .vmr bundles')
+
     wet_or_dry = 'dry' if dry else 'wet'
 
+    # Find all the files first so that missing files are reported before any .map files get written, and so that
+    # the (mod, vmr) pairs for all sites can be shared among the processes.
+    map_tasks = []
     for this_abbrev, this_lat, this_lon in zip(site_abbrev, site_lat, site_lon):
         if this_lat is None:
             # Assuming if lat is None, lon is as well b/c check_site_lat_lon_alt() should guarantee that.
@@ -129,8 +145,310 @@ def cl_driver(date_range, root_dir=None, mod_dir=None, save_dir=None, vmr_dir=No
         )
 
         for modf, vmrf in zip(mod_files, vmr_files):
-            writers.write_map_from_vmr_mod(vmr_file=vmrf, mod_file=modf, map_output_dir=this_save_dir, fmt=map_fmt,
-                                           wet_or_dry=wet_or_dry, site_abbrev=this_abbrev, no_cfunits=not req_cfunits)
+            map_tasks.append(dict(vmr_file=vmrf, mod_file=modf, map_output_dir=this_save_dir, fmt=map_fmt,
+                                  wet_or_dry=wet_or_dry, site_abbrev=this_abbrev, no_cfunits=not req_cfunits))
+
+    if nprocs == 0:
+        for task in map_tasks:
+            writers.write_map_from_vmr_mod(**task)
+        return
+
+    # Give each process several chunks so that one slow chunk does not leave the others idle at the end. imap returns
+    # the results in the order of the tasks, so failures are always reported in the same order.
+    chunksize = max(1, len(map_tasks) // (4 * nprocs))
+    with Pool(processes=nprocs) as pool:
+        errors = [err for err in pool.imap(_cl_write_map_task, map_tasks, chunksize=chunksize) if err is not None]
+
+    for err in errors:
+        logger.error(err)
+    if len(errors) > 0:
+        raise RuntimeError('Failed to write {} of {} .map files. The first error was: {}'.format(
+            len(errors), len(map_tasks), errors[0]))
+
+
+def _cl_write_map_task(task):
+    """
+    Worker for :func:`cl_driver` that writes one .map file.
+
+    :param task: the keywords for :func:`~ginput.common_utils.writers.write_map_from_vmr_mod`.
+    :type task: dict
+
+    :return: ``None`` if the .map file was written, otherwise a description of the error. The error is returned
+     rather than raised so that the other files are still written and all the errors can be reported together.
+    :rtype: str or None
+    """
+    try:
+        writers.write_map_from_vmr_mod(**task)
+    except Exception as err:
+        return '{} + {}: {}: {}'.format(task['mod_file'], task['vmr_file'], type(err).__name__, err)
+    else:
+        return None
+
+
+def _cl_bundle_driver(date_range, root_dir, mod_dir, vmr_dir, save_dir, sites, product='fpit', map_fmt='nc',
+                      dry=False, skip_missing=False, req_cfunits=False):
+    """
+    Generate .map files for :func:`cl_driver` from the daily .mod and .vmr bundles, see :func:`bundle_driver`.
+
+    The bundles are in ``mod_dir`` and ``vmr_dir``, or in the ``product`` subdirectory of ``root_dir``, which is also
+    the default ``save_dir``. ``sites`` is given to :func:`~ginput.common_utils.bundles.select_records`. Days missing
+    either bundle are skipped if ``skip_missing`` is ``True``. The other parameters are the same as :func:`cl_driver`.
+    """
+    if (mod_dir is None) != (vmr_dir is None):
+        raise TypeError('Must specify both or neither of `mod_dir` and `vmr_dir`')
+    elif root_dir is not None and mod_dir is not None:
+        raise TypeError('Must specify *either* `root_dir` or `mod_dir`+`vmr_dir`, not both.')
+    elif root_dir is None and mod_dir is None:
+        mod_dir = os.path.join(mod_utils.get_ggg_path(os.path.join('models', 'gnd'), 'model file directory'), product)
+        vmr_dir = os.path.join(mod_utils.get_ggg_path(os.path.join('vmrs', 'gnd'), 'vmr file directory'), product)
+    elif root_dir is not None:
+        mod_dir = vmr_dir = os.path.join(root_dir, product)
+        if save_dir is None:
+            save_dir = mod_dir
+
+    if save_dir is None:
+        raise TypeError('Cannot infer a save directory when not using root_dir')
+
+    mod_bundles = bundles.find_daily_bundles(mod_dir, 'mod', date_range, product=product, skip_missing=skip_missing)
+    vmr_bundles = bundles.find_daily_bundles(vmr_dir, 'vmr', date_range, product=product, skip_missing=skip_missing)
+    for day in sorted(mod_bundles.keys() & vmr_bundles.keys()):
+        bundle_driver(mod_bundles[day], vmr_bundles[day], save_dir, map_fmt=map_fmt, dry=dry, req_cfunits=req_cfunits,
+                      date_range=date_range, sites=sites)
+
+
+def bundle_driver(mod_bundle, vmr_bundle, save_dir, map_fmt='nc', dry=False, req_cfunits=False, date_range=None,
+                  sites=None):
+    """
+    Generate .map files from a .mod bundle and a .vmr bundle
+
+    Each profile in the .vmr bundle is matched to the profile in the .mod bundle with the same date/time and site and
+    a latitude and longitude within 0.5 degrees (to allow for the .vmr file names being rounded to whole degrees).
+
+    :param mod_bundle: the path to the .mod bundle.
+    :type mod_bundle: str
+
+    :param vmr_bundle: the path to the .vmr bundle.
+    :type vmr_bundle: str
+
+    :param save_dir: the directory to write the .map files or .map bundle to.
+    :type save_dir: str
+
+    :param map_fmt: "nc" or "txt" to write individual netCDF or text .map files, "bundle" to write a single .map bundle
+     for each day.
+    :type map_fmt: str
+
+    :param dry: set to ``True`` to write dry mole fractions instead of wet.
+    :type dry: bool
+
+    :param req_cfunits: set to ``True`` to require CFUnits to format unit strings in netCDF .map files.
+    :type req_cfunits: bool
+
+    :param date_range: the first (inclusive) and last (exclusive) date/time to write .map files for. If ``None``, they
+     are written for every profile in the .vmr bundle.
+    :type date_range: list(datetime-like)
+
+    :param sites: the sites to write .map files for, see :func:`~ginput.common_utils.bundles.select_records`. If
+     ``None``, they are written for every site.
+    :type sites: list(tuple)
+
+    :return: none, writes the .map files or bundles.
+    """
+    if map_fmt not in ('nc', 'txt', 'bundle'):
+        raise ValueError('map_fmt must be "nc", "txt", or "bundle"')
+
+    mod_profiles = bundles.read_bundle(mod_bundle)
+    product = bundles.read_bundle_info(vmr_bundle)['product']
+    if not os.path.isdir(save_dir):
+        os.makedirs(save_dir)
+
+    mod_by_time_site = dict()
+    for moddat in mod_profiles:
+        mod_by_time_site.setdefault((moddat['file']['datetime'], moddat['file']['site']), []).append(moddat)
+
+    profile_pairs = []
+    for vmrdat in bundles.select_records(bundles.read_bundle(vmr_bundle), date_range=date_range, sites=sites):
+        vmr_file = vmrdat['file']
+        candidates = mod_by_time_site.get((vmr_file['datetime'], vmr_file['site']), [])
+        matches = [m for m in candidates if abs(m['file']['lat'] - vmr_file['lat']) <= 0.5
+                   and abs(m['file']['lon'] - vmr_file['lon']) <= 0.5]
+        if len(matches) != 1:
+            raise RuntimeError('Found {} profiles in {} matching {} (expected 1)'.format(
+                len(matches), mod_bundle, vmr_file['name']))
+        profile_pairs.append((matches[0], vmrdat))
+
+    _write_maps(profile_pairs, save_dir, product, map_fmt=map_fmt, dry=dry, req_cfunits=req_cfunits)
+
+
+def _write_maps(profile_pairs, save_dir, product, map_fmt='nc', dry=False, req_cfunits=False):
+    """
+    Merge .mod and .vmr profiles and write the resulting .map files or bundles
+
+    :param profile_pairs: the matching .mod and .vmr profiles, as (.mod, .vmr) tuples. Both must be in the form of
+     profiles read from a bundle by :func:`~ginput.common_utils.bundles.read_bundle`.
+    :type profile_pairs: sequence(tuple(dict, dict))
+
+    :param save_dir: the directory to write the .map files or .map bundles to. Must exist.
+    :type save_dir: str
+
+    :param product: the GEOS product, used in the bundle file names.
+    :type product: str
+
+    The other parameters are the same as for :func:`bundle_driver`.
+
+    :return: none, writes the .map files or bundles.
+    """
+    wet_or_dry = 'dry' if dry else 'wet'
+    map_records = dict()
+    for moddat, vmrdat in profile_pairs:
+        vmr_file = vmrdat['file']
+        # The merge expects the .vmr profiles keyed by lower case names, as read_vmr_file gives them
+        vmr_profiles = {'profile': {k.lower(): v for k, v in vmrdat['profile'].items()}}
+        mapdat, obs_lat = writers._merge_and_convert_mod_vmr(vmr_profiles, moddat, wet_or_dry=wet_or_dry)
+        map_name = '{site}_{lat}_{lon}_{date}Z.map'.format(
+            site=vmr_file['site'], lat=mod_utils.find_lat_substring(vmr_file['name']),
+            lon=mod_utils.find_lon_substring(vmr_file['name']), date=vmr_file['datetime'].strftime('%Y%m%d%H')
+        )
+
+        if map_fmt == 'bundle':
+            file_vars = {k: moddat['file'][k] for k in ('datetime', 'lat', 'lon')}
+            map_records.setdefault(vmr_file['datetime'].date(), []).append(
+                bundles.map_record(map_name, vmr_file['site'], file_vars, mapdat, obs_lat, wet_or_dry)
+            )
+            continue
+
+        if map_fmt == 'nc':
+            map_name += '.nc'
+        writers.write_map_file(os.path.join(save_dir, map_name), mapdat, obs_lat, fmt=map_fmt, wet_or_dry=wet_or_dry,
+                               obs_date=moddat['file']['datetime'], obs_site=vmr_file['site'],
+                               file_lat=moddat['file']['lat'], file_lon=moddat['file']['lon'],
+                               no_cfunits=not req_cfunits)
+
+    for bundle_date, records in map_records.items():
+        bundles.write_bundle(os.path.join(save_dir, bundles.bundle_file_name(product, bundle_date, 'map')), 'map',
+                             records, units=dict(writers._map_text_units), product=product)
+
+
+def mod_vmr_map_driver(date_range, met_path, save_dir, chem_path=None, mode=mod_maker._default_mode, site_abbrev=None,
+                       site_lat=None, site_lon=None, site_alt=None, keep_latlon_prec=False, write_mods=False,
+                       write_vmrs=False, map_fmt='nc', dry=False, std_vmr_file=None, zgrid=None, mlo_smo_files=None,
+                       req_cfunits=False, nprocs=0, eqlat_cache_dir=None, eqlat_cache_max_entries=None,
+                       eqlat_cache_max_age=None, muted=False):
+    """
+    Generate .map files directly from GEOS data, passing the .mod and .vmr profiles between steps in memory
+
+    This runs the same steps as the "tccon-mod", "vmr", and "map" subcommands, except that the .mod profiles are given
+    straight to the prior generation and the .vmr profiles straight to the .map writer, rather than being written to
+    text files and read back in. The .mod and .vmr files are only written if requested. Since the profiles are not
+    rounded to the precision of the text files in between, the .map files can differ from those made by the separate
+    steps in the last digits.
+
+    All outputs are written in the standard directory tree under ``save_dir``, i.e. .mod files to
+    ``<product>/<site>/vertical``, .vmr files to ``<product>/<site>/vmrs-vertical``, and .map files to
+    ``<product>/<site>/maps-vertical``.
+
+    :param date_range: the start and (exclusive) end datetime of the period to generate .map files for.
+    :type date_range: list(datetime-like)
+
+    :param met_path: the path to the GEOS met files, see :func:`~ginput.mod_maker.mod_maker.driver`.
+    :type met_path: str
+
+    :param save_dir: the top directory to write the output to.
+    :type save_dir: str
+
+    :param chem_path: the path to the GEOS chemistry files, if not the same as ``met_path``.
+    :type chem_path: str or None
+
+    :param mode: which GEOS files to use. Must be one of the new mod_maker modes.
+    :type mode: str
+
+    :param site_abbrev: the TCCON site to generate .map files for, or the abbreviation to use for a custom location.
+     If this and ``site_lat`` are not given, .map files are made for all TCCON sites. Any abbreviation may be used for a
+     custom location, but without ``site_lat`` it must be a TCCON site.
+    :type site_abbrev: str or None
+
+    :param site_lat: the latitude of a custom location.
+    :type site_lat: float or None
+
+    :param site_lon: the longitude of a custom location.
+    :type site_lon: float or None
+
+    :param site_alt: the altitude of a custom location, in meters.
+    :type site_alt: float or None
+
+    :param keep_latlon_prec: set to ``True`` to keep 2 decimal places of lat/lon in the output file names.
+    :type keep_latlon_prec: bool
+
+    :param write_mods: set to ``True`` to also write the .mod files.
+    :type write_mods: bool
+
+    :param write_vmrs: set to ``True`` to also write the .vmr files.
+    :type write_vmrs: bool
+
+    :param map_fmt: "nc" or "txt" to write netCDF or text .map files.
+    :type map_fmt: str
+
+    :param std_vmr_file: the base .vmr file for the secondary gases, see
+     :func:`~ginput.priors.tccon_priors.generate_full_tccon_vmr_file`.
+    :type std_vmr_file: None, str, or bool
+
+    :param zgrid: an integral file or altitude grid to place the priors on.
+
+    :param mlo_smo_files: a dictionary or path to a JSON file configuring which MLO/SMO files to use, see
+     :func:`~ginput.priors.tccon_priors.generate_full_tccon_vmr_file`.
+    :type mlo_smo_files: dict or str or None
+
+    :param nprocs: number of processes to make the .mod and .vmr profiles with, see
+     :func:`~ginput.mod_maker.mod_maker.driver` and :func:`~ginput.priors.tccon_priors.generate_tccon_priors_driver`.
+    :type nprocs: int
+
+    :param muted: set to ``True`` to suppress most logging to the console.
+    :type muted: bool
+
+    The remaining parameters are the same as for :func:`bundle_driver` and :func:`~ginput.mod_maker.mod_maker.driver`.
+
+    :return: none, writes the .map files (and .mod and .vmr files, if requested).
+    """
+    if map_fmt not in ('nc', 'txt'):
+        raise ValueError('map_fmt must be "nc" or "txt"')
+    if mode not in mod_maker._new_modmaker_modes:
+        raise ValueError('mode must be one of {}'.format(', '.join(mod_maker._new_modmaker_modes)))
+    if site_lat is None and site_abbrev is not None and site_abbrev not in tccon_sites.tccon_site_info():
+        raise ValueError('"{}" is not a TCCON site; give --lat, --lon, and --alt to use it as the abbreviation for a '
+                         'custom location'.format(site_abbrev))
+    product = mode.replace('-eta', '')
+
+    mod_dicts = mod_maker.driver(date_range=date_range, met_path=met_path, chem_path=chem_path, save_path=save_dir,
+                                 keep_latlon_prec=keep_latlon_prec, save_in_utc=True, muted=muted, alt=site_alt,
+                                 lon=site_lon, lat=site_lat, site_abbrv=site_abbrev, mode=mode, include_chm=True,
+                                 eqlat_cache_dir=eqlat_cache_dir, eqlat_cache_max_entries=eqlat_cache_max_entries,
+                                 eqlat_cache_max_age=eqlat_cache_max_age, nprocs=nprocs,
+                                 mod_format='text' if write_mods else None)
+    mod_records = [site_dicts['record'] for utc_date in sorted(mod_dicts) for site_dicts in mod_dicts[utc_date].values()]
+    if len(mod_records) == 0:
+        raise IOError('No .mod profiles were generated for {} to {}'.format(*date_range))
+
+    if isinstance(mlo_smo_files, str):
+        with open(mlo_smo_files) as robj:
+            mlo_smo_files = json.load(robj)
+
+    # The .mod profiles are in UTC, so no offset is needed
+    vmr_records = tccon_priors.generate_full_tccon_vmr_file(
+        mod_data=mod_records, utc_offsets=dt.timedelta(0), save_dir=save_dir if write_vmrs else False,
+        product=product, std_vmr_file=std_vmr_file, site_abbrevs=[r['file']['site'] for r in mod_records],
+        keep_latlon_prec=keep_latlon_prec, mlo_smo_files=mlo_smo_files, flat_outdir=False, zgrid=zgrid, nprocs=nprocs,
+        return_records=True
+    )
+
+    site_pairs = dict()
+    for moddat, vmrdat in zip(mod_records, vmr_records):
+        site_pairs.setdefault(moddat['file']['site'], []).append((moddat, vmrdat))
+
+    for this_abbrev, profile_pairs in site_pairs.items():
+        map_dir = os.path.join(save_dir, product, this_abbrev, 'maps-vertical')
+        os.makedirs(map_dir, exist_ok=True)
+        _write_maps(profile_pairs, map_dir, product, map_fmt=map_fmt, dry=dry, req_cfunits=req_cfunits)
+        if not muted:
+            logger.info('Wrote {} .map files to {}'.format(len(profile_pairs), map_dir))
 
 
 def parse_cl_args(p: ArgumentParser):
@@ -159,6 +477,11 @@ def parse_cl_args(p: ArgumentParser):
     iogrp.add_argument('-k', '--keep-latlon-prec', action='store_true',
                        help='Use 2 decimal places for lat/lon in the names of the .mod files. This must match the '
                             'format of your .mod file names, the default is to round to the nearest degree.')
+    iogrp.add_argument('--from-bundles', action='store_true',
+                       help='Read the .mod and .vmr profiles from the daily bundles written by "mod --bundle" and '
+                            '"vmr --bundle" instead of from individual files. The bundles are looked for in mod_dir '
+                            'and vmr_dir, or in the <product> subdirectory of --root-dir, which is also where the .map '
+                            'files are saved if --save-dir is not given. --nprocs is not used.')
 
     sitegrp = p.add_argument_group('Location', 'Arguments specifying which site/location to generate .map files for')
     valid_site_ids = list(tccon_sites.tccon_site_info().keys())
@@ -171,9 +494,10 @@ def parse_cl_args(p: ArgumentParser):
                                                                     '--lat must be given as well.')
 
     fmtgrp = p.add_argument_group('Format', 'Control the format of the output file')
-    fmtgrp.add_argument('-f', '--map-fmt', choices=('nc', 'txt'), default='nc',
+    fmtgrp.add_argument('-f', '--map-fmt', choices=('nc', 'txt', 'bundle'), default='nc',
                         help='Select the output format for the .map files, "nc" for netCDF for "txt" for the legacy '
-                             'text format. Default is "%(default)s".')
+                             'text format. With --from-bundles, "bundle" writes one .map bundle per day instead. '
+                             'Default is "%(default)s".')
     fmtgrp.add_argument('-d', '--dry', action='store_true',
                         help='Save the priors as dry mole fraction instead of wet. Note that TCCON uses wet mole '
                              'fractions in the retrieval. If you have questions about which to use for your '
@@ -190,4 +514,79 @@ def parse_cl_args(p: ArgumentParser):
                                'a C-library incompatibility. Use this flag if following CF unit conventions is '
                                'necessary for your use of the .map files and you do not get a warning about CFUnits '
                                'failing to import.')
+    othergrp.add_argument('-n', '--nprocs', default=0, type=int,
+                          help='Number of processes to use to write the .map files in parallel. Default is 0, i.e. '
+                               'run in serial.')
     p.set_defaults(driver_fxn=cl_driver)
+
+
+def parse_mod_vmr_map_args(p: ArgumentParser):
+    p.description = 'Generate .map files from GEOS data in one step, without reading intermediate .mod/.vmr files'
+    p.add_argument('date_range', type=mod_utils.parse_date_range,
+                   help='The range of dates to generate .map files for. May be given as YYYYMMDD-YYYYMMDD, or '
+                        'YYYYMMDD_HH-YYYYMMDD_HH, where the ending date is exclusive. A single date may be given, '
+                        '(YYYYMMDD) in which case the ending date is assumed to be one day later.')
+
+    iogrp = p.add_argument_group('I/O', 'Arguments for input and output control')
+    iogrp.add_argument('met_path',
+                       help='Path to the meteorology FP(-IT) netCDF files. Must be directory with subdirectories '
+                            'Nx and Np or Nv, containing surface and profile paths respectively.')
+    iogrp.add_argument('save_dir',
+                       help='Top directory to save the output to. The .map files are saved in '
+                            '<product>/<site>/maps-vertical under this directory, and .mod and .vmr files (if '
+                            'requested) in <product>/<site>/vertical and <product>/<site>/vmrs-vertical.')
+    iogrp.add_argument('--chem-path', default=None,
+                       help='Path to the chemistry FP(-IT) files. Must be a directory with subdirectory Nv containing '
+                            'the chm netCDF files. If not given, it is assumed that these files are stored with the '
+                            'regular met data.')
+    iogrp.add_argument('--mode', choices=mod_maker._new_modmaker_modes, default=mod_maker._default_mode,
+                       help='Which GEOS files to use. Default is %(default)s.')
+    iogrp.add_argument('--write-mod', action='store_true', dest='write_mods',
+                       help='Also write the .mod files.')
+    iogrp.add_argument('--write-vmr', action='store_true', dest='write_vmrs',
+                       help='Also write the .vmr files.')
+    iogrp.add_argument('-k', '--keep-latlon-prec', action='store_true',
+                       help='Use 2 decimal places for lat/lon in the output file names, rather than rounding to the '
+                            'nearest degree.')
+
+    sitegrp = p.add_argument_group('Location', 'Arguments specifying which site/location to generate .map files for')
+    sitegrp.add_argument('--site', dest='site_abbrev',
+                         help='Which TCCON site to generate priors for. If not given, priors are generated for all '
+                              'TCCON sites. If --lat, --lon, and --alt are given, this may be any abbreviation and is '
+                              'only used in the file names.')
+    sitegrp.add_argument('--lat', type=float, dest='site_lat', help='Latitude of a custom location.')
+    sitegrp.add_argument('--lon', type=float, dest='site_lon',
+                         help='Longitude of a custom location in degrees east. Values should be positive; i.e. 90 W '
+                              'should be given as 270.')
+    sitegrp.add_argument('--alt', type=float, dest='site_alt', help='Altitude of a custom location in meters.')
+
+    priorgrp = p.add_argument_group('Priors', 'Arguments controlling the prior profiles')
+    priorgrp.add_argument('-b', '--base-vmr-file', dest='std_vmr_file',
+                          help='The summer 35N .vmr file that has base profiles, seasonal cycles, latitude gradients, '
+                               'and secular trends for all gases. This is used to fill in the secondary gases.')
+    priorgrp.add_argument('-i', '--integral-file', dest='zgrid',
+                          help='Path to an integral file that defined the altitude grid to place the priors on.')
+    priorgrp.add_argument('--mlo-smo-files-json', dest='mlo_smo_files',
+                          help='A JSON file that configures which files to read MLO/SMO data from. The top level must '
+                               'be a dictionary with lowercase gas names as keys. The values must be dictionaries with '
+                               '"mlo_file" and "smo_file" as keys, with their values being paths to the files to read.')
+
+    fmtgrp = p.add_argument_group('Format', 'Control the format of the output file')
+    fmtgrp.add_argument('-f', '--map-fmt', choices=('nc', 'txt'), default='nc',
+                        help='Select the output format for the .map files, "nc" for netCDF for "txt" for the legacy '
+                             'text format. Default is "%(default)s".')
+    fmtgrp.add_argument('-d', '--dry', action='store_true',
+                        help='Save the priors as dry mole fraction instead of wet. Note that TCCON uses wet mole '
+                             'fractions in the retrieval.')
+    fmtgrp.add_argument('-c', '--req-cfunits', action='store_true',
+                        help='Require that CFUnits be successfully imported. This is used to enforce CF unit '
+                             'conventions in netCDF output files.')
+
+    othergrp = p.add_argument_group('Other', 'Additional arguments')
+    othergrp.add_argument('-n', '--nprocs', default=0, type=int,
+                          help='Number of processes to use to make the .mod profiles for different GEOS times and the '
+                               '.vmr profiles in parallel. Default is 0, i.e. run in serial.')
+    othergrp.add_argument('-q', '--quiet', dest='muted', action='store_true',
+                          help='Suppress log output to command line.')
+    mod_maker._add_eqlat_cache_args(othergrp)
+    p.set_defaults(driver_fxn=mod_vmr_map_driver)
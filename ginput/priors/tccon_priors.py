@@ -55,27 +55,33 @@ from __future__ import print_function, division
 
 from abc import abstractmethod
 import argparse
-from collections import OrderedDict
+from contextlib import contextmanager
 from copy import deepcopy
 import datetime as dt
 import json
+from multiprocessing import Pool
 from pathlib import Path
 from typing import Optional, Union
 
 from dateutil.relativedelta import relativedelta
 from glob import glob
+from hashlib import sha1
+import itertools
 import netCDF4 as ncdf
 import numpy as np
 import os
 import pandas as pd
 import re
+import threading
 
-from scipy.interpolate import LinearNDInterpolator
+from scipy.signal import fftconvolve
+from scipy.spatial import Delaunay
 import xarray as xr
 
 from ..mod_maker import tccon_sites
-from ..common_utils import mod_utils, ioutils, readers, writers, run_utils, mod_constants as const
+from ..common_utils import mod_utils, ioutils, readers, writers, run_utils, bundles, mod_constants as const
 from ..common_utils.ggg_logging import logger
+from .. import __version__
 
 GGGPathError = mod_utils.GGGPathError
 
@@ -140,6 +146,240 @@ class GasRecordDateError(GasRecordError):
     pass
 
 
+class LutRegistry(object):
+    """
+    An in-process registry of the lookup tables in the ginput data directory.
+
+    Each table is read from disk the first time it is requested and kept as plain numpy arrays, so that functions
+    called for every profile (e.g. to add the mesospheric CO or find the tropospheric equivalent latitude) do not need
+    to open the netCDF file each time. A table is reloaded if its file changes: the file's size and modification time
+    are checked on every request, and if those change, the table is reloaded unless its SHA1 hash is unchanged.
+
+    Tables are registered by name with a function that returns the path to the default file (so that the path is looked
+    up when needed, rather than when registered) and a function that reads a file into a dictionary. Arrays in that
+    dictionary are made read-only because they are shared by every caller; anything that needs to modify them must copy
+    them first.
+
+    Access is protected by a lock, so one registry may be used by multiple threads. Each process has its own tables;
+    calling :meth:`preload` before starting worker processes with ``fork`` lets all the workers share the parent's
+    copy rather than each reading the files.
+    """
+    def __init__(self):
+        self._loaders = dict()
+        self._tables = dict()
+        self._lock = threading.RLock()
+
+    def register(self, name, default_file, loader):
+        """
+        Add a lookup table to the registry.
+
+        :param name: the name to request the table by.
+        :type name: str
+
+        :param default_file: a function with no arguments that returns the path to the file to load if none is given
+         when requesting the table.
+        :type default_file: callable
+
+        :param loader: a function that takes the path to a file and returns the table as a dictionary.
+        :type loader: callable
+
+        :return: None
+        """
+        with self._lock:
+            self._loaders[name] = (default_file, loader)
+
+    @property
+    def names(self):
+        """
+        The names of all the registered tables.
+        """
+        return tuple(self._loaders.keys())
+
+    def get(self, name, lut_file=None):
+        """
+        Get a lookup table, loading it if it is not yet loaded or its file has changed.
+
+        :param name: which table to get, must be one of :attr:`names`.
+        :type name: str
+
+        :param lut_file: the file to load the table from. If not given, the table's default file is used.
+        :type lut_file: str
+
+        :return: the table, as a dictionary. This dictionary is shared and must not be modified.
+        :rtype: dict
+        """
+        default_file, loader = self._loaders[name]
+        if lut_file is None:
+            lut_file = default_file()
+        lut_file = os.path.abspath(lut_file)
+        key = (name, lut_file)
+
+        with self._lock:
+            file_stat = os.stat(lut_file)
+            file_stat = (file_stat.st_size, file_stat.st_mtime_ns)
+            entry = self._tables.get(key)
+            if entry is not None and entry['stat'] == file_stat:
+                return entry['table']
+
+            file_hash = ioutils.make_dependent_file_hash(lut_file)
+            if entry is not None and entry['sha1'] == file_hash:
+                entry['stat'] = file_stat
+                return entry['table']
+
+            logger.debug('Loading {} lookup table from {}'.format(name, lut_file))
+            table = loader(lut_file)
+            for value in table.values():
+                if isinstance(value, np.ndarray):
+                    value.setflags(write=False)
+            self._tables[key] = {'stat': file_stat, 'sha1': file_hash, 'table': table}
+            return table
+
+    def preload(self, names=None):
+        """
+        Load lookup tables from their default files now, rather than when they are first needed.
+
+        :param names: which tables to load. If not given, all registered tables are loaded.
+        :type names: sequence(str)
+
+        :return: None
+        """
+        for name in (self.names if names is None else names):
+            self.get(name)
+
+    def memory_usage(self):
+        """
+        Report how much memory the loaded tables' arrays use.
+
+        :return: a dictionary with (name, file) tuples as keys and the number of bytes used by that table's arrays as
+         values.
+        :rtype: dict
+        """
+        with self._lock:
+            return {key: sum(_lut_nbytes(value) for value in entry['table'].values())
+                    for key, entry in self._tables.items()}
+
+    def clear(self):
+        """
+        Remove all loaded tables from memory. They will be reloaded the next time they are requested.
+
+        :return: None
+        """
+        with self._lock:
+            self._tables.clear()
+
+
+def _lut_nbytes(value):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    elif isinstance(value, dict):
+        return sum(_lut_nbytes(v) for v in value.values())
+    elif hasattr(value, '__dict__'):
+        return sum(v.nbytes for v in vars(value).values() if isinstance(v, np.ndarray))
+    else:
+        return 0
+
+
+def _dataarray_to_lut(data_array):
+    """
+    Convert a :class:`xarray.DataArray` to a dictionary of numpy arrays that :func:`_lut_to_dataarray` can rebuild it
+    from.
+    """
+    return {'data': data_array.data, 'dims': data_array.dims,
+            'coords': {dim: data_array[dim].data for dim in data_array.dims if dim in data_array.coords}}
+
+
+def _lut_to_dataarray(lut, copy=False):
+    """
+    Rebuild a :class:`xarray.DataArray` from a dictionary created by :func:`_dataarray_to_lut`. Set ``copy`` to
+    ``True`` if the array will be modified.
+    """
+    data = lut['data'].copy() if copy else lut['data']
+    return xr.DataArray(data, dims=lut['dims'], coords=lut['coords'])
+
+
+def _load_clams_lut(clams_file):
+    clams_dat = dict()
+    with ncdf.Dataset(clams_file, 'r') as clams:
+        clams_dat['eqlat'] = np.ma.getdata(clams.variables['lat'][:])
+        clams_dat['theta'] = np.ma.getdata(clams.variables['extended_theta'][:])
+        clams_dat['doy'] = np.ma.getdata(clams.variables['doy'][:])
+
+        # The original CLAMS file provided by Arlyn only went up to 2000 K. At first we tried just using the top
+        # for greater potential temperatures, but that led to too-great N2O values at those levels. We now
+        # extrapolate using the three end points to calculate a slope of age vs. theta. This calculation takes some
+        # time, so we've added the extended age to the CLAMS file using backend_analysis.clams.modify_clams_file().
+        clams_dat['age'] = np.ma.getdata(clams.variables['extended_age'][:])
+
+    clams_dat['eqlat_grid'], clams_dat['theta_grid'] = np.meshgrid(clams_dat['eqlat'], clams_dat['theta'])
+    if clams_dat['eqlat_grid'].shape != clams_dat['age'].shape[1:] or clams_dat['theta_grid'].shape != clams_dat['age'].shape[1:]:
+        raise RuntimeError('Failed to create equivalent lat/theta grids the same shape as CLAMS age')
+
+    clams_dat['lookup'] = ClamsAgeLookup.from_clams_dict(clams_dat)
+    return clams_dat
+
+
+def _load_theta_v_lat_lut(theta_v_lat_file):
+    theta_v_lat = dict()
+    with ncdf.Dataset(theta_v_lat_file, 'r') as nch:
+        theta_v_lat['theta'] = np.ma.getdata(nch.variables['theta_mean'][:]).squeeze()
+        lat_tmp = np.ma.getdata(nch.variables['latitude_mean'][:]).squeeze()
+        # Sometimes lats near 0 get read in as very small non-zero numbers. This causes a
+        # problem later when we select all lats in one hemisphere since the equator needs
+        # to be in both hemispheres for this to work
+        lat_tmp[np.abs(lat_tmp) < 0.001] = 0.0
+        theta_v_lat['lat'] = lat_tmp
+        theta_v_lat['times'] = np.ma.getdata(nch.variables['times'][:])
+        theta_v_lat['times_units'] = nch.variables['times'].units
+        theta_v_lat['times_calendar'] = nch.variables['times'].calendar
+
+        # Read the pressure range that we're using
+        theta_v_lat['pres_range'] = _read_pres_range(nch)
+
+    # Append the first time slice (which will be the first two weeks of the year) to the end so that we can
+    # intepolate past the last date, assuming that the changes are cyclical. At the same time, let's record the
+    # year used in the dates
+    new_time = ncdf.num2date(theta_v_lat['times'][0], theta_v_lat['times_units'], theta_v_lat['times_calendar'])
+    theta_v_lat['year'] = year = new_time.year
+    new_time = ncdf.date2num(new_time.replace(year=year+1), theta_v_lat['times_units'], theta_v_lat['times_calendar'])
+    theta_v_lat['times'] = np.concatenate([theta_v_lat['times'], [new_time]], axis=0)
+    for k in ('theta', 'lat'):
+        theta_v_lat[k] = np.concatenate([theta_v_lat[k], theta_v_lat[k][0:1, :]], axis=0)
+
+    return theta_v_lat
+
+
+def _load_ch4_hf_slopes_lut(lut_file):
+    with xr.open_dataset(lut_file) as nch:
+        try:
+            bin_names = [''.join(row) for row in nch.variables['bin_names'][:].T.data]
+        except TypeError:
+            # For some reason, some version of xarray read this variable properly as a 2D array of string
+            # objects, others (ostensibly with the same version) read it as a 2D array of 0D arrays, which
+            # contain the strings. In the latter case we need to extract the strings from the 0D arrays
+            # before we can join them.
+            bin_names = [''.join(el.item() for el in row) for row in nch.variables['bin_names'][:].T.data]
+
+        return {'bin_names': bin_names,
+                'ch4_hf_slopes': _dataarray_to_lut(nch['ch4_hf_slopes'].load()),
+                'slope_fit_params': _dataarray_to_lut(nch['slope_fit_params'].load())}
+
+
+def _load_dataset_luts(*variables):
+    def loader(lut_file):
+        with xr.open_dataset(lut_file) as ds:
+            return {k: _dataarray_to_lut(ds[k].load()) for k in variables}
+    return loader
+
+
+lut_registry = LutRegistry()
+lut_registry.register('clams', lambda: _clams_file, _load_clams_lut)
+lut_registry.register('theta_v_lat', lambda: _theta_v_lat_file, _load_theta_v_lat_lut)
+lut_registry.register('excess_co', lambda: _excess_co_file, _load_dataset_luts('co', 'co_nd', 'nair', 'altitude'))
+lut_registry.register('ch4_hf_slopes', lambda: HFTropicsRecord.ch4_hf_slopes_file, _load_ch4_hf_slopes_lut)
+lut_registry.register('ace_fn2o', lambda: N2OTropicsRecord._ace_fn2o_file, _load_dataset_luts('fn2o'))
+lut_registry.register('fn2o_fch4', lambda: CH4TropicsRecord._fn2o_fch4_lut_file, _load_dataset_luts('fch4'))
+
+
 def _init_prof(profs, n_lev, n_profs=0, fill_val=np.nan):
     """
     Initialize arrays for various profiles.
@@ -174,6 +414,277 @@ def _init_prof(profs, n_lev, n_profs=0, fill_val=np.nan):
         return profs
 
 
+def _interp_lut_pointwise(lut, coords, points):
+    """
+    Linearly interpolate a lookup table to individual points, extrapolating linearly beyond its coordinates.
+
+    This gives the same values as interpolating ``lut`` along each dimension in turn (e.g. with
+    :meth:`xarray.DataArray.interp` and ``fill_value='extrapolate'``) then picking out the value for each point, but
+    never computes the values for every combination of point coordinates.
+
+    :param lut: the n-dimensional lookup table.
+    :type lut: :class:`numpy.ndarray`
+
+    :param coords: the n coordinate vectors of the lookup table, each sorted in ascending order. Dimensions with a
+     single coordinate are not interpolated along.
+    :type coords: sequence(:class:`numpy.ndarray`)
+
+    :param points: the n coordinate arrays of the points, all the same shape.
+    :type points: sequence(:class:`numpy.ndarray`)
+
+    :return: the values at the points, with the same shape as the arrays in ``points``.
+    :rtype: :class:`numpy.ndarray`
+    """
+    # For each dimension, find the indices and weights of the two table values on either side of each point. Like
+    # scipy's interp1d, points beyond the ends use the first or last pair of coordinates, which extrapolates.
+    dim_inds = []
+    dim_weights = []
+    for coord, pts in zip(coords, points):
+        coord = np.asarray(coord, dtype=float)
+        pts = np.asarray(pts, dtype=float)
+        if coord.size == 1:
+            dim_inds.append((np.zeros(pts.shape, dtype=int),))
+            dim_weights.append((np.ones(pts.shape),))
+            continue
+        i_hi = np.clip(np.searchsorted(coord, pts), 1, coord.size - 1)
+        i_lo = i_hi - 1
+        wt = (pts - coord[i_lo]) / (coord[i_hi] - coord[i_lo])
+        dim_inds.append((i_lo, i_hi))
+        dim_weights.append((1 - wt, wt))
+
+    values = np.zeros(np.shape(points[0]))
+    for corner in itertools.product(*[range(len(inds)) for inds in dim_inds]):
+        corner_inds = tuple(inds[c] for inds, c in zip(dim_inds, corner))
+        corner_wt = np.prod([wts[c] for wts, c in zip(dim_weights, corner)], axis=0)
+        values += corner_wt * lut[corner_inds]
+    return values
+
+
+def _forward_interp_weights(x_out, x):
+    """
+    Compute the indices and weights to linearly interpolate values defined at ``x`` to ``x_out``.
+
+    This matches how pandas' index interpolation fills in missing values by default: points before the first of ``x``
+    are left unfilled and points after the last of ``x`` take the last value. The interpolated values are
+    ``y[i_lo] * (1 - weight) + y[i_hi] * weight`` where ``xx_out`` is ``True``.
+
+    :param x_out: the coordinates to interpolate to.
+    :type x_out: :class:`numpy.ndarray`
+
+    :param x: the coordinates of the values to interpolate, sorted in ascending order.
+    :type x: :class:`numpy.ndarray`
+
+    :return: the lower and upper indices into ``x``, the weights, and a boolean array that is ``True`` for points in
+     ``x_out`` that get a value.
+    :rtype: :class:`numpy.ndarray` x 4
+    """
+    if x.size == 1:
+        i_hi = np.zeros(x_out.shape, dtype=int)
+        return i_hi, i_hi, np.zeros(x_out.shape), x_out >= x[0]
+
+    i_hi = np.clip(np.searchsorted(x, x_out, side='right'), 1, x.size - 1)
+    i_lo = i_hi - 1
+    weight = np.clip((x_out - x[i_lo]) / (x[i_hi] - x[i_lo]), 0.0, 1.0)
+    return i_lo, i_hi, weight, x_out >= x[0]
+
+
+def _convolve_valid(series, kernels):
+    """
+    Convolve one series with several kernels at once.
+
+    This gives the same result as ``np.convolve(series, k, mode='valid')`` for each row ``k`` of ``kernels`` (to within
+    floating point precision), but uses FFTs to do all of them together. As with :func:`numpy.convolve`, NaNs in
+    ``series`` make any output value that depends on them NaN and a kernel with any NaNs gives all NaNs.
+
+    :param series: the 1D series to convolve.
+    :type series: :class:`numpy.ndarray`
+
+    :param kernels: the kernels, one per row. Must be shorter than ``series``.
+    :type kernels: :class:`numpy.ndarray`
+
+    :return: an array with one row per kernel and ``series.size - kernels.shape[1] + 1`` columns.
+    :rtype: :class:`numpy.ndarray`
+    """
+    series_nans = np.isnan(series)
+    kernel_nans = np.any(np.isnan(kernels), axis=1)
+    result = fftconvolve(np.where(series_nans, 0.0, series)[np.newaxis, :], np.where(np.isnan(kernels), 0.0, kernels),
+                         mode='valid', axes=1)
+
+    # Each output value n uses series[n:n+nkern], so count the NaNs in each of those windows
+    nkern = kernels.shape[1]
+    nan_cumsum = np.concatenate([[0], np.cumsum(series_nans)])
+    window_has_nans = (nan_cumsum[nkern:] - nan_cumsum[:-nkern]) > 0
+    result[:, window_has_nans] = np.nan
+    result[kernel_nans, :] = np.nan
+    return result
+
+
+# Optional ancillary profiles that the batch prior functions accept as nlev-by-nprof arrays and that must be passed
+# one column at a time to the single profile functions.
+_batch_profile_kws = ('profs_latency', 'prof_aoa', 'prof_world_flag', 'prof_gas_date', 'gas_record_dates')
+
+
+def _select_mod_profile(mod_data, index):
+    """
+    Extract one profile's data from a dictionary of stacked .mod data.
+
+    :param mod_data: stacked .mod data, as returned by :func:`stack_mod_data`.
+    :type mod_data: dict
+
+    :param index: which profile to extract.
+    :type index: int
+
+    :return: a dictionary structured like the output of :func:`~readers.read_mod_file` for the one profile. The profile
+     arrays are views into the stacked arrays.
+    :rtype: dict
+    """
+    profile_data = dict()
+    for group, group_data in mod_data.items():
+        if group == 'profile':
+            profile_data[group] = {k: v[:, index] for k, v in group_data.items()}
+        else:
+            profile_data[group] = {k: v[index] for k, v in group_data.items()}
+    return profile_data
+
+
+def _select_profile_kws(kwargs, index):
+    """
+    Pass through keyword arguments for one profile, selecting that profile's column from any batched ancillary arrays.
+    """
+    profile_kws = dict()
+    for k, v in kwargs.items():
+        if k == 'contexts':
+            # the batch methods take one PriorContext per profile, the single profile methods just that profile's
+            k, v = 'context', None if v is None else v[index]
+        elif k in _batch_profile_kws and v is not None:
+            v = v[:, index]
+        profile_kws[k] = v
+    return profile_kws
+
+
+def _stack_ancillary(ancillary_dicts):
+    """
+    Stack a list of per-profile ancillary dictionaries into one dictionary.
+
+    Only keys present in every dictionary are kept. Profile values are stacked into nlev-by-nprof arrays and scalar
+    values into nprof-element vectors.
+    """
+    if len(ancillary_dicts) == 0:
+        return dict()
+    keys = set(ancillary_dicts[0].keys()).intersection(*ancillary_dicts[1:])
+    return {k: np.stack([np.asarray(d[k]) for d in ancillary_dicts], axis=-1) for k in keys}
+
+
+class PriorContext(object):
+    """
+    The species-independent quantities for one prior profile.
+
+    Every trace gas record needs some of the same quantities derived from the .mod data, such as the tropopause altitude
+    or the CLAMS age of air. When priors for many gases are generated for the same profile, one instance of this class
+    can be given to each record so that these are only computed once. Each quantity is computed the first time it is
+    requested. Arrays are made read-only because they are shared by every record; copy them before modifying.
+
+    :param mod_data: the .mod data for the profile, as a dictionary from :func:`~readers.read_mod_file`.
+    :type mod_data: dict
+
+    :param obs_date: the UTC date of the profile, as given to the records' ``add_trop_prior`` and ``add_strat_prior``
+     methods.
+    :type obs_date: :class:`datetime.datetime`
+
+    :param obs_lat: the latitude of the profile. If not given, the "obs_lat" constant in ``mod_data`` is used.
+    :type obs_lat: float
+    """
+    def __init__(self, mod_data, obs_date, obs_lat=None):
+        self.mod_data = mod_data
+        self.obs_date = obs_date
+        self.obs_lat = mod_data['constants']['obs_lat'] if obs_lat is None else obs_lat
+        self._values = dict()
+
+    @property
+    def tropopause_alt(self):
+        """The altitude (km) of the blended tropopause, interpolated from the tropopause pressure."""
+        if 'tropopause_alt' not in self._values:
+            self._values['tropopause_alt'] = mod_utils.interp_tropopause_height_from_pressure(
+                self.mod_data['scalar']['TROPPB'], self.mod_data['profile']['Pressure'],
+                self.mod_data['profile']['Height']
+            )
+        return self._values['tropopause_alt']
+
+    @property
+    def trop_eqlat(self):
+        """The tropospheric equivalent latitude and mid-tropospheric potential temperature, see :func:`get_trop_eq_lat`."""
+        if 'trop_eqlat' not in self._values:
+            self._values['trop_eqlat'] = get_trop_eq_lat(self.mod_data['profile']['PT'],
+                                                         self.mod_data['profile']['Pressure'], self.obs_lat,
+                                                         self.obs_date)
+        return self._values['trop_eqlat']
+
+    @property
+    def clams_age(self):
+        """The CLAMS age of air (years) on each level of the profile, see :func:`get_clams_age`."""
+        if 'clams_age' not in self._values:
+            retrieval_doy = int(mod_utils.clams_day_of_year(self.obs_date))
+            age = get_clams_age(self.mod_data['profile']['PT'], self.mod_data['profile']['EqL'], retrieval_doy,
+                                as_timedelta=False)
+            age.setflags(write=False)
+            self._values['clams_age'] = age
+        return self._values['clams_age']
+
+    @staticmethod
+    def stacked_clams_age(contexts):
+        """
+        Get the CLAMS ages of air for several profiles.
+
+        The ages for any contexts that do not have them yet are computed with a single call to :func:`get_clams_age`
+        and stored in those contexts.
+
+        :param contexts: the contexts for the profiles, which must all have the same number of levels.
+        :type contexts: list(:class:`PriorContext`)
+
+        :return: nlev-by-nprof array of ages, in years.
+        :rtype: :class:`numpy.ndarray`
+        """
+        missing = [c for c in contexts if 'clams_age' not in c._values]
+        if len(missing) > 0:
+            theta = np.stack([c.mod_data['profile']['PT'] for c in missing], axis=1)
+            eqlat = np.stack([c.mod_data['profile']['EqL'] for c in missing], axis=1)
+            retrieval_doys = np.array([int(mod_utils.clams_day_of_year(c.obs_date)) for c in missing])
+            ages = get_clams_age(theta, eqlat, retrieval_doys[np.newaxis, :], as_timedelta=False)
+            for i, context in enumerate(missing):
+                age = ages[:, i].copy()
+                age.setflags(write=False)
+                context._values['clams_age'] = age
+        return np.stack([c.clams_age for c in contexts], axis=1)
+
+    @classmethod
+    def for_profiles(cls, mod_data, obs_dates, obs_lats=None):
+        """
+        Create the contexts for each profile in stacked .mod data.
+
+        :param mod_data: the stacked .mod data, as returned by :func:`stack_mod_data`.
+        :type mod_data: dict
+
+        :param obs_dates: the UTC dates of the profiles.
+        :type obs_dates: sequence(:class:`datetime.datetime`)
+
+        :param obs_lats: the latitudes of the profiles. If not given, the "obs_lat" constants in ``mod_data`` are used.
+        :type obs_lats: array-like
+
+        :return: one context per profile.
+        :rtype: list(:class:`PriorContext`)
+        """
+        if obs_lats is None:
+            obs_lats = mod_data['constants']['obs_lat']
+        return [cls(_select_mod_profile(mod_data, i), obs_dates[i], obs_lats[i]) for i in range(len(obs_dates))]
+
+
+def _get_prior_context(context, mod_data, obs_date, obs_lat=None):
+    """
+    Return ``context`` if one was given, otherwise a new :class:`PriorContext` for this profile.
+    """
+    return PriorContext(mod_data, obs_date, obs_lat) if context is None else context
+
+
 class TraceGasRecord(object):
     # these should be overridden in subclasses to specify the name and unit of the gas. The name will be used by the
     # seasonal cycle function to determine if it uses the CO2 parameterization or the default one, and the seasonal
@@ -238,6 +749,66 @@ class TraceGasRecord(object):
         """
         pass
 
+    def add_trop_prior_batch(self, prof_gas, obs_dates, obs_lats, mod_data, **kwargs):
+        """
+        Add the tropospheric component of the prior to many profiles at once.
+
+        The default implementation calls :meth:`add_trop_prior` on each profile in turn. Subclasses that can compute the
+        priors for all profiles together should override this.
+
+        :param prof_gas: nlev-by-nprof array of profiles to modify. Modified in-place.
+        :type prof_gas: :class:`numpy.ndarray`
+
+        :param obs_dates: nprof-element sequence of the UTC dates of the profiles.
+
+        :param obs_lats: nprof-element sequence of the latitudes of the profiles.
+
+        :param mod_data: the stacked .mod data, as returned by :func:`stack_mod_data`.
+        :type mod_data: dict
+
+        :param kwargs: additional keywords for :meth:`add_trop_prior`. Optional ancillary profiles (e.g.
+         ``profs_latency``) must be nlev-by-nprof arrays. ``contexts`` may be a list of one :class:`PriorContext` per
+         profile; each profile's is passed on as ``context``.
+
+        :return: the modified gas profiles and a dictionary of ancillary information, with the per-profile values
+         stacked along the last dimension.
+        """
+        ancillary = []
+        for i in range(np.shape(prof_gas)[1]):
+            _, this_ancillary = self.add_trop_prior(prof_gas[:, i], obs_dates[i], obs_lats[i],
+                                                    _select_mod_profile(mod_data, i), **_select_profile_kws(kwargs, i))
+            ancillary.append(this_ancillary)
+        return prof_gas, _stack_ancillary(ancillary)
+
+    def add_strat_prior_batch(self, prof_gas, retrieval_dates, mod_data, **kwargs):
+        """
+        Add the stratospheric component of the prior to many profiles at once.
+
+        The default implementation calls :meth:`add_strat_prior` on each profile in turn. Subclasses that can compute
+        the priors for all profiles together should override this.
+
+        :param prof_gas: nlev-by-nprof array of profiles to modify. Modified in-place.
+        :type prof_gas: :class:`numpy.ndarray`
+
+        :param retrieval_dates: nprof-element sequence of the UTC dates of the profiles.
+
+        :param mod_data: the stacked .mod data, as returned by :func:`stack_mod_data`.
+        :type mod_data: dict
+
+        :param kwargs: additional keywords for :meth:`add_strat_prior`. Optional ancillary profiles (e.g.
+         ``profs_latency``) must be nlev-by-nprof arrays. ``contexts`` may be a list of one :class:`PriorContext` per
+         profile; each profile's is passed on as ``context``.
+
+        :return: the modified gas profiles and a dictionary of ancillary information, with the per-profile values
+         stacked along the last dimension.
+        """
+        ancillary = []
+        for i in range(np.shape(prof_gas)[1]):
+            _, this_ancillary = self.add_strat_prior(prof_gas[:, i], retrieval_dates[i], _select_mod_profile(mod_data, i),
+                                                     **_select_profile_kws(kwargs, i))
+            ancillary.append(this_ancillary)
+        return prof_gas, _stack_ancillary(ancillary)
+
 
 class MloSmoTraceGasRecord(TraceGasRecord):
     """
@@ -281,6 +852,13 @@ class MloSmoTraceGasRecord(TraceGasRecord):
      recalculated. Default is ``None``, which will save the LUT if recalculated unless it was recalculated to cover the
      time frame requested. This option has no effect if the stratospheric lookup table is read from the netCDF file.
     :type save_strat: bool or None
+
+    :param strat_cache_dir: optional, a directory shared between runs to cache stratospheric lookup tables in. Whenever
+     the LUT would need to be recalculated (including when forced by ``recalculate_strat_lut`` or custom dates), a
+     table in this directory computed from the same MLO/SMO and code files, dates, and ginput version is loaded instead
+     if one exists, and newly calculated tables are added to it. Entries are written atomically, so concurrent runs
+     may share the same directory. This is independent of ``save_strat``. If ``None`` (default), no cache is used.
+    :type strat_cache_dir: str or None
     """
 
     # The lifetime is used to account for chemical loss between emission and the prior location. Setting to infinity
@@ -334,7 +912,8 @@ class MloSmoTraceGasRecord(TraceGasRecord):
         return self._last_record_date(self.conc_seasonal)
 
     def __init__(self, first_date=None, last_date=None, truncate_date=None, lag=None, mlo_file=None, smo_file=None,
-                 strat_age_scale=1.0, recalculate_strat_lut=None, save_strat=None, recalc_if_custom_dates=True):
+                 strat_age_scale=1.0, recalculate_strat_lut=None, save_strat=None, recalc_if_custom_dates=True,
+                 strat_cache_dir=None):
         has_custom_dates = first_date is not None or last_date is not None or truncate_date is not None
         first_date, last_date, self.sbc_lag, mlo_file, smo_file = self._init_helper(first_date, last_date, lag, mlo_file, smo_file)
         self.mlo_file = mlo_file
@@ -346,6 +925,11 @@ class MloSmoTraceGasRecord(TraceGasRecord):
         # leave the latency
         self.conc_trend = self.conc_seasonal.rolling(self.months_avg_for_trend, center=True).mean().dropna().drop('interp_flag', axis=1)
 
+        # Keep the monthly values as plain arrays as well, so that looking up the concentrations for the dates needed by
+        # each profile is just a call to np.interp rather than a series of pandas operations.
+        self._monthly_tables = {False: self._make_monthly_table(self.conc_seasonal),
+                                True: self._make_monthly_table(self.conc_trend)}
+
         # For the stratosphere, we need a lookup table that contains concentrations for given dates and ages. (Some
         # species may depend on additional variables, such as potential temperature.) This calculation involves
         # convolving the age spectra with the concentration record, so can be quite time consuming. To speed things up,
@@ -396,8 +980,25 @@ class MloSmoTraceGasRecord(TraceGasRecord):
 
         # May enter this if recalculation required by user, dependencies, or dates.
         if recalculate_strat_lut:
-            logger.info('Calculating {} strat LUT'.format(self.gas_name))
-            self.conc_strat = self._calc_age_spec_gas(self.conc_seasonal, lag=self.sbc_lag)
+            self.conc_strat = None
+            cache_file, cache_attrs = None, None
+            if strat_cache_dir is not None:
+                cache_file, cache_attrs = self._get_strat_cache_entry(strat_cache_dir, first_date, last_date,
+                                                                      truncate_date)
+                if cache_file is not None:
+                    self.conc_strat = self._load_cached_strat_arrays(cache_file, cache_attrs)
+
+            if self.conc_strat is None:
+                logger.info('Calculating {} strat LUT'.format(self.gas_name))
+                self.conc_strat = self._calc_age_spec_gas(self.conc_seasonal, lag=self.sbc_lag)
+                if cache_file is not None:
+                    try:
+                        self._save_strat_arrays(lut_file=cache_file, extra_attrs=cache_attrs)
+                    except PermissionError:
+                        logger.important('Could not add the {} strat LUT to the cache in {} due to a permission '
+                                         'error'.format(self.gas_name, strat_cache_dir))
+                    else:
+                        logger.important('Cached {} strat LUT as "{}"'.format(self.gas_name, cache_file))
             if save_strat:
                 try:
                     self._save_strat_arrays()
@@ -678,6 +1279,26 @@ class MloSmoTraceGasRecord(TraceGasRecord):
         return add_strat_prior_standard(gas_record=self, prof_gas=prof_gas, retrieval_date=retrieval_date,
                                         mod_data=mod_data, **kwargs)
 
+    def add_trop_prior_batch(self, prof_gas, obs_dates, obs_lats, mod_data, use_adjusted_zgrid=True, **kwargs):
+        """
+        Add the tropospheric component of the prior to many profiles at once.
+
+        See the help for :func:`add_trop_prior_standard_batch` in this module. All the inputs and outputs are the same
+        except that ``gas_record`` will be given this instance.
+        """
+        return add_trop_prior_standard_batch(gas_record=self, prof_gas=prof_gas, obs_dates=obs_dates, obs_lats=obs_lats,
+                                             mod_data=mod_data, use_adjusted_zgrid=use_adjusted_zgrid, **kwargs)
+
+    def add_strat_prior_batch(self, prof_gas, retrieval_dates, mod_data, **kwargs):
+        """
+        Add the stratospheric component of the prior to many profiles at once.
+
+        See the help for :func:`add_strat_prior_standard_batch` in this module. All the inputs and outputs are the same
+        except that ``gas_record`` will be given this instance.
+        """
+        return add_strat_prior_standard_batch(gas_record=self, prof_gas=prof_gas, retrieval_dates=retrieval_dates,
+                                              mod_data=mod_data, **kwargs)
+
     def add_extra_column(self, prof_gas, retrieval_date, mod_data, **kwargs):
 
         return prof_gas, dict()
@@ -904,70 +1525,67 @@ class MloSmoTraceGasRecord(TraceGasRecord):
             # 1950 is the year Arlyn Andrews used in her code. That will cause some NaNs at the beginning of the
             # record before our gas records start, but that's fine.
             new_index = np.arange(1950.0, max_dec_year, delt)
-            conv_dates = None
-            old_shape = -1  # will be initialized properly the first time through the loop
-
-            for ispec in range(spectra.shape[0]):
-                for itheta in range(n_theta):
-                    # The first step is to put the trace gas record on the same time resolution as the age spectra. This
-                    # is necessary for the convolution to work. Note that the age spectra aren't assigned to any
-                    # specific date, we just need the adjacent points in the age spectra and gas record to have the same
-                    # spacing in time.
-                    # To handle the reindexing properly, we need to keep the original rows in until we handle the
-                    # interpolation to the new values. For this part we need to use the decimal years as the index
-                    # and (as of 2022-08-30, pandas 1.4.3), remove columns that we don't need to allow the index
-                    # interpolation method to work
-                    tmp_index = np.unique(np.concatenate([df_lagged['dec_year'], new_index]))
-                    df_asi = df_lagged.set_index('dec_year', drop=False)[['dmf_mean']].reindex(tmp_index).interpolate(method='index').reindex(new_index)
-
-                    # Now we can do the convolution. Note: in Arlyn's original R code, she had to flip the age spectrum
-                    # to act as the convolution kernel, but testing showed that in order to get the same answer using
-                    # numpy's convolution function we had to leave the spectrum unflipped.
-                    #
-                    # This is because the numpy convolution operation acts to flip the kernel internally. It is defined
-                    # as
-                    #
-                    # (a * v)[n] = \sum_{m=-\infty}^{\infty} a[m]v[n-m]
-                    #
-                    # Note that v is indexed with n-m. This has the effect of reversing the kernel; for n=10, a[11] gets
-                    # multiplied by v[9], a[12] by v[8] and so on. R's convolve function uses a different indexing
-                    # pattern that does not reverse the kernel.
-                    #
-                    # We want the kernel reversed because the trace gas records are defined from old to new, while the
-                    # age spectra are from new to old. Therefore, we need to reverse the spectra before convolving to
-                    # actually put both in the same direction.
-                    conv_result = np.convolve(df_asi['dmf_mean'].values.squeeze(), spectra.iloc[ispec, :].values,
-                                              mode='valid')
-                    if conv_dates is None:
-                        conv_dates = new_index[(spectra.shape[1] - 1):]
-                        # The call to dec_year_to_dtindex was ~80% of the time for this function when it was being
-                        # called in every loop. There should be no reason to recalculate on every loop; the spectra
-                        # should not be changing size and should therefore always give results on the same dates
-                        conv_dates = cls._dec_year_to_dtindex(conv_dates, force_first_of_month=False)
-                        old_shape = spectra.shape[1]
-                    elif spectra.shape[1] != old_shape:
-                        raise NotImplementedError('Different spectra have different lengths; this is not allowed as '
-                                                  'currently implemented')
-
-                    # Finally we put the age-convolved gas concentration back onto the dates of the input dataframe,
-                    # unless alternate dates were specified.
-                    conv_df = pd.DataFrame(conv_result, index=conv_dates)
-                    tmp_index = np.unique(np.concatenate([out_dates, conv_dates]))
-                    this_out_df = conv_df.reindex(tmp_index).interpolate(method='index').reindex(out_dates)
-
-                    # And store this result in the output data frame, remembering that we added an extra row at the
-                    # beginning for zero age air, and again using broadcasting.
-                    #
-                    # We also deal with adding in any chemical loss here because we determine chemical loss from ACE
-                    # data with respect to the mean age of the air, therefore we need to lookup the fraction remaining
-                    # for that mean age, rather than apply it in the same convolution as the age spectra.
-                    out_array[:, ispec+1, itheta] = this_out_df.reindex(out_dates).to_numpy().squeeze() * fgas.isel(age=ispec, theta=itheta).item()
+
+            # The first step is to put the trace gas record on the same time resolution as the age spectra. This is
+            # necessary for the convolution to work. Note that the age spectra aren't assigned to any specific date,
+            # we just need the adjacent points in the age spectra and gas record to have the same spacing in time.
+            # This is the same for every spectrum, so only needs done once. As with pandas' index interpolation, dates
+            # before the first valid value are left as NaNs.
+            rec_years = df_lagged['dec_year'].to_numpy(dtype=float)
+            rec_dmf = df_lagged['dmf_mean'].to_numpy(dtype=float)
+            xx_rec = ~np.isnan(rec_dmf)
+            gas_series = np.interp(new_index, rec_years[xx_rec], rec_dmf[xx_rec])
+            gas_series[new_index < rec_years[xx_rec][0]] = np.nan
+
+            # Now we can do the convolution for all the spectra at once. Note: in Arlyn's original R code, she had to
+            # flip the age spectrum to act as the convolution kernel, but testing showed that in order to get the same
+            # answer using numpy's convolution function we had to leave the spectrum unflipped.
+            #
+            # This is because the numpy convolution operation acts to flip the kernel internally. It is defined
+            # as
+            #
+            # (a * v)[n] = \sum_{m=-\infty}^{\infty} a[m]v[n-m]
+            #
+            # Note that v is indexed with n-m. This has the effect of reversing the kernel; for n=10, a[11] gets
+            # multiplied by v[9], a[12] by v[8] and so on. R's convolve function uses a different indexing
+            # pattern that does not reverse the kernel.
+            #
+            # We want the kernel reversed because the trace gas records are defined from old to new, while the
+            # age spectra are from new to old. Therefore, we need to reverse the spectra before convolving to
+            # actually put both in the same direction. The FFT convolution is defined the same way as numpy's.
+            conv_result = _convolve_valid(gas_series, spectra.to_numpy(dtype=float))
+
+            # The spectra all have the same length and therefore give results on the same dates.
+            conv_dates = new_index[(spectra.shape[1] - 1):]
+            conv_dates = cls._dec_year_to_dtindex(conv_dates, force_first_of_month=False)
+
+            # Finally we put the age-convolved gas concentration back onto the dates of the input dataframe, unless
+            # alternate dates were specified. Every spectrum has NaNs in the same places (where the convolution
+            # reached back before the start of the record), so the same interpolation weights work for all of them.
+            conv_times = conv_dates.values.astype('datetime64[ns]').view('i8').astype(float)
+            out_times = pd.DatetimeIndex(out_dates).values.astype('datetime64[ns]').view('i8').astype(float)
+            valid = np.any(~np.isnan(conv_result), axis=0)
+            out_conv = np.full((n_dates, conv_result.shape[0]), np.nan)
+            if np.any(valid):
+                i_lo, i_hi, weight, xx_out = _forward_interp_weights(out_times, conv_times[valid])
+                valid_conv = conv_result[:, valid].T
+                weight = weight[xx_out, np.newaxis]
+                out_conv[xx_out] = valid_conv[i_lo[xx_out]] * (1 - weight) + valid_conv[i_hi[xx_out]] * weight
+
+            # And store this result in the output data frame, remembering that we added an extra row at the beginning
+            # for zero age air, and using broadcasting for theta.
+            #
+            # We also deal with adding in any chemical loss here because we determine chemical loss from ACE data with
+            # respect to the mean age of the air, therefore we need to lookup the fraction remaining for that mean age,
+            # rather than apply it in the same convolution as the age spectra.
+            fgas_data = fgas.transpose('age', 'theta').data
+            out_array[:, 1:] = out_conv[:, :, np.newaxis] * fgas_data[np.newaxis, :spectra.shape[0], :]
 
             gas_conc[region] = out_array
 
         return gas_conc
 
-    def _save_strat_arrays(self):
+    def _save_strat_arrays(self, lut_file=None, extra_attrs=None):
         # We can't just merge the different region's stratospheric concentration DataArrays into a single dataset
         # because that required that the arrays have the dimensions with the same names be the same, and the age
         # coordinate is not. We'll need to convert the coordinates to region-specific names and save that dataset.
@@ -985,12 +1603,24 @@ class MloSmoTraceGasRecord(TraceGasRecord):
 
         # Add some extra attributes - we want to record how this was created (esp. the commit hash) as well as the
         # SHA1 hashes of the MLO and SMO files so that we can verify that those haven't changed.
-        save_ds.attrs['history'] = ioutils.make_creation_info(self.get_strat_lut_file())
+        lut_file = self.get_strat_lut_file() if lut_file is None else lut_file
+        save_ds.attrs['history'] = ioutils.make_creation_info(lut_file)
         for att_name, file_path in self.list_strat_dependent_files().items():
             save_ds.attrs[att_name] = ioutils.make_dependent_file_hash(file_path)
-        save_ds.to_netcdf(self.get_strat_lut_file())
-
-    def _have_strat_array_deps_changed(self, dependent_files=None, lut_file=None):
+        if extra_attrs is not None:
+            save_ds.attrs.update(extra_attrs)
+
+        # Write under a temporary name then move into place so that other processes reading this LUT (especially from
+        # a shared cache directory) never see a partially written file.
+        tmp_file = '{}.{}.tmp'.format(lut_file, os.getpid())
+        try:
+            save_ds.to_netcdf(tmp_file)
+            os.replace(tmp_file, lut_file)
+        finally:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+    def _have_strat_array_deps_changed(self, dependent_files=None, lut_file=None, expected_attrs=None):
         """
         Check if dependencies for the strat LUTs have changed.
 
@@ -1002,8 +1632,12 @@ class MloSmoTraceGasRecord(TraceGasRecord):
         :param lut_file: the LUT netCDF file. If omitted, the path returned by ``cls.get_strat_lut_file()`` is used.
         :type lut_file: str
 
-        :return: ``True`` if the dependencies have changed (meaning a hash is different, the file doesn't exist, or one
-         of the expected files is missing), ``False`` otherwise.
+        :param expected_attrs: optional, a dictionary of other root level attributes that must have the given values
+         in the LUT netCDF file, such as the dates stored in strat LUT cache entries.
+        :type expected_attrs: dict
+
+        :return: ``True`` if the dependencies have changed (meaning a hash is different, the file doesn't exist, one
+         of the expected files is missing, or one of the ``expected_attrs`` differs), ``False`` otherwise.
         :rtype: bool
         """
         def check_hash(file_path, hash):
@@ -1028,8 +1662,94 @@ class MloSmoTraceGasRecord(TraceGasRecord):
                                      'generated'.format(dep_file=att_name, lut_file=lut_file))
                     return True
 
+            expected_attrs = dict() if expected_attrs is None else expected_attrs
+            for att_name, att_value in expected_attrs.items():
+                if ds.attrs.get(att_name) != att_value:
+                    logger.important('{att} in {lut_file} is {file_value}, expected {value}; strat LUT needs '
+                                     'regenerated'.format(att=att_name, lut_file=lut_file,
+                                                          file_value=ds.attrs.get(att_name), value=att_value))
+                    return True
+
             return False
 
+    def _get_strat_cache_entry(self, cache_dir, first_date, last_date, truncate_date):
+        """
+        Find the file in a strat LUT cache directory that a LUT for this record would be stored in.
+
+        Cache entries are keyed by the SHA1 hashes of the files returned by :meth:`list_strat_dependent_files` (the
+        MLO/SMO files and code modules), the first, last, and truncation dates of the record, the stratospheric boundary
+        condition lag, and the ginput version.
+
+        :param cache_dir: the cache directory. Will be created if it does not exist.
+        :type cache_dir: str
+
+        :param first_date: the first date of the record, after adjustment by :meth:`_init_helper`.
+        :type first_date: datetime-like
+
+        :param last_date: the last date of the record, after adjustment by :meth:`_init_helper`.
+        :type last_date: datetime-like
+
+        :param truncate_date: the date the MLO/SMO data were truncated at, may be ``None``.
+        :type truncate_date: datetime-like or None
+
+        :return: the path to the cache file (which may not exist yet) and the dictionary of attributes that identify the
+         entry, which must be stored in and checked against the cache file. If any of the dependency files is missing,
+         the LUT cannot be cached and ``(None, None)`` is returned.
+        :rtype: str, dict
+        """
+        dep_hashes = dict()
+        for att_name, file_path in self.list_strat_dependent_files().items():
+            if file_path is None or not os.path.isfile(file_path):
+                logger.important('Strat LUT dependency {} ({}) does not exist, so the {} strat LUT will not be cached'
+                                 .format(att_name, file_path, self.gas_name))
+                return None, None
+            dep_hashes[att_name] = ioutils.make_dependent_file_hash(file_path)
+
+        def fmt_date(date):
+            return 'none' if date is None else pd.Timestamp(date).isoformat()
+
+        cache_attrs = {'strat_first_date': fmt_date(first_date),
+                       'strat_last_date': fmt_date(last_date),
+                       'mlo_smo_truncate_date': fmt_date(truncate_date),
+                       'sbc_lag': str(self.sbc_lag),
+                       'ginput_version': __version__}
+
+        key_parts = [self.gas_name]
+        key_parts.extend('{}={}'.format(k, v) for k, v in sorted(dep_hashes.items()))
+        key_parts.extend('{}={}'.format(k, v) for k, v in sorted(cache_attrs.items()))
+        key = sha1(':'.join(key_parts).encode('utf8')).hexdigest()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        cache_file = os.path.join(cache_dir, '{}_strat_lut_{}.nc'.format(self.gas_name, key))
+        return cache_file, cache_attrs
+
+    def _load_cached_strat_arrays(self, cache_file, cache_attrs):
+        """
+        Load a strat LUT from a cache entry, if it exists and is still valid.
+
+        :param cache_file: the cache file, returned by :meth:`_get_strat_cache_entry`.
+        :type cache_file: str
+
+        :param cache_attrs: the identifying attributes for the entry, returned by :meth:`_get_strat_cache_entry`.
+        :type cache_attrs: dict
+
+        :return: the strat LUT dictionary, or ``None`` if the entry does not exist or could not be used.
+        :rtype: dict or None
+        """
+        if not os.path.exists(cache_file):
+            return None
+
+        try:
+            if self._have_strat_array_deps_changed(lut_file=cache_file, expected_attrs=cache_attrs):
+                return None
+            conc_strat = self._load_strat_arrays(lut_file=cache_file)
+        except (OSError, KeyError, ValueError) as err:
+            logger.warning('Could not read cached strat LUT {} ({}), will recompute it'.format(cache_file, err))
+            return None
+
+        logger.important('Loaded {} strat LUT from cache file "{}"'.format(self.gas_name, cache_file))
+        return conc_strat
+
     @classmethod
     def _load_strat_arrays(cls, lut_file=None):
         strat_dict = dict()
@@ -1064,8 +1784,9 @@ class MloSmoTraceGasRecord(TraceGasRecord):
         """
         Get stratospheric gas concentration for a given profile
 
-        :param date: the UTC date of the observation
-        :type date: datetime-like
+        :param date: the UTC date of the observation. May also be an array of dates the same shape as ``ages``, which
+         allows getting concentrations for levels from many profiles in one call.
+        :type date: datetime-like or array-like of datetimes
 
         :param ages: the age or ages of air (in years) to get concentration for. Must be the same shape as ``eqlat``.
         :type ages: array-like
@@ -1074,30 +1795,22 @@ class MloSmoTraceGasRecord(TraceGasRecord):
          ``ages``.
         :type eqlat: array-like
 
-        :param theta: the potential temperature profile associated with the prior. Only required if the
+        :param theta: the potential temperature profile associated with the prior. Only required if the stratospheric
+         lookup table has a theta dependence.
 
         :param as_dataframe: if ``True``, the gas concentration will be returned as a data frame. If ``False``, it will
          be returned as an array if ``ages`` and ``eqlat`` were arrays or a float if they were floats.
         :type as_dataframe: bool
 
         :return: the gas concentration as a data frame, numpy array, or scalar, depending on ``as_dataframe`` and the
-         input types. Also returns None, a placeholder for future information about profile latency, etc.
-        :rtype: float, :class:`numpy.ndarray`, or :class:`pandas.DataFrame`
+         input types. Also returns a dictionary with the dates in the MLO/SMO record that each level's gas came from and
+         the latency of those dates.
+        :rtype: float, :class:`numpy.ndarray`, or :class:`pandas.DataFrame`, and dict
         """
 
         ages = np.array(ages) * self.strat_age_scale
         eqlat = np.array(eqlat)
 
-        ancillary_dict = dict()
-
-        # Calculate the latency
-        age_rdeltas = mod_utils.frac_years_to_reldelta(ages)
-        # We need to subtract the lag, because we're looking up against dates that have been already shifted forward
-        # by that lag. That is, the age 0 air in the strat table for 1 Mar 2019 corresponds to the MLO/SMO record from
-        # 1 Jan 2019.
-        ancillary_dict['gas_record_dates'] = np.array([pd.Timestamp(date - a - self.sbc_lag) for a in age_rdeltas])
-        ancillary_dict['latency'] = self.get_latency_by_date(ancillary_dict['gas_record_dates'])
-
         if theta is None:
             # make it an array just to make the input checking easier
             theta = np.full_like(ages, self._no_theta_coord.item())
@@ -1109,43 +1822,40 @@ class MloSmoTraceGasRecord(TraceGasRecord):
         elif ages.ndim != 1 or eqlat.ndim != 1 or theta.ndim != 1:
             raise ValueError('ages, eqlat, and (if given) theta expected to be 1D arrays or convertible to 1D arrays')
 
+        point_dates = pd.DatetimeIndex(np.broadcast_to(np.asarray(date, dtype='datetime64[ns]'), ages.shape))
+
+        ancillary_dict = dict()
+
+        # Calculate the latency. We need to subtract the lag, because we're looking up against dates that have been
+        # already shifted forward by that lag. That is, the age 0 air in the strat table for 1 Mar 2019 corresponds to
+        # the MLO/SMO record from 1 Jan 2019.
+        record_dates = mod_utils.subtract_reldelta(mod_utils.subtract_frac_years(point_dates.values, ages), self.sbc_lag)
+        ancillary_dict['gas_record_dates'] = pd.DatetimeIndex(record_dates).to_numpy(dtype=object)
+        ancillary_dict['latency'] = self.get_latency_by_date(ancillary_dict['gas_record_dates'])
+
         # Get the concentrations for the given ages and equivalent latitudes for each region (tropics, midlat, and
         # vortex). We'll stitch them together after.
+        #
+        # We need to extrapolate because there can be ages outside those defined in the strat table or thetas just
+        # outside the bin center. Extrapolating along each physical dimension (rather than extrapolating the profile at
+        # the end) keeps the trend along each of them: for example, if age in the last bin is just out of the range in
+        # the strat table and has a big jump from the bin below, extrapolating the CO2 profile would lose the decrease
+        # at the top because the profile below could be flat, while extrapolating along the age dimension captures the
+        # fact that the age is actually lower at the top. _interp_lut_pointwise does the same linear interpolation and
+        # extrapolation along date, age, and theta that interpolating the xarray table along one dimension after another
+        # did, but only for the actual levels, not every combination of them. The theta dimension only has one
+        # coordinate when the table has no theta dependence, in which case it is not interpolated along.
         gas_by_region = dict()
-
-        # We only want to interpolate dimensions that an actual effect on the lookup table. So if the theta dimension
-        # has length 1, we can't interpolate along that dimension. We used to use xarray.DataArrays for ages and theta
-        # to create a dummy dimension "level" so that we could index along that later. However, that stopped working 
-        # with v. 2022.06 of xarray. Now we just use regular interpolation and numpy advanced indexing to extract the
-        # diagonal. A numpy array *should* be fine to return. We use an ordered dictionary to ensure interpolation 
-        # happens in the same order all the time (though shouldn't be an issue for Python versions past ~3.6).
-        interp_dims = OrderedDict([('date', date), ('age', ages)])
-        if self.strat_has_theta_dep:
-            interp_dims['theta'] = theta
-
         for region in self.age_spec_regions:
-            region_arr = self.conc_strat[region]
-            # We need to extrapolate because there can be ages outside those defined in the strat table or thetas just
-            # outside the bin center. We can't extrapolate in multiple dimensions, so we need to iterate over the dims
-            # and do each separately. It's better to do that that to handle extrapolation at the end once we have the
-            # profile because if we did that we lose the trend along each physical dimension. For example, if age in the
-            # last bin is just out of the range in the strat table and has a big jump from the bin below, extrapolating
-            # the CO2 profile would lose the decrease at the top because the profile below could be flat, while
-            # extrapolating along the age dimension captures the fact that the age is actually lower at the top.
-            tmp_arr = region_arr
-            for dim_name, dim_coords in interp_dims.items():
-                tmp_arr = tmp_arr.interp(method='linear', kwargs={'fill_value': 'extrapolate'}, **{dim_name: dim_coords})
-            # needed to handle cases without theta dependence - removes theta dimension
-            tmp_arr = tmp_arr.squeeze().data
-
-            # Interpolating each dimension in sequence like this leaves each dimension that had a non-scalar target for
-            # interpolation, so we need to get the diagonal which is the actual profile.
-            # Also we make diag_inds instead of using np.diag b/c the latter doesn't work in >2 dimensions.
-            diag_inds = tuple([np.arange(tmp_arr.shape[0])]*tmp_arr.ndim)
-            gas_by_region[region] = tmp_arr[diag_inds]
+            region_arr = self.conc_strat[region].transpose('date', 'age', 'theta')
+            lut_dates = region_arr['date'].data
+            one_day = np.timedelta64(1, 'D')
+            coords = [(lut_dates - lut_dates[0]) / one_day, region_arr['age'].data, region_arr['theta'].data]
+            points = [(point_dates.values - lut_dates[0]) / one_day, ages, theta]
+            gas_by_region[region] = _interp_lut_pointwise(region_arr.data, coords, points)
 
         gas_conc = gas_by_region['midlat']
-        doy = mod_utils.day_of_year(date) + 1  # most of the code from Arlyn Andrews assumes Jan 1 -> DOY = 1
+        doy = point_dates.dayofyear.to_numpy()  # most of the code from Arlyn Andrews assumes Jan 1 -> DOY = 1
         xx_tropics = mod_utils.is_tropics(eqlat, doy, ages)
         xx_vortex = mod_utils.is_vortex(eqlat, doy, ages)
 
@@ -1153,20 +1863,37 @@ class MloSmoTraceGasRecord(TraceGasRecord):
         gas_conc[xx_vortex] = gas_by_region['vortex'][xx_vortex]
 
         if as_dataframe:
-            return gas_conc.to_dataframe(name='dmf_mean').drop(['theta', 'date'], axis=1), ancillary_dict
+            return pd.DataFrame({'dmf_mean': gas_conc}, index=pd.Index(ages, name='age')), ancillary_dict
         else:
             return gas_conc.squeeze(), ancillary_dict
 
+    @staticmethod
+    def _make_monthly_table(df):
+        """
+        Convert a monthly concentration data frame into the arrays used by :meth:`get_gas_for_dates`.
+
+        :param df: the data frame with the monthly concentrations, indexed by the first of each month, with at least the
+         columns "dmf_mean" and "latency".
+        :type df: :class:`pandas.DataFrame`
+
+        :return: a dictionary with the dates as nanoseconds since 1970 ("times"), the concentrations ("dmf_mean"), and
+         the latencies ("latency") as contiguous float arrays.
+        :rtype: dict
+        """
+        return {'times': np.ascontiguousarray(df.index.values.astype('datetime64[ns]').view('i8'), dtype=float),
+                'dmf_mean': np.ascontiguousarray(df['dmf_mean'].to_numpy(), dtype=float),
+                'latency': np.ascontiguousarray(df['latency'].to_numpy(), dtype=float)}
+
     def get_gas_for_dates(self, dates, deseasonalize=False, as_dataframe=False):
         """
         Get trace gas concentrations for one or more dates.
 
-        This method will lookup concentrations for a specific date or dates, interpolating between the monthly values as
-        necessary.
+        This method will lookup concentrations for a specific date or dates, interpolating linearly in time between the
+        monthly values as necessary.
 
         :param dates: the date or dates to get concentrations for. If giving a single date, it may be any time that can
-         be converted to a Pandas :class:`~pandas.Timestamp`. If giving a series of dates, it must be a
-         :class:`pandas.DatetimeIndex`.
+         be converted to a Pandas :class:`~pandas.Timestamp`. If giving multiple dates, it may be a
+         :class:`pandas.DatetimeIndex` or any array-like of dates that can be converted to one.
 
         :param deseasonalize: whether to draw concentrations data from the trend only (``True``) or the seasonal cycle
          (``False``).
@@ -1178,55 +1905,43 @@ class MloSmoTraceGasRecord(TraceGasRecord):
 
         :return: the concentration data for the requested date(s), as a numpy vector or data frame. The data frame will
          also include the latency (how many years the concentrations had to be extrapolated).
+        :raises GasRecordDateError: if any of the dates are outside the record.
         """
         # Make inputs consistent: we expect dates to be a Pandas DatetimeIndex, but it may be a single timestamp or
-        # datetime. For now, we will not allow collections of datetimes, such inputs must be converted to DatetimeIndex
-        # instances before being passed in.
+        # datetime, or a collection of dates.
         if not isinstance(dates, pd.DatetimeIndex):
             try:
-                timestamp_in = pd.Timestamp(dates)
+                if np.ndim(dates) > 0:
+                    dates = pd.DatetimeIndex(dates)
+                else:
+                    dates = pd.DatetimeIndex([pd.Timestamp(dates)])
             except (ValueError, TypeError):
-                raise ValueError('dates must be a Pandas DatetimeIndex or an object convertible to a Pandas Timestamp. '
-                                 'Objects of type {} are not supported'.format(type(dates).__name__))
-            else:
-                dates = pd.DatetimeIndex([timestamp_in])
-
-        start_date = dates.min()
-        end_date = dates.max()
-
-        # Need to make sure we get data that bracket the start and end date, so set them the first days of month
-        start_date_subset = mod_utils.start_of_month(start_date, out_type=pd.Timestamp)
-        end_date_subset = mod_utils.start_of_month(end_date + relativedelta(months=1), out_type=pd.Timestamp)
-
-        # First get just monthly data. freq='MS' gives us monthly data at the start of the month. Use the existing logic
-        # to extrapolate the record for a given month if needed.
-        monthly_idx = pd.date_range(start_date_subset, end_date_subset, freq='MS')
-        monthly_df = pd.DataFrame(index=monthly_idx, columns=['dmf_mean', 'latency'], dtype=float)
-        for timestamp in monthly_df.index:
-            monthly_df.dmf_mean[timestamp], info_dict = self.get_gas_by_month(timestamp.year, timestamp.month, deseasonalize=deseasonalize)
-            monthly_df.latency[timestamp] = info_dict['latency']
-
-        # Now we resample to the dates requested, making sure to keep the values at the start of each month on either
-        # end of the record to ensure interpolation is successful
-        sample_date_idx = dates.copy()
-        sample_date_idx = sample_date_idx.append(monthly_idx)
-        sample_date_idx = sample_date_idx.sort_values()  # is needed for successful interpolation
-        sample_date_idx = pd.unique(sample_date_idx)  # deal with the possibility that one of the requested dates was a month start
-        df_resampled = monthly_df.reindex(sample_date_idx)
-
-        # Verify we have non-NaN values for all monthly reference points
-        if df_resampled['dmf_mean'][monthly_idx].isna().any():
-            raise RuntimeError('Failed to resample concentrations for date range {} to {}; first and/or last point is NA'
-                               .format(start_date_subset, end_date_subset))
-
-        df_resampled.interpolate(method='index', inplace=True)
-
-        # Return with just the originally requested dates
-        df_resampled = df_resampled.reindex(dates)
+                raise ValueError('dates must be a Pandas DatetimeIndex or an object convertible to a Pandas Timestamp '
+                                 'or DatetimeIndex. Objects of type {} are not supported'.format(type(dates).__name__))
+
+        table = self._monthly_tables[bool(deseasonalize)]
+        times = table['times']
+        date_values = dates.values.astype('datetime64[ns]').view('i8').astype(float)
+
+        # Each date must be bracketed by the first days of its month and the next month. Since the table has every
+        # month, that just means each date must be between the first and last months.
+        if date_values.size > 0:
+            first_ind = np.searchsorted(times, date_values.min(), side='right') - 1
+            last_ind = np.searchsorted(times, date_values.max(), side='right')
+            if first_ind < 0 or last_ind >= times.size:
+                raise GasRecordDateError('Dates from {} to {} are not entirely within the {} record ({} to {})'.format(
+                    dates.min(), dates.max(), self.gas_name, pd.Timestamp(int(times[0])), pd.Timestamp(int(times[-1]))
+                ))
+            if np.any(np.isnan(table['dmf_mean'][first_ind:last_ind+1])):
+                raise RuntimeError('Failed to resample concentrations for date range {} to {}; first and/or last point '
+                                   'is NA'.format(pd.Timestamp(int(times[first_ind])), pd.Timestamp(int(times[last_ind]))))
+
+        dmf_mean = np.interp(date_values, times, table['dmf_mean'])
         if as_dataframe:
-            return df_resampled
+            latency = np.interp(date_values, times, table['latency'])
+            return pd.DataFrame({'dmf_mean': dmf_mean, 'latency': latency}, index=dates)
         else:
-            return df_resampled['dmf_mean'].values
+            return dmf_mean
 
     def avg_gas_in_date_range(self, start_date, end_date, deseasonalize=False):
         """
@@ -1288,9 +2003,8 @@ class MloSmoTraceGasRecord(TraceGasRecord):
         :return: the concentration data for the requested date(s), as a numpy vector or data frame. The data frame will
          also include the latency (how many years the concentrations had to be extrapolated).
         """
-        gas_dates = [ref_date - dt.timedelta(days=a*365.25) for a in age]
-        return self.get_gas_for_dates(pd.DatetimeIndex(gas_dates), deseasonalize=deseasonalize,
-                                      as_dataframe=as_dataframe)
+        gas_dates = np.array([ref_date - dt.timedelta(days=a*365.25) for a in np.atleast_1d(age)], dtype='datetime64[ns]')
+        return self.get_gas_for_dates(gas_dates, deseasonalize=deseasonalize, as_dataframe=as_dataframe)
 
     def get_gas_by_month(self, year, month, deseasonalize=False):
         """
@@ -1395,14 +2109,13 @@ class MidlatTraceGasRecord(TraceGasRecord):
         self._ref_lat = vmr_info['scalar']['lat_vmr'].item()
         self._ref_decimal_date = vmr_info['scalar']['date_vmr'].item()
 
-    def add_trop_prior(self, prof_gas, obs_date, obs_lat, mod_data, use_theta_eqlat=True, **kwargs):
+    def add_trop_prior(self, prof_gas, obs_date, obs_lat, mod_data, use_theta_eqlat=True, context=None, **kwargs):
+        context = _get_prior_context(context, mod_data, obs_date, obs_lat)
         obs_doy = mod_utils.day_of_year(obs_date)
         itcz_lat, itcz_width = self.calc_itcz(lon_obs=mod_data['file']['lon'], doy_obs=obs_doy)
 
         z = mod_data['profile']['Height']
-        p = mod_data['profile']['Pressure']
-        ptrop = mod_data['scalar']['TROPPB']
-        ztrop = mod_utils.interp_tropopause_height_from_pressure(p_trop_met=ptrop, p_met=p, z_met=z)
+        ztrop = context.tropopause_alt
 
         # I kept the geographic lat here because this is doing both the troposphere and stratosphere. This could
         # potentially be updated to happen separately in the troposphere and stratosphere methods and use the
@@ -1412,7 +2125,7 @@ class MidlatTraceGasRecord(TraceGasRecord):
 
         xx_trop = z < ztrop
         if use_theta_eqlat:
-            trop_eqlat, midtrop_theta = get_trop_eq_lat(prof_theta=mod_data['profile']['PT'], p_levels=p, obs_lat=obs_lat, obs_date=obs_date)
+            trop_eqlat, midtrop_theta = context.trop_eqlat
         else:
             trop_eqlat = obs_lat
             midtrop_theta = np.nan
@@ -1428,19 +2141,17 @@ class MidlatTraceGasRecord(TraceGasRecord):
         # TODO: add what ancillary data is available.
         return prof_gas, dict(midtrop_theta=midtrop_theta)
 
-    def add_strat_prior(self, prof_gas, retrieval_date, mod_data, **kwargs):
+    def add_strat_prior(self, prof_gas, retrieval_date, mod_data, context=None, **kwargs):
+        context = _get_prior_context(context, mod_data, retrieval_date)
         z = mod_data['profile']['Height']
-        p = mod_data['profile']['Pressure']
-        ptrop = mod_data['scalar']['TROPPB']
-        ztrop = mod_utils.interp_tropopause_height_from_pressure(p_trop_met=ptrop, p_met=p, z_met=z)
+        ztrop = context.tropopause_alt
 
         prof_theta = mod_data['profile']['PT']
         prof_eqlat = mod_data['profile']['EqL']
-        retrieval_doy = int(mod_utils.clams_day_of_year(retrieval_date))
 
         xx_strat = z >= ztrop
         xx_middleworld = np.zeros(prof_theta.shape, dtype=np.bool_)
-        age_of_air_years = get_clams_age(prof_theta, prof_eqlat, retrieval_doy, as_timedelta=False)
+        age_of_air_years = context.clams_age
         xx_middleworld[xx_strat & np.isnan(age_of_air_years)] = True
         age_of_air_years = age_of_air_years[xx_strat]
 
@@ -1599,19 +2310,10 @@ class HFTropicsRecord(MloSmoTraceGasRecord):
 
     @classmethod
     def _load_ch4_hf_slopes(cls):
-        with xr.open_dataset(cls.ch4_hf_slopes_file) as nch:
-            try:
-                bin_names = [''.join(row) for row in nch.variables['bin_names'][:].T.data]
-            except TypeError:
-                # For some reason, some version of xarray read this variable properly as a 2D array of string
-                # objects, others (ostensibly with the same version) read it as a 2D array of 0D arrays, which
-                # contain the strings. In the latter case we need to extract the strings from the 0D arrays
-                # before we can join them.
-                bin_names = [''.join(el.item() for el in row) for row in nch.variables['bin_names'][:].T.data]
-
-            slopes = nch['ch4_hf_slopes']
-            fit_params = nch['slope_fit_params']
-        return bin_names, slopes, fit_params
+        lut = lut_registry.get('ch4_hf_slopes', cls.ch4_hf_slopes_file)
+        slopes = _lut_to_dataarray(lut['ch4_hf_slopes'])
+        fit_params = _lut_to_dataarray(lut['slope_fit_params'])
+        return list(lut['bin_names']), slopes, fit_params
 
     @classmethod
     def _calc_hf_from_ch4(cls, ch4_concs, ch4_record, year, ch4_hf_slopes, ch4_hf_fit_params, lag, use_ace_specific_slopes=False):
@@ -1742,21 +2444,20 @@ class N2OTropicsRecord(MloSmoTraceGasRecord):
             row[nans] = np.interp(row_age[nans], row_age[~nans], row[~nans])
             return row
 
-        with xr.open_dataset(cls._ace_fn2o_file) as dset:
-            fn2o_lut = dset['fn2o']
+        fn2o_lut = _lut_to_dataarray(lut_registry.get('ace_fn2o', cls._ace_fn2o_file)['fn2o'], copy=True)
 
-            # Yes, this is filling in a different direction than the CH4 method. There it makes sense to extend along
-            # theta, because (a) we don't expect much data beyond the available theta range from ACE and (b) plotted
-            # against theta, the curves are flat parabolas, so a constant extrapolation is reasonable. Here, it makes
-            # sense to extrapolate along the age b/c the curves converge at higher theta, so choosing a neighboring
-            # age bin's curve should be a good approximation.
-            for i in range(fn2o_lut.theta.size):
-                fn2o_lut[{'theta': i}] = fill_nans(fn2o_lut.age, fn2o_lut.isel(theta=i))
+        # Yes, this is filling in a different direction than the CH4 method. There it makes sense to extend along
+        # theta, because (a) we don't expect much data beyond the available theta range from ACE and (b) plotted
+        # against theta, the curves are flat parabolas, so a constant extrapolation is reasonable. Here, it makes
+        # sense to extrapolate along the age b/c the curves converge at higher theta, so choosing a neighboring
+        # age bin's curve should be a good approximation.
+        for i in range(fn2o_lut.theta.size):
+            fn2o_lut[{'theta': i}] = fill_nans(fn2o_lut.age, fn2o_lut.isel(theta=i))
 
-            # ages is assumed to be a simple numpy array. We'll extrapolate in order to get the very youngest and oldest
-            # ages that might be just outside the bin centers. Just in case, fill in any NaNs along the theta dimension
-            # (was necessary for CH4, might not be here).
-            fn2o_lut = fn2o_lut.interp(age=ages, kwargs={'fill_value': 'extrapolate'}).interpolate_na('theta')
+        # ages is assumed to be a simple numpy array. We'll extrapolate in order to get the very youngest and oldest
+        # ages that might be just outside the bin centers. Just in case, fill in any NaNs along the theta dimension
+        # (was necessary for CH4, might not be here).
+        fn2o_lut = fn2o_lut.interp(age=ages, kwargs={'fill_value': 'extrapolate'}).interpolate_na('theta')
 
         return fn2o_lut
 
@@ -1798,33 +2499,32 @@ class CH4TropicsRecord(MloSmoTraceGasRecord):
 
         # Then get the relationship between F(N2O) and F(CH4) derived from ACE-FTS data. This lookup table was created
         # using `backend_analysis/ace_fts_analysis.make_fch4_fn2o_lookup_table()`.
-        with xr.open_dataset(cls._fn2o_fch4_lut_file) as dset:
-            fch4_lut = dset['fch4']
-
-            # Extrapolate out to all thetas before interpolating to F(N2O). If we don't do this first, then we'll lose
-            # information at higher thetas. Say we need to interpolate to F(N2O) = 0.03 and the F(N2O) = 0.025 bin goes
-            # out to theta = 3500, but the F(N2O) = 0.075 bin only goes to theta = 2500. Then F(N2O) = 0.03 will get
-            # NaNs for theta > 2500 and lose any information from F(N2O) = 0.025 past theta = 2500, despite being closer
-            # to the F(N2O) = 0.025 bin.
-            for j in range(fch4_lut.shape[0]):
-                fch4_lut[j, :] = replace_end_nans(fch4_lut[j, :])
-
-            # Now that F(N2O) has both age and theta as axes, we need to deal with that. Unfortunately, we can't handle
-            # the interpolation along both axes in one shot, so we need to iterate over the theta values that we want
-            # the F(CH4) LUT to have, interpolate F(N2O) to those to get a vector with the same length as ages, then
-            # interpolate each theta row of F(CH4) to the F(N2O) values for each age.
-            fch4_lut_final = xr.DataArray(np.full([np.size(ages), np.size(fch4_lut.theta)], np.nan),
-                                          coords=[ages, fch4_lut.theta], dims=('age', 'theta'))
-            for itheta, this_theta in enumerate(fch4_lut.theta):
-                this_fn2o = fn2o.interp(theta=this_theta, kwargs={'fill_value': 'extrapolate'})
-                this_fch4 = fch4_lut[{'theta': itheta}]
-                # Use constant value extrapolation past the edge of the FN2O values in the LUT. Doing this rather than
-                # linear extrapolation prevents undershooting the F(CH4) at high theta.
-                fill_values = (this_fch4[0], this_fch4[-1])
-                fch4_lut_final[{'theta': itheta}] = this_fch4.interp(fn2o=this_fn2o, kwargs={'fill_value': fill_values})
-
-            # Fill in NaNs along each theta line
-            fch4_lut_final = fch4_lut_final.interpolate_na('theta')
+        fch4_lut = _lut_to_dataarray(lut_registry.get('fn2o_fch4', cls._fn2o_fch4_lut_file)['fch4'], copy=True)
+
+        # Extrapolate out to all thetas before interpolating to F(N2O). If we don't do this first, then we'll lose
+        # information at higher thetas. Say we need to interpolate to F(N2O) = 0.03 and the F(N2O) = 0.025 bin goes
+        # out to theta = 3500, but the F(N2O) = 0.075 bin only goes to theta = 2500. Then F(N2O) = 0.03 will get
+        # NaNs for theta > 2500 and lose any information from F(N2O) = 0.025 past theta = 2500, despite being closer
+        # to the F(N2O) = 0.025 bin.
+        for j in range(fch4_lut.shape[0]):
+            fch4_lut[j, :] = replace_end_nans(fch4_lut[j, :])
+
+        # Now that F(N2O) has both age and theta as axes, we need to deal with that. Unfortunately, we can't handle
+        # the interpolation along both axes in one shot, so we need to iterate over the theta values that we want
+        # the F(CH4) LUT to have, interpolate F(N2O) to those to get a vector with the same length as ages, then
+        # interpolate each theta row of F(CH4) to the F(N2O) values for each age.
+        fch4_lut_final = xr.DataArray(np.full([np.size(ages), np.size(fch4_lut.theta)], np.nan),
+                                      coords=[ages, fch4_lut.theta], dims=('age', 'theta'))
+        for itheta, this_theta in enumerate(fch4_lut.theta):
+            this_fn2o = fn2o.interp(theta=this_theta, kwargs={'fill_value': 'extrapolate'})
+            this_fch4 = fch4_lut[{'theta': itheta}]
+            # Use constant value extrapolation past the edge of the FN2O values in the LUT. Doing this rather than
+            # linear extrapolation prevents undershooting the F(CH4) at high theta.
+            fill_values = (this_fch4[0], this_fch4[-1])
+            fch4_lut_final[{'theta': itheta}] = this_fch4.interp(fn2o=this_fn2o, kwargs={'fill_value': fill_values})
+
+        # Fill in NaNs along each theta line
+        fch4_lut_final = fch4_lut_final.interpolate_na('theta')
 
         return fch4_lut_final
 
@@ -1850,6 +2550,21 @@ class CH4TropicsRecord(MloSmoTraceGasRecord):
             prof_gas[prof_gas < 0] = 0
         return prof_gas, ancillary_dict
 
+    def add_strat_prior_batch(self, prof_gas, retrieval_dates, mod_data, **kwargs):
+        prof_gas, ancillary_dict = super(CH4TropicsRecord, self).add_strat_prior_batch(prof_gas=prof_gas,
+                                                                                       retrieval_dates=retrieval_dates,
+                                                                                       mod_data=mod_data,
+                                                                                       **kwargs)
+        # same fix for negative values in the top level(s) as add_strat_prior
+        if np.any(prof_gas < 0):
+            for iprof in np.flatnonzero(np.any(prof_gas < 0, axis=0)):
+                inds = np.flatnonzero(prof_gas[:, iprof] < 0)
+                logger.info('Replacing negative CH4 value(s) at level(s) {} of profile {}'.format(
+                    ', '.join(str(v) for v in inds), iprof
+                ))
+            prof_gas[prof_gas < 0] = 0
+        return prof_gas, ancillary_dict
+
 
 class CORecord(TraceGasRecord):
     _gas_name = 'co'
@@ -1916,7 +2631,7 @@ class CORecord(TraceGasRecord):
 
         return scale
 
-    def add_trop_prior(self, prof_gas, obs_date, obs_lat, mod_data, **kwargs):
+    def add_trop_prior(self, prof_gas, obs_date, obs_lat, mod_data, context=None, **kwargs):
         """
         Add tropospheric CO prior.
 
@@ -1933,6 +2648,9 @@ class CORecord(TraceGasRecord):
         :param mod_data: the dictionary of model data read in from the .mod file.
         :type mod_data: dict
 
+        :param context: the species-independent quantities for this profile, if already computed.
+        :type context: :class:`PriorContext`
+
         :param kwargs: unused, swallows extra keyword arguments.
 
         :return: the modified gas profile and a dictionary on ancillary information (currently empty).
@@ -1949,7 +2667,7 @@ class CORecord(TraceGasRecord):
                                                  trop_pres=trop_pres, trop_theta=trop_theta)
 
         # these are computed only for inclusion in the ancillary data since they go in the .vmr header
-        trop_eff_lat, midtrop_theta = get_trop_eq_lat(theta, pres, obs_lat, obs_date)
+        trop_eff_lat, midtrop_theta = _get_prior_context(context, mod_data, obs_date, obs_lat).trop_eqlat
         return prof_gas, dict(midtrop_theta=midtrop_theta, trop_lat=trop_eff_lat)
 
     def add_strat_prior(self, prof_gas, retrieval_date, mod_data, **kwargs):
@@ -2105,18 +2823,136 @@ def regenerate_gas_strat_lut_files():
         record(force_strat_calculation=True, save_strat=True)
 
 
-def get_clams_age(theta, eq_lat, day_of_year, as_timedelta=False, clams_dat=dict()):
+class ClamsAgeLookup(object):
+    """
+    Vectorized lookup of the CLAMS age of air on its equivalent latitude/potential temperature grid.
+
+    Age used to be interpolated by building a :class:`~scipy.interpolate.LinearNDInterpolator` over the CLAMS grid for
+    every profile. Because that grid is rectilinear, the Delaunay triangulation behind that interpolator just splits
+    each grid cell into two triangles and is the same for every day of year. This class triangulates the grid once,
+    finds the cell containing each point with a binary search along each axis, and interpolates within the triangle
+    the original interpolator would have used. The results are therefore identical to the ``LinearNDInterpolator``
+    inside the grid and NaN outside it, but any number of points (and days of year) can be evaluated in one call.
+
+    :param eqlat: the equivalent latitude coordinate of the CLAMS grid, must be sorted ascending.
+    :type eqlat: array-like
+
+    :param theta: the potential temperature coordinate of the CLAMS grid, must be sorted ascending.
+    :type theta: array-like
+
+    :param doy: the day of year coordinate of the CLAMS ages.
+    :type doy: array-like
+
+    :param age: the CLAMS ages of air, with shape (ndoy, ntheta, neqlat).
+    :type age: array-like
+    """
+    def __init__(self, eqlat, theta, doy, age):
+        self.eqlat = np.asarray(eqlat, dtype=float)
+        self.theta = np.asarray(theta, dtype=float)
+        self.doy = np.asarray(doy)
+        # LinearNDInterpolator used the underlying data of masked arrays, so do the same here
+        age = np.asarray(age, dtype=float)
+        if age.shape != (self.doy.size, self.theta.size, self.eqlat.size):
+            raise ValueError('age must have shape (ndoy, ntheta, neqlat) = ({}, {}, {})'.format(
+                self.doy.size, self.theta.size, self.eqlat.size
+            ))
+        self.age = age.reshape(self.doy.size, -1)
+
+        # Points are ordered the same way as the flattened age for one day, i.e. theta varies slowest
+        el_grid, th_grid = np.meshgrid(self.eqlat, self.theta)
+        self._tri = Delaunay(np.column_stack([el_grid.ravel(), th_grid.ravel()]))
+
+        # Find the two triangles in each grid cell. Each triangle's lower-left vertex gives the cell it belongs to.
+        # Should Qhull ever produce triangles that span multiple cells, fall back on its own simplex search.
+        vert_th, vert_el = np.divmod(self._tri.simplices, self.eqlat.size)
+        cell_aligned = np.all(np.ptp(vert_th, axis=1) == 1) and np.all(np.ptp(vert_el, axis=1) == 1)
+        cell_inds = vert_th.min(axis=1) * (self.eqlat.size - 1) + vert_el.min(axis=1)
+        ncells = (self.theta.size - 1) * (self.eqlat.size - 1)
+        if cell_aligned and np.array_equal(np.bincount(cell_inds, minlength=ncells), np.full(ncells, 2)):
+            self._cell_simplices = np.argsort(cell_inds, kind='stable').reshape(ncells, 2)
+        else:
+            self._cell_simplices = None
+
+    @classmethod
+    def from_clams_dict(cls, clams_dat):
+        """
+        Create a lookup from a dictionary of CLAMS data, as described in :func:`get_clams_age`.
+
+        :param clams_dat: dictionary with keys 'eqlat', 'theta', 'doy', and 'age'.
+        :type clams_dat: dict
+
+        :rtype: :class:`ClamsAgeLookup`
+        """
+        return cls(clams_dat['eqlat'], clams_dat['theta'], clams_dat['doy'], clams_dat['age'])
+
+    def __call__(self, theta, eq_lat, day_of_year):
+        """
+        Look up CLAMS ages of air.
+
+        :param theta: potential temperatures to get the age at.
+        :type theta: array-like
+
+        :param eq_lat: equivalent latitudes to get the age at. Must be broadcastable against ``theta``.
+        :type eq_lat: array-like
+
+        :param day_of_year: day(s) of year to get the age for. Must be broadcastable against ``theta`` and ``eq_lat``,
+         e.g. an nprof-by-1 array to look up nprof-by-nlev profiles on different days. Every value must be one of the
+         days of year in the CLAMS data.
+        :type day_of_year: int or array-like
+
+        :return: the ages in fractional years, with the broadcast shape of the inputs. NaN for points outside the
+         CLAMS grid.
+        :rtype: :class:`numpy.ndarray`
+        """
+        theta, eq_lat, day_of_year = np.broadcast_arrays(np.ma.filled(theta, np.nan).astype(float),
+                                                         np.ma.filled(eq_lat, np.nan).astype(float),
+                                                         np.asarray(day_of_year))
+        idoy = np.clip(np.searchsorted(self.doy, day_of_year), 0, self.doy.size - 1)
+        if not np.all(self.doy[idoy] == day_of_year):
+            raise ValueError('Not all days of year requested are in the CLAMS data')
+
+        ages = np.full(theta.shape, np.nan)
+        xx = (theta >= self.theta[0]) & (theta <= self.theta[-1]) & (eq_lat >= self.eqlat[0]) & (eq_lat <= self.eqlat[-1])
+        points = np.column_stack([eq_lat[xx], theta[xx]])
+
+        if self._cell_simplices is None:
+            simplices = self._tri.find_simplex(points)
+            weights = self._barycentric_weights(simplices, points)
+        else:
+            ith = np.clip(np.searchsorted(self.theta, points[:, 1], side='right') - 1, 0, self.theta.size - 2)
+            iel = np.clip(np.searchsorted(self.eqlat, points[:, 0], side='right') - 1, 0, self.eqlat.size - 2)
+            candidates = self._cell_simplices[ith * (self.eqlat.size - 1) + iel]
+            # Each point is in whichever of its cell's triangles does not give it a (more) negative weight
+            weights_a = self._barycentric_weights(candidates[:, 0], points)
+            weights_b = self._barycentric_weights(candidates[:, 1], points)
+            use_a = weights_a.min(axis=1) >= weights_b.min(axis=1)
+            simplices = np.where(use_a, candidates[:, 0], candidates[:, 1])
+            weights = np.where(use_a[:, np.newaxis], weights_a, weights_b)
+
+        vertex_ages = self.age[idoy[xx][:, np.newaxis], self._tri.simplices[simplices]]
+        ages[xx] = np.sum(vertex_ages * weights, axis=1)
+        return ages
+
+    def _barycentric_weights(self, simplices, points):
+        # Same calculation as LinearNDInterpolator, see the scipy.spatial.Delaunay transform attribute
+        transform = self._tri.transform[simplices]
+        c = np.einsum('ijk,ik->ij', transform[:, :2, :], points - transform[:, 2, :])
+        return np.column_stack([c, 1 - c.sum(axis=1)])
+
+
+def get_clams_age(theta, eq_lat, day_of_year, as_timedelta=False, clams_dat=None):
     """
     Get the age of air predicted by the CLAMS model for points defined by potential temperature and equivalent latitude.
 
-    :param theta: a vector of potential temperatures, must be the same length as ``eq_lat``
+    :param theta: an array of potential temperatures, e.g. one profile or an nprof-by-nlev array of profiles.
     :type theta: :class:`numpy.ndarray`
 
-    :param eq_lat: a vector of equivalent latitudes, must be the same length as ``theta``
+    :param eq_lat: an array of equivalent latitudes, must be broadcastable against ``theta``
     :type eq_lat: :class:`numpy.ndarray`
 
-    :param day_of_year: which day of the year (e.g. Feb 1 = 32) to look up the age for
-    :type day_of_year: int
+    :param day_of_year: which day of the year (e.g. Feb 1 = 32) to look up the age for. May also be an array
+     broadcastable against ``theta`` to use different days for different profiles (e.g. nprof-by-1).
+    :type day_of_year: int or :class:`numpy.ndarray`
 
     :param as_timedelta: set this to ``True`` to return the ages as :class:`relativedelta` instances. When ``False``
      (default) just returned in fractional years.
@@ -2125,46 +2961,25 @@ def get_clams_age(theta, eq_lat, day_of_year, as_timedelta=False, clams_dat=dict
     :param clams_dat: a dictionary containing the CLAMS data with keys 'eqlat' (l-element vector), 'theta' (m-element
      vector), 'doy' (n-element vector), and 'age' (l-by-m-by-n array). This can be passed manually if you want to use a
      custom map of age of air vs. equivalent latitude and theta, but by default will be read in from the CLAMS file
-     provided by Arlyn Andrews and cached.
+     provided by Arlyn Andrews and kept in :data:`lut_registry`.
     :type clams_dat: dict
 
-    :return: a vector of ages the same length as ``theta`` and ``eq_lat``. The contents of the vector depend on the
-     value of ``as_timedelta``.
+    :return: an array of ages the same shape as ``theta`` and ``eq_lat`` broadcast together. The contents of the array
+     depend on the value of ``as_timedelta``. Points outside the CLAMS grid will be NaNs.
     :rtype: :class:`numpy.ndarray`
     """
-    if len(clams_dat) == 0:
-        # Take advantage of mutable default arguments to cache the CLAMS data. The first time this function is called,
-        # the dict will be empty, so the data will be loaded. The second time, since the dict will have been modified,
-        # with all the data, we don't need to load it. This should hopefully speed up this part of the code.
-        with ncdf.Dataset(_clams_file, 'r') as clams:
-            clams_dat['eqlat'] = clams.variables['lat'][:]
-            clams_dat['theta'] = clams.variables['extended_theta'][:]
-            clams_dat['doy'] = clams.variables['doy'][:]
-
-            # The original CLAMS file provided by Arlyn only went up to 2000 K. At first we tried just using the top
-            # for greater potential temperatures, but that led to too-great N2O values at those levels. We now
-            # extrapolate using the three end points to calculate a slope of age vs. theta. This calculation takes some
-            # time, so we've added the extended age to the CLAMS file using backend_analysis.clams.modify_clams_file().
-            clams_dat['age'] = clams.variables['extended_age'][:]
+    if clams_dat is None:
+        clams_dat = lut_registry.get('clams')
 
-            clams_dat['eqlat_grid'], clams_dat['theta_grid'] = np.meshgrid(clams_dat['eqlat'], clams_dat['theta'])
-            if clams_dat['eqlat_grid'].shape != clams_dat['age'].shape[1:] or clams_dat['theta_grid'].shape != clams_dat['age'].shape[1:]:
-                raise RuntimeError('Failed to create equivalent lat/theta grids the same shape as CLAMS age')
+    if 'lookup' not in clams_dat:
+        clams_dat['lookup'] = ClamsAgeLookup.from_clams_dict(clams_dat)
 
-    idoy = np.argwhere(clams_dat['doy'] == day_of_year).item()
-
-    el_grid, th_grid = np.meshgrid(clams_dat['eqlat'], clams_dat['theta'])
-    clams_points = np.array([[el, th] for el, th in zip(el_grid.flat, th_grid.flat)])
-
-    # interp2d does not behave well here; it interpolates to points outside the range of eqlat/theta and gives a much
-    # noisier result.
-    age_interp = LinearNDInterpolator(clams_points, clams_dat['age'][idoy, :, :].flatten())
-    prof_ages = np.array([age_interp(el, th).item() for el, th in zip(eq_lat, theta)])
+    prof_ages = clams_dat['lookup'](theta, eq_lat, day_of_year)
 
     if as_timedelta:
         # The CLAMS ages are in years, but relativedeltas don't accept fractional years. Instead, separate the whole
         # years and the fractional years.
-        prof_ages = np.array(mod_utils.frac_years_to_reldelta(prof_ages))
+        prof_ages = np.array(mod_utils.frac_years_to_reldelta(prof_ages.ravel())).reshape(prof_ages.shape)
 
     return prof_ages
 
@@ -2180,14 +2995,13 @@ def _read_pres_range(nc_handle):
 
 def _compute_midtrop_theta(p_levels, prof_theta, pres_range=None):
     if pres_range is None:
-        with ncdf.Dataset(_theta_v_lat_file) as nch:
-            pres_range = _read_pres_range(nch)
+        pres_range = lut_registry.get('theta_v_lat')['pres_range']
     zz = (p_levels >= pres_range[0]) & (p_levels <= pres_range[1])
     return np.mean(prof_theta[zz])
 
 
 def get_trop_eq_lat(prof_theta, p_levels, obs_lat, obs_date, theta_wt=1.0, lat_wt=1.0, dtheta_cutoff=0.25,
-                    _theta_v_lat=dict()):
+                    _theta_v_lat=None):
     """
     Compute the tropospheric equivalent latitude for an observation based on its mid-tropospheric potential temperature
 
@@ -2262,8 +3076,8 @@ def get_trop_eq_lat(prof_theta, p_levels, obs_lat, obs_date, theta_wt=1.0, lat_w
      mid-troposphere potential temperature have to be to take into account which one is closer. See above.
     :type dtheta_cutoff: float
 
-    :param _theta_v_lat: not intended to pass in; this is a dictionary that will be given the values read in from the
-     climatology file to cache them for future function calls.
+    :param _theta_v_lat: not intended to pass in; by default the values read in from the climatology file are taken
+     from :data:`lut_registry`.
 
     :return: the equivalent latitude derived from mid-tropospheric potential temperature
     :rtype: float
@@ -2301,31 +3115,8 @@ def get_trop_eq_lat(prof_theta, p_levels, obs_lat, obs_date, theta_wt=1.0, lat_w
             else:
                 return lat[north_min_ind]
 
-    if len(_theta_v_lat) == 0:
-        with ncdf.Dataset(_theta_v_lat_file, 'r') as nch:
-            _theta_v_lat['theta'] = nch.variables['theta_mean'][:].squeeze()
-            lat_tmp = nch.variables['latitude_mean'][:].squeeze()
-            # Sometimes lats near 0 get read in as very small non-zero numbers. This causes a 
-            # problem later when we select all lats in one hemisphere since the equator needs
-            # to be in both hemispheres for this to work
-            lat_tmp[np.abs(lat_tmp) < 0.001] = 0.0
-            _theta_v_lat['lat'] = lat_tmp
-            _theta_v_lat['times'] = nch.variables['times'][:]
-            _theta_v_lat['times_units'] = nch.variables['times'].units
-            _theta_v_lat['times_calendar'] = nch.variables['times'].calendar
-
-            # Read the pressure range that we're using
-            _theta_v_lat['pres_range'] = _read_pres_range(nch)
-
-            # Append the first time slice (which will be the first two weeks of the year) to the end so that we can
-            # intepolate past the last date, assuming that the changes are cyclical. At the same time, let's record the
-            # year used in the dates
-            new_time = ncdf.num2date(_theta_v_lat['times'][0], _theta_v_lat['times_units'], _theta_v_lat['times_calendar'])
-            _theta_v_lat['year'] = year = new_time.year
-            new_time = ncdf.date2num(new_time.replace(year=year+1), _theta_v_lat['times_units'], _theta_v_lat['times_calendar'])
-            _theta_v_lat['times'] = np.concatenate([_theta_v_lat['times'], [new_time]], axis=0)
-            for k in ('theta', 'lat'):
-                _theta_v_lat[k] = np.concatenate([_theta_v_lat[k], _theta_v_lat[k][0:1, :]], axis=0)
+    if _theta_v_lat is None:
+        _theta_v_lat = lut_registry.get('theta_v_lat')
 
     # First we need to get the lat vs. theta curve for this particular date
     ntimes, nbins = _theta_v_lat['theta'].shape
@@ -2399,7 +3190,8 @@ def adjust_zgrid(z_grid, z_trop, z_obs):
 #########################
 
 def add_trop_prior_standard(prof_gas, obs_date, obs_lat, gas_record, mod_data, ref_lat=45.0, use_theta_eqlat=True,
-                            profs_latency=None, prof_aoa=None, prof_world_flag=None, prof_gas_date=None, use_adjusted_zgrid=True):
+                            profs_latency=None, prof_aoa=None, prof_world_flag=None, prof_gas_date=None, use_adjusted_zgrid=True,
+                            context=None):
     """
     Add troposphere concentration to the prior profile using the standard approach.
 
@@ -2444,14 +3236,19 @@ def add_trop_prior_standard(prof_gas, obs_date, obs_lat, gas_record, mod_data, r
      Since most levels will have a window of dates, this is the middle of those windows. The dates are stored as a
      datetime object.
 
+    :param context: the species-independent quantities for this profile, if already computed for another species.
+    :type context: :class:`PriorContext`
+
     :return: the updated CO2 profile and a dictionary of the ancillary profiles.
     """
+    context = _get_prior_context(context, mod_data, obs_date, obs_lat)
+
     # Extract the necessary data from the .mod dict
     z_grid = mod_data['profile']['Height']
     z_obs = mod_data['scalar']['Height']
     theta_grid = mod_data['profile']['PT']
     pres_grid = mod_data['profile']['Pressure']
-    z_trop = mod_utils.interp_tropopause_height_from_pressure(mod_data['scalar']['TROPPB'], pres_grid, z_grid)
+    z_trop = context.tropopause_alt
     if use_adjusted_zgrid:
         logger.debug('Adjusting z-grid')
         z_grid = adjust_zgrid(z_grid, z_trop, z_obs)
@@ -2474,7 +3271,7 @@ def add_trop_prior_standard(prof_gas, obs_date, obs_lat, gas_record, mod_data, r
     if use_theta_eqlat:
         if theta_grid is None or pres_grid is None:
             raise TypeError('theta_grid and pres_grid must be given if use_theta_eqlat is True')
-        obs_lat, midtrop_theta = get_trop_eq_lat(theta_grid, pres_grid, obs_lat, obs_date)
+        obs_lat, midtrop_theta = context.trop_eqlat
     else:
         logger.debug('Using geographic latitude, not deriving from potential temperature')
         midtrop_theta = np.nan
@@ -2513,7 +3310,8 @@ def add_trop_prior_standard(prof_gas, obs_date, obs_lat, gas_record, mod_data, r
 
 
 def add_strat_prior_standard(prof_gas, retrieval_date, gas_record, mod_data,
-                             profs_latency=None, prof_aoa=None, prof_world_flag=None, gas_record_dates=None):
+                             profs_latency=None, prof_aoa=None, prof_world_flag=None, gas_record_dates=None,
+                             context=None):
     """
     Add the stratospheric trace gas to a TCCON prior profile using the standard approach.
 
@@ -2536,9 +3334,11 @@ def add_strat_prior_standard(prof_gas, retrieval_date, gas_record, mod_data,
     :param prof_aoa: nlev-element vector of ages of air, in years.
     :param prof_world_flag: nlev-element vector of ints which will indicate which levels are considered overworld and
      which middleworld. The values used for each are defined in :mod:`mod_constants`
+    :param context: the species-independent quantities for this profile, if already computed for another species.
 
     :return: the updated CO2 profile and a dictionary of the ancillary profiles.
     """
+    context = _get_prior_context(context, mod_data, retrieval_date)
     prof_theta = mod_data['profile']['PT']
     prof_eqlat = mod_data['profile']['EqL']
     prof_pres = mod_data['profile']['Pressure']
@@ -2560,9 +3360,7 @@ def add_strat_prior_standard(prof_gas, retrieval_date, gas_record, mod_data,
         raise NotImplementedError('No overworld levels found')
     
     prof_world_flag[xx_overworld] = const.overworld_flag
-    # Need the +1 because Jan 1 will be frac_year = 0, but CLAMS expects 1 <= doy <= 366
-    retrieval_doy = int(mod_utils.clams_day_of_year(retrieval_date))
-    age_of_air_years = get_clams_age(prof_theta, prof_eqlat, retrieval_doy, as_timedelta=False)
+    age_of_air_years = context.clams_age
     prof_aoa[xx_overworld] = age_of_air_years[xx_overworld]
 
     # Now, assuming that the CLAMS age is the mean age of the stratospheric air and that we can assume the CO2 has
@@ -2581,8 +3379,8 @@ def add_strat_prior_standard(prof_gas, retrieval_date, gas_record, mod_data,
     # space between that and the first > 380 level.
     ow1 = np.argwhere(xx_overworld)[0]
 
-    # This calculation must be consistent with that in the troposphere function or some levels may be skipped.
-    z_trop = mod_utils.interp_tropopause_height_from_pressure(mod_data['scalar']['TROPPB'], prof_pres, prof_z)
+    # This must be the same tropopause as in the troposphere function or some levels may be skipped.
+    z_trop = context.tropopause_alt
     xx_trop = prof_z <= z_trop
     uw1 = np.argwhere(xx_trop)[-1]
 
@@ -2596,6 +3394,195 @@ def add_strat_prior_standard(prof_gas, retrieval_date, gas_record, mod_data,
                       'stratum': prof_world_flag}
 
 
+def add_trop_prior_standard_batch(prof_gas, obs_dates, obs_lats, gas_record, mod_data, ref_lat=45.0,
+                                  use_theta_eqlat=True, profs_latency=None, prof_aoa=None, prof_world_flag=None,
+                                  prof_gas_date=None, use_adjusted_zgrid=True, contexts=None):
+    """
+    Add troposphere concentrations to many prior profiles at once using the standard approach.
+
+    Each profile gets the same values as it would from :func:`add_trop_prior_standard`, but the concentrations for the
+    tropospheric levels of all the profiles are looked up from ``gas_record`` in a single call.
+
+    :param prof_gas: nlev-by-nprof array of trace gas mixing ratios. Will be modified in-place.
+    :type prof_gas: :class:`numpy.ndarray`
+
+    :param obs_dates: nprof-element sequence of the UTC dates of the profiles.
+    :type obs_dates: sequence(:class:`datetime.datetime`)
+
+    :param obs_lats: nprof-element sequence of the latitudes of the profiles (degrees, south is negative).
+    :type obs_lats: array-like
+
+    :param mod_data: the stacked .mod data, as returned by :func:`stack_mod_data`.
+    :type mod_data: dict
+
+    :param contexts: the species-independent quantities for each profile, if already computed for another species.
+    :type contexts: list(:class:`PriorContext`)
+
+    All other parameters are the same as in :func:`add_trop_prior_standard`, except that the optional ancillary
+    profiles must be nlev-by-nprof arrays.
+
+    :return: the updated profiles and a dictionary of the ancillary profiles (nlev-by-nprof) and values (nprof-element
+     vectors).
+    """
+    z_met = mod_data['profile']['Height']
+    z_obs = mod_data['scalar']['Height']
+    theta_grid = mod_data['profile']['PT']
+    pres_grid = mod_data['profile']['Pressure']
+    if use_theta_eqlat and (theta_grid is None or pres_grid is None):
+        raise TypeError('theta_grid and pres_grid must be given if use_theta_eqlat is True')
+    elif not use_theta_eqlat:
+        logger.debug('Using geographic latitude, not deriving from potential temperature')
+
+    n_lev, n_prof = np.shape(z_met)
+    prof_gas = _init_prof(prof_gas, n_lev, n_prof)
+    profs_latency = _init_prof(profs_latency, n_lev, n_prof)
+    prof_aoa = _init_prof(prof_aoa, n_lev, n_prof)
+    prof_world_flag = _init_prof(prof_world_flag, n_lev, n_prof)
+    prof_gas_date = _init_prof(prof_gas_date, n_lev, n_prof, fill_val=None)
+    if contexts is None:
+        contexts = PriorContext.for_profiles(mod_data, obs_dates, obs_lats)
+
+    z_grid = np.array(z_met, dtype=float)
+    z_trop = np.full((n_prof,), np.nan)
+    trop_lats = np.array(obs_lats, dtype=float)
+    midtrop_theta = np.full((n_prof,), np.nan)
+    xx_trop = np.zeros((n_lev, n_prof), dtype=np.bool_)
+    if use_adjusted_zgrid:
+        logger.debug('Adjusting z-grids')
+    else:
+        logger.debug('Not adjusting z-grids')
+
+    # The profile-specific parts (tropopause, trop. eq. lat, age of air) are computed for each profile, but the dates
+    # that need looked up in the gas record are collected so that they can all be retrieved at once.
+    air_ages = []
+    lat_corrections = []
+    gas_dates = []
+    for i in range(n_prof):
+        z_trop[i] = contexts[i].tropopause_alt
+        if use_adjusted_zgrid:
+            z_grid[:, i] = adjust_zgrid(z_met[:, i], z_trop[i], z_obs[i])
+
+        if use_theta_eqlat:
+            trop_lats[i], midtrop_theta[i] = contexts[i].trop_eqlat
+
+        xx_trop[:, i] = z_grid[:, i] <= z_trop[i]
+        this_zgrid = z_grid[xx_trop[:, i], i]
+        obs_air_age = mod_utils.age_of_air(trop_lats[i], this_zgrid, z_trop[i], ref_lat=ref_lat)
+        mlo_smo_air_age = mod_utils.age_of_air(0.0, np.array([0.01]), z_trop[i], ref_lat=ref_lat).item()
+        air_age = obs_air_age - mlo_smo_air_age
+        air_ages.append(air_age)
+        gas_dates.extend(obs_dates[i] - dt.timedelta(days=a*365.25) for a in air_age)
+
+        prior_data = {'age_of_air': air_age, 'adj_zgrid': this_zgrid, 'z_trop': z_trop[i]}
+        lat_corrections.append(gas_record.lat_bias_correction(obs_date=obs_dates[i], obs_lat=trop_lats[i],
+                                                              mod_data=_select_mod_profile(mod_data, i),
+                                                              prior_data=prior_data))
+
+    prof_world_flag[xx_trop] = const.trop_flag
+
+    # One lookup for every tropospheric level of every profile. The interpolation in get_gas_for_dates only uses the
+    # monthly values around each date, so this gives the same values as looking up each profile separately.
+    gas_df = gas_record.get_gas_for_dates(pd.DatetimeIndex(gas_dates), deseasonalize=True, as_dataframe=True)
+    i_stop = np.cumsum([a.size for a in air_ages])
+    i_start = i_stop - np.array([a.size for a in air_ages], dtype=i_stop.dtype)
+
+    for i, air_age in enumerate(air_ages):
+        xx = xx_trop[:, i]
+        this_gas_df = gas_df.iloc[i_start[i]:i_stop[i]]
+        prof_aoa[xx, i] = air_age
+
+        # Same chemical loss and latitudinal corrections as the single profile function
+        lifetime_adj = np.exp(-air_age / gas_record.gas_trop_lifetime_yrs)
+        prof_gas[xx, i] = this_gas_df['dmf_mean'].values * lifetime_adj + lat_corrections[i]
+        profs_latency[xx, i] = this_gas_df['latency'].values
+        prof_gas_date[xx, i] = this_gas_df.index
+
+        year_fraction = mod_utils.date_to_frac_year(obs_dates[i])
+        prof_gas[xx, i] *= mod_utils.seasonal_cycle_factor(trop_lats[i], z_grid[xx, i], z_trop[i], year_fraction,
+                                                           species=gas_record, ref_lat=ref_lat)
+
+    return prof_gas, {'co2_latency': profs_latency, 'co2_date': prof_gas_date, 'age_of_air': prof_aoa,
+                      'midtrop_theta': midtrop_theta, 'stratum': prof_world_flag,
+                      'ref_lat': np.full((n_prof,), ref_lat), 'trop_lat': trop_lats, 'tropopause_alt': z_trop}
+
+
+def add_strat_prior_standard_batch(prof_gas, retrieval_dates, gas_record, mod_data, profs_latency=None, prof_aoa=None,
+                                   prof_world_flag=None, gas_record_dates=None, contexts=None):
+    """
+    Add the stratospheric trace gas to many TCCON prior profiles at once using the standard approach.
+
+    Each profile gets the same values as it would from :func:`add_strat_prior_standard`, but the CLAMS ages of air and
+    the stratospheric concentrations are looked up for all the profiles in a single call each.
+
+    :param prof_gas: nlev-by-nprof array of trace gas mixing ratios. Will be modified in-place.
+    :type prof_gas: :class:`numpy.ndarray`
+
+    :param retrieval_dates: nprof-element sequence of the UTC dates of the profiles.
+    :type retrieval_dates: sequence(:class:`datetime.datetime`)
+
+    :param mod_data: the stacked .mod data, as returned by :func:`stack_mod_data`.
+    :type mod_data: dict
+
+    :param contexts: the species-independent quantities for each profile, if already computed for another species.
+    :type contexts: list(:class:`PriorContext`)
+
+    All other parameters are the same as in :func:`add_strat_prior_standard`, except that the optional ancillary
+    profiles must be nlev-by-nprof arrays.
+
+    :return: the updated profiles and a dictionary of the ancillary profiles.
+    """
+    prof_theta = mod_data['profile']['PT']
+    prof_eqlat = mod_data['profile']['EqL']
+    prof_pres = mod_data['profile']['Pressure']
+    prof_z = mod_data['profile']['Height']
+    tropopause_pres = np.asarray(mod_data['scalar']['TROPPB'])
+
+    n_lev, n_prof = np.shape(prof_gas)
+    profs_latency = _init_prof(profs_latency, n_lev, n_prof)
+    prof_aoa = _init_prof(prof_aoa, n_lev, n_prof)
+    prof_world_flag = _init_prof(prof_world_flag, n_lev, n_prof)
+    gas_record_dates = _init_prof(gas_record_dates, n_lev, n_prof, fill_val=None)
+    if contexts is None:
+        contexts = PriorContext.for_profiles(mod_data, retrieval_dates)
+
+    xx_overworld = mod_utils.is_overworld(prof_theta, prof_pres, tropopause_pres[np.newaxis, :])
+    no_overworld = ~np.any(xx_overworld, axis=0)
+    if np.any(no_overworld):
+        raise NotImplementedError('No overworld levels found for profile(s) {}'.format(
+            ', '.join(str(i) for i in np.flatnonzero(no_overworld))
+        ))
+
+    prof_world_flag[xx_overworld] = const.overworld_flag
+    age_of_air_years = PriorContext.stacked_clams_age(contexts)
+    prof_aoa[xx_overworld] = age_of_air_years[xx_overworld]
+
+    # Look up the overworld levels of all the profiles at once, giving each level its profile's date
+    ow_dates = np.array(retrieval_dates, dtype=object)[np.nonzero(xx_overworld)[1]]
+    prof_gas[xx_overworld], strat_extra_info = gas_record.get_strat_gas(ow_dates, age_of_air_years[xx_overworld],
+                                                                        prof_eqlat[xx_overworld],
+                                                                        prof_theta[xx_overworld])
+    profs_latency[xx_overworld] = strat_extra_info['latency']
+    gas_record_dates[xx_overworld] = strat_extra_info['gas_record_dates']
+
+    for i in range(n_prof):
+        xx = xx_overworld[:, i]
+        # Middleworld interpolation in theta between the top tropospheric and bottom overworld levels, as in
+        # add_strat_prior_standard.
+        ow1 = np.argwhere(xx)[0]
+        z_trop = contexts[i].tropopause_alt
+        xx_trop = prof_z[:, i] <= z_trop
+        uw1 = np.argwhere(xx_trop)[-1]
+
+        gas_endpoints = np.array([prof_gas[uw1, i].item(), prof_gas[ow1, i].item()])
+        theta_endpoints = np.array([prof_theta[uw1, i].item(), prof_theta[ow1, i].item()])
+        xx_middleworld = ~xx_trop & ~xx
+        prof_gas[xx_middleworld, i] = np.interp(prof_theta[xx_middleworld, i], theta_endpoints, gas_endpoints)
+        prof_world_flag[xx_middleworld, i] = const.middleworld_flag
+
+    return prof_gas, {'latency': profs_latency, 'gas_record_dates': gas_record_dates, 'age_of_air': prof_aoa,
+                      'stratum': prof_world_flag}
+
+
 def _load_co_lut(lut_file):
     with xr.open_dataset(lut_file) as ds:
         co_lut = ds['co_excess']
@@ -2648,8 +3635,7 @@ def modify_strat_co(base_co_profile, pres_profile, eqlat_profile, pt_profile, tr
         raise ValueError('model_transition_pressures must be a two element tuple with the second element less than '
                          'the first.')
 
-    with xr.open_dataset(excess_co_lut) as ds:
-        co_lut = ds['co'][:]
+    co_lut = _lut_to_dataarray(lut_registry.get('excess_co', excess_co_lut)['co'])
 
     # Let's first get the CMAM CO profile for the right day of year and latitude
     xx_overworld = mod_utils.is_overworld(pt_profile, pres_profile, trop_pres)
@@ -2699,10 +3685,10 @@ def calculate_meso_co(alt_profile, eqlat_profile, pres_profile, temp_profile, pr
     top_pres = pres_profile[-1]
     top_temp = temp_profile[-1]
 
-    with xr.open_dataset(excess_co_lut) as ds:
-        co_nd = ds['co_nd'][:]
-        co_nair = ds['nair'][:]
-        co_alts = ds['altitude'][:]
+    co_lut = lut_registry.get('excess_co', excess_co_lut)
+    co_nd = _lut_to_dataarray(co_lut['co_nd'])
+    co_nair = _lut_to_dataarray(co_lut['nair'])
+    co_alts = _lut_to_dataarray(co_lut['altitude'])
 
     # In the LUT, nair is assumed to be the same for every profile (because pressure is) so we don't need to interpolate
     # anything before we calculate the effective vertical path we'll use to integrate the CO profiles.
@@ -2736,7 +3722,7 @@ def calculate_meso_co(alt_profile, eqlat_profile, pres_profile, temp_profile, pr
 
 
 def generate_single_tccon_prior(mod_file_data, utc_offset, concentration_record, zgrid=None,
-                                use_eqlat_trop=True, use_eqlat_strat=True, use_adjusted_zgrid=True):
+                                use_eqlat_trop=True, use_eqlat_strat=True, use_adjusted_zgrid=True, context=None):
     """
     Driver function to generate the TCCON prior profiles for a single observation.
 
@@ -2776,6 +3762,9 @@ def generate_single_tccon_prior(mod_file_data, utc_offset, concentration_record,
      is used as-is. 
     :type use_adjusted_zgrid: bool
 
+    :param context: the species-independent quantities for this profile, if already computed for another species.
+    :type context: :class:`PriorContext`
+
     :return: a dictionary containing all the profiles (including many for debugging) and a dictionary containing the
      units of the values in each profile.
     :rtype: dict, dict
@@ -2810,12 +3799,13 @@ def generate_single_tccon_prior(mod_file_data, utc_offset, concentration_record,
     gas_date_prof = np.full((n_lev,), None)
     latency_profs = np.full((n_lev,), np.nan)
     stratum_flag = np.full((n_lev,), -1)
+    context = _get_prior_context(context, mod_file_data, obs_utc_date, obs_lat)
 
     # gas_prof is modified in-place
     _, ancillary_trop = concentration_record.add_trop_prior(gas_prof, obs_utc_date, obs_lat, mod_file_data,
                                                             use_theta_eqlat=use_eqlat_trop, use_adjusted_zgrid=use_adjusted_zgrid,
                                                             profs_latency=latency_profs, prof_world_flag=stratum_flag, 
-                                                            prof_gas_date=gas_date_prof)
+                                                            prof_gas_date=gas_date_prof, context=context)
     aoa_prof_trop = ancillary_trop['age_of_air'] if 'age_of_air' in ancillary_trop else np.full_like(gas_prof, np.nan)
     trop_ref_lat = ancillary_trop['ref_lat'] if 'ref_lat' in ancillary_trop else np.nan
     trop_eqlat = ancillary_trop['trop_lat'] if 'trop_lat' in ancillary_trop else np.nan
@@ -2826,7 +3816,7 @@ def generate_single_tccon_prior(mod_file_data, utc_offset, concentration_record,
     # temperature (the "middleworld").
     _, ancillary_strat = concentration_record.add_strat_prior(
         gas_prof, obs_utc_date, mod_file_data, profs_latency=latency_profs, prof_world_flag=stratum_flag,
-        gas_record_dates=gas_date_prof
+        gas_record_dates=gas_date_prof, context=context
     )
     aoa_prof_strat = ancillary_strat['age_of_air'] if 'age_of_air' in ancillary_trop else np.full_like(gas_prof, np.nan)
 
@@ -2879,6 +3869,194 @@ def generate_single_tccon_prior(mod_file_data, utc_offset, concentration_record,
     return map_dict, units_dict, map_constants
 
 
+def stack_mod_data(mod_data):
+    """
+    Combine the data for many profiles into a single dictionary for :func:`generate_tccon_priors_batch`.
+
+    :param mod_data: data from .mod files prepared by Mod Maker. Each element may either be a path to a .mod file or a
+     dictionary from :func:`~mod_utils.read_mod_file`. All must have the same number of levels.
+    :type mod_data: sequence(str or dict)
+
+    :return: a dictionary with the same groups as the .mod dictionaries. Variables in the "profile" group are stacked
+     into nlev-by-nprof arrays, those in the other groups into nprof-element vectors. Only variables present for every
+     profile are included.
+    :rtype: dict
+    """
+    mod_dicts = []
+    for data in mod_data:
+        if isinstance(data, str):
+            data = readers.read_mod_file(data)
+        elif not isinstance(data, dict):
+            raise TypeError('Each element of mod_data must be a string (path pointing to a .mod file) or a dictionary')
+        mod_dicts.append(data)
+
+    if len(mod_dicts) == 0:
+        raise ValueError('mod_data must contain at least one profile')
+
+    stacked_data = dict()
+    for group, group_data in mod_dicts[0].items():
+        keys = [k for k in group_data if all(k in d[group] for d in mod_dicts[1:])]
+        if group == 'profile':
+            try:
+                stacked_data[group] = {k: np.stack([d[group][k] for d in mod_dicts], axis=1) for k in keys}
+            except ValueError:
+                raise ValueError('All the .mod profiles must have the same number of levels to be stacked')
+        else:
+            stacked_data[group] = {k: np.array([d[group][k] for d in mod_dicts]) for k in keys}
+
+    return stacked_data
+
+
+def _select_batch_prior(map_dict, map_constants, index):
+    """
+    Extract one profile's output from :func:`generate_tccon_priors_batch`, in the form returned by
+    :func:`generate_single_tccon_prior`.
+    """
+    profile_dict = {k: v[:, index] for k, v in map_dict.items()}
+    profile_constants = {k: v[index] if np.ndim(v) == 1 else v for k, v in map_constants.items()}
+    return profile_dict, profile_constants
+
+
+def generate_tccon_priors_batch(mod_data, utc_offsets, concentration_record, zgrid=None,
+                                use_eqlat_trop=True, use_eqlat_strat=True, use_adjusted_zgrid=True, contexts=None):
+    """
+    Generate TCCON prior profiles for many observations of one species at once.
+
+    This is the batched equivalent of :func:`generate_single_tccon_prior`: the priors for each profile are the same as
+    those function would produce, but the steps that can be shared across profiles (e.g. looking up the trace gas
+    record or the CLAMS age of air) are done once for all of them. Records that do not define a batched method for
+    their troposphere or stratosphere priors fall back on computing each profile in turn.
+
+    :param mod_data: the .mod data for the profiles. Either a sequence of paths to .mod files or dictionaries from
+     :func:`~mod_utils.read_mod_file`, or the output of :func:`stack_mod_data` for those.
+    :type mod_data: sequence(str or dict) or dict
+
+    :param utc_offsets: the difference between the .mod file dates and UTC; see :func:`generate_single_tccon_prior`.
+     May be a single timedelta for all profiles or one per profile.
+    :type utc_offsets: :class:`datetime.timedelta` or sequence(:class:`datetime.timedelta`)
+
+    :param concentration_record: the record for the species to generate the prior profiles for.
+    :type concentration_record: :class:`TraceGasRecord`
+
+    :param contexts: the species-independent quantities for each profile. Pass the same contexts when generating the
+     priors for several species from the same ``mod_data`` so that these are only computed once. If not given, they
+     are computed for this species only.
+    :type contexts: list(:class:`PriorContext`)
+
+    The remaining parameters are the same as for :func:`generate_single_tccon_prior`.
+
+    :return: dictionaries containing all the profiles (as nlev-by-nprof arrays), the units of those profiles, and the
+     constants (as nprof-element vectors, except for "strat_used_eqlat").
+    :rtype: dict, dict, dict
+    """
+    if isinstance(mod_data, dict):
+        if np.ndim(mod_data['profile']['Height']) != 2:
+            raise ValueError('If mod_data is a dictionary, it must be stacked .mod data from stack_mod_data')
+    else:
+        mod_data = stack_mod_data(mod_data)
+
+    n_lev, n_prof = np.shape(mod_data['profile']['Height'])
+    if isinstance(utc_offsets, (dt.timedelta, pd.Timedelta)):
+        utc_offsets = [utc_offsets] * n_prof
+    elif len(utc_offsets) != n_prof:
+        raise ValueError('utc_offsets must be a single timedelta or have one element per profile')
+
+    if not isinstance(concentration_record, TraceGasRecord):
+        raise TypeError('concentration_record must be a subclass instance of TraceGasTropicsRecord')
+    elif concentration_record.gas_name == '':
+        raise TypeError('concentration_record must be a specific subclass instance of TraceGasTropicsRecord that '
+                        'has a non-empty gas_name attribute; it cannot be an instance of TraceGasTropicsRecord itself.')
+
+    obs_lats = mod_data['constants']['obs_lat']
+    file_dates = mod_data['file']['datetime']
+    # Make the UTC dates datetime objects that are rounded to a date (hour/minute/etc = 0)
+    obs_utc_dates = [dt.datetime.combine((d - offset).date(), dt.time()) for d, offset in zip(file_dates, utc_offsets)]
+    if contexts is None:
+        contexts = PriorContext.for_profiles(mod_data, obs_utc_dates, obs_lats)
+    elif len(contexts) != n_prof:
+        raise ValueError('contexts must have one element per profile')
+
+    gas_prof = np.full((n_lev, n_prof), np.nan)
+    gas_date_prof = np.full((n_lev, n_prof), None)
+    latency_profs = np.full((n_lev, n_prof), np.nan)
+    stratum_flag = np.full((n_lev, n_prof), -1)
+
+    # gas_prof is modified in-place
+    _, ancillary_trop = concentration_record.add_trop_prior_batch(
+        gas_prof, obs_utc_dates, obs_lats, mod_data, use_theta_eqlat=use_eqlat_trop,
+        use_adjusted_zgrid=use_adjusted_zgrid, profs_latency=latency_profs, prof_world_flag=stratum_flag,
+        prof_gas_date=gas_date_prof, contexts=contexts
+    )
+    nan_vec = np.full((n_prof,), np.nan)
+    aoa_prof_trop = ancillary_trop['age_of_air'] if 'age_of_air' in ancillary_trop else np.full_like(gas_prof, np.nan)
+    trop_ref_lat = ancillary_trop['ref_lat'] if 'ref_lat' in ancillary_trop else nan_vec
+    trop_eqlat = ancillary_trop['trop_lat'] if 'trop_lat' in ancillary_trop else nan_vec
+    z_trop_met = ancillary_trop['tropopause_alt'] if 'tropopause_alt' in ancillary_trop else nan_vec
+    midtrop_theta = ancillary_trop['midtrop_theta'] if 'midtrop_theta' in ancillary_trop else nan_vec
+
+    _, ancillary_strat = concentration_record.add_strat_prior_batch(
+        gas_prof, obs_utc_dates, mod_data, profs_latency=latency_profs, prof_world_flag=stratum_flag,
+        gas_record_dates=gas_date_prof, contexts=contexts
+    )
+    aoa_prof_strat = ancillary_strat['age_of_air'] if 'age_of_air' in ancillary_strat else np.full_like(gas_prof, np.nan)
+
+    gas_name = concentration_record.gas_name
+    gas_unit = concentration_record.gas_unit
+    map_dict = {'Height': mod_data['profile']['Height'],
+                'Temp': mod_data['profile']['Temperature'],
+                'Pressure': mod_data['profile']['Pressure'],
+                'PT': mod_data['profile']['PT'],
+                'EqL': mod_data['profile']['EqL'],
+                gas_name: gas_prof,
+                'mean_latency': latency_profs,
+                'trop_age_of_air': aoa_prof_trop,
+                'strat_age_of_air': aoa_prof_strat,
+                'atm_stratum': stratum_flag,
+                'gas_date': gas_date_prof}
+
+    if zgrid is not None:
+        # The interpolation to the fixed altitude levels is still done per profile, since each has its own altitudes
+        profile_dicts = [mod_utils.interp_to_zgrid({k: v[:, i] for k, v in map_dict.items()}, zgrid,
+                                                   gas_extrap_method='const')
+                         for i in range(n_prof)]
+        map_dict = {k: np.stack([d[k] for d in profile_dicts], axis=1) for k in map_dict}
+
+    for i in range(n_prof):
+        concentration_record.add_extra_column(map_dict[gas_name][:, i], retrieval_date=obs_utc_dates[i],
+                                              mod_data=_select_mod_profile(mod_data, i))
+
+    missing_profs = np.flatnonzero(np.any(np.isnan(gas_prof), axis=0))
+    if missing_profs.size > 0:
+        raise RuntimeError('Some levels were not assigned a value in the gas profile for profile(s) {}'.format(
+            ', '.join(str(i) for i in missing_profs)
+        ))
+
+    units_dict = {'Height': 'km',
+                  'Temp': 'K',
+                  'Pressure': 'hPa',
+                  'PT': 'K',
+                  'EqL': 'degrees',
+                  gas_name: gas_unit,
+                  'mean_latency': 'yr',
+                  'trop_age_of_air': 'yr',
+                  'strat_age_of_air': 'yr',
+                  'atm_stratum': 'flag',
+                  'gas_date': 'yr',
+                  'gas_date_width': 'yr'}
+
+    map_constants = {'site_lon': mod_data['file']['lon'],
+                     'site_lat': mod_data['file']['lat'],
+                     'datetime': file_dates,
+                     'trop_eqlat': trop_eqlat,
+                     'midtrop_theta': midtrop_theta,
+                     'prof_ref_lat': trop_ref_lat,
+                     'surface_alt': mod_data['scalar']['Height'],
+                     'tropopause_alt': z_trop_met,
+                     'strat_used_eqlat': use_eqlat_strat}
+
+    return map_dict, units_dict, map_constants
+
+
 def _get_std_vmr_file(std_vmr_file):
     """
     Get the path to the standard .vmr file
@@ -2925,8 +4103,8 @@ def generate_full_tccon_vmr_file(mod_data, utc_offsets, save_dir, product='fpit'
     :param utc_offsets: difference(s) between local time and UTC time for each site
     :type utc_offsets: :class:`datetime.timedelta` or list(:class:`datetime.timedelta`)
 
-    :param save_dir: where to save the .vmr files
-    :type save_dir: str
+    :param save_dir: where to save the .vmr files, or ``False`` to not write them.
+    :type save_dir: str or bool
 
     :param std_vmr_file: a standard .vmr file that has profiles for all the gases needed by TCCON, as well as their
      seasonal cycles, latitudinal gradients, and secular trends. These profiles are assumed to be base profiles
@@ -2957,7 +4135,8 @@ def generate_full_tccon_vmr_file(mod_data, utc_offsets, save_dir, product='fpit'
             'ch4': {'mlo_file': './test/ml_ch4_test.txt', 'smo_file', './test/smo_ch4_test.txt'}
         }
 
-    :return: none, writes .vmr files
+    :return: the .vmr profiles if ``return_records=True`` is passed, see :func:`generate_tccon_priors_driver`. Writes
+     .vmr files unless ``save_dir`` is ``False``.
     :raises GGGPathError: if ``$GGGPATH`` is not defined and it needs to find the standard file or it cannot find the
      standard file in the expected place.
     """
@@ -2996,18 +4175,20 @@ def generate_full_tccon_vmr_file(mod_data, utc_offsets, save_dir, product='fpit'
         else:
             species.append(rec())
 
-    generate_tccon_priors_driver(mod_data=mod_data, utc_offsets=utc_offsets, species=species, site_abbrevs=site_abbrevs,
-                                 write_vmrs=save_dir, keep_latlon_prec=keep_latlon_prec, gas_name_order=std_vmr_gases,
-                                 product=product, special_header_info=extra_header, **kwargs)
+    return generate_tccon_priors_driver(mod_data=mod_data, utc_offsets=utc_offsets, species=species,
+                                        site_abbrevs=site_abbrevs, write_vmrs=save_dir,
+                                        keep_latlon_prec=keep_latlon_prec, gas_name_order=std_vmr_gases,
+                                        product=product, special_header_info=extra_header, **kwargs)
 
 
 def generate_tccon_priors_driver(mod_data, utc_offsets, species, site_abbrevs='xx', write_vmrs=False,
                                  gas_name_order=None, keep_latlon_prec=False, flat_outdir=True, product='fpit',
-                                 special_header_info: Optional[dict] = None, **prior_kwargs):
+                                 special_header_info: Optional[dict] = None, vmr_format='text', nprocs=0,
+                                 return_records=False, **prior_kwargs):
     """
     Generate multiple TCCON priors or a file containing multiple gas concentrations
 
-    This function wraps :func:`generate_single_tccon_prior`  in order to generate priors for one or more gases for one
+    This function wraps :func:`generate_tccon_priors_batch` in order to generate priors for one or more gases for one
     or more sites. The inputs ``mod_data``, ``utc_offsets``, and ``site_abbrevs`` determine the number of
     sites. Each of these must be either a single instance of the correct type or a collection of those types. Any of
     them given as collections must have the same number of elements; those given as single instances will be used for
@@ -3019,7 +4200,8 @@ def generate_tccon_priors_driver(mod_data, utc_offsets, species, site_abbrevs='x
     ``species`` can likewise be a single instance or a collection, but in either case will be applied to all
     sites/times. This determines which species will have profiles generated.
 
-    :param mod_data: input to :func:`generate_single_tccon_prior`, see that function.
+    :param mod_data: input to :func:`generate_single_tccon_prior`, see that function. The profiles read from a .mod
+     bundle by :func:`~ginput.common_utils.bundles.read_bundle` may be given directly.
 
     :param utc_offsets:  input to :func:`generate_single_tccon_prior`, see that function.
 
@@ -3043,8 +4225,24 @@ def generate_tccon_priors_driver(mod_data, utc_offsets, species, site_abbrevs='x
     :param special_header_info: A dictionary giving extra lines to write in the header of the .vmr file. The pairs
      will be written as "key: value" in the header. 
 
+    :param vmr_format: "text" to write the usual .vmr files or "bundle" to write one netCDF bundle per day holding all
+     the profiles instead (see :mod:`~ginput.common_utils.bundles`). Bundles are written to ``write_vmrs`` if
+     ``flat_outdir`` is ``True``, otherwise to a ``product`` subdirectory of it.
+    :type vmr_format: str
+
+    :param nprocs: number of processes to generate the priors with. The profiles are split into chunks and each
+     process generates the priors for all the species for the chunks it is given. Default is 0, i.e. run in serial.
+    :type nprocs: int
+
+    :param return_records: set to ``True`` to return the .vmr profiles. By default they are not kept, so that only one
+     batch of profiles is held in memory at a time (except when writing bundles, which hold a day's profiles).
+    :type return_records: bool
+
     :param prior_kwargs:
-    :return:
+    :return: if ``return_records`` is ``True``, the .vmr profiles as a list of dictionaries, one per profile, in the form
+     that :func:`~ginput.common_utils.bundles.read_bundle` returns for .vmr bundles. The gas profiles are dry mole
+     fractions. Otherwise ``None``.
+    :rtype: list(dict) or None
     """
     num_profiles = max(np.size(inpt) for inpt in [mod_data, utc_offsets, site_abbrevs])
     if site_abbrevs == 'all':
@@ -3091,6 +4289,8 @@ def generate_tccon_priors_driver(mod_data, utc_offsets, species, site_abbrevs='x
     mod_data = check_input(mod_data, 'mod_data', (str, dict))
     utc_offsets = check_input(utc_offsets, 'utc_offsets', (dt.timedelta, pd.Timedelta))
     site_abbrevs = check_input(site_abbrevs, 'site_abbrevs', (str,))
+    if len(mod_data) == 0:
+        raise ValueError('mod_data must contain at least one profile')
 
     # species will each be generated for every site.
     if isinstance(species, (str, MloSmoTraceGasRecord)):
@@ -3100,62 +4300,254 @@ def generate_tccon_priors_driver(mod_data, utc_offsets, species, site_abbrevs='x
     species = [gas_records[s]() if isinstance(s, str) else s for s in species]
 
     vmrs_dir, write_vmrs = parse_boollike_input(write_vmrs)
+    if vmr_format not in ('text', 'bundle'):
+        raise ValueError('vmr_format must be "text" or "bundle"')
+    if special_header_info is None:
+        special_header_info = dict()
 
     # MAIN LOOP #
-    # Loop over the requested profiles, creating a prior for each gas requested. Check that the other variables are all
-    # the same for each gas, then combine them to make a single .map file or dict for each profile
+    # Generate the priors for a batch of profiles at once for each gas, so that the record lookups can be shared. Then
+    # loop over the profiles in the batch, checking that the other variables are all the same for each gas, then
+    # combining the priors for each gas to make a single .vmr file or dict for each profile.
     ancillary_variables = ('Height', 'Temp', 'Pressure', 'PT', 'EqL')
     vmr_gases = dict()
-    for iprofile in range(num_profiles):
-        var_order = list(ancillary_variables)
-        for ispecie, specie_record in enumerate(species):
-            gas_name = specie_record.gas_name
-            var_order.append(specie_record.gas_name)
-            specie_profile, specie_units, specie_constants = \
-                generate_single_tccon_prior(mod_data[iprofile], utc_offsets[iprofile],
-                                            specie_record, **prior_kwargs)
-
-            if ispecie == 0 or np.isnan(map_constants['tropopause_alt']):
-                profile_dict = specie_profile
-                units_dict = specie_units
-                map_constants = specie_constants
+    vmr_records = []
+    bundle_records = dict()
+    with _priors_pool(species, nprocs) as pool:
+        for batch_start, batch_mod_data in _iter_prior_batches(mod_data):
+            batch_stop = batch_start + len(batch_mod_data)
+            batch_offsets = utc_offsets[batch_start:batch_stop]
+            if pool is None or len(batch_mod_data) == 1:
+                species_priors = _generate_species_priors(batch_mod_data, batch_offsets, species, prior_kwargs)
             else:
-                for ancvar in ancillary_variables:
-                    if not np.allclose(specie_profile[ancvar], profile_dict[ancvar], equal_nan=True):
-                        raise RuntimeError('Got different vectors for {} for difference species'.format(ancvar))
-
-                # All good? Add the current specie concentration to the dicts
-                profile_dict[gas_name] = specie_profile[gas_name]
-                units_dict[gas_name] = specie_units[gas_name]
-
-            # Record the profiles for the .vmr files, converted to dry mole fraction
-            vmr_gases[gas_name] = specie_profile[gas_name] * get_scale_factor(specie_units[gas_name])
-
-        # Write the combined .map file for all the requested species
-        site_lat = map_constants['site_lat']
-        site_lon = map_constants['site_lon']
-        site_date = map_constants['datetime']
-
-        if write_vmrs:
-            vmr_name = mod_utils.vmr_file_name(obs_date=site_date, lon=site_lon, lat=site_lat,
-                                               keep_latlon_prec=keep_latlon_prec)
-            if flat_outdir:
-                vmr_name = os.path.join(vmrs_dir, vmr_name)
-            else:
-                this_vmr_dir = mod_utils.vmr_output_subdir(vmrs_dir, site_abbrevs[iprofile], product=product)
-                if not os.path.exists(this_vmr_dir):
-                    os.makedirs(this_vmr_dir)
-                vmr_name = os.path.join(this_vmr_dir, vmr_name)
-            extra_header_info = {
-                'EFF_LAT_TROP': map_constants['trop_eqlat'],
-                'MIDTROP_THETA': '{:.2f}'.format(map_constants['midtrop_theta'])
-            }
-            extra_header_info.update(special_header_info)
-            writers.write_vmr_file(vmr_name, tropopause_alt=map_constants['tropopause_alt'],
-                                   profile_date=site_date, profile_lat=site_lat,
-                                   profile_alt=profile_dict['Height'], profile_gases=vmr_gases,
-                                   gas_name_order=gas_name_order,
-                                   extra_header_info=extra_header_info)
+                species_priors = _generate_species_priors_parallel(pool, nprocs, batch_mod_data, batch_offsets,
+                                                                   len(species), prior_kwargs)
+
+            for iprofile in range(batch_start, batch_stop):
+                for ispecie, specie_record in enumerate(species):
+                    gas_name = specie_record.gas_name
+                    batch_profiles, specie_units, batch_constants = species_priors[ispecie]
+                    specie_profile, specie_constants = _select_batch_prior(batch_profiles, batch_constants,
+                                                                           iprofile - batch_start)
+
+                    if ispecie == 0 or np.isnan(map_constants['tropopause_alt']):
+                        profile_dict = specie_profile
+                        units_dict = specie_units
+                        map_constants = specie_constants
+                    else:
+                        for ancvar in ancillary_variables:
+                            if not np.allclose(specie_profile[ancvar], profile_dict[ancvar], equal_nan=True):
+                                raise RuntimeError('Got different vectors for {} for difference species'.format(ancvar))
+
+                        # All good? Add the current specie concentration to the dicts
+                        profile_dict[gas_name] = specie_profile[gas_name]
+                        units_dict[gas_name] = specie_units[gas_name]
+
+                    # Record the profiles for the .vmr files, converted to dry mole fraction
+                    vmr_gases[gas_name] = specie_profile[gas_name] * get_scale_factor(specie_units[gas_name])
+
+                # Write the combined .map file for all the requested species
+                site_lat = map_constants['site_lat']
+                site_lon = map_constants['site_lon']
+                site_date = map_constants['datetime']
+
+                # Keep the .vmr profiles in the same form as a .vmr bundle holds them, so that they can be used without
+                # having to write and read back the .vmr files
+                vmr_name = mod_utils.vmr_file_name(obs_date=site_date, lon=site_lon, lat=site_lat,
+                                                   keep_latlon_prec=keep_latlon_prec)
+                extra_header_info = {
+                    'EFF_LAT_TROP': map_constants['trop_eqlat'],
+                    'MIDTROP_THETA': '{:.2f}'.format(map_constants['midtrop_theta'])
+                }
+                extra_header_info.update(special_header_info)
+
+                vmr_profile = {'Altitude': profile_dict['Height']}
+                vmr_profile.update(vmr_gases)
+                this_gas_order = vmr_gases.keys() if gas_name_order is None else gas_name_order
+                vmr_header = {'gas_name_order': ' '.join(this_gas_order),
+                              'extra_header': '\n'.join('{}: {}'.format(k, v) for k, v in extra_header_info.items())}
+                vmr_record = bundles.make_record(
+                    vmr_name, site_abbrevs[iprofile], {'datetime': site_date, 'lat': site_lat, 'lon': site_lon},
+                    scalar={'ZTROP_VMR': map_constants['tropopause_alt']}, profile=vmr_profile, header=vmr_header
+                )
+                if return_records:
+                    vmr_records.append(vmr_record)
+
+                if write_vmrs:
+                    if vmr_format == 'bundle':
+                        bundle_records.setdefault(site_date.date(), []).append(vmr_record)
+                        continue
+
+                    if flat_outdir:
+                        vmr_name = os.path.join(vmrs_dir, vmr_name)
+                    else:
+                        this_vmr_dir = mod_utils.vmr_output_subdir(vmrs_dir, site_abbrevs[iprofile], product=product)
+                        if not os.path.exists(this_vmr_dir):
+                            os.makedirs(this_vmr_dir)
+                        vmr_name = os.path.join(this_vmr_dir, vmr_name)
+                    writers.write_vmr_file(vmr_name, tropopause_alt=map_constants['tropopause_alt'],
+                                           profile_date=site_date, profile_lat=site_lat,
+                                           profile_alt=profile_dict['Height'], profile_gases=vmr_gases,
+                                           gas_name_order=gas_name_order,
+                                           extra_header_info=extra_header_info)
+
+    bundle_dir = vmrs_dir if flat_outdir else os.path.join(vmrs_dir, product)
+    for bundle_date, records in bundle_records.items():
+        os.makedirs(bundle_dir, exist_ok=True)
+        bundles.write_bundle(os.path.join(bundle_dir, bundles.bundle_file_name(product, bundle_date, 'vmr')), 'vmr',
+                             records, product=product)
+
+    return vmr_records if return_records else None
+
+
+# The largest number of profiles generate_tccon_priors_driver generates the priors for at once. Each batch's .mod
+# data and priors are only kept until its .vmr files are written, so this limits the memory needed for long runs,
+# unless the driver is asked to return all the .vmr profiles or to write bundles.
+_max_batch_profiles = 256
+
+
+def _generate_species_priors(mod_data, utc_offsets, species, prior_kwargs):
+    """
+    Generate the priors for each species for a set of profiles, sharing the species-independent quantities.
+
+    :param mod_data: the .mod files or dictionaries for the profiles.
+    :type mod_data: list(str or dict)
+
+    :param utc_offsets: the UTC offset for each profile.
+    :type utc_offsets: list(:class:`datetime.timedelta`)
+
+    :param species: the records for the species to generate priors for.
+    :type species: list(:class:`TraceGasRecord`)
+
+    :param prior_kwargs: additional keywords for :func:`generate_tccon_priors_batch`.
+    :type prior_kwargs: dict
+
+    :return: the output of :func:`generate_tccon_priors_batch` for each species.
+    :rtype: list(tuple)
+    """
+    stacked_mod_data = stack_mod_data(mod_data)
+    obs_utc_dates = [dt.datetime.combine((d - offset).date(), dt.time())
+                     for d, offset in zip(stacked_mod_data['file']['datetime'], utc_offsets)]
+    contexts = PriorContext.for_profiles(stacked_mod_data, obs_utc_dates)
+    return [generate_tccon_priors_batch(stacked_mod_data, utc_offsets, specie_record, contexts=contexts, **prior_kwargs)
+            for specie_record in species]
+
+
+def _iter_prior_batches(mod_data, max_profiles=_max_batch_profiles):
+    """
+    Split the profiles into batches for :func:`generate_tccon_priors_driver`, reading the .mod files as they are needed.
+
+    Each batch is a run of consecutive profiles with the same number of levels, so that they can be stacked by
+    :func:`stack_mod_data`, and has at most ``max_profiles`` profiles, to limit how many profiles are held in memory at
+    once.
+
+    :param mod_data: the .mod files or dictionaries for the profiles.
+    :type mod_data: list(str or dict)
+
+    :param max_profiles: the largest number of profiles to put in one batch.
+    :type max_profiles: int
+
+    :return: iterator over the index of the first profile in each batch and the list of .mod dictionaries in the batch.
+    """
+    batch = []
+    batch_start = 0
+    for i, moddat in enumerate(mod_data):
+        if isinstance(moddat, str):
+            moddat = readers.read_mod_file(moddat)
+        if len(batch) > 0 and (len(batch) == max_profiles or
+                               np.size(moddat['profile']['Height']) != np.size(batch[0]['profile']['Height'])):
+            yield batch_start, batch
+            batch = []
+            batch_start = i
+        batch.append(moddat)
+
+    if len(batch) > 0:
+        yield batch_start, batch
+
+
+@contextmanager
+def _priors_pool(species, nprocs):
+    """
+    Start the pool of processes for :func:`generate_tccon_priors_driver`, or give ``None`` if ``nprocs`` is 0.
+
+    The records in ``species`` are given to each process once when it starts, rather than with every chunk of profiles.
+
+    :param species: the records for the species to generate priors for.
+    :type species: list(:class:`TraceGasRecord`)
+
+    :param nprocs: the number of processes to start.
+    :type nprocs: int
+    """
+    if nprocs == 0:
+        yield None
+        return
+
+    # Every profile needs these tables; loading them before starting the processes lets them share the parent's copy
+    lut_registry.preload(['clams', 'theta_v_lat'])
+    with Pool(processes=nprocs, initializer=_init_priors_worker, initargs=(species,)) as pool:
+        yield pool
+
+
+def _generate_species_priors_parallel(pool, nprocs, mod_data, utc_offsets, n_species, prior_kwargs):
+    """
+    Generate the priors for each species with a pool of processes, see :func:`_generate_species_priors`.
+
+    :param pool: the pool from :func:`_priors_pool`.
+    :type pool: :class:`multiprocessing.pool.Pool`
+
+    :param nprocs: the number of processes in the pool.
+    :type nprocs: int
+
+    :param n_species: the number of species the pool's processes were given.
+    :type n_species: int
+
+    The other parameters and the return value are the same as :func:`_generate_species_priors`.
+    """
+    # Several chunks per process so that a slow chunk does not leave the other processes idle at the end
+    n_prof = len(mod_data)
+    if n_prof == 0:
+        raise ValueError('mod_data must contain at least one profile')
+    n_chunks = min(n_prof, 4 * nprocs)
+    chunk_edges = np.linspace(0, n_prof, n_chunks + 1).astype(int)
+    chunks = [(mod_data[i:j], utc_offsets[i:j], prior_kwargs) for i, j in zip(chunk_edges[:-1], chunk_edges[1:])]
+
+    # map returns the chunks in order, so the profiles stay in the same order as mod_data
+    chunk_priors = pool.map(_generate_priors_chunk, chunks)
+
+    species_priors = []
+    for ispecie in range(n_species):
+        chunk_maps, chunk_units, chunk_constants = zip(*[priors[ispecie] for priors in chunk_priors])
+        map_dict = {k: np.concatenate([d[k] for d in chunk_maps], axis=1) for k in chunk_maps[0]}
+        map_constants = {k: np.concatenate([d[k] for d in chunk_constants]) if np.ndim(v) == 1 else v
+                         for k, v in chunk_constants[0].items()}
+        species_priors.append((map_dict, chunk_units[0], map_constants))
+    return species_priors
+
+
+# The trace gas records for the current worker process, set by _init_priors_worker
+_worker_species = None
+
+
+def _init_priors_worker(species):
+    """
+    Store the trace gas records in a worker process for :func:`_generate_species_priors_parallel`.
+    """
+    global _worker_species
+    _worker_species = species
+
+
+def _generate_priors_chunk(args):
+    """
+    Worker for :func:`_generate_species_priors_parallel` that generates the priors for one chunk of profiles.
+
+    :param args: the .mod data, UTC offsets, and keywords for :func:`generate_tccon_priors_batch` for the chunk.
+    :type args: tuple
+
+    :return: the output of :func:`generate_tccon_priors_batch` for each species.
+    :rtype: list(tuple)
+    """
+    mod_data, utc_offsets, prior_kwargs = args
+    return _generate_species_priors(mod_data, utc_offsets, _worker_species, prior_kwargs)
 
 
 def _add_common_cl_args(parser):
@@ -3191,6 +4583,16 @@ def _add_common_cl_args(parser):
                         help='A JSON file that configures which files to read MLO/SMO data from. The top level must be a '
                              'dictionary with lowercase gas names as keys. The values must be dictionaries with "mlo_file" '
                              'and "smo_file" as keys, with their values being paths to the files to read.')
+    parser.add_argument('--bundle', dest='vmr_format', action='store_const', const='bundle', default='text',
+                        help='Write one netCDF bundle per day containing all the profiles instead of individual .vmr '
+                             'files. Use "export-bundle" to convert these back to .vmr files.')
+    parser.add_argument('--from-bundles', action='store_true',
+                        help='Read the .mod profiles from the daily bundles written by "mod --bundle" instead of from '
+                             'individual .mod files. The bundles are looked for in mod_dir, or in the <product> '
+                             'subdirectory of --mod-root-dir.')
+    parser.add_argument('-n', '--nprocs', default=0, type=int,
+                        help='Number of processes to use to generate the priors for different profiles in parallel. '
+                             'Default is 0, i.e. run in serial.')
 
 
 def parse_args(parser=None):
@@ -3243,7 +4645,7 @@ def runlog_cl_driver(runlog, first_date='2000-01-01', site_abbrev=None, **kwargs
 
 def cl_driver(date_range, mod_dir=None, mod_root_dir=None, save_dir=None, product='fpit',
               site_lat=None, site_lon=None, site_abbrev='xx', keep_latlon_prec=False, 
-              mlo_smo_files: Optional[Union[str, dict]] = None, **kwargs):
+              mlo_smo_files: Optional[Union[str, dict]] = None, from_bundles=False, **kwargs):
 
     # Read the MLO/SMO JSON if given
     if isinstance(mlo_smo_files, (str, Path)):
@@ -3259,6 +4661,25 @@ def cl_driver(date_range, mod_dir=None, mod_root_dir=None, save_dir=None, produc
     if save_dir is None:
         save_dir = mod_utils.get_ggg_path(os.path.join('vmrs', 'gnd'), 'save directory')
 
+    if from_bundles:
+        # The daily .mod bundles are in the product directory rather than site subdirectories, and hold every site
+        bundle_dir = mod_dir if mod_dir is not None else os.path.join(mod_root_dir, product)
+        sites = [(abbrev, lat, None if lon is None else lon - 360 if lon > 180 else lon)
+                 for abbrev, lat, lon in zip(site_abbrev, site_lat, site_lon)]
+        mod_data = []
+        for bundle_file in bundles.find_daily_bundles(bundle_dir, 'mod', date_range, product=product).values():
+            mod_data.extend(bundles.select_records(bundles.read_bundle(bundle_file), date_range=date_range,
+                                                   sites=sites))
+        if len(mod_data) == 0:
+            raise IOError('No profiles for the requested sites and dates were found in the .mod bundles in {}'
+                          .format(bundle_dir))
+
+        generate_full_tccon_vmr_file(mod_data=mod_data, utc_offsets=dt.timedelta(0), save_dir=save_dir,
+                                     product=product, keep_latlon_prec=keep_latlon_prec,
+                                     site_abbrevs=[rec['file']['site'] for rec in mod_data],
+                                     mlo_smo_files=mlo_smo_files, **kwargs)
+        return
+
     # Expand the date range to explicitly include every 3 hours
     orig_date_range = date_range
     date_range = pd.date_range(date_range[0], date_range[1], freq='3H')
@@ -6,6 +6,8 @@ import netCDF4 as ncdf
 import numpy as np
 import os
 import re
+import shutil
+import tempfile
 import unittest
 
 from . import test_utils
@@ -99,7 +101,7 @@ class FileComparer(object):
             ext = os.path.splitext(filename)
             raise NotImplementedError('Do not know how to read a "{}" file'.format(ext))
 
-    def compare_two_files(self, check_file, new_file, variable_mapping=None, variable_scaling=None):
+    def compare_two_files(self, check_file, new_file, variable_mapping=None, variable_scaling=None, rel_tol=1e-4):
         """Check that the data contained in two files are identical
 
         Parameters
@@ -121,6 +123,9 @@ class FileComparer(object):
             category then variable names as keys) and the values of the inner dictionary will be the factor to multiply
             that variable in the new file by.
 
+        rel_tol : float
+            Values must agree to within this fraction of the largest value of each variable in the check file.
+
         Returns
         -------
         bool
@@ -175,7 +180,7 @@ class FileComparer(object):
 
                 with self.subTest(check_file=check_file, new_file=new_file, category=category_name,
                                   variable=variable_name):
-                    test_result = _test_single_variable(variable_data, this_new_data)
+                    test_result = _test_single_variable(variable_data, this_new_data, rel_tol=rel_tol)
                     if not test_result:
                         try:
                             self._plot_helper(check_data=check_data, new_data=new_data, category=category_name,
@@ -261,9 +266,24 @@ class TestModMaker(unittest.TestCase, FileComparer):
         self._comparison_helper(lambda b, t: test_utils.iter_map_file_pairs(b, t, nc=False),
                                 test_utils.map_input_dir, test_utils.map_output_dir)
 
-    def _comparison_helper(self, iter_fxn, input_dir, output_dir):
+    def test_mod_vmr_map(self):
+        # The one-step mod-vmr-map driver keeps the profiles in memory, so it must give the same .map files as writing
+        # and reading back the .mod and .vmr files in setUpClass. Those text files round the values, so allow 0.1%.
+        date_range = [test_utils.test_date, test_utils.test_date+dt.timedelta(days=1)]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for map_fmt in ('nc', 'txt'):
+                map_maker.mod_vmr_map_driver(date_range, test_utils.geos_fp_dir, tmp_dir, mode='fpit-eta',
+                                             site_abbrev=test_utils.test_site, std_vmr_file=test_utils.std_vmr_file,
+                                             map_fmt=map_fmt, muted=True)
+            map_dir = os.path.join(tmp_dir, 'fpit', test_utils.test_site, 'maps-vertical')
+            self._comparison_helper(lambda b, t: test_utils.iter_map_file_pairs(b, t, nc=True),
+                                    test_utils.map_output_dir, map_dir, rel_tol=1e-3)
+            self._comparison_helper(lambda b, t: test_utils.iter_map_file_pairs(b, t, nc=False),
+                                    test_utils.map_output_dir, map_dir, rel_tol=1e-3)
+
+    def _comparison_helper(self, iter_fxn, input_dir, output_dir, **kws):
         for check_file, new_file in iter_fxn(input_dir, output_dir):
-            self.compare_two_files(check_file, new_file)
+            self.compare_two_files(check_file, new_file, **kws)
 
     @staticmethod
     def _plot_helper(check_data, new_data, category, variable, new_file, new_variable=None):
@@ -322,6 +342,70 @@ class TestMapMaker(unittest.TestCase, FileComparer):
             vmr_scales = self._get_map_unit_scales(map_file)
             self.compare_two_files(vmr_file, map_file, variable_mapping=self.vmr_to_map, variable_scaling=vmr_scales)
 
+    def test_nprocs(self):
+        # The files from setUpClass were written serially, so the parallel ones must be identical to them. The netCDF
+        # history attribute includes the creation time, so that is the only thing allowed to differ.
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for map_fmt in ('nc', 'txt'):
+                map_maker.cl_driver(date_range=self._date_range, mod_dir=self._mod_dir, vmr_dir=self._vmr_dir,
+                                    save_dir=tmp_dir, dry=True, site_abbrev=test_utils.test_site, map_fmt=map_fmt,
+                                    nprocs=2)
+
+            map_files = sorted(os.listdir(tmp_dir))
+            self.assertEqual(map_files, sorted(f for f in os.listdir(self._map_dir) if '.map' in f))
+            for map_file in map_files:
+                with self.subTest(map_file=map_file):
+                    serial_file = os.path.join(self._map_dir, map_file)
+                    parallel_file = os.path.join(tmp_dir, map_file)
+                    if map_file.endswith('.nc'):
+                        self._compare_nc_maps(serial_file, parallel_file)
+                    else:
+                        with open(serial_file) as f1, open(parallel_file) as f2:
+                            self.assertEqual(f1.read(), f2.read())
+
+    def test_nprocs_errors(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            mod_dir = os.path.join(tmp_dir, 'mod')
+            vmr_dir = os.path.join(tmp_dir, 'vmr')
+            shutil.copytree(self._mod_dir, mod_dir)
+            shutil.copytree(self._vmr_dir, vmr_dir)
+            map_dir = os.path.join(tmp_dir, 'maps')
+            os.mkdir(map_dir)
+
+            # Break two of the .vmr files. The errors must come back in time order, regardless of which process
+            # finishes first, so that the log and the exception always point to the same file.
+            vmr_files = sorted(glob(os.path.join(vmr_dir, '*.vmr')))
+            bad_files = [vmr_files[1], vmr_files[5]]
+            for vmr_file in bad_files:
+                with open(vmr_file, 'w') as wobj:
+                    wobj.write('not a vmr file\n')
+
+            for _ in range(2):
+                with self.assertLogs(map_maker.logger, level='ERROR') as logs, self.assertRaises(RuntimeError) as err:
+                    map_maker.cl_driver(date_range=self._date_range, mod_dir=mod_dir, vmr_dir=vmr_dir,
+                                        save_dir=map_dir, dry=True,
+                                        site_abbrev=test_utils.test_site, map_fmt='nc', nprocs=2)
+
+                self.assertEqual(len(logs.records), len(bad_files))
+                for record, vmr_file in zip(logs.records, bad_files):
+                    self.assertIn(vmr_file, record.getMessage())
+                self.assertIn('Failed to write 2 of {}'.format(len(vmr_files)), str(err.exception))
+                self.assertIn(bad_files[0], str(err.exception))
+
+            map_files = sorted(os.listdir(map_dir))
+            self.assertEqual(len(map_files), len(vmr_files) - len(bad_files))
+
+    def _compare_nc_maps(self, serial_file, parallel_file):
+        with ncdf.Dataset(serial_file) as ds1, ncdf.Dataset(parallel_file) as ds2:
+            self.assertEqual({k: ds1.getncattr(k) for k in ds1.ncattrs() if k != 'history'},
+                             {k: ds2.getncattr(k) for k in ds2.ncattrs() if k != 'history'})
+            self.assertEqual(sorted(ds1.variables.keys()), sorted(ds2.variables.keys()))
+            for varname, var1 in ds1.variables.items():
+                var2 = ds2.variables[varname]
+                self.assertEqual({k: var1.getncattr(k) for k in var1.ncattrs()},
+                                 {k: var2.getncattr(k) for k in var2.ncattrs()})
+                np.testing.assert_array_equal(var1[:], var2[:])
+
     @classmethod
     def _get_nc_unit_scales(cls, map_file):
         with ncdf.Dataset(map_file) as ds:
@@ -367,13 +451,13 @@ def _clean_up_files_recursive(top_dir, pattern):
                 os.remove(fullfile)
 
 
-def _test_single_variable(variable_data, this_new_data):
+def _test_single_variable(variable_data, this_new_data, rel_tol=1e-4):
     try:
         # We need some absolute tolerance, otherwise inconsequential differences cause the test to fail. E.g. as N2O and
-        # CH4 go to zero, a difference of 1e-13 parts triggers a failure, which really doesn't matter. We'll make the
-        # absolute tolerance equal to 0.01% of the maximum value in the original data, because a 0.01% difference in
-        # the prior concentration really shouldn't matter.
-        atol = 1e-4 * np.abs(np.nanmax(variable_data))
+        # CH4 go to zero, a difference of 1e-13 parts triggers a failure, which really doesn't matter. By default, we'll
+        # make the absolute tolerance equal to 0.01% of the maximum value in the original data, because a 0.01%
+        # difference in the prior concentration really shouldn't matter.
+        atol = rel_tol * np.abs(np.nanmax(variable_data))
         return np.isclose(variable_data, this_new_data, atol=atol).all()
     except TypeError:
         # Not all variables with be float arrays. If np.isclose() can't coerce the data to a numeric
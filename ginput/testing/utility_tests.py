@@ -1,12 +1,22 @@
-from datetime import datetime as dtime
+from argparse import ArgumentParser
+from contextlib import contextmanager
+from datetime import datetime as dtime, timedelta
+from hashlib import sha1
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from itertools import product
+import h5py
 import netCDF4 as ncdf
 import numpy as np
+import numpy.ma as ma
 import os
+import tempfile
+import threading
 import unittest
 
-from ..common_utils import mod_utils
+from ..common_utils import mod_utils, ioutils, bundles, readers, sat_utils, writers
+from ..download import download_utils
 from ..mod_maker import mod_maker, tccon_sites
+from ..priors import acos_interface, tccon_priors, map_maker
 
 from . import test_utils
 
@@ -77,6 +87,182 @@ class TestGinputUtils(unittest.TestCase):
                 th_chk = mod_utils.calculate_potential_temperature(p, t)
                 self.assertLess(abs(theta - th_chk), 0.01)
 
+    def test_eqlat_interpolator(self):
+        pv_grid = np.array([-10.0, 0.0, 10.0])
+        theta_grid = np.array([300.0, 400.0])
+        el_table = np.array([[-60.0, 0.0, 60.0], [-80.0, 0.0, 80.0]])
+        interpolator = mod_utils.EqLatInterpolator(pv_grid, theta_grid, el_table)
+
+        pv = np.array([[5.0, -10.0, 20.0], [0.0, np.nan, -5.0]])
+        theta = np.array([[350.0, 300.0, 400.0], [250.0, 350.0, 1000.0]])
+        # Points outside the grid are clamped to its edges, as interp2d did
+        expected = np.array([[35.0, -60.0, 80.0], [0.0, np.nan, -40.0]])
+
+        el = interpolator(pv, theta)
+        self.assertEqual(el.shape, pv.shape)
+        np.testing.assert_allclose(el, expected)
+        for p, t, e in zip(pv.flat, theta.flat, expected.flat):
+            with self.subTest(pv=p, theta=t):
+                np.testing.assert_allclose(interpolator(p, t), e)
+
+    def test_eqlat_vectorized_helpers(self):
+        rng = np.random.default_rng(42)
+        pt = np.sort(rng.uniform(250.0, 1500.0, (20, 4, 5)), axis=0)
+        pv = rng.normal(0.0, 1e-5, pt.shape)
+        # Repeated and out of order coordinates in some columns, and a NaN in another
+        pt[3, 0, 0] = pt[2, 0, 0]
+        pt[:, 1, 1] = pt[::-1, 1, 1]
+        pt[5, 2, 2] = np.nan
+        theta_grid = np.linspace(200.0, 1600.0, 50)
+
+        interp_pv = mod_utils._interp_columns(theta_grid, pt, pv)
+        for i, j in product(range(pt.shape[1]), range(pt.shape[2])):
+            with self.subTest(column=(i, j)):
+                np.testing.assert_array_equal(interp_pv[:, i, j], np.interp(theta_grid, pt[:, i, j], pv[:, i, j]))
+
+        area = rng.uniform(0.0, 1.0, pv.shape[1:])
+        level_pv = interp_pv[10]
+        level_pv[0, 0] = np.nan
+        thresholds = np.linspace(np.nanmin(level_pv), np.nanmax(level_pv), 100)
+        expected = np.array([np.sum(area[level_pv >= t]) for t in thresholds])
+        np.testing.assert_allclose(mod_utils._area_above_thresholds(level_pv, area, thresholds), expected)
+
+    def test_vectorized_date_subtraction(self):
+        from dateutil.relativedelta import relativedelta
+
+        dates = np.array(['2016-02-29T00:00', '2018-03-31T12:30', '2018-01-01T00:00:00.000001'], dtype='datetime64[us]')
+        ages = np.array([0.25, 1.0, 5.7])
+        lag = relativedelta(months=2, days=1)
+        record_dates = mod_utils.subtract_reldelta(mod_utils.subtract_frac_years(dates, ages), lag)
+        for d, a, r in zip(dates.tolist(), ages, record_dates.tolist()):
+            with self.subTest(date=d, age=a):
+                self.assertEqual(r, d - mod_utils.frac_years_to_reldelta(a) - lag)
+
+        self.assertTrue(np.isnat(mod_utils.subtract_frac_years(dates[:1], np.array([np.nan]))[0]))
+
+    def test_eqlat_table_cache(self):
+        interpolator = mod_utils.EqLatInterpolator(np.array([-10.0, 0.0, 10.0]), np.array([300.0, 400.0]),
+                                                   np.array([[-60.0, 0.0, 60.0], [-80.0, 0.0, 80.0]]))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # The cache only cares about the contents of the GEOS files, so stand-in files work fine here
+            geos_files = [os.path.join(tmp_dir, 'geos{}.nc4'.format(i)) for i in range(3)]
+            for i, geos_file in enumerate(geos_files):
+                with open(geos_file, 'w') as fobj:
+                    fobj.write('file {}'.format(i))
+
+            cache = ioutils.EqLatTableCache(os.path.join(tmp_dir, 'cache'), max_entries=2)
+            self.assertIsNone(cache.load(geos_files[0]))
+            cache.save(geos_files[0], interpolator)
+            cached = cache.load(geos_files[0])
+            np.testing.assert_array_equal(cached.interp_EL, interpolator.interp_EL)
+            np.testing.assert_array_equal(cached(5.0, 350.0), interpolator(5.0, 350.0))
+
+            with self.subTest(check='modified table code'):
+                # Stand in for an edit to mod_maker by swapping its file for a different one
+                code_file = os.path.join(tmp_dir, 'mod_maker.py')
+                with open(code_file, 'w') as fobj:
+                    fobj.write('# modified')
+                orig_code_files = ioutils._eqlat_table_code_files
+                ioutils._eqlat_table_code_files = (orig_code_files[0], code_file)
+                try:
+                    new_code_cache = ioutils.EqLatTableCache(cache.cache_dir)
+                finally:
+                    ioutils._eqlat_table_code_files = orig_code_files
+                self.assertIsNone(new_code_cache.load(geos_files[0]))
+                os.remove(code_file)
+
+            with self.subTest(check='modified GEOS file'):
+                with open(geos_files[0], 'a') as fobj:
+                    fobj.write(' modified')
+                self.assertIsNone(cache.load(geos_files[0]))
+
+            with self.subTest(check='eviction'):
+                cache.save(geos_files[1], interpolator)
+                cache.save(geos_files[2], interpolator)
+                self.assertEqual(len(os.listdir(cache.cache_dir)), 2)
+
+    def test_clams_age_lookup(self):
+        from scipy.interpolate import LinearNDInterpolator
+
+        eqlat = np.array([-90.0, -30.0, 0.0, 45.0, 90.0])
+        theta = np.array([380.0, 500.0, 800.0, 2000.0])
+        doy = np.arange(1, 4)
+        age = np.random.default_rng(42).uniform(0.0, 6.0, (doy.size, theta.size, eqlat.size))
+        lookup = tccon_priors.ClamsAgeLookup(eqlat, theta, doy, age)
+
+        test_theta = np.array([[400.0, 800.0, 1500.0, 2500.0], [380.0, 600.0, 1999.0, 350.0]])
+        test_eqlat = np.array([[10.0, -30.0, 80.0, 0.0], [-90.0, 30.0, 20.0, 0.0]])
+        test_doy = np.array([[1], [3]])
+        ages = lookup(test_theta, test_eqlat, test_doy)
+        self.assertEqual(ages.shape, test_theta.shape)
+
+        el_grid, th_grid = np.meshgrid(eqlat, theta)
+        points = np.column_stack([el_grid.ravel(), th_grid.ravel()])
+        for iprof, d in enumerate(test_doy[:, 0]):
+            with self.subTest(doy=d):
+                reference = LinearNDInterpolator(points, age[d - 1].ravel())(test_eqlat[iprof], test_theta[iprof])
+                np.testing.assert_allclose(ages[iprof], reference)
+
+    def test_lut_registry(self):
+        nloads = []
+
+        def loader(lut_file):
+            nloads.append(lut_file)
+            return {'values': np.loadtxt(lut_file)}
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            lut_file = os.path.join(tmp_dir, 'lut.txt')
+            np.savetxt(lut_file, np.arange(4.0))
+            registry = tccon_priors.LutRegistry()
+            registry.register('test', lambda: lut_file, loader)
+
+            registry.preload()
+            table = registry.get('test')
+            self.assertEqual(len(nloads), 1)
+            self.assertFalse(table['values'].flags.writeable)
+            self.assertEqual(registry.memory_usage(), {('test', lut_file): 4 * 8})
+
+            with self.subTest(check='touched file'):
+                os.utime(lut_file, ns=(0, 0))
+                self.assertIs(registry.get('test'), table)
+                self.assertEqual(len(nloads), 1)
+
+            with self.subTest(check='modified file'):
+                np.savetxt(lut_file, np.arange(5.0))
+                np.testing.assert_array_equal(registry.get('test')['values'], np.arange(5.0))
+                self.assertEqual(len(nloads), 2)
+
+    def test_read_mod_file(self):
+        mod_dir = os.path.join(test_utils.mod_input_dir, 'oc', 'vertical')
+        mod_file = os.path.join(mod_dir, sorted(f for f in os.listdir(mod_dir) if f.endswith('.mod'))[0])
+        moddat = readers.read_mod_file(mod_file)
+        modstruct = readers.read_mod_file(mod_file, as_struct=True)
+
+        self.assertEqual(moddat['file']['datetime'], mod_utils.find_datetime_substring(mod_file, out_type=dtime))
+        self.assertEqual(moddat['constants']['obs_lat'], modstruct.constants['obs_lat'])
+        self.assertEqual(list(moddat['profile'].keys()), modstruct.profile_names)
+        for key, values in moddat['profile'].items():
+            self.assertEqual(values.dtype, np.float64)
+            np.testing.assert_array_equal(values, modstruct[key])
+        self.assertEqual(readers.read_mod_file_units(mod_file),
+                         dict(zip(modstruct.profile_names, modstruct.profile_units)))
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # Masked values are written as "--" by mod_maker; they should come back as NaNs
+            masked_file = os.path.join(tmp_dir, os.path.basename(mod_file))
+            with open(mod_file) as robj:
+                lines = robj.readlines()
+            nhead = len(modstruct.header_lines)
+            values = lines[nhead].split()
+            values[2] = '--'
+            lines[nhead] = '  '.join(values) + '\n'
+            with open(masked_file, 'w') as wobj:
+                wobj.writelines(lines)
+
+            masked_dat = readers.read_mod_file(masked_file)
+            self.assertTrue(np.isnan(masked_dat['profile'][modstruct.profile_names[2]][0]))
+            np.testing.assert_array_equal(masked_dat['profile']['Temperature'], moddat['profile']['Temperature'])
+
 
 class TestModMakerUtils(unittest.TestCase):
     @staticmethod
@@ -95,6 +281,61 @@ class TestModMakerUtils(unittest.TestCase):
             new_lon = mod_maker.lat_lon_interp(lon_array, lat, lon, [site_lat], [site_lon], [ids])[0]
             return new_lat.item(), new_lon.item()
 
+    def test_lat_lon_interp_weights(self):
+        lat = np.arange(-90.0, 91.0, 2.0)
+        lon = np.arange(-180.0, 180.0, 2.5)
+        lon_grid, lat_grid = np.meshgrid(lon, lat)
+        # Linear in latitude and longitude, so bilinear interpolation should reproduce it exactly
+        data = np.stack([lat_grid + 2 * lon_grid, np.full(lat_grid.shape, 300.0)])
+        data[0, 56, 10] = np.nan
+
+        site_lats = np.array([21.3, -45.0, 22.5, 30.0])
+        site_lons = np.array([-150.2, 100.0, -154.0, 179.0])
+        ids = [mod_maker.querry_indices([lat, lon], slat, slon, None, None) for slat, slon in zip(site_lats, site_lons)]
+        interp_data = mod_maker.lat_lon_interp(data, lat, lon, site_lats, site_lons, ids)
+
+        self.assertEqual(interp_data.shape, (2, site_lats.size))
+        np.testing.assert_allclose(interp_data[0, :2], site_lats[:2] + 2 * site_lons[:2])
+        # A NaN corner makes the result NaN, constant fields must come out exactly, and cells across the date line
+        # interpolate between 177.5 and -180 (= 180)
+        self.assertTrue(np.isnan(interp_data[0, 2]))
+        np.testing.assert_array_equal(interp_data[1], 300.0)
+        lat_frac = (30.0 - lat[ids[3][0]]) / 2.0
+        expected = (1 - lat_frac) * data[0, ids[3][0], [-1, 0]] + lat_frac * data[0, ids[3][1], [-1, 0]]
+        np.testing.assert_allclose(interp_data[0, 3], 0.4 * expected[0] + 0.6 * expected[1])
+
+    def test_geos_subset_reader(self):
+        lat = np.arange(-90.0, 91.0, 2.0)
+        lon = np.arange(-180.0, 180.0, 2.5)
+        rng = np.random.default_rng(0)
+        data = rng.normal(size=(1, 3, lat.size, lon.size))
+        data[0, 1, 60, 20] = np.nan
+
+        # Include points next to each other (should share a box), on both sides of the date line, and next to the NaN
+        site_lats = np.array([21.3, 22.1, -45.0, 30.0, -10.0, 31.0])
+        site_lons = np.array([-150.2, -149.0, 100.0, 179.0, -179.0, -130.1])
+        ids = [mod_maker.querry_indices([lat, lon], slat, slon, None, None) for slat, slon in zip(site_lats, site_lons)]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            nc_file = os.path.join(tmp_dir, 'geos.nc4')
+            with ncdf.Dataset(nc_file, 'w') as ds:
+                ds.createDimension('time', 1)
+                ds.createDimension('lev', 3)
+                ds.createDimension('lat', lat.size)
+                ds.createDimension('lon', lon.size)
+                ds.createVariable('T', float, ('time', 'lev', 'lat', 'lon'))[:] = data
+            with ncdf.Dataset(nc_file) as ds:
+                subset = mod_maker.GeosSubsetReader(ids, lat.size, lon.size)
+                compact = subset.read(ds['T'])
+
+        self.assertLess(compact.size, data.size // 100)
+        weights = mod_maker.lat_lon_interp_weights(lat, lon, site_lats, site_lons, ids)
+        expected = mod_maker.lat_lon_interp(data[0], lat, lon, site_lats, site_lons, ids, interp_weights=weights)
+        result = mod_maker.lat_lon_interp(compact, lat, lon, site_lats, site_lons, ids,
+                                          interp_weights=subset.remap_weights(weights))
+        np.testing.assert_array_equal(result, expected)
+        self.assertTrue(np.isnan(result[1, -1]))
+
     def test_lat_lon_interp(self):
         sites = tccon_sites.tccon_site_info_for_date(test_utils.test_date)
         failed_sites = []
@@ -108,6 +349,624 @@ class TestModMakerUtils(unittest.TestCase):
         msg = "{nfail}/{tot} sites' interpolated lat/lon do not match their original: {sites}".format(nfail=len(failed_sites), tot=len(sites), sites=', '.join(failed_sites))
         self.assertTrue(len(failed_sites) == 0, msg=msg)
 
+    def test_write_mod(self):
+        # Rewrite the stored .mod files from their own profiles. The stored pressures only have four significant
+        # figures, so the potential temperature and mean molecular weight computed from them may differ slightly; every
+        # other value must be written exactly as stored.
+        mod_dir = os.path.join(test_utils.mod_input_dir, 'oc', 'vertical')
+        mod_files = sorted(f for f in os.listdir(mod_dir) if f.endswith('.mod'))
+        computed_columns_rtol = {3: 1e-5, 7: 2e-4}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for mod_file in mod_files:
+                stored_file = os.path.join(mod_dir, mod_file)
+                stored = readers.read_mod_file(stored_file)
+                with open(stored_file) as f:
+                    stored_lines = f.readlines()
+
+                prof = stored['profile']
+                data = {'lev': prof['Pressure'], 'T': prof['Temperature'], 'H': prof['Height'],
+                        'H2O_DMF': ma.masked_array(prof['H2O']), 'RH': ma.masked_array(prof['RH'] / 100),
+                        'EPV': prof['EPV'], 'O3': prof['O3'], 'CO': prof['CO']}
+                surf_data = {key: stored['scalar'][name]
+                             for key, name in zip(writers.mod_surf_var_order, writers.mod_surf_names)}
+                # The constants line keeps more precision for the tropopause pressure than the surface line
+                surf_data['TROPPB'] = stored['constants']['tropopause_pressure']
+
+                new_file = os.path.join(tmp_dir, mod_file)
+                mod_maker.write_mod(new_file, stored_lines[4].rstrip('\n'), stored['constants']['obs_lat'], data=data,
+                                    surf_data=surf_data, func=lambda epv, pt: ma.masked_array(prof['EqL']),
+                                    muted=True, chem_vars=True)
+                with open(new_file) as f:
+                    new_lines = f.readlines()
+
+                self.assertEqual(len(new_lines), len(stored_lines), msg=mod_file)
+                self.assertEqual(new_lines[:7], stored_lines[:7], msg=mod_file)
+                for iline, (new_line, stored_line) in enumerate(zip(new_lines[7:], stored_lines[7:]), start=8):
+                    msg = '{} line {}'.format(mod_file, iline)
+                    self.assertEqual(len(new_line), len(stored_line), msg=msg)
+                    new_values, stored_values = new_line.split(), stored_line.split()
+                    self.assertEqual(len(new_values), len(stored_values), msg=msg)
+                    for icol, (new_val, stored_val) in enumerate(zip(new_values, stored_values)):
+                        if icol in computed_columns_rtol:
+                            np.testing.assert_allclose(float(new_val), float(stored_val),
+                                                       rtol=computed_columns_rtol[icol], err_msg=msg)
+                        else:
+                            self.assertEqual(new_val, stored_val, msg=msg)
+
+
+class TestBundles(unittest.TestCase):
+    def test_mod_bundle_round_trip(self):
+        mod_dir = os.path.join(test_utils.mod_input_dir, 'oc', 'vertical')
+        mod_files = sorted(os.path.join(mod_dir, f) for f in os.listdir(mod_dir) if f.endswith('.mod'))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            bundle_file = os.path.join(tmp_dir, 'test.mod.nc')
+            bundles.bundle_text_files(bundle_file, 'mod', mod_files, site_abbrev='oc')
+            self.assertEqual(len(bundles.read_bundle(bundle_file)), len(mod_files))
+
+            bundles.export_bundle(bundle_file, tmp_dir)
+            for mod_file in mod_files:
+                with open(mod_file) as orig, open(os.path.join(tmp_dir, os.path.basename(mod_file))) as exported:
+                    self.assertEqual(orig.read(), exported.read(), msg=os.path.basename(mod_file))
+
+    def test_failed_write_keeps_bundle(self):
+        mod_dir = os.path.join(test_utils.mod_input_dir, 'oc', 'vertical')
+        mod_files = sorted(os.path.join(mod_dir, f) for f in os.listdir(mod_dir) if f.endswith('.mod'))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            bundle_file = os.path.join(tmp_dir, 'test.mod.nc')
+            bundles.bundle_text_files(bundle_file, 'mod', mod_files, site_abbrev='oc')
+            records = bundles.read_bundle(bundle_file)
+
+            # A value that cannot be written only fails once the new file is being written
+            records[0]['scalar']['SZA'] = 'not a number'
+            with self.assertRaises(ValueError):
+                bundles.write_bundle(bundle_file, 'mod', records, replace=True)
+            self.assertEqual(os.listdir(tmp_dir), ['test.mod.nc'])
+            self.assertEqual(len(bundles.read_bundle(bundle_file)), len(mod_files))
+
+    def test_select_records(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            mod_bundle, _ = self._write_daily_bundles(tmp_dir)
+            bundle_dir = os.path.dirname(mod_bundle)
+            date_range = [test_utils.test_date - timedelta(days=1), test_utils.test_date + timedelta(days=1)]
+            with self.assertRaisesRegex(IOError, 'FPIT_20171231.mod.nc'):
+                bundles.find_daily_bundles(bundle_dir, 'mod', date_range)
+            bundle_files = bundles.find_daily_bundles(bundle_dir, 'mod', date_range, skip_missing=True)
+            self.assertEqual(list(bundle_files.keys()), [test_utils.test_date.date()])
+
+            records = bundles.read_bundle(bundle_files[test_utils.test_date.date()])
+            date_range = [test_utils.test_date + timedelta(hours=3), test_utils.test_date + timedelta(hours=12)]
+            selected = bundles.select_records(records, date_range=date_range)
+            self.assertEqual([r['file']['datetime'].hour for r in selected], [3, 6, 9])
+
+            self.assertEqual(len(bundles.select_records(records, sites=[('oc', None, None)])), len(records))
+            self.assertEqual(len(bundles.select_records(records, sites=[('oc', 36.6, 262.5)])), len(records))
+            self.assertEqual(bundles.select_records(records, sites=[('oc', 40., -97.)]), [])
+            self.assertEqual(bundles.select_records(records, sites=[('pa', None, None)]), [])
+
+    def test_map_from_bundles(self):
+        # The "map" subcommand must give the same .map files from the daily bundles as from the text files
+        mod_dir = os.path.join(test_utils.mod_input_dir, 'oc', 'vertical')
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self._write_daily_bundles(tmp_dir)
+            text_dir = os.path.join(tmp_dir, 'text_maps')
+            os.mkdir(text_dir)
+            map_maker.cl_driver([test_utils.test_date, test_utils.test_date + timedelta(days=1)], mod_dir=mod_dir,
+                                vmr_dir=test_utils.vmr_input_dir, save_dir=text_dir, map_fmt='txt', dry=True,
+                                site_abbrev='oc')
+
+            for map_fmt, save_dir in [('txt', 'fpit'), ('bundle', 'bundle_maps')]:
+                args = ['20180101', '--root-dir', tmp_dir, '--from-bundles', '--site', 'oc', '--dry', '--map-fmt',
+                        map_fmt]
+                if map_fmt == 'bundle':
+                    args += ['--save-dir', os.path.join(tmp_dir, save_dir)]
+                    os.mkdir(os.path.join(tmp_dir, save_dir))
+                self._run_cl(map_maker.parse_cl_args, args)
+
+            map_files = sorted(os.listdir(text_dir))
+            self.assertEqual(len(map_files), 8)
+            self.assertEqual(sorted(f for f in os.listdir(os.path.join(tmp_dir, 'fpit')) if f.endswith('.map')),
+                             map_files)
+            map_bundle = os.path.join(tmp_dir, 'bundle_maps', bundles.bundle_file_name('fpit', test_utils.test_date,
+                                                                                        'map'))
+            export_dir = os.path.join(tmp_dir, 'exported')
+            bundles.export_bundle(map_bundle, export_dir)
+            for map_file in map_files:
+                with open(os.path.join(text_dir, map_file)) as robj:
+                    text_map = robj.read()
+                for other_dir in ('fpit', 'exported'):
+                    with open(os.path.join(tmp_dir, other_dir, map_file)) as robj:
+                        self.assertEqual(robj.read(), text_map, msg='{} ({})'.format(map_file, other_dir))
+
+    def test_bundle_driver(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            mod_bundle, vmr_bundle = self._write_daily_bundles(tmp_dir)
+            save_dir = os.path.join(tmp_dir, 'maps')
+            os.mkdir(save_dir)
+
+            date_range = [test_utils.test_date + timedelta(hours=18), test_utils.test_date + timedelta(days=1)]
+            map_maker.bundle_driver(mod_bundle, vmr_bundle, save_dir, map_fmt='txt', date_range=date_range)
+            self.assertEqual(sorted(os.listdir(save_dir)),
+                             ['oc_37N_097W_2018010118Z.map', 'oc_37N_097W_2018010121Z.map'])
+            map_maker.bundle_driver(mod_bundle, vmr_bundle, save_dir, map_fmt='txt', sites=[('pa', None, None)])
+            self.assertEqual(len(os.listdir(save_dir)), 2)
+
+            # Each .vmr profile needs exactly one .mod profile
+            mod_records = bundles.read_bundle(mod_bundle)
+            bundles.write_bundle(mod_bundle, 'mod', mod_records[1:], replace=True)
+            with self.assertRaisesRegex(RuntimeError, 'Found 0 profiles'):
+                map_maker.bundle_driver(mod_bundle, vmr_bundle, save_dir, map_fmt='txt')
+
+    @staticmethod
+    def _write_daily_bundles(bundle_dir):
+        mod_dir = os.path.join(test_utils.mod_input_dir, 'oc', 'vertical')
+        mod_files = sorted(os.path.join(mod_dir, f) for f in os.listdir(mod_dir) if f.endswith('.mod'))
+        vmr_files = sorted(os.path.join(test_utils.vmr_input_dir, f) for f in os.listdir(test_utils.vmr_input_dir)
+                           if f.endswith('.vmr'))
+        bundle_dir = os.path.join(bundle_dir, 'fpit')
+        os.makedirs(bundle_dir, exist_ok=True)
+        mod_bundle = os.path.join(bundle_dir, bundles.bundle_file_name('fpit', test_utils.test_date, 'mod'))
+        vmr_bundle = os.path.join(bundle_dir, bundles.bundle_file_name('fpit', test_utils.test_date, 'vmr'))
+        bundles.bundle_text_files(mod_bundle, 'mod', mod_files, site_abbrev='oc')
+        bundles.bundle_text_files(vmr_bundle, 'vmr', vmr_files, site_abbrev='oc')
+        return mod_bundle, vmr_bundle
+
+    @staticmethod
+    def _run_cl(parse_fxn, args):
+        parser = ArgumentParser()
+        parse_fxn(parser)
+        cl_args = vars(parser.parse_args(args))
+        driver_fxn = cl_args.pop('driver_fxn')
+        driver_fxn(**cl_args)
+
+
+def _write_test_clams_file(clams_file):
+    """
+    Write a small, smooth stand-in for the CLAMS age climatology, which is not distributed with the test data. It covers
+    the potential temperatures and equivalent latitudes in the test .mod files.
+    """
+    lat = np.arange(-90., 90.1, 5.)
+    theta = np.arange(250., 6001., 50.)
+    doy = np.arange(1, 367)
+    age = (0.5 + 4.5 * np.clip((theta[np.newaxis, :, np.newaxis] - 350) / 2000, 0, 1)
+           * (1 + 0.3 * np.cos(np.deg2rad(lat))[np.newaxis, np.newaxis, :])
+           * (1 + 0.1 * np.sin(2 * np.pi * doy / 366.))[:, np.newaxis, np.newaxis])
+    with ncdf.Dataset(clams_file, 'w') as nch:
+        nch.createDimension('doy', doy.size)
+        nch.createDimension('theta', theta.size)
+        nch.createDimension('lat', lat.size)
+        nch.createVariable('lat', 'f8', ('lat',))[:] = lat
+        nch.createVariable('extended_theta', 'f8', ('theta',))[:] = theta
+        nch.createVariable('doy', 'i4', ('doy',))[:] = doy
+        nch.createVariable('extended_age', 'f8', ('doy', 'theta', 'lat'))[:] = age
+    return clams_file
+
+
+class TestTcconPriors(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # The CLAMS age climatology is not distributed with the test data, so write a small, smooth stand-in that
+        # covers the potential temperatures and equivalent latitudes in the test .mod files.
+        cls._tmp_dir = tempfile.TemporaryDirectory()
+        cls._orig_clams_file = tccon_priors._clams_file
+        tccon_priors._clams_file = _write_test_clams_file(os.path.join(cls._tmp_dir.name, 'clams_test.nc'))
+
+    @classmethod
+    def tearDownClass(cls):
+        tccon_priors._clams_file = cls._orig_clams_file
+        cls._tmp_dir.cleanup()
+
+    @staticmethod
+    def _read_test_mod_files():
+        return [readers.read_mod_file(f) for f in TestTcconPriors._list_test_mod_files()]
+
+    @staticmethod
+    def _list_test_mod_files():
+        mod_dir = os.path.join(test_utils.mod_input_dir, 'oc', 'vertical')
+        return sorted(os.path.join(mod_dir, f) for f in os.listdir(mod_dir) if f.endswith('.mod'))
+
+    @classmethod
+    def _get_test_species(cls):
+        # Covers the batched stratosphere (CO2), the per-profile contexts (HF, CO) and the .mod-only records (H2O).
+        # The CO2 record takes a while to set up, so only make it once.
+        if not hasattr(cls, '_species'):
+            cls._species = [tccon_priors.CO2TropicsRecord(save_strat=False),
+                            tccon_priors.MidlatTraceGasRecord('HF', vmr_file=test_utils.std_vmr_file),
+                            tccon_priors.CORecord(),
+                            tccon_priors.H2ORecord()]
+        return cls._species
+
+    def test_driver_mixed_levels(self):
+        # Profiles with different numbers of levels cannot be stacked together, so they must go in separate batches.
+        # H2O and O3 come straight from the .mod data, so this does not need any of the lookup tables.
+        moddat = self._read_test_mod_files()[:2]
+        moddat[1]['profile'] = {k: v[5:] for k, v in moddat[1]['profile'].items()}
+        species = [tccon_priors.H2ORecord(), tccon_priors.O3Record()]
+
+        vmr_records = tccon_priors.generate_tccon_priors_driver(moddat, timedelta(0), species, return_records=True)
+        self.assertEqual(len(vmr_records), 2)
+        for record, data in zip(vmr_records, moddat):
+            self.assertEqual(record['profile']['Altitude'].size, data['profile']['Height'].size)
+            np.testing.assert_array_equal(record['profile']['Altitude'], data['profile']['Height'])
+            for specie in species:
+                single_prior, units, _ = tccon_priors.generate_single_tccon_prior(data, timedelta(0), specie)
+                scale = 1e-9 if units[specie.gas_name] == 'ppb' else 1.0
+                np.testing.assert_array_equal(record['profile'][specie.gas_name],
+                                              single_prior[specie.gas_name] * scale)
+
+        # The profiles are only kept if asked for
+        self.assertIsNone(tccon_priors.generate_tccon_priors_driver(moddat, timedelta(0), species))
+
+    def test_cl_driver_from_bundles(self):
+        # The "vmr" subcommand must give the same .vmr files from the daily .mod bundles as from the .mod files
+        mod_files = self._list_test_mod_files()
+        date_range = [test_utils.test_date, test_utils.test_date + timedelta(days=1)]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            bundle_dir = os.path.join(tmp_dir, 'fpit')
+            os.mkdir(bundle_dir)
+            bundles.bundle_text_files(os.path.join(bundle_dir, bundles.bundle_file_name('fpit', date_range[0], 'mod')),
+                                      'mod', mod_files, site_abbrev='oc')
+
+            parser = ArgumentParser()
+            tccon_priors.parse_args(parser)
+            cl_args = vars(parser.parse_args(['20180101', '--mod-root-dir', tmp_dir, '--from-bundles', '--site', 'oc']))
+            self.assertTrue(cl_args['from_bundles'])
+
+            vmr_files = dict()
+            for name, mod_kws in [('text', {'mod_dir': os.path.dirname(mod_files[0])}),
+                                  ('bundle', {'mod_root_dir': tmp_dir, 'from_bundles': True})]:
+                save_dir = os.path.join(tmp_dir, name)
+                os.mkdir(save_dir)
+                tccon_priors.cl_driver(date_range, save_dir=save_dir, site_abbrev='oc', std_vmr_file=False,
+                                       flat_outdir=True, use_existing_luts=True, **mod_kws)
+                vmr_files[name] = sorted(os.listdir(save_dir))
+
+            self.assertEqual(len(vmr_files['text']), len(mod_files))
+            self.assertEqual(vmr_files['bundle'], vmr_files['text'])
+            for vmr_file in vmr_files['text']:
+                with open(os.path.join(tmp_dir, 'text', vmr_file)) as f1, \
+                        open(os.path.join(tmp_dir, 'bundle', vmr_file)) as f2:
+                    self.assertEqual(f1.read(), f2.read(), msg=vmr_file)
+
+    def test_prior_batches_read_lazily(self):
+        # The driver must only hold one batch of .mod files at a time, so each file is read when its batch is needed
+        mod_files = self._list_test_mod_files()
+        files_read = []
+
+        def iter_mod_files():
+            for f in mod_files:
+                files_read.append(f)
+                yield f
+
+        batches = list()
+        for batch_start, batch in tccon_priors._iter_prior_batches(iter_mod_files(), max_profiles=3):
+            # Reading one file past the end of the batch is allowed, since that is how the batch is known to be done
+            self.assertLessEqual(len(files_read), batch_start + len(batch) + 1)
+            batches.append((batch_start, len(batch)))
+            for moddat, mod_file in zip(batch, mod_files[batch_start:]):
+                self.assertEqual(moddat['file']['datetime'], readers.read_mod_file(mod_file)['file']['datetime'])
+
+        self.assertEqual(batches, [(0, 3), (3, 3), (6, 2)])
+
+    def test_batch_shared_contexts(self):
+        # Reusing one set of contexts for every species must give the same priors as computing them for each species
+        moddat = self._read_test_mod_files()
+        stacked = tccon_priors.stack_mod_data(moddat)
+        obs_dates = [dtime.combine(d.date(), dtime.min.time()) for d in stacked['file']['datetime']]
+        contexts = tccon_priors.PriorContext.for_profiles(stacked, obs_dates)
+
+        for specie in self._get_test_species():
+            ref_prof, ref_units, ref_constants = tccon_priors.generate_tccon_priors_batch(moddat, timedelta(0), specie)
+            prof, units, constants = tccon_priors.generate_tccon_priors_batch(moddat, timedelta(0), specie,
+                                                                              contexts=contexts)
+            self.assertEqual(units, ref_units)
+            self.assertEqual(sorted(prof.keys()), sorted(ref_prof.keys()))
+            for key in ref_prof:
+                np.testing.assert_array_equal(prof[key], ref_prof[key], err_msg='{} {}'.format(specie.gas_name, key))
+            for key in ref_constants:
+                np.testing.assert_array_equal(constants[key], ref_constants[key],
+                                              err_msg='{} {}'.format(specie.gas_name, key))
+
+        np.testing.assert_array_equal(tccon_priors.PriorContext.stacked_clams_age(contexts),
+                                      np.stack([c.clams_age for c in contexts], axis=1))
+
+    def test_driver_nprocs(self):
+        # Generating the priors in worker processes must not change them
+        moddat = self._read_test_mod_files()
+        species = self._get_test_species()
+
+        serial_records = tccon_priors.generate_tccon_priors_driver(moddat, timedelta(0), species, nprocs=0,
+                                                                     return_records=True)
+        parallel_records = tccon_priors.generate_tccon_priors_driver(moddat, timedelta(0), species, nprocs=2,
+                                                                       return_records=True)
+        self.assertEqual(len(parallel_records), len(serial_records))
+        for serial, parallel in zip(serial_records, parallel_records):
+            self.assertEqual(sorted(parallel['profile'].keys()), sorted(serial['profile'].keys()))
+            for key, values in serial['profile'].items():
+                np.testing.assert_array_equal(parallel['profile'][key], values, err_msg=key)
+            self.assertEqual(parallel['scalar'], serial['scalar'])
+
+        # A single profile goes through the serial path even when a pool is requested
+        one_record = tccon_priors.generate_tccon_priors_driver(moddat[:1], timedelta(0), species, nprocs=2,
+                                                                return_records=True)
+        for key, values in serial_records[0]['profile'].items():
+            np.testing.assert_array_equal(one_record[0]['profile'][key], values, err_msg=key)
+
+
+class TestAcosInterface(unittest.TestCase):
+    # A synthetic OCO granule, built from the test .mod files, of this many sounding groups by footprints
+    _n_groups = 4
+    _n_footprints = 8
+
+    @classmethod
+    def setUpClass(cls):
+        cls._tmp_dir = tempfile.TemporaryDirectory()
+        cls._orig_clams_file = tccon_priors._clams_file
+        tccon_priors._clams_file = _write_test_clams_file(os.path.join(cls._tmp_dir.name, 'clams_test.nc'))
+        cls._met_file = cls._write_met_file(os.path.join(cls._tmp_dir.name, 'met_resampled.h5'))
+        # Only the dates in the GEOS file names are used, since the equivalent latitude interpolators are replaced
+        cls._geos_files = [os.path.join(cls._tmp_dir.name, 'GEOS.fpit.asm.inst3_3d_asm_Np.GEOS5124.20180101_{:02d}00.V01.nc4'.format(h))
+                           for h in (0, 3, 6)]
+        cls._strat_cache_dir = os.path.join(cls._tmp_dir.name, 'strat_cache')
+        os.mkdir(cls._strat_cache_dir)
+
+    @classmethod
+    def tearDownClass(cls):
+        tccon_priors._clams_file = cls._orig_clams_file
+        cls._tmp_dir.cleanup()
+
+    def setUp(self):
+        # Reading the full 0.5 degree GEOS files for the equivalent latitude would need more test data than we can
+        # distribute, so use smooth interpolators that vary a bit in time instead
+        self._orig_eqlat_functions = acos_interface._geos_eqlat_functions
+        acos_interface._geos_eqlat_functions = self._test_eqlat_functions
+
+    def tearDown(self):
+        acos_interface._geos_eqlat_functions = self._orig_eqlat_functions
+
+    @staticmethod
+    def _test_eqlat_functions(geos_files, eqlat_cache=None):
+        geos_datenums = np.array([sat_utils.datetime2datenum(mod_utils.datetime_from_geos_filename(f))
+                                  for f in geos_files])
+        pv_grid = np.linspace(-100., 100., 201)
+        theta_grid = np.linspace(200., 6000., 59)
+        scaled_pv = pv_grid[np.newaxis, :] / (theta_grid[:, np.newaxis] / 300.) ** 2
+        eqlat_fxns = [mod_utils.EqLatInterpolator(pv_grid, theta_grid, 90 * np.tanh((1 + 0.1 * i) * scaled_pv))
+                      for i in range(len(geos_files))]
+        return geos_datenums, eqlat_fxns
+
+    @classmethod
+    def _write_met_file(cls, met_file):
+        mod_data = TestTcconPriors._read_test_mod_files()
+        shape = (cls._n_groups, cls._n_footprints)
+        nlev = mod_data[0]['profile']['Height'].size
+        met = {k: np.zeros(shape + (nlev,)) for k in ('temperature_profile_met', 'vector_pressure_levels_met',
+                                                      'height_profile_met', 'epv_profile_met')}
+        for k in ('gph_met', 'blended_tropopause_pressure_met', 'tropopause_temperature_met', 'sounding_latitude',
+                  'sounding_longitude'):
+            met[k] = np.zeros(shape)
+        met['sounding_time_string'] = np.empty(shape, dtype='S32')
+        met['sounding_qual_flag'] = np.zeros(shape, dtype=np.int8)
+        for i, (i_group, i_foot) in enumerate(np.ndindex(*shape)):
+            data = mod_data[i % len(mod_data)]
+            # The met variables are ordered surface to top of atmosphere and in SI units
+            met['temperature_profile_met'][i_group, i_foot] = data['profile']['Temperature'][::-1]
+            met['vector_pressure_levels_met'][i_group, i_foot] = data['profile']['Pressure'][::-1] * 100
+            met['height_profile_met'][i_group, i_foot] = data['profile']['Height'][::-1] * 1000
+            met['epv_profile_met'][i_group, i_foot] = data['profile']['EPV'][::-1] * 1e-6
+            met['gph_met'][i_group, i_foot] = data['scalar']['Height'] * 1000
+            met['blended_tropopause_pressure_met'][i_group, i_foot] = data['scalar']['TROPPB'] * 100
+            met['tropopause_temperature_met'][i_group, i_foot] = data['scalar']['TROPT']
+            met['sounding_latitude'][i_group, i_foot] = data['file']['lat']
+            met['sounding_longitude'][i_group, i_foot] = data['file']['lon']
+            sounding_time = dtime(2018, 1, 1, 1) + timedelta(minutes=5 * i)
+            met['sounding_time_string'][i_group, i_foot] = sounding_time.strftime(acos_interface._acos_tstring_fmt).encode()
+        # One bad sounding, to check that its fill values end up in the same place
+        met['sounding_qual_flag'][1, 3] = 1
+
+        with h5py.File(met_file, 'w') as h5obj:
+            for k, v in met.items():
+                group = 'SoundingGeometry' if k.startswith('sounding') else 'Meteorology'
+                h5obj.require_group(group).create_dataset(k, data=v)
+        return met_file
+
+    def _run_priors(self, output_file, **kws):
+        acos_interface.acos_interface_main('oco', self._met_file, self._geos_files, output_file,
+                                           truncate_mlo_smo_by=None, cache_strat_lut=False,
+                                           strat_cache_dir=self._strat_cache_dir,
+                                           interp_pickle_dir=self._tmp_dir.name, **kws)
+        return output_file
+
+    def _assert_priors_equal(self, expected_file, test_file):
+        def read_datasets(h5file):
+            datasets = dict()
+            with h5py.File(h5file, 'r') as h5obj:
+                h5obj.visititems(lambda name, obj: datasets.update({name: obj[()]})
+                                 if isinstance(obj, h5py.Dataset) else None)
+            return datasets
+
+        expected = read_datasets(expected_file)
+        test = read_datasets(test_file)
+        self.assertEqual(sorted(expected.keys()), sorted(test.keys()))
+        for name, values in expected.items():
+            with self.subTest(dataset=name):
+                np.testing.assert_array_equal(test[name], values)
+
+    @staticmethod
+    @contextmanager
+    def _count_pools():
+        pools = []
+        orig_pool = acos_interface.Pool
+
+        def counting_pool(*args, **kwargs):
+            pools.append(orig_pool(*args, **kwargs))
+            return pools[-1]
+
+        acos_interface.Pool = counting_pool
+        try:
+            yield pools
+        finally:
+            acos_interface.Pool = orig_pool
+
+    @staticmethod
+    @contextmanager
+    def _count_shared_arrays():
+        names = []
+        orig_share_array = acos_interface._share_array
+
+        def counting_share_array(array, share_dir, name):
+            names.append(name)
+            return orig_share_array(array, share_dir, name)
+
+        acos_interface._share_array = counting_share_array
+        try:
+            yield names
+        finally:
+            acos_interface._share_array = orig_share_array
+
+    def _list_shared_dirs(self):
+        return [d for d in os.listdir(self._tmp_dir.name) if d.startswith('ginput_shared_')]
+
+    def test_parallel_priors(self):
+        # The parallel calculation must give the same priors as the serial one, start the worker processes only once
+        # for the equivalent latitudes and the priors, and clean up its shared arrays
+        serial_file = self._run_priors(os.path.join(self._tmp_dir.name, 'priors_serial.h5'))
+        with self._count_pools() as pools:
+            parallel_file = self._run_priors(os.path.join(self._tmp_dir.name, 'priors_parallel.h5'), nprocs=2)
+        self._assert_priors_equal(serial_file, parallel_file)
+        self.assertEqual(len(pools), 1)
+        self.assertEqual(self._list_shared_dirs(), [])
+
+    def test_chunked_priors(self):
+        # Processing the granule a few frames at a time must give the same priors as doing it all at once. In parallel,
+        # the chunks must reuse the same workers, eq. lat. tables, and strat LUT.
+        whole_file = self._run_priors(os.path.join(self._tmp_dir.name, 'priors_whole.h5'))
+        serial_chunk_file = self._run_priors(os.path.join(self._tmp_dir.name, 'priors_chunked_serial.h5'),
+                                             chunk_size=3)
+        self._assert_priors_equal(whole_file, serial_chunk_file)
+
+        with self._count_pools() as pools, self._count_shared_arrays() as shared_names:
+            parallel_chunk_file = self._run_priors(os.path.join(self._tmp_dir.name, 'priors_chunked_parallel.h5'),
+                                                   chunk_size=3, nprocs=2)
+        self._assert_priors_equal(whole_file, parallel_chunk_file)
+        self.assertEqual(len(pools), 1)
+        self.assertEqual(len([n for n in shared_names if n.startswith('interp_el')]), len(self._geos_files))
+        lut_names = [n for n in shared_names if n.startswith('strat_lut')]
+        self.assertGreater(len(lut_names), 0)
+        self.assertEqual(len(lut_names), len(set(lut_names)))
+        self.assertEqual(self._list_shared_dirs(), [])
+
+
+class _RangeRequestHandler(BaseHTTPRequestHandler):
+    # A minimal stand-in for the GEOS data servers: serves files from memory, supports range requests (including
+    # If-Range), cuts off the first response for any path in ``truncate_once`` halfway through, and records the path of
+    # every GET request.
+    files = dict()
+    truncate_once = set()
+    last_modified = 'Tue, 01 Jan 2019 00:00:00 GMT'
+    get_paths = []
+
+    def log_message(self, *args):
+        pass
+
+    def _send_headers(self):
+        data = self.files.get(self.path)
+        if data is None:
+            self.send_error(404)
+            return None, 0
+
+        start = 0
+        range_header = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        if range_header is not None and (if_range is None or if_range == self.last_modified):
+            start = int(range_header.split('=')[1].split('-')[0])
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, len(data) - 1, len(data)))
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(data) - start))
+        self.send_header('Last-Modified', self.last_modified)
+        self.end_headers()
+        return data, start
+
+    def do_HEAD(self):
+        self._send_headers()
+
+    def do_GET(self):
+        self.get_paths.append(self.path)
+        data, start = self._send_headers()
+        if data is None:
+            return
+        if self.path in self.truncate_once:
+            self.truncate_once.discard(self.path)
+            self.wfile.write(data[start:len(data) // 2])
+            self.close_connection = True
+        else:
+            self.wfile.write(data[start:])
+
+
+class TestDownloadUtils(unittest.TestCase):
+    def test_download_files(self):
+        rng = np.random.default_rng(0)
+        files = {'/file{}.nc4'.format(i): rng.bytes(200000) for i in range(4)}
+        _RangeRequestHandler.files = files
+        _RangeRequestHandler.truncate_once = {'/file0.nc4', '/file2.nc4'}
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _RangeRequestHandler)
+        server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+        server_thread.start()
+        try:
+            base_url = 'http://127.0.0.1:{}'.format(server.server_address[1])
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                pairs = [(base_url + path, os.path.join(tmp_dir, path.lstrip('/'))) for path in files]
+                bad_url = base_url + '/file3.nc4'
+                failures = download_utils.download_files(pairs, nthreads=3, backoff=0, retries=2,
+                                                         checksums={bad_url: '0' * 40})
+
+                with self.subTest(check='checksum'):
+                    self.assertEqual(list(failures), [bad_url])
+                    self.assertFalse(os.path.exists(os.path.join(tmp_dir, 'file3.nc4')))
+                for path, data in files.items():
+                    if path == '/file3.nc4':
+                        continue
+                    with self.subTest(file=path), open(os.path.join(tmp_dir, path.lstrip('/')), 'rb') as f:
+                        self.assertEqual(sha1(f.read()).hexdigest(), sha1(data).hexdigest())
+                self.assertFalse(any(f.endswith('.part') for f in os.listdir(tmp_dir)))
+
+                # Files that are already present and up to date should not be downloaded again
+                self.assertFalse(download_utils.download_file(*pairs[0]))
+
+                with self.subTest(check='stale partial file'):
+                    # A partial file from an older version of the remote file must not be resumed
+                    dest = os.path.join(tmp_dir, 'stale.nc4')
+                    with open(dest + '.part', 'wb') as f:
+                        f.write(b'x' * 1000)
+                    old_time = dtime(2018, 6, 1).timestamp()
+                    os.utime(dest + '.part', (old_time, old_time))
+                    self.assertTrue(download_utils.download_file(base_url + '/file1.nc4', dest, backoff=0))
+                    with open(dest, 'rb') as f:
+                        self.assertEqual(f.read(), files['/file1.nc4'])
+
+                with self.subTest(check='not found'):
+                    _RangeRequestHandler.get_paths = []
+                    with self.assertRaises(download_utils.DownloadError):
+                        download_utils.download_file(base_url + '/missing.nc4', os.path.join(tmp_dir, 'missing.nc4'),
+                                                     backoff=0, retries=3)
+                    self.assertEqual(_RangeRequestHandler.get_paths, ['/missing.nc4'])
+
+                with self.subTest(check='failed rename'):
+                    # A destination that cannot be replaced is reported as a failure rather than stopping the others
+                    os.makedirs(os.path.join(tmp_dir, 'isdir.nc4', 'sub'))
+                    failures = download_utils.download_files(
+                        [(base_url + '/file0.nc4', os.path.join(tmp_dir, 'isdir.nc4')),
+                         (base_url + '/file1.nc4', os.path.join(tmp_dir, 'ok.nc4'))], backoff=0, retries=0
+                    )
+                    self.assertEqual(list(failures), [base_url + '/file0.nc4'])
+                    self.assertIsInstance(failures[base_url + '/file0.nc4'], OSError)
+                    self.assertTrue(os.path.exists(os.path.join(tmp_dir, 'ok.nc4')))
+        finally:
+            server.shutdown()
+            server.server_close()
+
 
 if __name__ == '__main__':
     unittest.main()